@@ -1,8 +1,14 @@
 package main
 
 import (
+	"fmt"
+	"io"
+	"os"
 	"strings"
+	"time"
 
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/clients"
 	"github.com/adhuliya/span/pkg/logger"
 	"github.com/adhuliya/span/pkg/spir"
 	"github.com/spf13/cobra"
@@ -13,6 +19,19 @@ type CmdLine struct {
 	Command    string
 	InputFiles []string // Positional (non-flag) arguments: typically input file paths.
 	DumpTUTxt  bool
+	Jobs       int    // Number of files to load (or functions to analyze) concurrently (0: one per CPU)
+	CacheDir   string // Directory of the TU snapshots (empty: no snapshots)
+
+	// Options of the analyze command
+	Analyses     []string // Names of the analyses to run (see clients.AnalysisNames())
+	OutputFormat string   // Format of the results: json, bin or facts
+	OutputFile   string   // File to write the results (or the linked TU) to
+	Solver       string   // Fixed point solver: generic, bitvector or sparse
+	ResultStore  string   // Directory of the results reused across runs (empty: none)
+	Stats        string   // File to write the performance report to ("-": stderr, empty: none)
+	Interproc    string   // Analysis of the calls: none, summaries or contexts
+	// Write only the facts at the entry and the exit of the basic blocks.
+	BoundaryFacts bool
 }
 
 var (
@@ -21,6 +40,8 @@ var (
 		Use:   "span",
 		Short: "Synergistic Program Analyzer",
 		Long:  `SPAN is a program analysis engine for analyzing C11 standard programs. It can analyze single or multiple SPIR files.`,
+		// The errors of the commands are logged by main.
+		SilenceErrors: true,
 	}
 )
 
@@ -33,22 +54,50 @@ func configureCommand() {
 	rootCmd.PersistentFlags().BoolVar(&cmdLine.LogConfig.UseJSON, "log-json", false, "Use JSON format for logging")
 	rootCmd.PersistentFlags().BoolVar(&cmdLine.DumpTUTxt, "dump-txt",
 		false, "Dump the TU in text format (default: false)")
+	rootCmd.PersistentFlags().StringVar(&cmdLine.CacheDir, "cache-dir", "",
+		"Cache the converted TUs as snapshots in this directory (default: no cache)")
 
 	// Add subcommands
-	rootCmd.AddCommand(analyzeCmd)
+	rootCmd.AddCommand(analyzeCmd())
 	rootCmd.AddCommand(loacCmd())
+	rootCmd.AddCommand(linkCmd())
 }
 
-var analyzeCmd = &cobra.Command{
-	Use:   "analyze [flags] [files...]",
-	Short: "Analyze a SPIR file",
-	Args:  cobra.MinimumNArgs(1),
-	Run: func(cmd *cobra.Command, args []string) {
-		cmdLine.Command = "analyze"
-		cmdLine.InputFiles = args
-		logger.Get().Info("Analyzing SPIR file...")
-		// TODO: Implement analyze
-	},
+var analyzeCmd = func() *cobra.Command {
+	cmd := &cobra.Command{
+		Use:   "analyze [flags] [files...]",
+		Short: "Analyze SPIR protocol buffer file(s)",
+		Args:  cobra.MinimumNArgs(1),
+		// An error (e.g. a file that fails to load) is returned to main,
+		// which exits with a non-zero status.
+		SilenceUsage: true,
+		RunE: func(cmd *cobra.Command, args []string) error {
+			cmdLine.Command = "analyze"
+			cmdLine.InputFiles = args
+			if err := executeAnalyze(); err != nil {
+				return fmt.Errorf("analysis failed: %w", err)
+			}
+			return nil
+		},
+	}
+	cmd.Flags().StringSliceVarP(&cmdLine.Analyses, "analysis", "a", []string{"livevars"},
+		"Analyses to run ("+strings.Join(clients.AnalysisNames(), ", ")+")")
+	cmd.Flags().StringVar(&cmdLine.OutputFormat, "format", "json", "Format of the results (json, bin, facts)")
+	cmd.Flags().StringVarP(&cmdLine.OutputFile, "output", "o", "", "Write the results to this file (default: stdout)")
+	cmd.Flags().StringVar(&cmdLine.Solver, "solver", "generic",
+		"Fixed point solver (generic, bitvector, sparse); the others fall back to generic for an analysis they don't support")
+	cmd.Flags().StringVar(&cmdLine.ResultStore, "result-store", "",
+		"Reuse the results of the unchanged functions stored in this directory (default: analyze all)")
+	cmd.Flags().StringVar(&cmdLine.Stats, "stats", "",
+		"Write the time taken and the solver counters per function and per analysis as JSON to this file (\"-\": stderr)")
+	cmd.Flags().IntVarP(&cmdLine.Jobs, "jobs", "j", 0, "Number of functions to analyze concurrently (default: one per CPU)")
+	cmd.Flags().StringVar(&cmdLine.Interproc, "interproc", "none",
+		"Analysis of the calls (none; summaries: bottom-up with the summaries of the callees; "+
+			"contexts: top-down from main in a context per entry fact), by the generic solver; "+
+			"an analysis without summaries falls back to none")
+	cmd.Flags().BoolVar(&cmdLine.BoundaryFacts, "boundary-facts", false,
+		"Write only the facts at the entry and the exit of the basic blocks, the others can be recomputed from them (default: all the facts)")
+	return cmd
 }
 
 var loacCmd = func() *cobra.Command {
@@ -62,6 +111,7 @@ var loacCmd = func() *cobra.Command {
 			executeLoad()
 		},
 	}
+	cmd.Flags().IntVarP(&cmdLine.Jobs, "jobs", "j", 0, "Number of files to load concurrently (default: one per CPU)")
 	return cmd
 }
 
@@ -86,13 +136,291 @@ func processCmdLine(args []string) *cobra.Command {
 	return rootCmd
 }
 
-func executeAnalyze() error {
-	// TODO: Implement analyze
-	return nil
+// executeAnalyze runs the selected analyses on every function of the input files.
+// The functions of a file are analyzed concurrently (see CmdLine.Jobs); with
+// --interproc, a SummaryAnalysis analyzes them all together first. The
+// results of a function are written out, in the order of the functions, as
+// soon as its analysis converges and those of the previous functions are
+// written, and are then dropped.
+func executeAnalyze() (err error) {
+	args := getCmdLine().InputFiles
+	if len(args) == 0 {
+		return fmt.Errorf("no input files specified")
+	}
+
+	format, err := analysis.ParseResultFormat(getCmdLine().OutputFormat)
+	if err != nil {
+		return err
+	}
+
+	solver, err := analysis.ParseSolverMode(getCmdLine().Solver)
+	if err != nil {
+		return err
+	}
+
+	interproc, err := analysis.ParseInterprocMode(getCmdLine().Interproc)
+	if err != nil {
+		return err
+	}
+	if interproc != analysis.IntraprocMode && getCmdLine().ResultStore != "" {
+		// The key of a function (see analysis.FuncKeys) doesn't cover its callees.
+		return fmt.Errorf("--result-store is not supported with --interproc %s", getCmdLine().Interproc)
+	}
+
+	factories := make([]analysis.AnalysisFactory, len(getCmdLine().Analyses))
+	for i, name := range getCmdLine().Analyses {
+		factory, ok := clients.AnalysisFactory(name)
+		if !ok {
+			return fmt.Errorf("unknown analysis %q (expected one of: %s)",
+				name, strings.Join(clients.AnalysisNames(), ", "))
+		}
+		factories[i] = factory
+	}
+
+	var out io.Writer = os.Stdout
+	if outFile := getCmdLine().OutputFile; outFile != "" {
+		file, err := os.Create(outFile)
+		if err != nil {
+			return err
+		}
+		defer file.Close()
+		out = file
+	}
+	resWriter, err := analysis.NewResultWriter(out, format)
+	if err != nil {
+		return err
+	}
+	defer func() {
+		// A writer may complete its output on close (e.g. the index of the facts format).
+		if closeErr := resWriter.Close(); err == nil {
+			err = closeErr
+		}
+	}()
+
+	var incremental *analysis.IncrementalAnalyzer
+	if dir := getCmdLine().ResultStore; dir != "" {
+		store, err := analysis.NewResultStore(dir)
+		if err != nil {
+			return err
+		}
+		incremental = analysis.NewIncrementalAnalyzer(store, solver)
+	}
+
+	var report *analysis.StatsReport
+	if getCmdLine().Stats != "" {
+		report = analysis.NewStatsReport(getCmdLine().Solver)
+	}
+
+	for _, file := range args {
+		tu, err := loadTU(file)
+		if err != nil {
+			return err
+		}
+		var funcKeys []map[spir.EntityId]string // per analysis
+		if incremental != nil {
+			for _, name := range getCmdLine().Analyses {
+				funcKeys = append(funcKeys, analysis.FuncKeys(tu, name, solver))
+			}
+		}
+		// The inter-procedural analyses analyze all the functions first.
+		tuAnalyzers := make([]analysis.TUAnalyzer, len(factories))
+		tuResults := make([]map[spir.EntityId]analysis.FuncResult, len(factories))
+		for i, factory := range factories {
+			tuAnalyzer, ok := analysis.NewTUAnalyzer(tu, factory, interproc, getCmdLine().Jobs)
+			if !ok {
+				continue
+			}
+			tuAnalyzer.SetCollectStats(report != nil)
+			tuResults[i] = make(map[spir.EntityId]analysis.FuncResult)
+			for _, res := range tuAnalyzer.AnalyzeTU() {
+				tuResults[i][res.FuncId] = res
+			}
+			tuAnalyzers[i] = tuAnalyzer
+		}
+		// A task per function (with a body) and analysis, written in this order.
+		var tasks []analyzeTask
+		for _, fid := range tu.FunctionIds() {
+			fun := tu.GetFunctionById(fid)
+			if fun.Body() == nil {
+				logger.Get().Debug("Skipping function without a body", "function", fun.Name())
+				continue
+			}
+			for i := range factories {
+				tasks = append(tasks, analyzeTask{fun: fun, analysis: i})
+			}
+		}
+		// The functions are analyzed concurrently, and their results written
+		// in order as soon as the results of the previous ones are.
+		err = analysis.RunOrdered(len(tasks), getCmdLine().Jobs, func(k int) analyzeOutput {
+			task := tasks[k]
+			fun := task.fun
+			out := analyzeOutput{header: analysis.ResultHeader{
+				TUName:       file,
+				AnalysisName: getCmdLine().Analyses[task.analysis],
+				FuncName:     fun.Name(),
+			}}
+			if tuAnalyzer := tuAnalyzers[task.analysis]; tuAnalyzer != nil {
+				res := tuResults[task.analysis][fun.Id()]
+				if getCmdLine().BoundaryFacts {
+					analysis.KeepBoundaryFacts(fun.Body(), res.FactMap)
+				}
+				out.res = &res
+				out.stats, out.elapsed = tuAnalyzer.FuncStats(fun.Id())
+				return out
+			}
+			if report != nil {
+				out.stats = &analysis.EngineStats{}
+			}
+			start := time.Now()
+			if incremental != nil {
+				out.rendered, out.loaded = incremental.AnalyzeFunction(tu, fun,
+					funcKeys[task.analysis][fun.Id()], factories[task.analysis], out.stats)
+				out.elapsed = time.Since(start)
+				if getCmdLine().BoundaryFacts {
+					analysis.KeepBoundaryRenderedFacts(fun.Body(), out.rendered)
+				}
+				return out
+			}
+			res := analysis.AnalyzeFunctionWithStats(tu, fun, factories[task.analysis](), solver, false, false, out.stats)
+			out.elapsed = time.Since(start)
+			if getCmdLine().BoundaryFacts {
+				analysis.KeepBoundaryFacts(fun.Body(), res.FactMap)
+			}
+			out.res = &res
+			return out
+		}, func(_ int, out analyzeOutput) error {
+			addFuncStats(report, out.header, out.elapsed, out.stats, out.loaded)
+			if out.rendered != nil {
+				return resWriter.WriteRenderedResult(out.header, out.rendered)
+			}
+			return resWriter.WriteFuncResult(out.header, out.res)
+		})
+		if err != nil {
+			return err
+		}
+	}
+	if incremental != nil {
+		loaded, analyzed := incremental.Stats()
+		logger.Get().Info("Incremental analysis", "loaded", loaded, "analyzed", analyzed)
+	}
+	if report != nil {
+		if err := writeStatsReport(report, getCmdLine().Stats); err != nil {
+			return err
+		}
+	}
+	return nil // the writer is closed by the deferred call
+}
+
+// The analysis of a function by one of the analyses of the command line.
+type analyzeTask struct {
+	fun      *spir.Function
+	analysis int // the index in CmdLine.Analyses
+}
+
+// The result of an analyzeTask, to be written.
+type analyzeOutput struct {
+	header   analysis.ResultHeader
+	res      *analysis.FuncResult
+	rendered *analysis.RenderedResult // with a result store (res is nil)
+	loaded   bool                     // the rendered result was loaded from the store
+	stats    *analysis.EngineStats
+	elapsed  time.Duration
+}
+
+// addFuncStats adds the stats of a function to the report (if any); the
+// counters of a result loaded from the result store are zero.
+func addFuncStats(report *analysis.StatsReport, header analysis.ResultHeader,
+	elapsed time.Duration, stats *analysis.EngineStats, loaded bool) {
+	if report == nil {
+		return
+	}
+	report.Add(analysis.FuncStats{
+		TUName:       header.TUName,
+		FuncName:     header.FuncName,
+		AnalysisName: header.AnalysisName,
+		Elapsed:      elapsed,
+		Counters:     *stats,
+		Loaded:       loaded,
+	})
+}
+
+// writeStatsReport writes the report to the file ("-": stderr).
+func writeStatsReport(report *analysis.StatsReport, file string) error {
+	if file == "-" {
+		return report.Write(os.Stderr)
+	}
+	out, err := os.Create(file)
+	if err != nil {
+		return err
+	}
+	if err := report.Write(out); err != nil {
+		out.Close()
+		return err
+	}
+	return out.Close()
+}
+
+var linkCmd = func() *cobra.Command {
+	cmd := &cobra.Command{
+		Use:   "link [flags] [files...]",
+		Short: "Link SPIR protocol buffer file(s) into a single TU",
+		Args:  cobra.MinimumNArgs(1),
+		// An error is returned to main, as for the analyze command.
+		SilenceUsage: true,
+		RunE: func(cmd *cobra.Command, args []string) error {
+			cmdLine.Command = "link"
+			cmdLine.InputFiles = args
+			if err := executeLink(); err != nil {
+				return fmt.Errorf("linking failed: %w", err)
+			}
+			return nil
+		},
+	}
+	cmd.Flags().IntVarP(&cmdLine.Jobs, "jobs", "j", 0, "Number of files to load concurrently (default: one per CPU)")
+	cmd.Flags().StringVarP(&cmdLine.OutputFile, "output", "o", "",
+		"Write the linked TU to this "+spir.SpirProtoFileSuffix+" file (default: not written)")
+	return cmd
 }
 
+// executeLink loads the input files (concurrently) and links them into a
+// single TU (see spir.LinkTUs). A file that fails to load fails the link.
+// The linked TU is written to the output file, if any.
 func executeLink() error {
-	// TODO: Implement link
+	args := getCmdLine().InputFiles
+	if len(args) == 0 {
+		return fmt.Errorf("no input files specified")
+	}
+	outFile := getCmdLine().OutputFile
+	if outFile != "" && !strings.HasSuffix(outFile, spir.SpirProtoFileSuffix) {
+		return fmt.Errorf("output file %s: expected the %s extension", outFile, spir.SpirProtoFileSuffix)
+	}
+
+	start := time.Now()
+	results := spir.LoadSpirFilesCached(args, getCmdLine().Jobs, snapshotCache())
+	tus := make([]*spir.TU, 0, len(results))
+	for _, res := range results {
+		if res.Err != nil {
+			return res.Err
+		}
+		tus = append(tus, res.TU)
+	}
+	loadTime := time.Since(start)
+
+	tu, err := spir.LinkTUs(tus, nil, false)
+	if err != nil {
+		return err
+	}
+	logger.Get().Info("Linked SPIR files", "files", len(tus),
+		"functions", len(tu.FunctionIds()), "load", loadTime, "elapsed", time.Since(start))
+	if getCmdLine().DumpTUTxt {
+		tu.Dump()
+	}
+	if outFile != "" {
+		if err := spir.WriteSpirProto(spir.ConvertInternalTUToBitTU(tu), outFile); err != nil {
+			return err
+		}
+		logger.Get().Info("Wrote the linked TU", "file", outFile)
+	}
 	return nil
 }
 
@@ -102,9 +430,9 @@ func getCmdLine() *CmdLine {
 
 func executeLoad() {
 	// This function loads all SPIR protocol buffer files listed in the command line args.
-	// It iterates through all arguments, filters for files ending with ".spir.pb",
-	// loads each one using ReadSpirProto, converts it to an internal TU, and errors
-	// out on any file not ending with ".spir.pb".
+	// The files are read, unmarshalled and converted to internal TUs concurrently
+	// (see spir.LoadSpirFiles). The results are reported in the order of the args,
+	// and a failure in one file does not stop the loading of the others.
 
 	args := getCmdLine().InputFiles
 
@@ -113,30 +441,48 @@ func executeLoad() {
 		return
 	}
 
-	for _, file := range args {
-		if !strings.HasSuffix(file, ".spir.pb") {
-			logger.Get().Error("Invalid file extension for: " + file + " (expected .spir.pb)")
-			return
-		}
-		logger.Get().Info("Loading SPIR protocol buffer file: " + file)
-		bitTU, err := spir.ReadSpirProto(file)
-		if err != nil {
-			logger.Get().Error("Failed to read SPIR proto file: "+file, "error", err)
-			return
-		}
-
-		tu := spir.ConvertBitTUToInternalTU(bitTU)
-		if tu == nil {
-			logger.Get().Error("Failed to convert to internal TU for file: " + file)
-			return
+	start := time.Now()
+	results := spir.LoadSpirFilesCached(args, getCmdLine().Jobs, snapshotCache())
+	failed := 0
+	total := spir.LoadStats{}
+	for _, res := range results {
+		total.Add(res.Stats)
+		if res.Err != nil {
+			failed++
+			logger.Get().Error("Failed to load SPIR file: "+res.File, "error", res.Err)
+			continue
 		}
 
 		// Optionally store or process the TU here, e.g., add it to a list for later use.
-		logger.Get().Info("Successfully loaded and converted SPIR file: " + file)
+		logger.Get().Info("Successfully loaded and converted SPIR file: "+res.File,
+			"snapshot", res.FromSnapshot, "stats", res.Stats)
 		if getCmdLine().DumpTUTxt {
-			logger.Get().Info("Dumping TU in text format: " + file)
-			tu.Dump()
+			logger.Get().Info("Dumping TU in text format: " + res.File)
+			res.TU.Dump()
 		}
 	}
+	logger.Get().Info("Loaded SPIR files", "loaded", len(results)-failed,
+		"failed", failed, "elapsed", time.Since(start), "stats", total)
+}
+
+// loadTU reads a SPIR protocol buffer file (with a ".spir.pb" extension)
+// and converts it to an internal TU.
+func loadTU(file string) (*spir.TU, error) {
+	logger.Get().Info("Loading SPIR protocol buffer file: " + file)
+	res := spir.LoadSpirFileCached(file, snapshotCache())
+	return res.TU, res.Err
+}
 
+// snapshotCache returns the cache of TU snapshots, or nil if it is disabled
+// (or can't be created, which is logged).
+func snapshotCache() *spir.SnapshotCache {
+	if getCmdLine().CacheDir == "" {
+		return nil
+	}
+	cache, err := spir.NewSnapshotCache(getCmdLine().CacheDir)
+	if err != nil {
+		logger.Get().Error("Not using the snapshot cache", "error", err)
+		return nil
+	}
+	return cache
 }
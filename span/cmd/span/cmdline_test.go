@@ -0,0 +1,320 @@
+package main
+
+import (
+	"bufio"
+	"bytes"
+	"encoding/binary"
+	"encoding/json"
+	"fmt"
+	"os"
+	"path/filepath"
+	"reflect"
+	"slices"
+	"strings"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/clients"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A line of the json results (see analysis.NewResultWriter).
+type jsonResult struct {
+	Func  string                  `json:"func"`
+	Facts []analysis.RenderedFact `json:"facts"`
+}
+
+func readJSONResults(t *testing.T, file string) map[string][]analysis.RenderedFact {
+	t.Helper()
+	in, err := os.Open(file)
+	if err != nil {
+		t.Fatal(err)
+	}
+	defer in.Close()
+	results := map[string][]analysis.RenderedFact{}
+	scanner := bufio.NewScanner(in)
+	for scanner.Scan() {
+		var res jsonResult
+		if err := json.Unmarshal(scanner.Bytes(), &res); err != nil {
+			t.Fatal(err)
+		}
+		results[res.Func] = res.Facts
+	}
+	return results
+}
+
+// TestExecuteAnalyze_spirFile analyzes a serialized .spir.pb file end to end:
+// the functions loaded have a body, and the facts written are those of the
+// analysis of the TU in memory.
+func TestExecuteAnalyze_spirFile(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "globals"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.NewExampleBitTU_Globals(), file); err != nil {
+		t.Fatal(err)
+	}
+
+	for _, solver := range []string{"generic", "bitvector"} {
+		out := filepath.Join(dir, solver+".json")
+		cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"livevars"},
+			OutputFormat: "json", OutputFile: out, Solver: solver}
+		if err := executeAnalyze(); err != nil {
+			t.Fatalf("%s: %v", solver, err)
+		}
+		got := readJSONResults(t, out)
+
+		res := spir.LoadSpirFile(file)
+		if res.Err != nil {
+			t.Fatal(res.Err)
+		}
+		mode, _ := analysis.ParseSolverMode(solver)
+		newAnalysis, _ := clients.AnalysisFactory("livevars")
+		for _, name := range []string{"f:f", spir.K_MAIN_FUNC_NAME} {
+			fun := res.TU.GetFunction(name)
+			funcRes := analysis.AnalyzeFunctionWithSolver(res.TU, fun, newAnalysis(), mode, false, false)
+			want := analysis.RenderFuncResult(&funcRes).Facts
+			if len(got[name]) == 0 || !reflect.DeepEqual(got[name], want) {
+				t.Errorf("%s, %s: expected the facts %v, got %v", solver, name, want, got[name])
+			}
+		}
+	}
+}
+
+// The sizes in the facts format (see analysis/factsresults.go).
+const (
+	factsFooterSize     = 40
+	factsIndexEntrySize = 48
+)
+
+// TestExecuteAnalyze_factsFormat writes the results in the facts format: the
+// file ends with a single footer, whose sections end where the file does.
+func TestExecuteAnalyze_factsFormat(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "globals"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.NewExampleBitTU_Globals(), file); err != nil {
+		t.Fatal(err)
+	}
+	out := filepath.Join(dir, "out.facts")
+	cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"livevars"},
+		OutputFormat: "facts", OutputFile: out, Solver: "generic"}
+	if err := executeAnalyze(); err != nil {
+		t.Fatal(err)
+	}
+
+	data, err := os.ReadFile(out)
+	if err != nil {
+		t.Fatal(err)
+	}
+	le := binary.LittleEndian
+	if len(data) < factsFooterSize || string(data[:8]) != analysis.FactsResultMagic ||
+		string(data[len(data)-8:]) != analysis.FactsResultMagic {
+		t.Fatalf("bad facts file (%d bytes)", len(data))
+	}
+	footer := data[len(data)-factsFooterSize:]
+	namesOffset, nameCount := le.Uint64(footer), le.Uint64(footer[8:])
+	indexOffset, funcCount := le.Uint64(footer[16:]), le.Uint64(footer[24:])
+	if funcCount != 2 {
+		t.Errorf("expected the results of 2 functions, got %d", funcCount)
+	}
+	if want := indexOffset + funcCount*factsIndexEntrySize + factsFooterSize; uint64(len(data)) != want {
+		t.Fatalf("expected %d bytes, got %d", want, len(data))
+	}
+	// The magic is only in the header and in the footer (e.g. the trailer is
+	// not written again by a second close).
+	if n := bytes.Count(data, []byte(analysis.FactsResultMagic)); n != 2 {
+		t.Fatalf("expected a single footer, got the magic %d times", n)
+	}
+	names := data[namesOffset:indexOffset]
+	nameBytes := le.Uint64(names[8*nameCount:])
+	var got []string
+	for i := range nameCount {
+		start, end := le.Uint64(names[8*i:]), le.Uint64(names[8*(i+1):])
+		got = append(got, string(names[8*(nameCount+1)+start:8*(nameCount+1)+end]))
+	}
+	if 8*(nameCount+1)+nameBytes > uint64(len(names)) || !slices.Contains(got, file) ||
+		!slices.Contains(got, "livevars") || !slices.Contains(got, spir.K_MAIN_FUNC_NAME) {
+		t.Errorf("expected the names of the file, the analysis and main, got %q", got)
+	}
+}
+
+// TestExecuteAnalyze_jobs analyzes the functions concurrently: the results
+// are written in the same order as by a single job.
+func TestExecuteAnalyze_jobs(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "globals"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.NewExampleBitTU_Globals(), file); err != nil {
+		t.Fatal(err)
+	}
+	var outputs []string
+	for _, jobs := range []int{1, 4} {
+		out := filepath.Join(dir, fmt.Sprintf("jobs%d.json", jobs))
+		cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"livevars", "reachdefs"},
+			OutputFormat: "json", OutputFile: out, Solver: "generic", Jobs: jobs}
+		if err := executeAnalyze(); err != nil {
+			t.Fatalf("jobs=%d: %v", jobs, err)
+		}
+		data, err := os.ReadFile(out)
+		if err != nil {
+			t.Fatal(err)
+		}
+		outputs = append(outputs, string(data))
+	}
+	if lines := strings.Count(outputs[0], "\n"); lines != 4 || outputs[1] != outputs[0] {
+		t.Errorf("expected the same 4 results, got\n%s\nand\n%s", outputs[0], outputs[1])
+	}
+}
+
+func TestExecuteAnalyze_loadError(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	cmdLine = CmdLine{InputFiles: []string{filepath.Join(dir, "missing"+spir.SpirProtoFileSuffix)},
+		Analyses: []string{"livevars"}, OutputFormat: "json", OutputFile: filepath.Join(dir, "out.json"),
+		Solver: "generic"}
+	if err := executeAnalyze(); err == nil {
+		t.Errorf("expected an error for a missing file")
+	}
+}
+
+// TestExecuteLink_output writes the linked TU, which loads back with the
+// functions of the input.
+func TestExecuteLink_output(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "globals"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.NewExampleBitTU_Globals(), file); err != nil {
+		t.Fatal(err)
+	}
+	out := filepath.Join(dir, "linked"+spir.SpirProtoFileSuffix)
+	cmdLine = CmdLine{InputFiles: []string{file}, OutputFile: out}
+	if err := executeLink(); err != nil {
+		t.Fatal(err)
+	}
+
+	res := spir.LoadSpirFile(out)
+	if res.Err != nil {
+		t.Fatal(res.Err)
+	}
+	for _, name := range []string{"f:f", spir.K_MAIN_FUNC_NAME} {
+		if fun := res.TU.GetFunction(name); fun == nil || fun.Body() == nil {
+			t.Errorf("the linked TU has no function %s with a body", name)
+		}
+	}
+}
+
+func TestExecuteLink_errors(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	cmdLine = CmdLine{InputFiles: []string{filepath.Join(dir, "missing"+spir.SpirProtoFileSuffix)}}
+	if err := executeLink(); err == nil {
+		t.Errorf("expected an error for a missing file")
+	}
+	cmdLine.OutputFile = filepath.Join(dir, "linked.txt")
+	if err := executeLink(); err == nil || !strings.Contains(err.Error(), spir.SpirProtoFileSuffix) {
+		t.Errorf("expected an error for the extension of the output file, got %v", err)
+	}
+}
+
+// TestExecuteAnalyze_boundaryFacts writes only the facts at the boundaries
+// of the blocks (of the straight line main function).
+func TestExecuteAnalyze_boundaryFacts(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "straight"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.ConvertInternalTUToBitTU(spir.NewExampleTU_Straight(8)), file); err != nil {
+		t.Fatal(err)
+	}
+	for _, store := range []string{"", filepath.Join(dir, "store")} {
+		for range 2 { // the second time from the result store, if any
+			out := filepath.Join(dir, "out.json")
+			cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"livevars"}, OutputFormat: "json",
+				OutputFile: out, Solver: "generic", ResultStore: store, BoundaryFacts: true}
+			if err := executeAnalyze(); err != nil {
+				t.Fatal(err)
+			}
+			res := spir.LoadSpirFile(file)
+			if res.Err != nil {
+				t.Fatal(res.Err)
+			}
+			body := res.TU.GetFunction(spir.K_MAIN_FUNC_NAME).Body()
+			want := 0 // the entry and the exit of each block
+			for _, bbId := range spir.GetBBWorklist(body, spir.NoOrder) {
+				want += min(body.BasicBlock(bbId).InsnCount(), 2)
+			}
+			if got := readJSONResults(t, out)[spir.K_MAIN_FUNC_NAME]; len(got) != want {
+				t.Errorf("store %q: expected %d boundary facts, got %d", store, want, len(got))
+			}
+		}
+	}
+}
+
+// A TU with a call to a function with a body:
+//
+//	f() { g = 1; }
+//	main() { g = 0; f(); x = g; return x; }
+func newCallsTestTU() *spir.TU {
+	tu := spir.NewTU()
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	g := tu.NewVar("g", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	x := tu.NewVar("x", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+
+	fbb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 2)
+	tu.AddInsn(fbb, spir.AssignI(spir.ValX(g), spir.ValX(tu.NewConst(1, spir.Int32QT))), nil)
+	tu.AddInsn(fbb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+	f := tu.NewFunction("f", funcQT, nil, fbb)
+
+	bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 4)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(g), spir.ValX(tu.NewConst(0, spir.Int32QT))), nil)
+	tu.AddInsn(bb, spir.CallI(spir.CallX(f.Id(), tu.NewCallSiteId())), nil)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(x), spir.ValX(g)), nil)
+	tu.AddInsn(bb, spir.ReturnI(spir.ValX(x)), nil)
+	tu.NewFunction(spir.K_MAIN_FUNC_NAME, funcQT, nil, bb)
+	return tu
+}
+
+// TestExecuteAnalyze_interproc analyzes the calls with the summaries of the
+// callees, then in the value contexts of the callees: the facts after the
+// call in main change, and those of f only in its value context.
+func TestExecuteAnalyze_interproc(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	dir := t.TempDir()
+	file := filepath.Join(dir, "calls"+spir.SpirProtoFileSuffix)
+	if err := spir.WriteSpirProto(spir.ConvertInternalTUToBitTU(newCallsTestTU()), file); err != nil {
+		t.Fatal(err)
+	}
+	results := map[string]map[string][]analysis.RenderedFact{}
+	for _, interproc := range []string{"none", "summaries", "contexts"} {
+		out := filepath.Join(dir, interproc+".json")
+		cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"reachdefs"},
+			OutputFormat: "json", OutputFile: out, Solver: "generic", Interproc: interproc,
+			Stats: filepath.Join(dir, interproc+".stats.json")}
+		if err := executeAnalyze(); err != nil {
+			t.Fatalf("%s: %v", interproc, err)
+		}
+		results[interproc] = readJSONResults(t, out)
+	}
+	intra, summaries, contexts := results["none"], results["summaries"], results["contexts"]
+	if len(summaries) != 2 || !reflect.DeepEqual(summaries["f"], intra["f"]) {
+		t.Errorf("expected the same facts of f, got\n%v\nand\n%v", intra["f"], summaries["f"])
+	}
+	main := summaries[spir.K_MAIN_FUNC_NAME]
+	if len(main) != 4 || reflect.DeepEqual(main, intra[spir.K_MAIN_FUNC_NAME]) {
+		t.Errorf("expected other facts of main with the summaries, got %v", main)
+	}
+	if !reflect.DeepEqual(contexts[spir.K_MAIN_FUNC_NAME], main) {
+		t.Errorf("expected the facts of main of the summaries in its context, got %v",
+			contexts[spir.K_MAIN_FUNC_NAME])
+	}
+	if len(contexts["f"]) != 2 || reflect.DeepEqual(contexts["f"], intra["f"]) {
+		t.Errorf("expected the facts of f with the entry fact of the call, got %v", contexts["f"])
+	}
+
+	cmdLine = CmdLine{InputFiles: []string{file}, Analyses: []string{"reachdefs"}, OutputFormat: "json",
+		OutputFile: filepath.Join(dir, "out.json"), Solver: "generic", Interproc: "summaries",
+		ResultStore: filepath.Join(dir, "store")}
+	if err := executeAnalyze(); err == nil {
+		t.Error("expected an error for the summaries with a result store")
+	}
+}
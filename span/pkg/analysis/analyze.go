@@ -15,8 +15,6 @@ import (
 	"github.com/adhuliya/span/pkg/analysis/lattice"
 	"github.com/adhuliya/span/pkg/logger"
 	"github.com/adhuliya/span/pkg/spir"
-
-	"github.com/adhuliya/span/internal/util/errs"
 )
 
 type BBWorklist struct {
@@ -45,7 +43,8 @@ func (wl *BBWorklist) Pop() spir.BasicBlockId {
 }
 
 func (wl *BBWorklist) Push(bbId spir.BasicBlockId) bool {
-	if wl.stackTop >= wl.graph.BBCount()-1 || slices.Contains(wl.worklist, bbId) {
+	// Only the blocks up to the stack top are pending; the others are done.
+	if wl.stackTop >= len(wl.worklist)-1 || slices.Contains(wl.worklist[:wl.stackTop+1], bbId) {
 		return false
 	}
 	wl.stackTop++
@@ -74,6 +73,9 @@ type Analyzer interface {
 	GetFactMapValue(insnId spir.InsnId) lattice.Pair
 }
 
+// The number of times the fact at a loop head may change before it is widened.
+const DefaultWidenDelay = 3
+
 // This file defines the intra-procedural analysis for the SPAN program analysis engine.
 // The intra-procedural analysis is used to analyze the program within a single procedure.
 // It is used to analyze the program without considering the control-flow between procedures.
@@ -100,12 +102,65 @@ type IntraPAN struct {
 	skipCallsKnob bool
 	// Apply meet operation at basic block boundary
 	meetAtBasicBlock bool
+	// Interns the immutable facts stored in the fact map,
+	// so that the equal facts at different program points are shared.
+	interner *lattice.Interner
+	// The summaries of the callees, applied at the call sites
+	// by a SummaryAnalysis (nil: the calls are analyzed by AnalyzeInsn).
+	summaries CallSummaries
+	// The IN fact at the entry replacing that of the analysis' boundary fact,
+	// if hasEntryFact (see NewIntraPANWithEntry).
+	entryFact    lattice.Lattice
+	hasEntryFact bool
+	// The IN fact at the entry block (from the boundary fact).
+	entryIn lattice.Lattice
+	// The widening points: the loop heads for a forward analysis,
+	// and the sources of the back edges for a backward analysis.
+	widenPoints map[spir.BasicBlockId]bool
+	// The number of changes of the fact at a widening point before it is
+	// widened (< 0 disables widening), and the number of narrowing steps
+	// at a widening point once the facts converge (0 disables narrowing).
+	widenDelay  int
+	narrowSteps int
+	// The number of changes of the fact at each widening point (in a phase).
+	pointUpdates map[spir.BasicBlockId]int
+	// In the narrowing (descending) phase of the analysis.
+	narrowing bool
+	// The performance counters (nil: not counted), and the number of
+	// visits of each block (only if counted).
+	stats  *EngineStats
+	visits map[spir.BasicBlockId]int
+	// The pairs of the facts along the edges of the branches, released once
+	// the facts converge (nil: allocated on the heap).
+	arena *lattice.PairArena
+	// The blocks analyzed, if only a region of the graph is (see PointQueries);
+	// nil: all the blocks. No fact flows into a block out of the region.
+	region map[spir.BasicBlockId]bool
 }
 
 func NewIntraPAN(ctxId spir.ContextId, analysis Analysis,
 	graph spir.Graph, context *spir.Context,
 	skipCallsKnob bool, meetAtBasicBlock bool) Analyzer {
-	intra := &IntraPAN{
+	intra := newIntraPAN(ctxId, analysis, graph, context, skipCallsKnob, meetAtBasicBlock)
+	intra.initialize() // Initialize the fact map.
+	return Analyzer(intra)
+}
+
+// NewIntraPANWithEntry is NewIntraPAN with the given IN fact at the entry
+// instead of that of the analysis' boundary fact (e.g. for a value context).
+func NewIntraPANWithEntry(ctxId spir.ContextId, analysis Analysis,
+	graph spir.Graph, context *spir.Context, entryFact lattice.Lattice,
+	skipCallsKnob bool, meetAtBasicBlock bool) Analyzer {
+	intra := newIntraPAN(ctxId, analysis, graph, context, skipCallsKnob, meetAtBasicBlock)
+	intra.entryFact, intra.hasEntryFact = entryFact, true
+	intra.initialize()
+	return Analyzer(intra)
+}
+
+func newIntraPAN(ctxId spir.ContextId, analysis Analysis,
+	graph spir.Graph, context *spir.Context,
+	skipCallsKnob bool, meetAtBasicBlock bool) *IntraPAN {
+	return &IntraPAN{
 		ctxId:            ctxId,
 		context:          context,
 		analysis:         analysis,
@@ -113,9 +168,28 @@ func NewIntraPAN(ctxId spir.ContextId, analysis Analysis,
 		wl:               NewWorklistBB(graph, analysis.VisitingOrder()),
 		skipCallsKnob:    skipCallsKnob,
 		meetAtBasicBlock: meetAtBasicBlock,
+		interner:         lattice.NewInterner(),
+		arena:            lattice.NewPairArena(),
+		widenPoints:      getWidenPoints(graph, analysis.VisitingOrder()),
+		widenDelay:       DefaultWidenDelay,
+		pointUpdates:     make(map[spir.BasicBlockId]int),
 	}
-	intra.initialize() // Initialize the fact map.
-	return Analyzer(intra)
+}
+
+// getWidenPoints returns the blocks to widen the facts at: for a forward
+// analysis, the loop heads (whose IN facts are widened); for a backward
+// analysis, the sources of the back edges (whose OUT facts are widened).
+// Every cycle in the graph has a widening point.
+func getWidenPoints(graph spir.Graph, visitOrder spir.GraphVisitingOrder) map[spir.BasicBlockId]bool {
+	points := make(map[spir.BasicBlockId]bool)
+	for _, edge := range spir.GetBackEdges(graph) {
+		if visitOrder == spir.PostOrder {
+			points[edge.From] = true
+		} else {
+			points[edge.To] = true
+		}
+	}
+	return points
 }
 
 func (intra *IntraPAN) initialize() {
@@ -129,20 +203,28 @@ func (intra *IntraPAN) initialize() {
 		WithAnalysisId(intra.analysis.InstanceId().AnalysisId())
 	//entryBBId, exitBBId := intra.graph.EntryBlock(), intra.graph.ExitBlock()
 	boundaryFact := intra.analysis.BoundaryFact(intra.graph, intra.context)
+	if intra.hasEntryFact {
+		boundaryFact = lattice.NewPair(intra.entryFact, boundaryFact.L2(), boundaryFact.FactId())
+	}
+	intra.entryIn = boundaryFact.L1()
 	entryInsnId := intra.graph.EntryBlock().EntryInsn().Id()
 	exitInsnId := intra.graph.ExitBlock().ExitInsn().Id()
 	if entryInsnId == exitInsnId {
-		intra.factMap[entryInsnId] = lattice.NewPair(boundaryFact.L1(), boundaryFact.L2(),
-			factId.WithUBEntityId(spir.EntityId(entryInsnId)))
+		intra.factMap[entryInsnId] = intra.interner.InternPair(lattice.NewPair(boundaryFact.L1(), boundaryFact.L2(),
+			factId.WithUBEntityId(spir.EntityId(entryInsnId))))
 	} else {
-		intra.factMap[entryInsnId] = lattice.NewPair(boundaryFact.L1(), nil,
-			factId.WithUBEntityId(spir.EntityId(entryInsnId)))
-		intra.factMap[exitInsnId] = lattice.NewPair(nil, boundaryFact.L2(),
-			factId.WithUBEntityId(spir.EntityId(exitInsnId)))
+		intra.factMap[entryInsnId] = intra.interner.InternPair(lattice.NewPair(boundaryFact.L1(), nil,
+			factId.WithUBEntityId(spir.EntityId(entryInsnId))))
+		intra.factMap[exitInsnId] = intra.interner.InternPair(lattice.NewPair(nil, boundaryFact.L2(),
+			factId.WithUBEntityId(spir.EntityId(exitInsnId))))
 	}
 	intra.context.SetInfo(uint64(intra.ctxId), intra.factMap)
 
 	// 2. Initialize the analysis handles basic blocks flag.
+	intra.initHandlesBB()
+}
+
+func (intra *IntraPAN) initHandlesBB() {
 	_, change := intra.analysis.AnalyzeBB(nil, lattice.NewPair(nil, nil, lattice.NIL_FACT_ID), intra.context)
 	if change == lattice.NotImplemented {
 		intra.analysisHandlesBB = false
@@ -172,19 +254,71 @@ func (intra *IntraPAN) Graph() spir.Graph {
 }
 
 func (intra *IntraPAN) SetFactMapValue(insnId spir.InsnId, fact lattice.Pair) {
-	intra.factMap[insnId] = fact
+	intra.factMap[insnId] = intra.interner.InternPair(fact)
+}
+
+func (intra *IntraPAN) Interner() *lattice.Interner {
+	return intra.interner
+}
+
+// SetInterner replaces the (per analyzer) interner, e.g. to share the facts
+// across the functions of a TU.
+func (intra *IntraPAN) SetInterner(interner *lattice.Interner) {
+	intra.interner = interner
+}
+
+// SetWidening sets the number of changes of the fact at a loop head before
+// it is widened (< 0 disables widening; DefaultWidenDelay by default), and
+// the number of narrowing steps at a loop head after the facts converge
+// (0 disables the narrowing pass, the default).
+func (intra *IntraPAN) SetWidening(delay int, narrowSteps int) {
+	intra.widenDelay, intra.narrowSteps = delay, max(narrowSteps, 0)
+}
+
+// WidenPoints returns the widening points of the analysis (sorted).
+func (intra *IntraPAN) WidenPoints() []spir.BasicBlockId {
+	points := make([]spir.BasicBlockId, 0, len(intra.widenPoints))
+	for bbId := range intra.widenPoints {
+		points = append(points, bbId)
+	}
+	slices.Sort(points)
+	return points
+}
+
+// SetPairArena sets the arena the pairs of the branch facts are allocated in
+// (nil allocates them on the heap). It is released when the facts converge.
+func (intra *IntraPAN) SetPairArena(arena *lattice.PairArena) {
+	intra.arena = arena
+}
+
+// SetStats sets the performance counters to count the work into (nil disables counting).
+func (intra *IntraPAN) SetStats(stats *EngineStats) {
+	intra.stats = stats
+	if stats != nil && intra.visits == nil {
+		intra.visits = make(map[spir.BasicBlockId]int)
+	}
+}
+
+// SetCallSummaries sets the summaries of the callees to apply at the call sites.
+func (intra *IntraPAN) SetCallSummaries(summaries CallSummaries) {
+	intra.summaries = summaries
 }
 
 func (intra *IntraPAN) GetFactMapValue(insnId spir.InsnId) lattice.Pair {
 	if _, ok := intra.factMap[insnId]; !ok {
-		intra.factMap[insnId] = lattice.NewPair(nil, nil,
-			lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
-				WithAnalysisId(intra.analysis.InstanceId().AnalysisId()).
-				WithUBEntityId(spir.EntityId(insnId)))
+		intra.factMap[insnId] = intra.newInsnFact(insnId)
 	}
 	return intra.factMap[insnId]
 }
 
+// newInsnFact returns the (Top) fact of an instruction not in the fact map.
+func (intra *IntraPAN) newInsnFact(insnId spir.InsnId) lattice.Pair {
+	return lattice.NewPair(nil, nil,
+		lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+			WithAnalysisId(intra.analysis.InstanceId().AnalysisId()).
+			WithUBEntityId(spir.EntityId(insnId)))
+}
+
 func (intra *IntraPAN) GetBBFact(bb *spir.BasicBlock) lattice.Pair {
 	entryInsnId := bb.EntryInsnId()
 	exitInsnId := bb.ExitInsnId()
@@ -200,15 +334,71 @@ func (intra *IntraPAN) GetBBFact(bb *spir.BasicBlock) lattice.Pair {
 // AnalyzeGraph performs intra-procedural analysis on the program.
 // It iterates over the worklist of basic blocks, updating analysis facts until a fixed point is reached,
 // then stores the result in the context object.
+//
+// With narrowing enabled, once the facts converge (with widening at the loop
+// heads), the graph is analyzed again, recomputing the facts at the merge
+// points from all their predecessors and narrowing the facts at the loop heads.
 func (intra *IntraPAN) AnalyzeGraph() lattice.FactChanged {
+	factChange := intra.analyzeWorklist()
+	if intra.narrowSteps > 0 && len(intra.widenPoints) > 0 {
+		intra.narrowing = true
+		clear(intra.pointUpdates)
+		intra.startNarrowing()
+		if intra.analyzeWorklist() == lattice.Changed {
+			factChange = lattice.Changed
+		}
+		intra.narrowing = false
+	}
+	intra.releaseArena()
+	return factChange
+}
+
+// releaseArena copies the pairs of the fact map allocated in the arena to
+// the heap, and releases the arena (its slabs are reused by the next analysis).
+func (intra *IntraPAN) releaseArena() {
+	if intra.arena.Len() == 0 {
+		return
+	}
+	moved := make(map[*lattice.Pair]*lattice.Pair)
+	var keep func(l lattice.Lattice) lattice.Lattice
+	keep = func(l lattice.Lattice) lattice.Lattice {
+		pair, ok := intra.arena.Owned(l)
+		if !ok {
+			return l
+		}
+		if kept, ok := moved[pair]; ok {
+			return kept // Shared by several facts.
+		}
+		kept := &lattice.Pair{}
+		moved[pair] = kept
+		*kept = lattice.NewPair(keep(pair.L1()), keep(pair.L2()), pair.FactId())
+		return kept
+	}
+	for insnId, fact := range intra.factMap {
+		if l1, l2 := keep(fact.L1()), keep(fact.L2()); l1 != fact.L1() || l2 != fact.L2() {
+			intra.factMap[insnId] = lattice.NewPair(l1, l2, fact.FactId())
+		}
+	}
+	intra.arena.Release()
+}
+
+func (intra *IntraPAN) analyzeWorklist() lattice.FactChanged {
 	factChange := lattice.NoChange
 	for !intra.wl.IsEmpty() {
 		bbId := intra.wl.Pop()
 		bb := intra.graph.BasicBlock(bbId)
+		if intra.stats != nil {
+			intra.stats.visit(intra.visits[bbId])
+			intra.visits[bbId]++
+		}
 
-		logger.Get().Debug("Visiting", "BB", bbId)
+		if logger.Tracing() {
+			logger.Trace("Visiting", "BB", bbId)
+		}
 		inout, change := intra.AnalyzeBB(bb)
-		logger.Get().Debug("After analysis:", "OutFact", lattice.String(inout.L2()), "change", change)
+		if logger.Tracing() {
+			logger.Trace("After analysis:", "OutFact", lazyString(inout.L2()), "change", change)
+		}
 
 		if change.HasChange() {
 			// The fact map changed
@@ -224,6 +414,9 @@ func (intra *IntraPAN) AnalyzeBB(bb *spir.BasicBlock) (lattice.Pair, lattice.Fac
 	// Use the analysis's AnalyzeBB method if it handles basic blocks explicitly.
 	if intra.analysisHandlesBB {
 		bbInOut := intra.GetBBFact(bb)
+		if intra.stats != nil {
+			intra.stats.InsnTransfers += uint64(bb.InsnCount())
+		}
 		return intra.analysis.AnalyzeBB(bb, bbInOut, intra.context)
 	}
 
@@ -234,13 +427,20 @@ func (intra *IntraPAN) AnalyzeBB(bb *spir.BasicBlock) (lattice.Pair, lattice.Fac
 	var inout lattice.Pair
 	change := lattice.NoChange
 
-	for i := range bb.InsnCount() {
-		i = InsnIndex(i, lastIndx, reverse)
+	for k := range bb.InsnCount() {
+		i := InsnIndex(k, lastIndx, reverse)
 		insn := bb.Insn(i)
 
-		logger.Get().Debug("Before analysis:", "Insn", insn, "InFact", intra.GetFactMapValue(insn.Id()).L1())
-		inout, change = intra.analysis.AnalyzeInsn(insn, intra.GetFactMapValue(insn.Id()), intra.context)
-		logger.Get().Debug("After  analysis:", "Insn", insn, "OutFact", inout.L2(), "change", change)
+		if logger.Tracing() {
+			logger.Trace("Before analysis:", "Insn", insn, "InFact", lazyString(intra.GetFactMapValue(insn.Id()).L1()))
+		}
+		inout, change = intra.analyzeInsn(insn, intra.GetFactMapValue(insn.Id()))
+		if intra.stats != nil {
+			intra.stats.InsnTransfers++
+		}
+		if logger.Tracing() {
+			logger.Trace("After  analysis:", "Insn", insn, "OutFact", lazyString(inout.L2()), "change", change)
+		}
 
 		// Record changes at the boundaries of the basic block.
 		bbInChanged = bbInChanged || (i == firstIndx && change.HasChangedIn())
@@ -252,8 +452,8 @@ func (intra *IntraPAN) AnalyzeBB(bb *spir.BasicBlock) (lattice.Pair, lattice.Fac
 
 		// Save and Propagate the facts to the next instruction.
 		intra.SetFactMapValue(insn.Id(), inout) // Save
-		nextInsnIdx := InsnIndex(i+1, lastIndx, reverse)
-		if i != nextInsnIdx {
+		if k < lastIndx {
+			nextInsnIdx := InsnIndex(k+1, lastIndx, reverse)
 			nextInsnId := bb.Insn(nextInsnIdx).Id()
 			nextInsnInOut := intra.GetFactMapValue(nextInsnId)
 			intra.SetFactMapValue(nextInsnId,
@@ -263,14 +463,32 @@ func (intra *IntraPAN) AnalyzeBB(bb *spir.BasicBlock) (lattice.Pair, lattice.Fac
 	return intra.GetBBFact(bb), lattice.GetInOutChanged(bbInChanged, bbOutChanged)
 }
 
+// analyzeInsn applies the summaries of the callees at a call site, if set.
+func (intra *IntraPAN) analyzeInsn(insn spir.Insn, inOut lattice.Pair) (lattice.Pair, lattice.FactChanged) {
+	if intra.summaries != nil && insn.HasCallExpr() {
+		if summaryAn, ok := intra.analysis.(SummaryAnalysis); ok {
+			var callees []CalleeSummary
+			if ctxSummaries, ok := intra.summaries.(ContextCallSummaries); ok {
+				callees = ctxSummaries.CalleeExitFacts(insn, inOut.L1())
+			} else {
+				callees = intra.summaries.CalleeSummaries(insn)
+			}
+			return summaryAn.AnalyzeCall(insn, inOut, callees, intra.context)
+		}
+	}
+	return intra.analysis.AnalyzeInsn(insn, inOut, intra.context)
+}
+
+// lazyString formats the fact only if the trace is logged.
+func lazyString(fact lattice.Lattice) logger.Lazy {
+	return func() any { return lattice.String(fact) }
+}
+
 // Returns the index of the instruction in the basic block.
 // If reverse is true, the index is returned in reverse order (i.e. i = 0 translates to lastIndx).
 // The returned index is always in the range [0, lastIndx].
 func InsnIndex(i int, lastIndx int, reverse bool) int {
 	if reverse {
-		if i == lastIndx {
-			return lastIndx
-		}
 		return lastIndx - i
 	}
 
@@ -296,49 +514,151 @@ func (intra *IntraPAN) propagateFactsBackward(
 	bb *spir.BasicBlock, inout lattice.Pair) {
 
 	for i := range bb.PredCount() {
-		predBB := bb.Pred(i)
-		predInsnId := predBB.ExitInsnId()
-		thisBBSuccPos := predBB.SuccPos(bb)
-		val, chg := GetPredOutFact(predBB, intra.GetFactMapValue(predInsnId), thisBBSuccPos), true
+		intra.flowOut(bb.Pred(i), bb, inout.L1())
+	}
+}
+
+// flowOut updates the OUT fact of predBB along its edge to bb, with the IN
+// fact of bb (for a backward analysis).
+func (intra *IntraPAN) flowOut(predBB, bb *spir.BasicBlock, fact lattice.Lattice) {
+	if intra.region != nil && !intra.region[predBB.Id()] {
+		return
+	}
+	predInsnId := predBB.ExitInsnId()
+	thisBBSuccPos := predBB.SuccPos(bb)
+	oldVal := GetPredOutFact(predBB, intra.GetFactMapValue(predInsnId), thisBBSuccPos)
+	val, chg := fact, true
+
+	switch {
+	case intra.narrowing:
+		val, chg = intra.narrowAt(predBB.Id(), oldVal, fact)
+	case intra.meetAtBasicBlock:
+		val, chg = intra.meet(oldVal, fact)
+	}
+	if !intra.narrowing && chg {
+		val = intra.widenAt(predBB.Id(), oldVal, val)
+	}
+
+	if chg {
+		intra.SetFactMapValue(predInsnId,
+			setPredOutFact(intra.arena, predBB, intra.GetFactMapValue(predInsnId), thisBBSuccPos, val))
+		intra.push(predBB.Id())
+	}
+}
 
-		if intra.meetAtBasicBlock {
-			val, chg = lattice.Meet(val, inout.L1())
+func (intra *IntraPAN) meet(l1, l2 lattice.Lattice) (lattice.Lattice, bool) {
+	if intra.stats != nil {
+		intra.stats.Meets++
+	}
+	return lattice.Meet(l1, l2)
+}
+
+// push adds the block, whose facts have changed, to the worklist.
+func (intra *IntraPAN) push(bbId spir.BasicBlockId) {
+	if intra.stats == nil {
+		intra.wl.Push(bbId)
+		return
+	}
+	intra.stats.Changes++
+	if intra.wl.Push(bbId) {
+		intra.stats.push(intra.visits[bbId])
+	}
+}
+
+// widenAt widens the new fact at a widening point, once the fact there has
+// changed widenDelay times.
+func (intra *IntraPAN) widenAt(bbId spir.BasicBlockId, old, val lattice.Lattice) lattice.Lattice {
+	if intra.widenDelay < 0 || !intra.widenPoints[bbId] {
+		return val
+	}
+	if intra.pointUpdates[bbId]++; intra.pointUpdates[bbId] > intra.widenDelay {
+		val, _ = lattice.Widen(old, val)
+		if intra.stats != nil {
+			intra.stats.Widens++
 		}
+	}
+	return val
+}
 
-		intra.SetFactMapValue(predInsnId, SetPredOutFact(predBB, intra.GetFactMapValue(predInsnId), thisBBSuccPos, val))
+// narrowAt returns the new fact replacing the old one in the narrowing phase:
+// the old fact narrowed towards the recomputed fact at a widening point (at
+// most narrowSteps times), else the recomputed fact.
+func (intra *IntraPAN) narrowAt(bbId spir.BasicBlockId, old, fact lattice.Lattice) (lattice.Lattice, bool) {
+	if !intra.widenPoints[bbId] {
+		return fact, !lattice.Equals(old, fact)
+	}
+	if intra.pointUpdates[bbId] >= intra.narrowSteps {
+		return old, false
+	}
+	val, chg := lattice.Narrow(old, fact)
+	if intra.stats != nil {
+		intra.stats.Widens++
+	}
+	if chg {
+		intra.pointUpdates[bbId]++
+	}
+	return val, chg
+}
 
-		if chg {
-			intra.wl.Push(predBB.Id())
+// startNarrowing narrows the facts at the widening points (and adds their
+// blocks to the worklist), to begin the narrowing phase.
+func (intra *IntraPAN) startNarrowing() {
+	for _, bbId := range intra.WidenPoints() {
+		bb := intra.graph.BasicBlock(bbId)
+		if intra.analysis.VisitingOrder() != spir.PostOrder {
+			intra.flowIn(bb, nil)
+			continue
 		}
+		for i := range bb.SuccCount() {
+			succ := bb.Succ(i)
+			intra.flowOut(bb, succ, intra.GetFactMapValue(succ.EntryInsnId()).L1())
+		}
+	}
+}
+
+// SplitBranchFact returns the facts along the true and false edges of a branch.
+// The OUT fact of a basic block with two successors is a *lattice.Pair of
+// the facts along its true and false edges. An analysis that doesn't
+// distinguish the edges may return a single fact, used along both the edges.
+func SplitBranchFact(out lattice.Lattice) (lattice.Lattice, lattice.Lattice) {
+	if pair, ok := out.(*lattice.Pair); ok {
+		return pair.L1(), pair.L2()
 	}
+	return out, out
 }
 
 func GetPredOutFact(predBB *spir.BasicBlock, inout lattice.Pair,
 	succIdx int) lattice.Lattice {
 	val := inout.L2()
 	if predBB.SuccCount() > 1 {
-		pair, ok := val.(*lattice.Pair)
-		if !ok {
-			panic("val is not a lattice pair")
+		trueFact, falseFact := SplitBranchFact(val)
+		if succIdx == 1 {
+			return falseFact
 		}
-		return pair.Lats(succIdx)
+		return trueFact
 	}
 	return val
 }
 
 func SetPredOutFact(predBB *spir.BasicBlock, inout lattice.Pair,
+	succIdx int, val lattice.Lattice) lattice.Pair {
+	return setPredOutFact(nil, predBB, inout, succIdx, val)
+}
+
+// setPredOutFact is SetPredOutFact allocating the pair of a branch in the arena.
+func setPredOutFact(arena *lattice.PairArena, predBB *spir.BasicBlock, inout lattice.Pair,
 	succIdx int, val lattice.Lattice) lattice.Pair {
 	if predBB.SuccCount() == 1 {
+		// The common case: the OUT fact itself, nothing is allocated.
 		return lattice.NewPair(inout.L1(), val, inout.FactId())
-	} else {
-		pair, _ := val.(*lattice.Pair)
-		if succIdx == 0 {
-			pair.SetLats(val, pair.L2())
-		} else if succIdx == 1 {
-			pair.SetLats(pair.L1(), val)
-		}
-		return lattice.NewPair(inout.L1(), pair, inout.FactId())
 	}
+	trueFact, falseFact := SplitBranchFact(inout.L2())
+	if succIdx == 0 {
+		trueFact = val
+	} else if succIdx == 1 {
+		falseFact = val
+	}
+	return lattice.NewPair(inout.L1(), arena.New(trueFact, falseFact, inout.FactId()), inout.FactId())
 }
 
 func (intra *IntraPAN) propagateFactsForward(
@@ -348,34 +668,54 @@ func (intra *IntraPAN) propagateFactsForward(
 
 	// This condition is taken only if there are two successors.
 	if fbb := bb.FalseSucc(); fbb != nil {
-		// STEP: Extract the lattice pair
-		trueFalseOutFact, ok := trueFact.(*lattice.Pair)
-		errs.Assert(ok, "Out fact is not a lattice pair")
-		trueFact, falseFact = trueFalseOutFact.L1(), trueFalseOutFact.L2()
-
-		// STEP: Propagete fact
-		nextInOut := intra.GetFactMapValue(fbb.EntryInsnId())
-		val, chg := falseFact, true
-		if intra.meetAtBasicBlock {
-			val, chg = lattice.Meet(nextInOut.L1(), falseFact)
-		}
-		intra.SetFactMapValue(fbb.EntryInsnId(), lattice.NewPair(val, nextInOut.L2(), nextInOut.FactId()))
-		if chg {
-			intra.wl.Push(fbb.Id())
-		}
+		// STEP: Extract the facts along the true and false edges
+		trueFact, falseFact = SplitBranchFact(inout.L2())
+		intra.flowIn(fbb, falseFact) // STEP: Propagete fact
 	}
 
 	// Here, the trueFact is either the OUT or the true part of the OUT lattice pair.
 	if tbb := bb.TrueSucc(); tbb != nil {
-		// STEP: Propagete fact
-		nextInOut := intra.GetFactMapValue(tbb.EntryInsnId())
-		val, chg := trueFact, true
-		if tbb.PredCount() > 1 || intra.meetAtBasicBlock {
-			val, chg = lattice.Meet(nextInOut.L1(), trueFact)
-		}
-		intra.SetFactMapValue(tbb.EntryInsnId(), lattice.NewPair(val, nextInOut.L2(), nextInOut.FactId()))
-		if chg {
-			intra.wl.Push(tbb.Id())
-		}
+		intra.flowIn(tbb, trueFact) // STEP: Propagete fact
+	}
+}
+
+// flowIn updates the IN fact of nextBB with the fact along an edge into it
+// (for a forward analysis). In the narrowing phase, the IN fact is recomputed
+// from all the predecessors (the fact is unused).
+func (intra *IntraPAN) flowIn(nextBB *spir.BasicBlock, fact lattice.Lattice) {
+	if intra.region != nil && !intra.region[nextBB.Id()] {
+		return
+	}
+	nextInOut := intra.GetFactMapValue(nextBB.EntryInsnId())
+	val, chg := fact, true
+
+	switch {
+	case intra.narrowing:
+		val, chg = intra.narrowAt(nextBB.Id(), nextInOut.L1(), intra.predsOutFact(nextBB))
+	case nextBB.PredCount() > 1 || intra.meetAtBasicBlock:
+		val, chg = intra.meet(nextInOut.L1(), fact)
+	}
+	if !intra.narrowing && chg {
+		val = intra.widenAt(nextBB.Id(), nextInOut.L1(), val)
+	}
+
+	if chg {
+		intra.SetFactMapValue(nextBB.EntryInsnId(), lattice.NewPair(val, nextInOut.L2(), nextInOut.FactId()))
+		intra.push(nextBB.Id())
 	}
 }
+
+// predsOutFact returns the meet of the OUT facts of the predecessors of the
+// block along their edges to it (and of the boundary fact at the entry block).
+func (intra *IntraPAN) predsOutFact(bb *spir.BasicBlock) lattice.Lattice {
+	var val lattice.Lattice
+	if bb == intra.graph.EntryBlock() {
+		val = intra.entryIn
+	}
+	for i := range bb.PredCount() {
+		predBB := bb.Pred(i)
+		predOut := GetPredOutFact(predBB, intra.GetFactMapValue(predBB.ExitInsnId()), predBB.SuccPos(bb))
+		val, _ = intra.meet(val, predOut)
+	}
+	return val
+}
@@ -0,0 +1,43 @@
+package analysis
+
+import (
+	"fmt"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// BenchmarkIntraPAN runs the range analysis of testRangeClient over the
+// chained loops of spir.NewExampleTU_Loops, with and without widening.
+func BenchmarkIntraPAN(b *testing.B) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	for _, loops := range []int{1, 16, 256} {
+		tu := spir.NewExampleTU_Loops(loops)
+		main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+		c1, c1000 := tu.NewConst(1, spir.Int32QT), tu.NewConst(1000, spir.Int32QT)
+		for _, widen := range []struct {
+			name               string
+			delay, narrowSteps int
+		}{
+			{"widen", DefaultWidenDelay, 1},
+			{"nowiden", -1, 0},
+		} {
+			b.Run(fmt.Sprintf("loops=%d/%s", loops, widen.name), func(b *testing.B) {
+				b.ReportAllocs()
+				for b.Loop() {
+					client := &testRangeClient{
+						v:     tu.GetEntityId("i"),
+						bound: 1000,
+						lits:  map[spir.EntityId]int32{c1: 1, c1000: 1000},
+					}
+					ctx := spir.NewContext(tu)
+					ctx.SetCurrentScopeEid(main.Id())
+					intra := NewIntraPAN(spir.GetNextContextId(), client, main.Body(), ctx, false, false).(*IntraPAN)
+					intra.SetWidening(widen.delay, widen.narrowSteps)
+					intra.AnalyzeGraph()
+				}
+			})
+		}
+	}
+}
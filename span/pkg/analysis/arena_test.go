@@ -0,0 +1,94 @@
+package analysis
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestPairArena(t *testing.T) {
+	arena := lattice.NewPairArena()
+	var pairs []*lattice.Pair
+	for i := range 100 {
+		pairs = append(pairs, arena.New(nil, &lattice.TopBotLatticeBot, lattice.FactId(i)))
+	}
+	if arena.Len() != 100 {
+		t.Fatalf("expected 100 pairs, got %d", arena.Len())
+	}
+	for i, pair := range pairs {
+		if got, ok := arena.Owned(pair); !ok || got != pair || pair.FactId() != lattice.FactId(i) {
+			t.Errorf("pair %d: not owned by the arena", i)
+		}
+	}
+	heap := lattice.NewPair(nil, nil, lattice.NIL_FACT_ID)
+	if _, ok := arena.Owned(&heap); ok {
+		t.Errorf("a pair on the heap is owned by the arena")
+	}
+	if _, ok := arena.Owned(&lattice.TopBotLatticeBot); ok {
+		t.Errorf("a lattice is owned by the arena")
+	}
+	arena.Release()
+	if arena.Len() != 0 {
+		t.Errorf("expected an empty arena, got %d pairs", arena.Len())
+	}
+	var nilArena *lattice.PairArena
+	if pair := nilArena.New(nil, nil, lattice.NIL_FACT_ID); pair == nil {
+		t.Errorf("a nil arena did not allocate")
+	}
+}
+
+func TestSetPredOutFact_allocs(t *testing.T) {
+	tu := spir.NewExampleTU_C()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	head := main.Body().EntryBlock().TrueSucc() // a branch
+	entry := main.Body().EntryBlock()           // a single successor
+	inout := lattice.NewPair(nil, nil, lattice.NIL_FACT_ID)
+	arena := lattice.NewPairArena()
+	defer arena.Release()
+
+	if allocs := testing.AllocsPerRun(100, func() {
+		setPredOutFact(arena, entry, inout, 0, &lattice.TopBotLatticeBot)
+	}); allocs != 0 {
+		t.Errorf("single successor: expected no allocation, got %v", allocs)
+	}
+	if allocs := testing.AllocsPerRun(1000, func() {
+		setPredOutFact(arena, head, inout, 1, &lattice.TopBotLatticeBot)
+	}); allocs >= 0.1 {
+		t.Errorf("branch: expected the pairs allocated in slabs, got %v allocations per pair", allocs)
+	}
+}
+
+func TestIntraPAN_pairArena(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_Loops(4)
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	analyze := func(arena *lattice.PairArena) AnalysisFactMap {
+		ctx := spir.NewContext(tu)
+		ctx.SetCurrentScopeEid(main.Id())
+		intra := NewIntraPAN(spir.GetNextContextId(), &testBackwardClient{}, main.Body(), ctx, false, false).(*IntraPAN)
+		intra.SetPairArena(arena)
+		intra.AnalyzeGraph()
+		if arena.Len() != 0 {
+			t.Errorf("the arena is not released")
+		}
+		return *intra.FactMap()
+	}
+
+	want := analyze(nil)
+	got := analyze(lattice.NewPairArena())
+	analyze(lattice.NewPairArena()) // Reuses (and overwrites) the released slabs.
+	branches := 0
+	for insnId, fact := range want {
+		if _, ok := fact.L2().(*lattice.Pair); ok {
+			branches++
+		}
+		if !lattice.Equals(got[insnId].L1(), fact.L1()) || !lattice.Equals(got[insnId].L2(), fact.L2()) {
+			t.Errorf("insn %v: expected %v, got %v", insnId, fact, got[insnId])
+		}
+	}
+	if branches != 4 {
+		t.Errorf("expected the facts of 4 branches, got %d", branches)
+	}
+}
@@ -0,0 +1,512 @@
+package analysis
+
+// This file defines a bit-vector engine mode for the separable (gen/kill)
+// analyses, e.g. live variables.
+//
+// The entities mentioned by the transfer functions of a function are
+// renumbered into a dense local index [0, n), so that a data flow value is
+// a []uint64 of (n+63)/64 words. The gen/kill vectors of each basic block
+// are precomputed, and the fixed point is computed over the basic blocks
+// with word-parallel operations only: no lattice objects, no fact map.
+// The results are materialized into an AnalysisFactMap (the lattice API)
+// only on request (see FactMap).
+//
+// A client may also describe a conditional gen (gen a set of entities only if
+// an entity is in the flow input), as in strong liveness. A basic block with
+// a conditional gen cannot be summarized as a gen/kill pair, so its
+// instructions are applied one by one (still with word operations).
+
+import (
+	"math/bits"
+	"slices"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The transfer function of an instruction in a bit-vector analysis:
+//
+//	flowOut = (flowIn - Kill) ∪ Gen ∪ (CondGen if CondOn ∈ flowIn)
+//
+// where the flow is forward (IN to OUT) or backward (OUT to IN) as per the
+// analysis' visiting order. KillAll kills every entity.
+type BitTransfer struct {
+	Gen     []spir.EntityId
+	Kill    []spir.EntityId
+	KillAll bool
+	CondOn  spir.EntityId // spir.NIL_ID if there is no conditional gen
+	CondGen []spir.EntityId
+}
+
+// Reset clears the transfer function (to the identity), keeping the memory.
+func (t *BitTransfer) Reset() {
+	t.Gen, t.Kill, t.CondGen = t.Gen[:0], t.Kill[:0], t.CondGen[:0]
+	t.KillAll, t.CondOn = false, spir.NIL_ID
+}
+
+// A BitVectorAnalysis is an analysis whose data flow values are sets of
+// entities and whose transfer functions are gen/kill operations.
+// Its AnalyzeInsn must agree with InsnTransfer; the bit-vector mode is then
+// a faster way to compute the same facts.
+type BitVectorAnalysis interface {
+	Analysis
+
+	// MeetIsUnion returns true for a may analysis (the meet is the set union),
+	// and false for a must analysis (the meet is the set intersection).
+	MeetIsUnion() bool
+	// BoundaryEids returns the entities in the boundary fact, i.e. at the
+	// entry (forward) or at the exit (backward) of the graph.
+	BoundaryEids(graph spir.Graph, ctx *spir.Context) []spir.EntityId
+	// InsnTransfer describes the transfer function of the instruction in t.
+	// The caller resets t before each call.
+	InsnTransfer(insn spir.Insn, ctx *spir.Context, t *BitTransfer)
+	// NewBitVectorFact returns the lattice value of the given set of entities.
+	NewBitVectorFact(eids *spir.EidSet, factId lattice.FactId) lattice.Lattice
+}
+
+// A dense bit vector over the local index of the entities.
+type bitVec []uint64
+
+func bitVecWords(n int) int {
+	return (n + 63) / 64
+}
+
+func (v bitVec) has(i int32) bool {
+	return v[i>>6]&(1<<(i&63)) != 0
+}
+
+func (v bitVec) set(i int32) {
+	v[i>>6] |= 1 << (i & 63)
+}
+
+func (v bitVec) unset(i int32) {
+	v[i>>6] &^= 1 << (i & 63)
+}
+
+// fill sets the bits [0, n).
+func (v bitVec) fill(n int) {
+	for i := range v {
+		v[i] = ^uint64(0)
+	}
+	if r := n % 64; r != 0 {
+		v[len(v)-1] = 1<<r - 1
+	}
+}
+
+func (v bitVec) or(o bitVec) {
+	for i, w := range o {
+		v[i] |= w
+	}
+}
+
+func (v bitVec) and(o bitVec) {
+	for i, w := range o {
+		v[i] &= w
+	}
+}
+
+// The transfer function of a compiled instruction, on the local indices.
+type bitInsn struct {
+	insnId  spir.InsnId
+	killAll bool
+	condOn  int32 // -1 if there is no conditional gen
+	gen     []int32
+	kill    []int32
+	condGen []int32
+}
+
+// apply transforms the flow input v to the flow output (in place).
+func (t *bitInsn) apply(v bitVec) {
+	cond := t.condOn >= 0 && v.has(t.condOn)
+	if t.killAll {
+		clear(v)
+	}
+	for _, i := range t.kill {
+		v.unset(i)
+	}
+	for _, i := range t.gen {
+		v.set(i)
+	}
+	if cond {
+		for _, i := range t.condGen {
+			v.set(i)
+		}
+	}
+}
+
+type bitBB struct {
+	bb    *spir.BasicBlock
+	insns []bitInsn // in the flow order
+	// The summary: flowOut = (flowIn &^ kill) | gen. Valid if summarized.
+	summarized bool
+	gen, kill  bitVec
+	// The predecessors (successors) along the flow, as indices into bbs.
+	flowPreds, flowSuccs []int32
+	flowIn, flowOut      bitVec
+}
+
+func (b *bitBB) transfer(dst, flowIn bitVec) {
+	copy(dst, flowIn)
+	if b.summarized {
+		for i := range dst {
+			dst[i] = dst[i]&^b.kill[i] | b.gen[i]
+		}
+		return
+	}
+	for k := range b.insns {
+		b.insns[k].apply(dst)
+	}
+}
+
+// BitVectorIntraPAN is the bit-vector counterpart of IntraPAN.
+type BitVectorIntraPAN struct {
+	ctxId    spir.ContextId
+	context  *spir.Context
+	analysis BitVectorAnalysis
+	graph    spir.Graph
+	backward bool
+	meetOr   bool // the meet is the union
+
+	eids     []spir.EntityId // local index -> entity id
+	local    map[spir.EntityId]int32
+	words    int
+	bbs      []bitBB // in the visiting order
+	boundary int     // index of the boundary basic block in bbs (-1 if none)
+	bndVec   bitVec
+	insnBB   map[spir.InsnId]int32 // instruction -> index of its basic block
+	solved   bool
+
+	factMap AnalysisFactMap // materialized on request
+
+	stats  *EngineStats // the performance counters (nil: not counted)
+	visits []int        // of each block in bbs (only if counted)
+}
+
+func NewBitVectorIntraPAN(ctxId spir.ContextId, analysis BitVectorAnalysis,
+	graph spir.Graph, context *spir.Context) *BitVectorIntraPAN {
+	bv := &BitVectorIntraPAN{
+		ctxId:    ctxId,
+		context:  context,
+		analysis: analysis,
+		graph:    graph,
+		backward: analysis.VisitingOrder() == spir.PostOrder,
+		meetOr:   analysis.MeetIsUnion(),
+		local:    make(map[spir.EntityId]int32),
+		boundary: -1,
+		insnBB:   make(map[spir.InsnId]int32),
+	}
+	bv.compile()
+	return bv
+}
+
+func (bv *BitVectorIntraPAN) localIndex(eid spir.EntityId) int32 {
+	if i, ok := bv.local[eid]; ok {
+		return i
+	}
+	i := int32(len(bv.eids))
+	bv.local[eid] = i
+	bv.eids = append(bv.eids, eid)
+	return i
+}
+
+func (bv *BitVectorIntraPAN) localIndices(eids []spir.EntityId) []int32 {
+	var res []int32
+	for _, eid := range eids {
+		if eid != spir.NIL_ID {
+			res = append(res, bv.localIndex(eid))
+		}
+	}
+	return res
+}
+
+// compile renumbers the entities, and computes the gen/kill vectors and
+// the flow edges of the basic blocks.
+func (bv *BitVectorIntraPAN) compile() {
+	// The worklist is popped from its end, hence reversed for the visiting order.
+	order := spir.GetBBWorklist(bv.graph, bv.analysis.VisitingOrder())
+	slices.Reverse(order)
+	index := make(map[spir.BasicBlockId]int32, len(order))
+	bv.bbs = make([]bitBB, 0, len(order))
+	for _, bbId := range order {
+		if _, ok := index[bbId]; ok {
+			continue
+		}
+		index[bbId] = int32(len(bv.bbs))
+		bv.bbs = append(bv.bbs, bitBB{bb: bv.graph.BasicBlock(bbId), summarized: true})
+	}
+
+	// 1. The transfer functions, with the entities renumbered.
+	var t BitTransfer
+	for b := range bv.bbs {
+		bb := &bv.bbs[b]
+		n := bb.bb.InsnCount()
+		bb.insns = make([]bitInsn, n)
+		for k := range n {
+			insn := bb.bb.Insn(InsnIndex(k, n-1, bv.backward))
+			t.Reset()
+			bv.analysis.InsnTransfer(insn, bv.context, &t)
+			bi := &bb.insns[k]
+			bi.insnId, bi.killAll, bi.condOn = insn.Id(), t.KillAll, -1
+			bi.gen, bi.kill = bv.localIndices(t.Gen), bv.localIndices(t.Kill)
+			if t.CondOn != spir.NIL_ID {
+				bi.condOn, bi.condGen = bv.localIndex(t.CondOn), bv.localIndices(t.CondGen)
+				bb.summarized = false
+			}
+			bv.insnBB[insn.Id()] = int32(b)
+		}
+	}
+	boundary := bv.localIndices(bv.analysis.BoundaryEids(bv.graph, bv.context))
+
+	// 2. The bit vectors, all from a single allocation.
+	bv.words = bitVecWords(len(bv.eids))
+	slab := make([]uint64, bv.words*(4*len(bv.bbs)+1))
+	next := func() bitVec {
+		v := bitVec(slab[:bv.words:bv.words])
+		slab = slab[bv.words:]
+		return v
+	}
+	bv.bndVec = next()
+	for _, i := range boundary {
+		bv.bndVec.set(i)
+	}
+	boundaryBB := bv.graph.EntryBlock()
+	if bv.backward {
+		boundaryBB = bv.graph.ExitBlock()
+	}
+	for b := range bv.bbs {
+		bb := &bv.bbs[b]
+		bb.flowIn, bb.flowOut = next(), next()
+		if !bv.meetOr {
+			bb.flowOut.fill(len(bv.eids)) // Top of a must analysis
+		}
+		if bb.bb == boundaryBB {
+			bv.boundary = b
+		}
+		if bb.summarized {
+			bb.gen, bb.kill = next(), next()
+			for k := range bb.insns {
+				bv.compose(bb, &bb.insns[k])
+			}
+		}
+
+		preds, predCount := bb.bb.Pred, bb.bb.PredCount()
+		if bv.backward {
+			preds, predCount = bb.bb.Succ, bb.bb.SuccCount()
+		}
+		for i := range predCount {
+			if p, ok := index[preds(i).Id()]; ok {
+				bb.flowPreds = append(bb.flowPreds, p)
+			}
+		}
+	}
+	for b := range bv.bbs {
+		for _, p := range bv.bbs[b].flowPreds {
+			bv.bbs[p].flowSuccs = append(bv.bbs[p].flowSuccs, int32(b))
+		}
+	}
+}
+
+// compose appends the instruction (in the flow order) to the block summary.
+func (bv *BitVectorIntraPAN) compose(bb *bitBB, t *bitInsn) {
+	if t.killAll {
+		clear(bb.gen)
+		bb.kill.fill(len(bv.eids))
+	}
+	for _, i := range t.kill {
+		bb.gen.unset(i)
+		bb.kill.set(i)
+	}
+	for _, i := range t.gen {
+		bb.gen.set(i)
+	}
+}
+
+// meetInto computes the flow input of the basic block.
+func (bv *BitVectorIntraPAN) meetInto(b int) {
+	bb := &bv.bbs[b]
+	in := bb.flowIn
+	switch {
+	case b == bv.boundary:
+		copy(in, bv.bndVec)
+	case bv.meetOr:
+		clear(in)
+	default:
+		in.fill(len(bv.eids)) // Top of a must analysis
+	}
+	for _, p := range bb.flowPreds {
+		if bv.meetOr {
+			in.or(bv.bbs[p].flowOut)
+		} else {
+			in.and(bv.bbs[p].flowOut)
+		}
+	}
+}
+
+// AnalyzeGraph computes the fixed point, with a FIFO worklist of the basic
+// blocks initialized in the visiting order. As with IntraPAN, the first
+// call reports a change (the facts are computed for the first time).
+func (bv *BitVectorIntraPAN) AnalyzeGraph() lattice.FactChanged {
+	factChange := lattice.NoChange
+	if !bv.solved && len(bv.bbs) > 0 {
+		factChange = lattice.Changed
+	}
+	bv.solved = true
+	queue := make([]int32, 0, len(bv.bbs))
+	inQueue := make([]bool, len(bv.bbs))
+	for b := range bv.bbs {
+		queue = append(queue, int32(b))
+		inQueue[b] = true
+	}
+	tmp := make(bitVec, bv.words)
+	for len(queue) > 0 {
+		b := queue[0]
+		queue = queue[1:]
+		inQueue[b] = false
+
+		bv.meetInto(int(b))
+		bb := &bv.bbs[b]
+		bb.transfer(tmp, bb.flowIn)
+		if bv.stats != nil {
+			bv.stats.visit(bv.visits[b])
+			bv.visits[b]++
+			bv.stats.Meets += uint64(len(bb.flowPreds))
+			bv.stats.InsnTransfers += uint64(len(bb.insns))
+		}
+		if slices.Equal(tmp, bb.flowOut) {
+			continue
+		}
+		copy(bb.flowOut, tmp)
+		factChange = lattice.Changed
+		for _, s := range bb.flowSuccs {
+			if bv.stats != nil {
+				bv.stats.Changes++
+			}
+			if !inQueue[s] {
+				inQueue[s] = true
+				queue = append(queue, s)
+				if bv.stats != nil {
+					bv.stats.push(bv.visits[s])
+				}
+			}
+		}
+	}
+	bv.factMap = nil // stale
+	return factChange
+}
+
+// SetStats sets the performance counters to count the work into (nil disables counting).
+func (bv *BitVectorIntraPAN) SetStats(stats *EngineStats) {
+	bv.stats = stats
+	if stats != nil && bv.visits == nil {
+		bv.visits = make([]int, len(bv.bbs))
+	}
+}
+
+func (bv *BitVectorIntraPAN) eidSet(v bitVec) *spir.EidSet {
+	set := spir.NewEidSet(false, false)
+	for i, w := range v {
+		for w != 0 {
+			set.Add(bv.eids[i*64+bits.TrailingZeros64(w)])
+			w &= w - 1
+		}
+	}
+	return set
+}
+
+// walkBB calls yield with the flow input and output of each instruction
+// of the basic block, in the flow order. The vectors are reused.
+func (bv *BitVectorIntraPAN) walkBB(b int, yield func(t *bitInsn, flowIn, flowOut bitVec)) {
+	bb := &bv.bbs[b]
+	flowIn, flowOut := slices.Clone(bb.flowIn), make(bitVec, bv.words)
+	for k := range bb.insns {
+		copy(flowOut, flowIn)
+		bb.insns[k].apply(flowOut)
+		yield(&bb.insns[k], flowIn, flowOut)
+		flowIn, flowOut = flowOut, flowIn
+	}
+}
+
+// InsnEids returns the sets of entities in the IN and OUT facts of the
+// instruction, without materializing any lattice value.
+func (bv *BitVectorIntraPAN) InsnEids(insnId spir.InsnId) (in, out *spir.EidSet, ok bool) {
+	b, ok := bv.insnBB[insnId]
+	if !ok {
+		return nil, nil, false
+	}
+	bv.walkBB(int(b), func(t *bitInsn, flowIn, flowOut bitVec) {
+		if t.insnId == insnId {
+			in, out = bv.eidSet(flowIn), bv.eidSet(flowOut)
+		}
+	})
+	if bv.backward {
+		in, out = out, in
+	}
+	return in, out, true
+}
+
+// materialize builds the fact map from the converged bit vectors.
+func (bv *BitVectorIntraPAN) materialize() {
+	bv.factMap = make(AnalysisFactMap, len(bv.insnBB))
+	factId := lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+		WithAnalysisId(bv.analysis.InstanceId().AnalysisId())
+	for b := range bv.bbs {
+		bv.walkBB(b, func(t *bitInsn, flowIn, flowOut bitVec) {
+			insnFactId := factId.WithUBEntityId(spir.EntityId(t.insnId))
+			in, out := flowIn, flowOut
+			if bv.backward {
+				in, out = out, in
+			}
+			bv.factMap[t.insnId] = lattice.NewPair(
+				bv.analysis.NewBitVectorFact(bv.eidSet(in), insnFactId.WithFactPoint(lattice.FactIdUB_Point_IN)),
+				bv.analysis.NewBitVectorFact(bv.eidSet(out), insnFactId.WithFactPoint(lattice.FactIdUB_Point_OUT)),
+				insnFactId)
+		})
+	}
+	// Replace the fact map of a previous solve, if any.
+	bv.context.RemoveInfo(uint64(bv.ctxId))
+	bv.context.SetInfo(uint64(bv.ctxId), bv.factMap)
+}
+
+// EntityCount returns the number of entities in the local index.
+func (bv *BitVectorIntraPAN) EntityCount() int {
+	return len(bv.eids)
+}
+
+func (bv *BitVectorIntraPAN) Context() *spir.Context {
+	return bv.context
+}
+
+func (bv *BitVectorIntraPAN) GetAnalysis() Analysis {
+	return bv.analysis
+}
+
+func (bv *BitVectorIntraPAN) GetContextId() spir.ContextId {
+	return bv.ctxId
+}
+
+func (bv *BitVectorIntraPAN) Graph() spir.Graph {
+	return bv.graph
+}
+
+// FactMap materializes the facts (on the first call after AnalyzeGraph).
+func (bv *BitVectorIntraPAN) FactMap() *AnalysisFactMap {
+	if bv.factMap == nil {
+		bv.materialize()
+	}
+	return &bv.factMap
+}
+
+func (bv *BitVectorIntraPAN) SetFactMapValue(insnId spir.InsnId, fact lattice.Pair) {
+	(*bv.FactMap())[insnId] = fact
+}
+
+func (bv *BitVectorIntraPAN) GetFactMapValue(insnId spir.InsnId) lattice.Pair {
+	factMap := *bv.FactMap()
+	if _, ok := factMap[insnId]; !ok {
+		factMap[insnId] = lattice.NewPair(nil, nil,
+			lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+				WithAnalysisId(bv.analysis.InstanceId().AnalysisId()).
+				WithUBEntityId(spir.EntityId(insnId)))
+	}
+	return factMap[insnId]
+}
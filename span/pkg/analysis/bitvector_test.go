@@ -0,0 +1,89 @@
+package analysis
+
+import (
+	"slices"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A forward must analysis: the variables assigned on every path.
+type testAssignedClient struct {
+	testForwardClient
+}
+
+func (c *testAssignedClient) MeetIsUnion() bool {
+	return false
+}
+
+func (c *testAssignedClient) BoundaryEids(graph spir.Graph, ctx *spir.Context) []spir.EntityId {
+	return nil
+}
+
+func (c *testAssignedClient) InsnTransfer(insn spir.Insn, ctx *spir.Context, t *BitTransfer) {
+	if insn.InsnKind() == spir.K_IK_IASGN_RHS_OP || insn.InsnKind() == spir.K_IK_IASGN_SIMPLE {
+		t.Gen = append(t.Gen, insn.LhsX().GetOpr1())
+	}
+}
+
+func (c *testAssignedClient) NewBitVectorFact(eids *spir.EidSet, factId lattice.FactId) lattice.Lattice {
+	return &lattice.TopBotLatticeTop
+}
+
+func TestBitVectorIntraPAN_mustForward(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_B_1()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	cfg := main.Body()
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(main.Id())
+
+	bv := NewBitVectorIntraPAN(spir.GetNextContextId(), &testAssignedClient{}, cfg, ctx)
+	if change := bv.AnalyzeGraph(); change != lattice.Changed {
+		t.Fatalf("expected a change, got %v", change)
+	}
+
+	ifInsn := cfg.EntryBlock().Insn(0) // t1 = 0 < argc
+	t1 := ifInsn.LhsX().GetOpr1()
+	in, out, ok := bv.InsnEids(ifInsn.Id())
+	if !ok || !in.IsEmpty() || !out.Equals(*spir.NewEidSet(false, false, t1)) {
+		t.Errorf("entry insn: expected {} -> {t1}, got %v -> %v", in, out)
+	}
+	// The exit is reached along both the branches, with t1 assigned on each.
+	exitId := cfg.ExitBlock().ExitInsnId()
+	if in, _, _ := bv.InsnEids(exitId); !slices.Equal(in.Values(), []spir.EntityId{t1}) {
+		t.Errorf("exit insn: expected {t1}, got %v", in)
+	}
+	if _, _, ok := bv.InsnEids(spir.InsnId(1 << 30)); ok {
+		t.Error("expected no facts for an unknown insn")
+	}
+	if got := len(*bv.FactMap()); got != 5 {
+		t.Errorf("expected 5 materialized facts, got %d", got)
+	}
+}
+
+// A second solve replaces the fact map of the first in the context.
+func TestBitVectorIntraPAN_resolve(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_B_1()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(main.Id())
+	ctxId := spir.GetNextContextId()
+	bv := NewBitVectorIntraPAN(ctxId, &testAssignedClient{}, main.Body(), ctx)
+
+	bv.AnalyzeGraph()
+	exitId := main.Body().ExitBlock().ExitInsnId()
+	bv.SetFactMapValue(exitId, lattice.NewPair(nil, nil, lattice.NIL_FACT_ID)) // a stale fact
+	bv.AnalyzeGraph()
+	want := (*bv.FactMap())[exitId]
+	value, ok := ctx.GetInfo(uint64(ctxId))
+	if !ok {
+		t.Fatalf("no fact map in the context")
+	}
+	if got := value.(AnalysisFactMap)[exitId]; got.L1() != want.L1() || got.L1() == nil {
+		t.Errorf("expected the fact map of the second solve in the context, got %v", got)
+	}
+}
@@ -0,0 +1,351 @@
+package analysis
+
+// This file defines the memory bounded retention of the facts of the
+// functions analyzed, for the whole program runs on large code:
+//  1. The boundary facts mode: only the facts at the entry and the exit of
+//     each basic block are kept (KeepBoundaryFacts). The facts of the other
+//     instructions are recomputed on demand, by re-running the transfer
+//     functions of their block (see FactRecomputer).
+//  2. A FactBudget: the fact maps of the finished functions are published
+//     into a context while their estimated size is under a global budget.
+//     Over the budget, the least recently used fact maps are spilled to a
+//     ResultStore (rendered, see RenderFuncResult), or evicted.
+
+import (
+	"container/list"
+	"fmt"
+	"slices"
+	"sync"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// KeepBoundaryFacts deletes the facts of the instructions of the graph that
+// are neither the entry nor the exit of their basic block.
+// It returns the number of facts deleted.
+func KeepBoundaryFacts(graph spir.Graph, factMap AnalysisFactMap) int {
+	deleted := 0
+	forEachInnerInsn(graph, func(insnId spir.InsnId) {
+		if _, ok := factMap[insnId]; ok {
+			delete(factMap, insnId)
+			deleted++
+		}
+	})
+	return deleted
+}
+
+// KeepBoundaryRenderedFacts is KeepBoundaryFacts for a rendered result
+// (e.g. loaded from a ResultStore).
+func KeepBoundaryRenderedFacts(graph spir.Graph, res *RenderedResult) int {
+	inner := make(map[spir.InsnId]bool)
+	forEachInnerInsn(graph, func(insnId spir.InsnId) { inner[insnId] = true })
+	count := len(res.Facts)
+	res.Facts = slices.DeleteFunc(res.Facts, func(fact RenderedFact) bool { return inner[fact.InsnId] })
+	return count - len(res.Facts)
+}
+
+// forEachInnerInsn calls f on the instructions of the graph that are neither
+// the entry nor the exit of their basic block.
+func forEachInnerInsn(graph spir.Graph, f func(insnId spir.InsnId)) {
+	for _, bbId := range spir.GetBBWorklist(graph, spir.NoOrder) {
+		bb := graph.BasicBlock(bbId)
+		for i := 1; i < bb.InsnCount()-1; i++ {
+			f(bb.Insn(i).Id())
+		}
+	}
+}
+
+// RecomputeBBFacts recomputes the facts of the instructions of the block
+// from the facts at its boundaries (the IN of its entry for a forward
+// analysis, the OUT of its exit for a backward analysis), by re-running the
+// transfer functions of its instructions. The facts are returned, the fact
+// map is not modified. For an analysis that handles the blocks itself (see
+// Analysis.AnalyzeBB) only the facts at the boundaries are returned.
+func (intra *IntraPAN) RecomputeBBFacts(bb *spir.BasicBlock) AnalysisFactMap {
+	facts := make(AnalysisFactMap, bb.InsnCount())
+	if intra.analysisHandlesBB {
+		facts[bb.EntryInsnId()] = intra.storedFact(bb.EntryInsnId())
+		facts[bb.ExitInsnId()] = intra.storedFact(bb.ExitInsnId())
+		return facts
+	}
+
+	reverse := intra.analysis.VisitingOrder() == spir.PostOrder
+	lastIndx := bb.InsnCount() - 1
+	var flow lattice.Lattice // the fact flowing into the next instruction
+	for k := range bb.InsnCount() {
+		insn := bb.Insn(InsnIndex(k, lastIndx, reverse))
+		inout := intra.storedFact(insn.Id())
+		if k > 0 {
+			if reverse {
+				inout = lattice.NewPair(inout.L1(), flow, inout.FactId())
+			} else {
+				inout = lattice.NewPair(flow, inout.L2(), inout.FactId())
+			}
+		}
+		inout, _ = intra.analyzeInsn(insn, inout)
+		if intra.stats != nil {
+			intra.stats.InsnTransfers++
+		}
+		facts[insn.Id()] = inout
+		if reverse {
+			flow = inout.L1()
+		} else {
+			flow = inout.L2()
+		}
+	}
+	return facts
+}
+
+// storedFact returns the fact of the instruction in the fact map (Top if absent).
+func (intra *IntraPAN) storedFact(insnId spir.InsnId) lattice.Pair {
+	if fact, ok := intra.factMap[insnId]; ok {
+		return fact
+	}
+	return intra.newInsnFact(insnId)
+}
+
+// FactRecomputer recomputes the facts of the instructions of a function
+// from the facts kept at the boundaries of its blocks (see KeepBoundaryFacts).
+// The facts of the last block recomputed are cached, so that the facts of
+// the instructions of a block are recomputed once when queried in a row.
+type FactRecomputer struct {
+	intra     *IntraPAN
+	insnBB    map[spir.InsnId]spir.BasicBlockId // built on the first query
+	lastBB    spir.BasicBlockId
+	lastFacts AnalysisFactMap
+}
+
+// NewFactRecomputer creates a recomputer of the facts of the function in
+// factMap (its converged facts, possibly only at the boundaries), for a fresh
+// analysis object an of the analysis that computed them.
+func NewFactRecomputer(tu *spir.TU, fun *spir.Function, an Analysis, factMap AnalysisFactMap) *FactRecomputer {
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+
+	intra := newIntraPAN(spir.GetNextContextId(), an, fun.Body(), ctx, false, false)
+	intra.factMap = factMap
+	intra.initHandlesBB()
+	return &FactRecomputer{intra: intra}
+}
+
+// SetCallSummaries sets the summaries of the callees used when the facts were
+// computed (see IntraPAN.SetCallSummaries), to apply them at the call sites.
+func (r *FactRecomputer) SetCallSummaries(summaries CallSummaries) {
+	r.intra.SetCallSummaries(summaries)
+}
+
+// BBFacts returns the facts of the instructions of the block.
+func (r *FactRecomputer) BBFacts(bbId spir.BasicBlockId) AnalysisFactMap {
+	if r.lastFacts == nil || r.lastBB != bbId {
+		r.lastBB, r.lastFacts = bbId, r.intra.RecomputeBBFacts(r.intra.graph.BasicBlock(bbId))
+	}
+	return r.lastFacts
+}
+
+// InsnFact returns the fact of the instruction, from the fact map if there,
+// or else recomputed. It returns false if the instruction is not in the function.
+func (r *FactRecomputer) InsnFact(insnId spir.InsnId) (lattice.Pair, bool) {
+	if fact, ok := r.intra.factMap[insnId]; ok {
+		return fact, true
+	}
+	if r.insnBB == nil {
+		r.insnBB = make(map[spir.InsnId]spir.BasicBlockId)
+		for _, bbId := range spir.GetBBWorklist(r.intra.graph, spir.NoOrder) {
+			bb := r.intra.graph.BasicBlock(bbId)
+			for i := range bb.InsnCount() {
+				r.insnBB[bb.Insn(i).Id()] = bbId
+			}
+		}
+	}
+	bbId, ok := r.insnBB[insnId]
+	if !ok {
+		return lattice.Pair{}, false
+	}
+	fact, ok := r.BBFacts(bbId)[insnId]
+	return fact, ok
+}
+
+// retainResult applies the retention options of a driver to the result of
+// a function: keeping only its boundary facts, and publishing its fact map
+// into the budget (then the result no longer holds it).
+func retainResult(res *FuncResult, fun *spir.Function, boundaryFactsOnly bool, budget *FactBudget) {
+	if boundaryFactsOnly {
+		KeepBoundaryFacts(fun.Body(), res.FactMap)
+	}
+	if budget != nil {
+		if err := budget.Publish(res); err != nil {
+			logger.Get().Warn("Failed to spill the facts", "function", fun.Name(), "error", err)
+		}
+		res.FactMap = nil
+	}
+}
+
+// The estimated bytes held by an entry of a fact map: the key, the pair
+// and the map overhead, without the lattices of the pair.
+const FactMapEntryBytes = 96
+
+// EstimateFactMapBytes estimates the bytes held by the fact map: its entries
+// and their lattices, sized by lattice.SizeBytes (e.g. by the cardinality of
+// a set or of a map). The lattices shared by the facts (e.g. interned, see
+// lattice.Interner) are counted once.
+func EstimateFactMapBytes(factMap AnalysisFactMap) int64 {
+	size := int64(len(factMap)) * FactMapEntryBytes
+	seen := make(map[lattice.Lattice]bool)
+	var add func(l lattice.Lattice)
+	add = func(l lattice.Lattice) {
+		if l == nil || seen[l] {
+			return
+		}
+		seen[l] = true
+		if pair, ok := l.(*lattice.Pair); ok { // the facts along the edges of a branch
+			add(pair.L1())
+			add(pair.L2())
+			return
+		}
+		size += lattice.SizeBytes(l)
+	}
+	for _, fact := range factMap {
+		add(fact.L1())
+		add(fact.L2())
+	}
+	return size
+}
+
+// The published fact map of a function.
+type budgetEntry struct {
+	ctxId  spir.ContextId
+	funcId spir.EntityId
+	bytes  int64
+}
+
+// FactBudget bounds the (estimated) memory held by the fact maps of the
+// finished functions published into a context. It is safe for concurrent use.
+type FactBudget struct {
+	mu        sync.Mutex
+	ctx       *spir.Context
+	maxBytes  int64
+	usedBytes int64
+	store     *ResultStore                       // nil: the fact maps over the budget are evicted
+	lru       *list.List                         // of *budgetEntry, the most recently used first
+	entries   map[spir.ContextId]*list.Element   // the fact maps in the context
+	pending   map[spir.ContextId]AnalysisFactMap // the fact maps being spilled
+	spilled   map[spir.ContextId]bool            // the fact maps in the store
+	spills    uint64
+	evictions uint64
+}
+
+// NewFactBudget creates a budget of maxBytes for the fact maps published
+// into ctx. The fact maps over the budget are spilled to the store,
+// or evicted if the store is nil.
+func NewFactBudget(ctx *spir.Context, maxBytes int64, store *ResultStore) *FactBudget {
+	return &FactBudget{
+		ctx:      ctx,
+		maxBytes: maxBytes,
+		store:    store,
+		lru:      list.New(),
+		entries:  make(map[spir.ContextId]*list.Element),
+		pending:  make(map[spir.ContextId]AnalysisFactMap),
+		spilled:  make(map[spir.ContextId]bool),
+	}
+}
+
+// The key of a spilled fact map in the ResultStore.
+func spillKey(ctxId spir.ContextId) string {
+	return fmt.Sprintf("ctx-%d", ctxId)
+}
+
+// Publish sets the fact map of the result into the context (keyed by its
+// context id, as MergeInto), and spills or evicts the least recently used
+// fact maps while over the budget. The result should not be retained by the
+// caller, so that the memory of an evicted fact map can be reclaimed.
+// A fact map being spilled is still returned by FactMap until it is stored,
+// and only then loaded by LoadSpilled.
+func (b *FactBudget) Publish(res *FuncResult) error {
+	b.mu.Lock()
+	if b.ctx.SetInfo(uint64(res.CtxId), res.FactMap) {
+		entry := &budgetEntry{ctxId: res.CtxId, funcId: res.FuncId, bytes: EstimateFactMapBytes(res.FactMap)}
+		b.entries[res.CtxId] = b.lru.PushFront(entry)
+		b.usedBytes += entry.bytes
+	}
+
+	var victims []*FuncResult
+	for b.usedBytes > b.maxBytes && b.lru.Len() > 0 {
+		entry := b.lru.Remove(b.lru.Back()).(*budgetEntry)
+		delete(b.entries, entry.ctxId)
+		b.usedBytes -= entry.bytes
+		value, _ := b.ctx.GetInfo(uint64(entry.ctxId))
+		b.ctx.RemoveInfo(uint64(entry.ctxId))
+		if b.store != nil {
+			factMap := value.(AnalysisFactMap)
+			victims = append(victims, &FuncResult{FuncId: entry.funcId, CtxId: entry.ctxId, FactMap: factMap})
+			b.pending[entry.ctxId] = factMap
+		} else {
+			b.evictions++
+		}
+	}
+	b.mu.Unlock()
+
+	// Spill outside the lock: the pending fact maps are only read.
+	var err error
+	for _, victim := range victims {
+		storeErr := b.store.Store(spillKey(victim.CtxId), RenderFuncResult(victim))
+		b.mu.Lock()
+		delete(b.pending, victim.CtxId)
+		if storeErr == nil {
+			b.spilled[victim.CtxId] = true
+			b.spills++
+		} else {
+			b.evictions++ // the facts are lost
+		}
+		b.mu.Unlock()
+		if storeErr != nil && err == nil {
+			err = fmt.Errorf("failed to spill the facts of context %d: %w", victim.CtxId, storeErr)
+		}
+	}
+	return err
+}
+
+// FactMap returns the fact map of the context id, if it is in the context
+// or being spilled (i.e. not spilled or evicted), and marks it as the most
+// recently used.
+func (b *FactBudget) FactMap(ctxId spir.ContextId) (AnalysisFactMap, bool) {
+	b.mu.Lock()
+	defer b.mu.Unlock()
+	elem, ok := b.entries[ctxId]
+	if !ok {
+		factMap, pending := b.pending[ctxId]
+		return factMap, pending
+	}
+	b.lru.MoveToFront(elem)
+	value, _ := b.ctx.GetInfo(uint64(ctxId))
+	return value.(AnalysisFactMap), true
+}
+
+// LoadSpilled loads the (rendered) facts of the context id spilled to the
+// store. The facts are spilled once they are completely stored.
+func (b *FactBudget) LoadSpilled(ctxId spir.ContextId) (*RenderedResult, error) {
+	b.mu.Lock()
+	spilled := b.spilled[ctxId]
+	b.mu.Unlock()
+	if !spilled {
+		return nil, fmt.Errorf("the facts of context %d are not spilled", ctxId)
+	}
+	return b.store.Load(spillKey(ctxId))
+}
+
+// UsedBytes returns the estimated bytes of the fact maps in the context.
+func (b *FactBudget) UsedBytes() int64 {
+	b.mu.Lock()
+	defer b.mu.Unlock()
+	return b.usedBytes
+}
+
+// Stats returns the number of fact maps spilled and evicted.
+func (b *FactBudget) Stats() (spills, evictions uint64) {
+	b.mu.Lock()
+	defer b.mu.Unlock()
+	return b.spills, b.evictions
+}
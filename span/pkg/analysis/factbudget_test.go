@@ -0,0 +1,180 @@
+package analysis
+
+import (
+	"maps"
+	"os"
+	"path/filepath"
+	"slices"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestFactRecomputer(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	for _, n := range []int{8, 100} { // 100: in two blocks (see spir.ConstructCFG)
+		tu := spir.NewExampleTU_Straight(n)
+		main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+		newClient := func() Analysis {
+			return &testRangeClient{v: tu.GetEntityId("i"), lits: map[spir.EntityId]int32{tu.NewConst(1, spir.Int32QT): 1}}
+		}
+
+		full := AnalyzeFunction(tu, main, newClient(), false, false).FactMap
+		boundary := maps.Clone(full)
+		bbIds := spir.GetBBWorklist(main.Body(), spir.NoOrder)
+		kept := 0
+		for _, bbId := range bbIds {
+			kept += min(main.Body().BasicBlock(bbId).InsnCount(), 2)
+		}
+		if deleted := KeepBoundaryFacts(main.Body(), boundary); len(full) != n+3 || deleted != n+3-kept || len(boundary) != kept {
+			t.Fatalf("n=%d: expected %d facts deleted and %d kept, got %d and %d", n, n+3-kept, kept, deleted, len(boundary))
+		}
+		rendered := RenderFuncResult(&FuncResult{FactMap: full})
+		if deleted := KeepBoundaryRenderedFacts(main.Body(), rendered); deleted != n+3-kept ||
+			!slices.Equal(rendered.Facts, RenderFuncResult(&FuncResult{FactMap: boundary}).Facts) {
+			t.Errorf("n=%d: expected the rendered facts of the boundaries, got %v", n, rendered.Facts)
+		}
+
+		rc := NewFactRecomputer(tu, main, newClient(), boundary)
+		for _, bbId := range bbIds {
+			bb := main.Body().BasicBlock(bbId)
+			for i := range bb.InsnCount() {
+				insn := bb.Insn(i)
+				got, ok := rc.InsnFact(insn.Id())
+				want := full[insn.Id()]
+				if !ok || !lattice.Equals(got.L1(), want.L1()) || !lattice.Equals(got.L2(), want.L2()) {
+					t.Errorf("n=%d, insn %d: expected %s, got %s (%t)", n, i, want.String(), got.String(), ok)
+				}
+				if insn.IsReturn() && !lattice.Equals(rc.BBFacts(bbId)[insn.Id()].L1(), int32Range(int32(n+1), int32(n+1))) {
+					t.Errorf("n=%d: expected i in [%d, %d] after the increments", n, n+1, n+1)
+				}
+			}
+		}
+		if _, ok := rc.InsnFact(spir.InsnId(1 << 20)); ok {
+			t.Errorf("expected no fact for an instruction not in the function")
+		}
+	}
+}
+
+func TestFactBudget(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	const n = 8
+	tu := spir.NewExampleTU_Straight(n)
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	funcs := []*spir.Function{main, main, main, main}
+	factMap := AnalyzeFunction(tu, main, newTestForwardClient(), false, false).FactMap
+	budgetBytes := 2 * EstimateFactMapBytes(factMap) // the facts of two functions
+
+	t.Run("spill", func(t *testing.T) {
+		store, err := NewResultStore(t.TempDir())
+		if err != nil {
+			t.Fatal(err)
+		}
+		budget := NewFactBudget(spir.NewContext(tu), budgetBytes, store)
+		p := NewParallelIntraPAN(tu, newTestForwardClient, false, false)
+		p.SetWorkers(1)
+		p.SetFactBudget(budget)
+		results := p.AnalyzeFunctions(funcs)
+
+		if spills, evictions := budget.Stats(); spills != 2 || evictions != 0 {
+			t.Errorf("expected 2 spills and no evictions, got %d and %d", spills, evictions)
+		}
+		if used := budget.UsedBytes(); used != budgetBytes {
+			t.Errorf("expected %d bytes used, got %d", budgetBytes, used)
+		}
+		for i, res := range results {
+			if res.FactMap != nil {
+				t.Errorf("result %d: the fact map is retained", i)
+			}
+			factMap, inMemory := budget.FactMap(res.CtxId)
+			spilled, err := budget.LoadSpilled(res.CtxId)
+			switch {
+			case i < 2 && (inMemory || err != nil || len(spilled.Facts) != n+3):
+				t.Errorf("result %d: expected spilled facts, got %v (%v)", i, spilled, err)
+			case i >= 2 && (!inMemory || len(factMap) != n+3 || err == nil):
+				t.Errorf("result %d: expected the facts in memory", i)
+			}
+		}
+	})
+
+	t.Run("spill failure", func(t *testing.T) {
+		dir := t.TempDir()
+		store, err := NewResultStore(filepath.Join(dir, "spill"))
+		if err != nil {
+			t.Fatal(err)
+		}
+		os.RemoveAll(store.Dir()) // the spills fail
+		budget := NewFactBudget(spir.NewContext(tu), budgetBytes, store)
+		var failed []spir.ContextId
+		for range 3 {
+			res := AnalyzeFunction(tu, main, newTestForwardClient(), false, false)
+			if err := budget.Publish(&res); err != nil {
+				failed = append(failed, res.CtxId)
+			}
+		}
+		if len(failed) != 1 {
+			t.Fatalf("expected a failed spill, got %d", len(failed))
+		}
+		// The first fact map, which failed to spill, is not marked spilled.
+		if spills, evictions := budget.Stats(); spills != 0 || evictions != 1 {
+			t.Errorf("expected no spills and an eviction, got %d and %d", spills, evictions)
+		}
+	})
+
+	t.Run("evict", func(t *testing.T) {
+		budget := NewFactBudget(spir.NewContext(tu), budgetBytes, nil)
+		p := NewParallelIntraPAN(tu, newTestForwardClient, false, false)
+		p.SetWorkers(2)
+		p.SetFactBudget(budget)
+		p.SetBoundaryFactsOnly(true) // 2 facts per function: all fit
+		p.AnalyzeFunctions(funcs)
+		if spills, evictions := budget.Stats(); spills != 0 || evictions != 0 {
+			t.Errorf("expected no spills or evictions, got %d and %d", spills, evictions)
+		}
+
+		budget = NewFactBudget(spir.NewContext(tu), budgetBytes, nil)
+		p.SetBoundaryFactsOnly(false)
+		p.SetFactBudget(budget)
+		p.AnalyzeFunctions(funcs)
+		if spills, evictions := budget.Stats(); spills != 0 || evictions != 2 {
+			t.Errorf("expected 2 evictions, got %d spills and %d evictions", spills, evictions)
+		}
+	})
+}
+
+func TestEstimateFactMapBytes(t *testing.T) {
+	newSet := func(n int) *lattice.MaySetLattice {
+		eids := spir.NewEidSet(false, false)
+		for i := range n {
+			eids.Add(spir.EntityId(i + 1))
+		}
+		return lattice.NewMaySetLattice(*eids, false)
+	}
+	estimate := func(l lattice.Lattice) int64 {
+		branch := lattice.NewPair(l, l, lattice.NIL_FACT_ID)
+		return EstimateFactMapBytes(AnalysisFactMap{
+			1: lattice.NewPair(l, l, lattice.NIL_FACT_ID),
+			2: lattice.NewPair(l, &branch, lattice.NIL_FACT_ID),
+		})
+	}
+
+	small, large := newSet(1), newSet(1000)
+	if large.SizeBytes() <= small.SizeBytes() {
+		t.Fatalf("expected a larger size for the larger set, got %d and %d", large.SizeBytes(), small.SizeBytes())
+	}
+	// The lattice shared by the facts is counted once.
+	if got, want := estimate(small), 2*FactMapEntryBytes+small.SizeBytes(); got != want {
+		t.Errorf("expected %d bytes, got %d", want, got)
+	}
+	if got, want := estimate(large), 2*FactMapEntryBytes+large.SizeBytes(); got != want {
+		t.Errorf("expected %d bytes, got %d", want, got)
+	}
+	if got, want := estimate(&lattice.TopBotLatticeBot), 2*FactMapEntryBytes+lattice.LatticeBytes; got != int64(want) {
+		t.Errorf("expected %d bytes for a lattice without a size, got %d", want, got)
+	}
+	if got := estimate(nil); got != 2*FactMapEntryBytes {
+		t.Errorf("expected %d bytes for Top, got %d", 2*FactMapEntryBytes, got)
+	}
+}
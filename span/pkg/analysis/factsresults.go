@@ -0,0 +1,398 @@
+package analysis
+
+// This file defines the facts format, a compact binary format of the results
+// for bulk post-processing (e.g. with NumPy, see tools/span_results).
+// Unlike the bin format, the facts are not rendered as strings: each fact is
+// encoded by the kind of its lattice (a range, a set as a bitset, or the
+// entries of a KV lattice) in fixed width little endian records, so that a
+// reader can memory map the file and view each array in place.
+//
+// The layout of a facts file (version 1) is:
+//
+//	header:    magic "SPNFACTS" | u32 version | u32 reserved
+//	chunks:    a chunk per function, in the order written (see factsChunk)
+//	names:     u64 offsets[count+1] | the bytes of the names
+//	index:     a function entry per chunk (see factsChunk.indexEntry)
+//	footer:    u64 names offset | u64 name count | u64 index offset | u64 func count | magic
+//
+// The index is at the end so that each chunk is written (and flushed) as
+// soon as its function converges, like in the other formats.
+// Every section, and every array in a chunk, starts at a multiple of 8 bytes.
+
+import (
+	"bufio"
+	"encoding/binary"
+	"slices"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// Magic bytes at the start and at the end of a facts file.
+const FactsResultMagic = "SPNFACTS"
+
+// The version of the facts format, incremented on an incompatible change.
+const FactsResultVersion = 1
+
+const (
+	factsHeaderSize     = 16
+	factsFooterSize     = 40
+	factsIndexEntrySize = 48
+	factsRecordSize     = 24
+	factsKVRecordSize   = 32
+)
+
+// The kind of a fact record, decided by the lattice of the fact.
+type FactKind uint8
+
+const (
+	NilFact    FactKind = 0 // a nil lattice (Top)
+	TopBotFact FactKind = 1 // only the flags are set
+	RangeFact  FactKind = 2 // value kind, a = min, b = max (encoded as in lattice.RangeLattice)
+	SetFact    FactKind = 3 // count = the elements, a = the first word of the bitset
+	KVFact     FactKind = 4 // count = the entries, a = the first entry
+	StringFact FactKind = 5 // a = the string (the lattice rendered by lattice.String)
+)
+
+// The flags of a fact record.
+const (
+	FactFlagTop uint8 = 1 << iota
+	FactFlagBot
+	FactFlagUniversal // a set of all the entities
+)
+
+// A SetLattice is a lattice whose value is a set of entities (e.g. the live
+// variables). Its facts are written as bitsets in the facts format.
+type SetLattice interface {
+	lattice.Lattice
+	// ElemSet adds the entities in the lattice to set, and returns set.
+	ElemSet(set *spir.EidSet) *spir.EidSet
+}
+
+// A fixed width fact record:
+//
+//	u8 kind | u8 flags | u8 value kind | u8 reserved | u32 count | u64 a | u64 b
+type factRecord struct {
+	kind    FactKind
+	flags   uint8
+	valKind uint8
+	count   uint32
+	a, b    uint64
+	elems   []spir.EntityId // the elements of a SetFact, until placed in the bitsets
+}
+
+// An entry of a KV fact: u32 key | u32 reserved | the record of the value.
+// A non Top default value of the lattice is the first entry, with the key NIL_ID.
+type kvRecord struct {
+	key  spir.EntityId
+	fact factRecord
+}
+
+// The facts of a function, in the arrays of its chunk:
+//
+//	u32 insn ids[n] | in records[n] | out records[n] | u32 universe[u]
+//	u64 bitset words[w] | kv records[k] | u32 string offsets[s+1] | string bytes
+//
+// The universe is the sorted entities of all the sets of the function,
+// and the bitset of a set has a bit per entity of the universe
+// (the bit i is the bit i%64 of its word i/64).
+type factsChunk struct {
+	insnIds  []spir.InsnId
+	in, out  []factRecord
+	kvs      []kvRecord
+	universe []spir.EntityId
+	words    []uint64
+	strs     []string
+}
+
+func (c *factsChunk) reset() {
+	c.insnIds = c.insnIds[:0]
+	c.in, c.out = c.in[:0], c.out[:0]
+	c.kvs = c.kvs[:0]
+	c.universe = c.universe[:0]
+	c.words = c.words[:0]
+	c.strs = c.strs[:0]
+}
+
+func (c *factsChunk) addString(s string) factRecord {
+	c.strs = append(c.strs, s)
+	return factRecord{kind: StringFact, a: uint64(len(c.strs) - 1)}
+}
+
+// encode encodes a fact by the kind of its lattice. The values in a KV
+// lattice are encoded with inKV set, and a KV value is written as a string.
+func (c *factsChunk) encode(l lattice.Lattice, inKV bool) factRecord {
+	if l == nil {
+		return factRecord{kind: NilFact, flags: FactFlagTop}
+	}
+	var flags uint8
+	if l.IsTop() {
+		flags |= FactFlagTop
+	}
+	if l.IsBot() {
+		flags |= FactFlagBot
+	}
+
+	switch lat := l.(type) {
+	case *lattice.TopBotLT:
+		return factRecord{kind: TopBotFact, flags: flags}
+	case *lattice.RangeLattice:
+		typ, min, max := lat.Bounds()
+		return factRecord{kind: RangeFact, flags: flags, valKind: uint8(typ), a: min, b: max}
+	case SetLattice:
+		set := lat.ElemSet(spir.NewEidSet(false, false))
+		if set.IsUniversal() {
+			flags |= FactFlagUniversal
+		}
+		rec := factRecord{kind: SetFact, flags: flags, count: uint32(set.Len())}
+		rec.elems = make([]spir.EntityId, 0, set.Len())
+		for _, id := range set.Iterator {
+			rec.elems = append(rec.elems, id)
+		}
+		return rec
+	case *lattice.EntityIdMapKVLattice:
+		if !inKV {
+			return c.encodeKV(lat, flags)
+		}
+	}
+	rec := c.addString(lattice.String(l))
+	rec.flags = flags
+	return rec
+}
+
+func (c *factsChunk) encodeKV(kv *lattice.EntityIdMapKVLattice, flags uint8) factRecord {
+	rec := factRecord{kind: KVFact, flags: flags, a: uint64(len(c.kvs))}
+	if def := kv.DefaultValue(); !lattice.IsTop(def) {
+		c.kvs = append(c.kvs, kvRecord{key: spir.NIL_ID, fact: c.encode(def, true)})
+	}
+	keys := spir.NewEidSet(false, false)
+	kv.AllKeysPresent(keys)
+	for _, key := range keys.Iterator {
+		if val, ok := kv.Get(key); ok {
+			c.kvs = append(c.kvs, kvRecord{key: key, fact: c.encode(val, true)})
+		}
+	}
+	rec.count = uint32(len(c.kvs) - int(rec.a))
+	return rec
+}
+
+// placeSets builds the universe of the sets of the function,
+// and places the elements of each set in its bitset.
+func (c *factsChunk) placeSets() {
+	sets := make([]*factRecord, 0)
+	for _, recs := range [][]factRecord{c.in, c.out} {
+		for i := range recs {
+			if recs[i].kind == SetFact {
+				sets = append(sets, &recs[i])
+			}
+		}
+	}
+	for i := range c.kvs {
+		if c.kvs[i].fact.kind == SetFact {
+			sets = append(sets, &c.kvs[i].fact)
+		}
+	}
+	if len(sets) == 0 {
+		return
+	}
+
+	for _, rec := range sets {
+		c.universe = append(c.universe, rec.elems...)
+	}
+	slices.Sort(c.universe)
+	c.universe = slices.Compact(c.universe)
+
+	setWords := (len(c.universe) + 63) / 64
+	c.words = slices.Grow(c.words[:0], len(sets)*setWords)[:len(sets)*setWords]
+	clear(c.words)
+	for i, rec := range sets {
+		rec.a = uint64(i * setWords)
+		bits := c.words[i*setWords : (i+1)*setWords]
+		pos := 0 // the elements and the universe are both sorted
+		for _, id := range rec.elems {
+			for c.universe[pos] != id {
+				pos++
+			}
+			bits[pos/64] |= 1 << (pos % 64)
+		}
+		rec.elems = nil
+	}
+}
+
+func appendFactRecord(buf []byte, rec factRecord) []byte {
+	buf = append(buf, byte(rec.kind), rec.flags, rec.valKind, 0)
+	buf = binary.LittleEndian.AppendUint32(buf, rec.count)
+	buf = binary.LittleEndian.AppendUint64(buf, rec.a)
+	return binary.LittleEndian.AppendUint64(buf, rec.b)
+}
+
+// pad8 pads the buffer to a multiple of 8 bytes.
+func pad8(buf []byte) []byte {
+	for len(buf)%8 != 0 {
+		buf = append(buf, 0)
+	}
+	return buf
+}
+
+// appendTo appends the arrays of the chunk to buf.
+func (c *factsChunk) appendTo(buf []byte) []byte {
+	for _, id := range c.insnIds {
+		buf = binary.LittleEndian.AppendUint32(buf, uint32(id))
+	}
+	buf = pad8(buf)
+	for _, recs := range [][]factRecord{c.in, c.out} {
+		for _, rec := range recs {
+			buf = appendFactRecord(buf, rec)
+		}
+	}
+	for _, id := range c.universe {
+		buf = binary.LittleEndian.AppendUint32(buf, uint32(id))
+	}
+	buf = pad8(buf)
+	for _, word := range c.words {
+		buf = binary.LittleEndian.AppendUint64(buf, word)
+	}
+	for _, kv := range c.kvs {
+		buf = binary.LittleEndian.AppendUint32(buf, uint32(kv.key))
+		buf = binary.LittleEndian.AppendUint32(buf, 0)
+		buf = appendFactRecord(buf, kv.fact)
+	}
+	offset := uint32(0)
+	for _, s := range c.strs {
+		buf = binary.LittleEndian.AppendUint32(buf, offset)
+		offset += uint32(len(s))
+	}
+	buf = binary.LittleEndian.AppendUint32(buf, offset)
+	for _, s := range c.strs {
+		buf = append(buf, s...)
+	}
+	return pad8(buf)
+}
+
+// The index entry of a chunk:
+//
+//	u64 chunk offset | u32 func id | u32 tu name | u32 analysis name | u32 func name
+//	u32 insns | u32 universe | u32 words | u32 kvs | u32 strings | u32 string bytes
+//
+// where the names are indices in the names section.
+func (c *factsChunk) indexEntry(buf []byte, offset uint64, funcId spir.EntityId, names [3]uint32) []byte {
+	strBytes := 0
+	for _, s := range c.strs {
+		strBytes += len(s)
+	}
+	buf = binary.LittleEndian.AppendUint64(buf, offset)
+	buf = binary.LittleEndian.AppendUint32(buf, uint32(funcId))
+	for _, name := range names {
+		buf = binary.LittleEndian.AppendUint32(buf, name)
+	}
+	for _, n := range []int{len(c.insnIds), len(c.universe), len(c.words), len(c.kvs), len(c.strs), strBytes} {
+		buf = binary.LittleEndian.AppendUint32(buf, uint32(n))
+	}
+	return buf
+}
+
+type factsResultWriter struct {
+	w         *bufio.Writer
+	offset    uint64 // the bytes written
+	chunk     factsChunk
+	buf       []byte
+	index     []byte
+	funcCount uint64
+	names     []string
+	nameIds   map[string]uint32
+	closed    bool
+}
+
+func newFactsResultWriter(w *bufio.Writer) *factsResultWriter {
+	return &factsResultWriter{w: w, nameIds: make(map[string]uint32)}
+}
+
+func (fw *factsResultWriter) writeHeader() error {
+	header := append([]byte(FactsResultMagic), make([]byte, factsHeaderSize-len(FactsResultMagic))...)
+	binary.LittleEndian.PutUint32(header[len(FactsResultMagic):], FactsResultVersion)
+	return fw.write(header)
+}
+
+func (fw *factsResultWriter) write(data []byte) error {
+	n, err := fw.w.Write(data)
+	fw.offset += uint64(n)
+	return err
+}
+
+func (fw *factsResultWriter) nameId(name string) uint32 {
+	id, ok := fw.nameIds[name]
+	if !ok {
+		id = uint32(len(fw.names))
+		fw.names = append(fw.names, name)
+		fw.nameIds[name] = id
+	}
+	return id
+}
+
+func (fw *factsResultWriter) WriteFuncResult(header ResultHeader, res *FuncResult) error {
+	c := &fw.chunk
+	c.reset()
+	c.insnIds = append(c.insnIds, res.FactMap.SortedInsnIds()...)
+	for _, insnId := range c.insnIds {
+		pair := res.FactMap[insnId]
+		c.in = append(c.in, c.encode(pair.L1(), false))
+		c.out = append(c.out, c.encode(pair.L2(), false))
+	}
+	c.placeSets()
+	return fw.writeChunk(header, res.FuncId)
+}
+
+// WriteRenderedResult writes the facts as strings (the lattices are not available).
+func (fw *factsResultWriter) WriteRenderedResult(header ResultHeader, res *RenderedResult) error {
+	c := &fw.chunk
+	c.reset()
+	for _, fact := range res.Facts {
+		c.insnIds = append(c.insnIds, fact.InsnId)
+		c.in = append(c.in, c.addString(fact.In))
+		c.out = append(c.out, c.addString(fact.Out))
+	}
+	return fw.writeChunk(header, res.FuncId)
+}
+
+func (fw *factsResultWriter) writeChunk(header ResultHeader, funcId spir.EntityId) error {
+	names := [3]uint32{fw.nameId(header.TUName), fw.nameId(header.AnalysisName), fw.nameId(header.FuncName)}
+	fw.index = fw.chunk.indexEntry(fw.index, fw.offset, funcId, names)
+	fw.funcCount++
+
+	fw.buf = fw.chunk.appendTo(fw.buf[:0])
+	if err := fw.write(fw.buf); err != nil {
+		return err
+	}
+	return fw.w.Flush()
+}
+
+// Close writes the names, the index and the footer, once.
+func (fw *factsResultWriter) Close() error {
+	if fw.closed {
+		return nil
+	}
+	fw.closed = true
+	namesOffset := fw.offset
+	buf := fw.buf[:0]
+	offset := uint64(0)
+	for _, name := range fw.names {
+		buf = binary.LittleEndian.AppendUint64(buf, offset)
+		offset += uint64(len(name))
+	}
+	buf = binary.LittleEndian.AppendUint64(buf, offset)
+	for _, name := range fw.names {
+		buf = append(buf, name...)
+	}
+	buf = pad8(buf)
+
+	indexOffset := namesOffset + uint64(len(buf))
+	buf = append(buf, fw.index...)
+	for _, n := range []uint64{namesOffset, uint64(len(fw.names)), indexOffset, fw.funcCount} {
+		buf = binary.LittleEndian.AppendUint64(buf, n)
+	}
+	buf = append(buf, FactsResultMagic...)
+	if err := fw.write(buf); err != nil {
+		return err
+	}
+	return fw.w.Flush()
+}
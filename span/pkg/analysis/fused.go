@@ -0,0 +1,419 @@
+package analysis
+
+// This file defines the fused intra-procedural engine: it runs a number of
+// analyses over a graph in one traversal.
+//  1. The forward analyses share a worklist in reverse post-order, and the
+//     backward analyses (spir.PostOrder) a worklist in post-order.
+//  2. The facts are kept in a structure of arrays: for each analysis (a lane),
+//     an array of the IN and an array of the OUT facts, indexed by the dense
+//     slot of the instruction (the slots of a block are consecutive).
+//  3. A visit of a block applies, instruction by instruction, the transfer
+//     functions of the lanes whose facts in the block changed (a bitmask per
+//     block), so that the block is traversed once for all of them.
+//  4. A SynergyAnalysis reads the current facts of the other lanes (see
+//     FusedPAN.InsnFact). Its facts in a block are recomputed when the facts
+//     of another lane change there, until all the lanes converge.
+//
+// The facts are propagated between the blocks as by IntraPAN (with the meet
+// at the joins and the widening at the widening points); the narrowing phase,
+// the call summaries and the analyses handling the blocks themselves
+// (Analysis.AnalyzeBB) are not supported: use IntraPAN for those.
+
+import (
+	"fmt"
+	"math/bits"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The maximum number of analyses fused in a direction (the bits of a block's mask).
+const MaxFusedLanes = 64
+
+// A SynergyAnalysis is an analysis that reads the current facts of the other
+// analyses fused with it (e.g. to refine its own facts with theirs).
+type SynergyAnalysis interface {
+	Analysis
+	// SetPeers is called once by NewFusedPAN, with the engine and the lane
+	// of the analysis (its index in the analyses given).
+	SetPeers(peers *FusedPAN, lane int)
+}
+
+// The facts and the state of an analysis in a FusedPAN.
+type fusedLane struct {
+	analysis Analysis
+	factId   lattice.FactId // the fact id of the analysis, without the instruction
+	in, out  []lattice.Lattice
+	group    *fusedGroup
+	bit      uint64 // the bit of the lane in the masks of its group
+	// The number of changes of the fact at each widening point.
+	pointUpdates map[spir.BasicBlockId]int
+}
+
+// The lanes of a direction, sharing a worklist.
+type fusedGroup struct {
+	reverse bool // backward (post-order)
+	lanes   []*fusedLane
+	wl      *BBWorklist
+	dirty   map[spir.BasicBlockId]uint64 // the lanes to analyze at each block
+	// The dirty readers to analyze at all the instructions of each block
+	// (the facts they read may have changed anywhere in the block).
+	woken       map[spir.BasicBlockId]uint64
+	widenPoints map[spir.BasicBlockId]bool
+}
+
+// FusedPAN analyzes a graph with a number of analyses in one traversal.
+type FusedPAN struct {
+	ctxId   spir.ContextId
+	context *spir.Context
+	graph   spir.Graph
+	lanes   []*fusedLane
+	groups  []*fusedGroup // the forward group, then the backward group
+	// The slot of the entry instruction of each block.
+	firstSlot map[spir.BasicBlockId]int
+	insnSlot  map[spir.InsnId]int
+	// The lanes reading the facts of the others.
+	readers          []*fusedLane
+	meetAtBasicBlock bool
+	widenDelay       int
+	interner         *lattice.Interner
+	stats            *EngineStats
+	visits           map[spir.BasicBlockId]int
+}
+
+// NewFusedPAN creates an engine analyzing the graph with the analyses (the
+// lanes, in order), in the context. It fails if more than MaxFusedLanes
+// analyses are given in a direction, or if an analysis handles the blocks itself.
+func NewFusedPAN(ctxId spir.ContextId, analyses []Analysis,
+	graph spir.Graph, context *spir.Context, meetAtBasicBlock bool) (*FusedPAN, error) {
+	fused := &FusedPAN{
+		ctxId:            ctxId,
+		context:          context,
+		graph:            graph,
+		firstSlot:        make(map[spir.BasicBlockId]int),
+		insnSlot:         make(map[spir.InsnId]int),
+		meetAtBasicBlock: meetAtBasicBlock,
+		widenDelay:       DefaultWidenDelay,
+		interner:         lattice.NewInterner(),
+	}
+	for _, bbId := range spir.GetBBWorklist(graph, spir.NoOrder) {
+		bb := graph.BasicBlock(bbId)
+		fused.firstSlot[bbId] = len(fused.insnSlot)
+		for i := range bb.InsnCount() {
+			fused.insnSlot[bb.Insn(i).Id()] = len(fused.insnSlot)
+		}
+	}
+
+	forward := &fusedGroup{reverse: false}
+	backward := &fusedGroup{reverse: true}
+	fused.groups = []*fusedGroup{forward, backward}
+	for _, group := range fused.groups {
+		order := spir.ReversePostOrder
+		if group.reverse {
+			order = spir.PostOrder
+		}
+		group.wl = NewWorklistBB(graph, order)
+		group.dirty = make(map[spir.BasicBlockId]uint64)
+		group.woken = make(map[spir.BasicBlockId]uint64)
+		group.widenPoints = getWidenPoints(graph, order)
+	}
+
+	for _, an := range analyses {
+		if _, change := an.AnalyzeBB(nil, lattice.NewPair(nil, nil, lattice.NIL_FACT_ID), context); change != lattice.NotImplemented {
+			return nil, fmt.Errorf("analysis %s handles the basic blocks itself", an.Name())
+		}
+		group := forward
+		if an.VisitingOrder() == spir.PostOrder {
+			group = backward
+		}
+		if len(group.lanes) == MaxFusedLanes {
+			return nil, fmt.Errorf("more than %d analyses in a direction", MaxFusedLanes)
+		}
+		lane := &fusedLane{
+			analysis: an,
+			factId: lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+				WithAnalysisId(an.InstanceId().AnalysisId()),
+			in:           make([]lattice.Lattice, len(fused.insnSlot)),
+			out:          make([]lattice.Lattice, len(fused.insnSlot)),
+			group:        group,
+			bit:          1 << len(group.lanes),
+			pointUpdates: make(map[spir.BasicBlockId]int),
+		}
+		group.lanes = append(group.lanes, lane)
+		fused.lanes = append(fused.lanes, lane)
+	}
+
+	fused.initialize()
+	for i, lane := range fused.lanes {
+		if reader, ok := lane.analysis.(SynergyAnalysis); ok {
+			fused.readers = append(fused.readers, lane)
+			reader.SetPeers(fused, i)
+		}
+	}
+	return fused, nil
+}
+
+// initialize sets the boundary facts of the lanes, and marks all the lanes
+// dirty at all the blocks (all the blocks are in the worklists).
+func (fused *FusedPAN) initialize() {
+	entrySlot := fused.insnSlot[fused.graph.EntryBlock().EntryInsnId()]
+	exitSlot := fused.insnSlot[fused.graph.ExitBlock().ExitInsnId()]
+	for _, lane := range fused.lanes {
+		boundaryFact := lane.analysis.BoundaryFact(fused.graph, fused.context)
+		lane.in[entrySlot] = fused.interner.InternLattice(boundaryFact.L1())
+		lane.out[exitSlot] = fused.interner.InternLattice(boundaryFact.L2())
+	}
+	for _, group := range fused.groups {
+		all := uint64(1)<<len(group.lanes) - 1
+		for bbId := range fused.firstSlot {
+			group.dirty[bbId] = all
+		}
+	}
+}
+
+// SetWidening sets the number of changes of the fact at a widening point
+// before it is widened (< 0 disables widening; DefaultWidenDelay by default).
+func (fused *FusedPAN) SetWidening(delay int) {
+	fused.widenDelay = delay
+}
+
+// SetStats sets the performance counters to count the work into (nil disables counting).
+// A visit of a block counts once, whatever the number of lanes analyzed.
+func (fused *FusedPAN) SetStats(stats *EngineStats) {
+	fused.stats = stats
+	if stats != nil && fused.visits == nil {
+		fused.visits = make(map[spir.BasicBlockId]int)
+	}
+}
+
+func (fused *FusedPAN) Graph() spir.Graph {
+	return fused.graph
+}
+
+func (fused *FusedPAN) Context() *spir.Context {
+	return fused.context
+}
+
+func (fused *FusedPAN) GetContextId() spir.ContextId {
+	return fused.ctxId
+}
+
+// Analyses returns the analyses of the lanes, in order.
+func (fused *FusedPAN) Analyses() []Analysis {
+	analyses := make([]Analysis, len(fused.lanes))
+	for i, lane := range fused.lanes {
+		analyses[i] = lane.analysis
+	}
+	return analyses
+}
+
+// InsnFact returns the current fact of the lane at the instruction (Top if
+// the instruction is not in the graph). It may be called by the analyses
+// during the analysis (see SynergyAnalysis).
+func (fused *FusedPAN) InsnFact(lane int, insnId spir.InsnId) lattice.Pair {
+	l := fused.lanes[lane]
+	factId := l.factId.WithUBEntityId(spir.EntityId(insnId))
+	slot, ok := fused.insnSlot[insnId]
+	if !ok {
+		return lattice.NewPair(nil, nil, factId)
+	}
+	return lattice.NewPair(l.in[slot], l.out[slot], factId)
+}
+
+// FactMap returns the facts of the lane as the fact map of an IntraPAN.
+func (fused *FusedPAN) FactMap(lane int) AnalysisFactMap {
+	factMap := make(AnalysisFactMap, len(fused.insnSlot))
+	for insnId := range fused.insnSlot {
+		factMap[insnId] = fused.InsnFact(lane, insnId)
+	}
+	return factMap
+}
+
+// AnalyzeGraph analyzes the graph with all the lanes until their facts
+// converge: the forward and the backward worklists are drained in turn
+// (a lane may dirty the other direction through the SynergyAnalysis readers).
+func (fused *FusedPAN) AnalyzeGraph() lattice.FactChanged {
+	factChange := lattice.NoChange
+	for {
+		pending := false
+		for _, group := range fused.groups {
+			for !group.wl.IsEmpty() {
+				pending = true
+				if fused.analyzeBB(group, group.wl.Pop()) {
+					factChange = lattice.Changed
+				}
+			}
+		}
+		if !pending {
+			return factChange
+		}
+	}
+}
+
+// analyzeBB analyzes the block with the dirty lanes of the group, and
+// propagates their changed facts. It returns true if a fact changed.
+func (fused *FusedPAN) analyzeBB(group *fusedGroup, bbId spir.BasicBlockId) bool {
+	mask, woken := group.dirty[bbId], group.woken[bbId]
+	group.dirty[bbId], group.woken[bbId] = 0, 0
+	if mask == 0 {
+		return false
+	}
+	bb := fused.graph.BasicBlock(bbId)
+	if fused.stats != nil {
+		fused.stats.visit(fused.visits[bbId])
+		fused.visits[bbId]++
+	}
+
+	first, lastIndx := fused.firstSlot[bbId], bb.InsnCount()-1
+	active := mask                            // the lanes whose facts still change in the block
+	var inChanged, outChanged, touched uint64 // by lane
+	for k := 0; k <= lastIndx && active != 0; k++ {
+		i := InsnIndex(k, lastIndx, group.reverse)
+		insn := bb.Insn(i)
+		slot := first + i
+		for lanes := active; lanes != 0; lanes &= lanes - 1 {
+			lane := group.lanes[bits.TrailingZeros64(lanes)]
+			inout, change := lane.analysis.AnalyzeInsn(insn,
+				lattice.NewPair(lane.in[slot], lane.out[slot], lane.factId.WithUBEntityId(spir.EntityId(insn.Id()))),
+				fused.context)
+			if fused.stats != nil {
+				fused.stats.InsnTransfers++
+			}
+			if !change.HasChange() {
+				if woken&lane.bit == 0 {
+					active &^= lane.bit // No need to propagate further in the block.
+				}
+				continue
+			}
+
+			touched |= lane.bit
+			if i == 0 && change.HasChangedIn() {
+				inChanged |= lane.bit
+			}
+			if i == lastIndx && change.HasChangedOut() {
+				outChanged |= lane.bit
+			}
+			lane.in[slot] = fused.interner.InternLattice(inout.L1())
+			lane.out[slot] = fused.interner.InternLattice(inout.L2())
+			if k < lastIndx {
+				// Propagate the changed fact to the next instruction.
+				next := first + InsnIndex(k+1, lastIndx, group.reverse)
+				if change.HasChangedIn() {
+					lane.out[next] = lane.in[slot]
+				} else {
+					lane.in[next] = lane.out[slot]
+				}
+			}
+		}
+	}
+
+	for lanes := inChanged | outChanged; lanes != 0; lanes &= lanes - 1 {
+		lane := group.lanes[bits.TrailingZeros64(lanes)]
+		if inChanged&lane.bit != 0 {
+			for i := range bb.PredCount() {
+				fused.flowOut(lane, bb.Pred(i), bb)
+			}
+		}
+		if outChanged&lane.bit != 0 {
+			fused.flowSuccs(lane, bb)
+		}
+	}
+	if touched != 0 {
+		fused.wakeReaders(group, bbId, touched)
+	}
+	return touched != 0
+}
+
+// wakeReaders marks the readers dirty at the block, where the facts of
+// the lanes touched (of the group) changed, except if only their own did.
+func (fused *FusedPAN) wakeReaders(group *fusedGroup, bbId spir.BasicBlockId, touched uint64) {
+	for _, reader := range fused.readers {
+		if reader.group == group && touched&^reader.bit == 0 {
+			continue
+		}
+		reader.group.woken[bbId] |= reader.bit
+		fused.markDirty(reader, bbId)
+	}
+}
+
+// markDirty marks the lane dirty at the block, and adds it to the worklist.
+func (fused *FusedPAN) markDirty(lane *fusedLane, bbId spir.BasicBlockId) {
+	group := lane.group
+	group.dirty[bbId] |= lane.bit
+	if fused.stats == nil {
+		group.wl.Push(bbId)
+		return
+	}
+	fused.stats.Changes++
+	if group.wl.Push(bbId) {
+		fused.stats.push(fused.visits[bbId])
+	}
+}
+
+// flowSuccs propagates the OUT fact of the lane at the block to its successors.
+func (fused *FusedPAN) flowSuccs(lane *fusedLane, bb *spir.BasicBlock) {
+	out := lane.out[fused.firstSlot[bb.Id()]+bb.InsnCount()-1]
+	trueFact, falseFact := out, out
+	if fbb := bb.FalseSucc(); fbb != nil {
+		trueFact, falseFact = SplitBranchFact(out)
+		fused.flowIn(lane, fbb, falseFact)
+	}
+	if tbb := bb.TrueSucc(); tbb != nil {
+		fused.flowIn(lane, tbb, trueFact)
+	}
+}
+
+// flowIn updates the IN fact of the lane at nextBB with the fact along an
+// edge into it (as IntraPAN.flowIn).
+func (fused *FusedPAN) flowIn(lane *fusedLane, nextBB *spir.BasicBlock, fact lattice.Lattice) {
+	slot := fused.firstSlot[nextBB.Id()]
+	old := lane.in[slot]
+	val, chg := fact, true
+	if nextBB.PredCount() > 1 || fused.meetAtBasicBlock {
+		val, chg = fused.meet(old, fact)
+	}
+	if chg {
+		lane.in[slot] = fused.interner.InternLattice(fused.widenAt(lane, nextBB.Id(), old, val))
+		fused.markDirty(lane, nextBB.Id())
+	}
+}
+
+// flowOut updates the OUT fact of the lane at predBB along its edge to bb,
+// with the IN fact of the lane at bb (as IntraPAN.flowOut).
+func (fused *FusedPAN) flowOut(lane *fusedLane, predBB, bb *spir.BasicBlock) {
+	slot := fused.firstSlot[predBB.Id()] + predBB.InsnCount() - 1
+	succPos := predBB.SuccPos(bb)
+	predOut := lattice.NewPair(lane.in[slot], lane.out[slot], lane.factId)
+	old := GetPredOutFact(predBB, predOut, succPos)
+	val, chg := lane.in[fused.firstSlot[bb.Id()]], true
+	if fused.meetAtBasicBlock {
+		val, chg = fused.meet(old, val)
+	}
+	if chg {
+		val = fused.widenAt(lane, predBB.Id(), old, val)
+		lane.out[slot] = fused.interner.InternLattice(SetPredOutFact(predBB, predOut, succPos, val).L2())
+		fused.markDirty(lane, predBB.Id())
+	}
+}
+
+func (fused *FusedPAN) meet(l1, l2 lattice.Lattice) (lattice.Lattice, bool) {
+	if fused.stats != nil {
+		fused.stats.Meets++
+	}
+	return lattice.Meet(l1, l2)
+}
+
+// widenAt widens the new fact of the lane at a widening point, once the
+// fact there has changed widenDelay times (as IntraPAN.widenAt).
+func (fused *FusedPAN) widenAt(lane *fusedLane, bbId spir.BasicBlockId, old, val lattice.Lattice) lattice.Lattice {
+	if fused.widenDelay < 0 || !lane.group.widenPoints[bbId] {
+		return val
+	}
+	if lane.pointUpdates[bbId]++; lane.pointUpdates[bbId] > fused.widenDelay {
+		val, _ = lattice.Widen(old, val)
+		if fused.stats != nil {
+			fused.stats.Widens++
+		}
+	}
+	return val
+}
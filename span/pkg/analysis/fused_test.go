@@ -0,0 +1,140 @@
+package analysis
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A backward analysis: Bot at the instructions from which the exit is reached.
+type testBackwardClient struct {
+	testForwardClient
+}
+
+func (c *testBackwardClient) VisitingOrder() spir.GraphVisitingOrder {
+	return spir.PostOrder
+}
+
+func (c *testBackwardClient) BoundaryFact(graph spir.Graph, ctx *spir.Context) lattice.Pair {
+	return lattice.NewPair(nil, &lattice.TopBotLatticeBot, lattice.NIL_FACT_ID)
+}
+
+func (c *testBackwardClient) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	trueFact, falseFact := SplitBranchFact(inOut.L2())
+	in, _ := lattice.Meet(trueFact, falseFact)
+	change := lattice.NoChange
+	if !lattice.Equals(inOut.L1(), in) {
+		change = lattice.InChanged
+	}
+	return lattice.NewPair(in, inOut.L2(), inOut.FactId()), change
+}
+
+// A forward analysis reading its facts from those of a peer (the range of i).
+type testPeerClient struct {
+	testForwardClient
+	peers     *FusedPAN
+	rangeLane int
+}
+
+func (c *testPeerClient) SetPeers(peers *FusedPAN, lane int) {
+	c.peers = peers
+}
+
+func (c *testPeerClient) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	out := c.peers.InsnFact(c.rangeLane, insn.Id()).L2()
+	change := lattice.NoChange
+	if !lattice.Equals(inOut.L2(), out) {
+		change = lattice.OutChanged
+	}
+	return lattice.NewPair(inOut.L1(), out, inOut.FactId()), change
+}
+
+func TestFusedPAN(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_Loops(3)
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	newRange := func() *testRangeClient {
+		return &testRangeClient{
+			v:     tu.GetEntityId("i"),
+			bound: 1000,
+			lits:  map[spir.EntityId]int32{tu.NewConst(1, spir.Int32QT): 1, tu.NewConst(1000, spir.Int32QT): 1000},
+		}
+	}
+	newCtx := func() *spir.Context {
+		ctx := spir.NewContext(tu)
+		ctx.SetCurrentScopeEid(main.Id())
+		return ctx
+	}
+
+	// The separate analyses.
+	var separate EngineStats
+	var want []AnalysisFactMap
+	for _, an := range []Analysis{newRange(), &testBackwardClient{}, newRange()} {
+		intra := NewIntraPAN(spir.GetNextContextId(), an, main.Body(), newCtx(), false, false).(*IntraPAN)
+		intra.SetWidening(-1, 0)
+		intra.SetStats(&separate)
+		intra.AnalyzeGraph()
+		want = append(want, *intra.FactMap())
+	}
+
+	compare := func(t *testing.T, fused *FusedPAN, lane int, want AnalysisFactMap) {
+		t.Helper()
+		got := fused.FactMap(lane)
+		for insnId, fact := range want {
+			if !lattice.Equals(got[insnId].L1(), fact.L1()) || !lattice.Equals(got[insnId].L2(), fact.L2()) {
+				t.Errorf("lane %d, insn %v: expected %v, got %v", lane, insnId, fact, got[insnId])
+			}
+		}
+	}
+
+	t.Run("same facts", func(t *testing.T) {
+		// The two range analyses share the forward traversal.
+		fused, err := NewFusedPAN(spir.GetNextContextId(), []Analysis{newRange(), &testBackwardClient{}, newRange()},
+			main.Body(), newCtx(), false)
+		if err != nil {
+			t.Fatal(err)
+		}
+		fused.SetWidening(-1)
+		var stats EngineStats
+		fused.SetStats(&stats)
+		if fused.AnalyzeGraph() != lattice.Changed {
+			t.Errorf("expected the facts to change")
+		}
+		compare(t, fused, 0, want[0])
+		compare(t, fused, 1, want[1])
+		compare(t, fused, 2, want[2])
+		if stats.BBVisits >= separate.BBVisits {
+			t.Errorf("expected fewer visits than the separate analyses (%d), got %d", separate.BBVisits, stats.BBVisits)
+		}
+		if stats.InsnTransfers != separate.InsnTransfers {
+			t.Errorf("expected %d transfers, got %d", separate.InsnTransfers, stats.InsnTransfers)
+		}
+	})
+
+	t.Run("synergy", func(t *testing.T) {
+		// The reader is analyzed before its peer, so it first reads its Top facts.
+		peer := &testPeerClient{rangeLane: 1}
+		fused, err := NewFusedPAN(spir.GetNextContextId(), []Analysis{peer, newRange(), &testBackwardClient{}},
+			main.Body(), newCtx(), false)
+		if err != nil {
+			t.Fatal(err)
+		}
+		if peer.peers != fused {
+			t.Fatalf("the peers of the reader are not set")
+		}
+		fused.SetWidening(-1)
+		fused.AnalyzeGraph()
+		compare(t, fused, 1, want[0])
+		compare(t, fused, 2, want[1])
+		reader := fused.FactMap(0)
+		for insnId, fact := range want[0] {
+			if !lattice.Equals(reader[insnId].L2(), fact.L2()) {
+				t.Errorf("insn %v: the reader has %v, its peer %v", insnId, reader[insnId].L2(), fact.L2())
+			}
+		}
+	})
+}
@@ -0,0 +1,198 @@
+package analysis
+
+// This file defines the incremental re-analysis of the functions of a TU.
+//
+// The converged (rendered) results of a function are kept in a ResultStore,
+// keyed by a hash of everything the results depend on (see FuncKeys):
+//  1. The engine version, the analysis and the solver.
+//  2. The contents of the function (spir.FunctionHash).
+//  3. The contents of every function reachable from it in the call graph
+//     (see spir.CallGraph), since the summaries of the callees are inputs
+//     of its analysis.
+//  4. The state of the TU read by the analyses: the global variables (e.g.
+//     the boundary fact of LiveVars) and the main function.
+//
+// Hence on the next run, a function is re-solved only if it or one of its
+// (transitive) callees has changed; the results of the others are loaded.
+
+import (
+	"crypto/sha256"
+	"encoding/hex"
+	"encoding/json"
+	"errors"
+	"fmt"
+	"io/fs"
+	"os"
+	"path/filepath"
+	"sync/atomic"
+
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The file extension of the results in a ResultStore.
+const ResultStoreFileSuffix = ".spres"
+
+// ResultStore stores the rendered results of functions in a directory, by
+// their keys. Like spir.SnapshotCache, a result is written to a temporary
+// file that is then renamed, so that concurrent runs can share the store.
+type ResultStore struct {
+	dir string
+}
+
+func NewResultStore(dir string) (*ResultStore, error) {
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		return nil, fmt.Errorf("failed to create result store dir %s: %w", dir, err)
+	}
+	return &ResultStore{dir: dir}, nil
+}
+
+func (s *ResultStore) Dir() string {
+	return s.dir
+}
+
+func (s *ResultStore) path(key string) string {
+	return filepath.Join(s.dir, key+ResultStoreFileSuffix)
+}
+
+// Load reads the result with the given key.
+// The error satisfies errors.Is(err, fs.ErrNotExist) if there is no such result.
+func (s *ResultStore) Load(key string) (*RenderedResult, error) {
+	data, err := os.ReadFile(s.path(key))
+	if err != nil {
+		return nil, err
+	}
+	res := &RenderedResult{}
+	if err := json.Unmarshal(data, res); err != nil {
+		return nil, fmt.Errorf("invalid stored result %s: %w", s.path(key), err)
+	}
+	return res, nil
+}
+
+// Store writes the result with the given key.
+func (s *ResultStore) Store(key string, res *RenderedResult) error {
+	data, err := json.Marshal(res)
+	if err != nil {
+		return err
+	}
+	tmp, err := os.CreateTemp(s.dir, key+".*.tmp")
+	if err != nil {
+		return err
+	}
+	defer os.Remove(tmp.Name()) // no-op after a successful rename
+
+	_, err = tmp.Write(data)
+	if closeErr := tmp.Close(); err == nil {
+		err = closeErr
+	}
+	if err != nil {
+		return err
+	}
+	return os.Rename(tmp.Name(), s.path(key))
+}
+
+// FuncKeys returns the ResultStore key of each function (with a body) of the
+// TU, for the given analysis (its name) and solver.
+func FuncKeys(tu *spir.TU, analysisName string, solver SolverMode) map[spir.EntityId]string {
+	cg := spir.NewCallGraph(tu)
+	hashes := make(map[spir.EntityId]string)
+	for _, fid := range cg.FuncIds() {
+		hashes[fid] = spir.FunctionHash(tu, tu.GetFunctionById(fid))
+	}
+
+	tuState := tuStateHash(tu)
+
+	keys := make(map[spir.EntityId]string, len(hashes))
+	visited := make(map[spir.EntityId]bool)
+	var reach []spir.EntityId
+	var visit func(fid spir.EntityId)
+	visit = func(fid spir.EntityId) {
+		if visited[fid] {
+			return
+		}
+		visited[fid] = true
+		reach = append(reach, fid)
+		for _, callee := range cg.Callees(fid) {
+			visit(callee)
+		}
+	}
+	for _, fid := range tu.FunctionIds() {
+		if _, ok := hashes[fid]; !ok {
+			continue
+		}
+		clear(visited)
+		reach = reach[:0]
+		visit(fid)
+
+		h := sha256.New()
+		fmt.Fprintf(h, "%s\x00%s\x00%d\x00%s\x00%v", spir.EngineVersion(), analysisName, solver, tuState, fid)
+		for _, r := range reach { // in the DFS order, which is deterministic
+			// A declared only callee contributes its id, as it has no body.
+			fmt.Fprintf(h, "\x00%v:%s", r, hashes[r])
+		}
+		keys[fid] = hex.EncodeToString(h.Sum(nil))
+	}
+	return keys
+}
+
+// tuStateHash returns a hash of the state of the TU that the analysis of a
+// function may read besides its call graph: the ids of the global variables,
+// and of the main function.
+func tuStateHash(tu *spir.TU) string {
+	h := sha256.New()
+	if main := tu.GetFunction(spir.K_MAIN_FUNC_NAME); main != nil {
+		fmt.Fprintf(h, "main:%v", main.Id())
+	}
+	globals := tu.GlobalVars()
+	globals.Iterator(func(_ int, eid spir.EntityId) bool { // in the ascending order
+		fmt.Fprintf(h, "\x00%v", eid)
+		return true
+	})
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+// IncrementalAnalyzer analyzes the functions whose results are not in the
+// store, and loads the results of the others. It is safe for concurrent use.
+type IncrementalAnalyzer struct {
+	store    *ResultStore
+	solver   SolverMode
+	loaded   atomic.Int64
+	analyzed atomic.Int64
+}
+
+func NewIncrementalAnalyzer(store *ResultStore, solver SolverMode) *IncrementalAnalyzer {
+	return &IncrementalAnalyzer{store: store, solver: solver}
+}
+
+// AnalyzeFunction returns the result of the analysis of the function with
+// the given key (see FuncKeys), from the store if present, and true if it was
+// loaded. The work of the solver is counted into stats (if not nil) when the
+// function is analyzed. The store's errors are logged, since the result can
+// always be computed.
+func (ia *IncrementalAnalyzer) AnalyzeFunction(tu *spir.TU, fun *spir.Function,
+	key string, newAnalysis AnalysisFactory, stats *EngineStats) (*RenderedResult, bool) {
+	res, err := ia.store.Load(key)
+	switch {
+	case err == nil && res.FuncId == fun.Id():
+		ia.loaded.Add(1)
+		return res, true
+	case err == nil:
+		logger.Get().Warn("Ignoring the stored result of another function",
+			"function", fun.Name(), "storedFuncId", res.FuncId)
+	case !errors.Is(err, fs.ErrNotExist):
+		logger.Get().Warn("Ignoring the stored result", "function", fun.Name(), "error", err)
+	}
+
+	funcRes := AnalyzeFunctionWithStats(tu, fun, newAnalysis(), ia.solver, false, false, stats)
+	res = RenderFuncResult(&funcRes)
+	if err := ia.store.Store(key, res); err != nil {
+		logger.Get().Warn("Failed to store the result", "function", fun.Name(), "error", err)
+	}
+	ia.analyzed.Add(1)
+	return res, false
+}
+
+// Stats returns the number of results loaded from the store, and analyzed.
+func (ia *IncrementalAnalyzer) Stats() (loaded, analyzed int) {
+	return int(ia.loaded.Load()), int(ia.analyzed.Load())
+}
@@ -0,0 +1,142 @@
+package analysis
+
+import (
+	"maps"
+	"os"
+	"slices"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A TU with main calling f, and g calling nothing.
+func newIncrementalTestTU() (tu *spir.TU, fbb *spir.BasicBlock, main, f, g *spir.Function) {
+	tu = spir.NewTU()
+	int32QT := spir.NewQualVT(&spir.Int32VT, spir.K_QK_QNIL)
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	x := tu.NewVar("x", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, int32QT)
+	y := tu.NewVar("y", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, int32QT)
+
+	fbb = spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 2)
+	tu.AddInsn(fbb, spir.AssignI(spir.ValX(x), spir.ValX(y)), nil)
+	f = tu.NewFunction("f", funcQT, nil, fbb)
+
+	gbb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 1)
+	tu.AddInsn(gbb, spir.ReturnI(spir.ValX(y)), nil)
+	g = tu.NewFunction("g", funcQT, nil, gbb)
+
+	mainbb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 2)
+	tu.AddInsn(mainbb, spir.CallI(spir.CallX(f.Id(), tu.NewCallSiteId())), nil)
+	tu.AddInsn(mainbb, spir.ReturnI(spir.ValX(x)), nil)
+	main = tu.NewFunction(spir.K_MAIN_FUNC_NAME, funcQT, nil, mainbb)
+	return tu, fbb, main, f, g
+}
+
+func TestFuncKeys(t *testing.T) {
+	tu, fbb, main, f, g := newIncrementalTestTU()
+	if got := main.Callees(); !slices.Equal(got, []spir.EntityId{f.Id()}) {
+		t.Fatalf("expected main to call f, got %v", got)
+	}
+
+	keys := FuncKeys(tu, "test", GenericSolver)
+	if len(keys) != 3 || keys[main.Id()] == keys[f.Id()] {
+		t.Fatalf("expected 3 distinct keys, got %v", keys)
+	}
+	if !maps.Equal(keys, FuncKeys(tu, "test", GenericSolver)) {
+		t.Error("the keys of an unchanged TU differ")
+	}
+	if other := FuncKeys(tu, "other", GenericSolver); other[g.Id()] == keys[g.Id()] {
+		t.Error("expected the keys to depend on the analysis")
+	}
+
+	// A change to f changes the keys of f and its caller main only.
+	tu.AddInsn(fbb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+	changed := FuncKeys(tu, "test", GenericSolver)
+	if changed[f.Id()] == keys[f.Id()] || changed[main.Id()] == keys[main.Id()] {
+		t.Error("expected the keys of f and main to change")
+	}
+	if changed[g.Id()] != keys[g.Id()] {
+		t.Error("expected the key of g to be unchanged")
+	}
+
+	// A new global (e.g. live at the exit of every function) changes all the keys.
+	tu.NewVar("z", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	for fid, key := range FuncKeys(tu, "test", GenericSolver) {
+		if key == changed[fid] {
+			t.Errorf("expected the key of %v to change with the globals", fid)
+		}
+	}
+}
+
+func TestIncrementalAnalyzer(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu, fbb, _, f, _ := newIncrementalTestTU()
+	store, err := NewResultStore(t.TempDir())
+	if err != nil {
+		t.Fatal(err)
+	}
+
+	run := func() (results map[spir.EntityId]*RenderedResult, loaded, analyzed int) {
+		ia := NewIncrementalAnalyzer(store, GenericSolver)
+		keys := FuncKeys(tu, "test", GenericSolver)
+		results = make(map[spir.EntityId]*RenderedResult)
+		for fid, key := range keys {
+			results[fid], _ = ia.AnalyzeFunction(tu, tu.GetFunctionById(fid), key, newTestForwardClient, nil)
+		}
+		loaded, analyzed = ia.Stats()
+		return results, loaded, analyzed
+	}
+
+	first, loaded, analyzed := run()
+	if loaded != 0 || analyzed != 3 {
+		t.Fatalf("first run: expected 0 loaded and 3 analyzed, got %d and %d", loaded, analyzed)
+	}
+	second, loaded, analyzed := run()
+	if loaded != 3 || analyzed != 0 {
+		t.Fatalf("second run: expected 3 loaded and 0 analyzed, got %d and %d", loaded, analyzed)
+	}
+	for fid, res := range first {
+		if !slices.Equal(res.Facts, second[fid].Facts) {
+			t.Errorf("the loaded result of %v differs from the analyzed one", fid)
+		}
+	}
+
+	tu.AddInsn(fbb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+	third, loaded, analyzed := run()
+	if loaded != 1 || analyzed != 2 {
+		t.Errorf("after a change to f: expected 1 loaded and 2 analyzed, got %d and %d", loaded, analyzed)
+	}
+	if len(third[f.Id()].Facts) != 2 {
+		t.Errorf("expected the facts of the 2 insns of f, got %d", len(third[f.Id()].Facts))
+	}
+
+	// A corrupt result is analyzed again.
+	for _, key := range FuncKeys(tu, "test", GenericSolver) {
+		if err := os.WriteFile(store.path(key), []byte("garbage"), 0o644); err != nil {
+			t.Fatal(err)
+		}
+	}
+	if _, loaded, analyzed := run(); loaded != 0 || analyzed != 3 {
+		t.Errorf("corrupt store: expected 0 loaded and 3 analyzed, got %d and %d", loaded, analyzed)
+	}
+}
+
+// The work of the solver is counted for a function analyzed, not for a
+// result loaded from the store.
+func TestIncrementalAnalyzer_stats(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu, _, _, f, _ := newIncrementalTestTU()
+	store, err := NewResultStore(t.TempDir())
+	if err != nil {
+		t.Fatal(err)
+	}
+	key := FuncKeys(tu, "test", GenericSolver)[f.Id()]
+	for i, wantLoaded := range []bool{false, true} {
+		stats := &EngineStats{}
+		_, loaded := NewIncrementalAnalyzer(store, GenericSolver).AnalyzeFunction(tu, f, key, newTestForwardClient, stats)
+		if loaded != wantLoaded || (stats.InsnTransfers > 0) == loaded {
+			t.Errorf("run %d: expected loaded=%v, got loaded=%v with %+v", i, wantLoaded, loaded, *stats)
+		}
+	}
+}
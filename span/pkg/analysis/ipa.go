@@ -3,6 +3,9 @@ package analysis
 // This file defines the inter-procedural analysis interface.
 
 import (
+	"fmt"
+	"time"
+
 	"github.com/adhuliya/span/pkg/analysis/lattice"
 	"github.com/adhuliya/span/pkg/spir"
 )
@@ -21,3 +24,102 @@ type InterPA interface {
 	// Use GetContext(nil, nil, nil) to get the context for the main (entry) function.
 	GetContext(callSite *spir.Insn, lp lattice.Pair, ipaCtx InterPACtx) InterPACtx
 }
+
+// The summary of a possible target of a call.
+type CalleeSummary struct {
+	FuncId spir.EntityId
+	// The summary (nil, i.e. Top, until the callee is analyzed: e.g. in the
+	// first iteration over a recursive SCC).
+	Summary lattice.ConstLattice
+	// False for a callee without a body (e.g. an external function),
+	// whose effect must be over-approximated.
+	Known bool
+}
+
+// CallSummaries provides the summaries of the targets of the calls in a function.
+type CallSummaries interface {
+	// CalleeSummaries returns the summaries of the possible targets of the call
+	// (an empty list if the targets are unknown).
+	CalleeSummaries(callSite spir.Insn) []CalleeSummary
+}
+
+// ContextCallSummaries provides context sensitive summaries (see
+// ValueContextAnalyzer): the exit facts of the targets of a call, for the
+// IN fact at the call as their entry fact.
+type ContextCallSummaries interface {
+	CallSummaries
+	CalleeExitFacts(callSite spir.Insn, entry lattice.Lattice) []CalleeSummary
+}
+
+// A SummaryAnalysis summarizes the effect of each function, so that the
+// functions are analyzed bottom-up (see SummaryScheduler): a call site is
+// analyzed with the summaries of its targets instead of AnalyzeInsn.
+type SummaryAnalysis interface {
+	Analysis
+	// FuncSummary returns the summary of the function from its converged facts.
+	FuncSummary(fun *spir.Function, analyzer Analyzer) lattice.ConstLattice
+	// AnalyzeCall is AnalyzeInsn for an instruction with a call.
+	AnalyzeCall(insn spir.Insn, inOut lattice.Pair, callees []CalleeSummary,
+		ctx *spir.Context) (lattice.Pair, lattice.FactChanged)
+}
+
+// How the calls between the functions are analyzed.
+type InterprocMode uint8
+
+const (
+	// Each function is analyzed alone (see AnalyzeFunction).
+	IntraprocMode InterprocMode = iota
+	// The functions are analyzed bottom-up with the summaries of their
+	// callees (see SummaryScheduler), for a SummaryAnalysis.
+	// Other analyses fall back to the IntraprocMode.
+	SummariesMode
+	// The functions are analyzed top-down, in a value context per entry fact
+	// (see ValueContextAnalyzer), for a SummaryAnalysis.
+	// Other analyses fall back to the IntraprocMode.
+	ValueContextsMode
+)
+
+// ParseInterprocMode parses the name of a mode (empty: none).
+func ParseInterprocMode(name string) (InterprocMode, error) {
+	switch name {
+	case "", "none":
+		return IntraprocMode, nil
+	case "summaries":
+		return SummariesMode, nil
+	case "contexts":
+		return ValueContextsMode, nil
+	}
+	return 0, fmt.Errorf("unknown inter-procedural mode %q (expected none, summaries or contexts)", name)
+}
+
+// A TUAnalyzer analyzes all the functions of a TU together, through their calls.
+type TUAnalyzer interface {
+	// AnalyzeTU returns the results of the functions with a body, in
+	// ascending order of their ids.
+	AnalyzeTU() []FuncResult
+	SetCollectStats(collectStats bool)
+	FuncStats(fid spir.EntityId) (*EngineStats, time.Duration)
+}
+
+var _ TUAnalyzer = (*SummaryScheduler)(nil)
+var _ TUAnalyzer = (*ValueContextAnalyzer)(nil)
+
+// NewTUAnalyzer returns the analyzer of the TU for the mode, or false if
+// the mode analyzes each function alone or the analysis is not a
+// SummaryAnalysis. The functions are analyzed by at most workers goroutines
+// (< 1: GOMAXPROCS), if the analyzer supports it.
+func NewTUAnalyzer(tu *spir.TU, newAnalysis AnalysisFactory, mode InterprocMode,
+	workers int) (TUAnalyzer, bool) {
+	if _, ok := newAnalysis().(SummaryAnalysis); !ok {
+		return nil, false
+	}
+	switch mode {
+	case SummariesMode:
+		sched := NewSummaryScheduler(tu, newAnalysis, false)
+		sched.SetWorkers(workers)
+		return sched, true
+	case ValueContextsMode:
+		return NewValueContextAnalyzer(tu, newAnalysis, DefaultMaxValueContexts, false), true
+	}
+	return nil, false
+}
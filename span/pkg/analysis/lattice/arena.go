@@ -0,0 +1,101 @@
+package lattice
+
+// This file defines an arena of the pairs allocated by an analysis engine
+// for the facts along the edges of the branches (see analysis.SetPredOutFact).
+//
+// Such a *Pair is allocated each time the fact along an edge of a branch
+// changes, and the previous one becomes garbage. The arena allocates them in
+// slabs, and recycles the slabs in bulk (across the functions analyzed) once
+// the analysis of a function converges and the pairs still used are copied
+// out of the arena (see Owned and Release).
+
+import (
+	"slices"
+	"sync"
+	"unsafe"
+)
+
+// The number of pairs in a slab of a PairArena.
+const pairSlabSize = 64
+
+type pairSlab [pairSlabSize]Pair
+
+// The slabs released by the arenas, for reuse.
+var pairSlabPool = sync.Pool{New: func() any { return new(pairSlab) }}
+
+// PairArena allocates pairs in slabs. It is not safe for concurrent use.
+// A nil *PairArena allocates each pair on the heap.
+type PairArena struct {
+	slabs []*pairSlab
+	next  int // the next free pair in the last slab
+	// The start addresses of the slabs, sorted (nil: to be sorted).
+	starts []uintptr
+}
+
+func NewPairArena() *PairArena {
+	return &PairArena{next: pairSlabSize}
+}
+
+// New returns a new pair of the values, allocated in the arena.
+func (a *PairArena) New(l1, l2 Lattice, factId FactId) *Pair {
+	if a == nil {
+		pair := NewPair(l1, l2, factId)
+		return &pair
+	}
+	if a.next == pairSlabSize {
+		a.slabs = append(a.slabs, pairSlabPool.Get().(*pairSlab))
+		a.next = 0
+		a.starts = nil
+	}
+	pair := &a.slabs[len(a.slabs)-1][a.next]
+	a.next++
+	*pair = NewPair(l1, l2, factId)
+	return pair
+}
+
+// Len returns the number of pairs allocated in the arena.
+func (a *PairArena) Len() int {
+	if a == nil || len(a.slabs) == 0 {
+		return 0
+	}
+	return (len(a.slabs)-1)*pairSlabSize + a.next
+}
+
+// Owned returns the pair if l is a pair allocated in the arena.
+func (a *PairArena) Owned(l Lattice) (*Pair, bool) {
+	pair, ok := l.(*Pair)
+	if !ok || pair == nil || a == nil || len(a.slabs) == 0 {
+		return nil, false
+	}
+	if a.starts == nil {
+		a.starts = make([]uintptr, len(a.slabs))
+		for i, slab := range a.slabs {
+			a.starts[i] = uintptr(unsafe.Pointer(slab))
+		}
+		slices.Sort(a.starts)
+	}
+	addr := uintptr(unsafe.Pointer(pair))
+	// The last slab starting at or before addr.
+	i, found := slices.BinarySearch(a.starts, addr)
+	if !found {
+		if i == 0 {
+			return nil, false
+		}
+		i--
+	}
+	return pair, addr < a.starts[i]+unsafe.Sizeof(pairSlab{})
+}
+
+// Release recycles the slabs of the arena, emptying it.
+// The pairs allocated in the arena must no longer be used.
+func (a *PairArena) Release() {
+	if a == nil {
+		return
+	}
+	for _, slab := range a.slabs {
+		*slab = pairSlab{} // Drop the references to the lattices.
+		pairSlabPool.Put(slab)
+	}
+	clear(a.slabs)
+	a.slabs, a.next, a.starts = a.slabs[:0], pairSlabSize, nil
+}
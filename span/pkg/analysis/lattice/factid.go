@@ -100,8 +100,8 @@ func (f FactId) Reserved() uint64 {
 	return (uint64(f) >> FactIdReservedShift) & FactIdReservedMask
 }
 
-// IncVersion returns a new FactId with the version part incremented by 1,
-// wrapping around to 0 if it exceeds the maximum value for the version bits.
+// IncVersion returns a new FactId with the version part incremented by 1.
+// It panics if the version exceeds the maximum value for the version bits.
 func (f FactId) IncVersion() FactId {
 	incVersion := f.Version() + 1
 	newVersion := incVersion & FactIdVersionMask
@@ -141,7 +141,7 @@ func (f FactId) WithVersion(version uint64) FactId {
 	return FactId(v)
 }
 
-// WithInstrId sets the InstrId bits (does not alter FactPoint etc)
+// WithUBEntityId sets the InstrId bits (does not alter FactPoint etc)
 func (f FactId) WithUBEntityId(entityId spir.EntityId) FactId {
 	// Clear the entity id region and set the new entity id bits
 	v := uint64(f)
@@ -13,7 +13,7 @@ func mkFactId(version, factPoint, instrId, analysisId, reserved uint64) FactId {
 }
 
 func TestFactId_Getters(t *testing.T) {
-	f := mkFactId(100, 2, 0xdeadbeef, 0xabc, 5)
+	f := mkFactId(100, 2, 0xdeadbeef, 0xabc, 2)
 	if got := f.Version(); got != 100 {
 		t.Errorf("Version() = %d, want 100", got)
 	}
@@ -26,8 +26,8 @@ func TestFactId_Getters(t *testing.T) {
 	if got := f.AnalysisId(); got != 0xabc {
 		t.Errorf("AnalysisId() = %#x, want 0xabc", got)
 	}
-	if got := f.Reserved(); got != 5 {
-		t.Errorf("Reserved() = %d, want 5", got)
+	if got := f.Reserved(); got != 2 {
+		t.Errorf("Reserved() = %d, want 2", got)
 	}
 	wantUnique := uint64(2 | (0xdeadbeef << FactIdUB_PointBits))
 	if got := f.UniqueId(); got != wantUnique {
@@ -64,19 +64,20 @@ func TestFactId_WithVersion(t *testing.T) {
 	}
 }
 
-func TestFactId_WithInstrId(t *testing.T) {
+func TestFactId_WithUBEntityId(t *testing.T) {
 	base := mkFactId(1, 2, 0x111, 0x222, 1)
-	got := base.WithInstrId(0xfeedface)
+	got := base.WithUBEntityId(0xfeedface)
 	if got.InstrId() != 0xfeedface {
 		t.Errorf("InstrId = %#x", got.InstrId())
 	}
 	if got.Version() != base.Version() || got.FactPoint() != base.FactPoint() ||
 		got.AnalysisId() != base.AnalysisId() || got.Reserved() != base.Reserved() {
-		t.Errorf("WithInstrId changed other fields")
+		t.Errorf("WithUBEntityId changed other fields")
 	}
-	masked := base.WithInstrId(0xffffffffffffffff)
-	if masked.InstrId() != FactIdUB_EntityIdMask {
-		t.Errorf("WithInstrId mask: got %#x", masked.InstrId())
+	all := base.WithUBEntityId(0xffffffff)
+	if all.InstrId() != FactIdUB_EntityIdMask || all.FactPoint() != base.FactPoint() ||
+		all.AnalysisId() != base.AnalysisId() {
+		t.Errorf("WithUBEntityId of all the bits: got %#x", all.InstrId())
 	}
 }
 
@@ -116,7 +117,7 @@ func TestFactId_WithAnalysisId(t *testing.T) {
 	if got.Version() != base.Version() {
 		t.Errorf("version changed")
 	}
-	overflow := base.WithAnalysisId(0xfffff)
+	overflow := base.WithAnalysisId(0xffff)
 	if overflow.AnalysisId() != FactIdAnalysisMask {
 		t.Errorf("analysis mask: got %#x", overflow.AnalysisId())
 	}
@@ -124,8 +125,8 @@ func TestFactId_WithAnalysisId(t *testing.T) {
 
 func TestFactId_WithReserved(t *testing.T) {
 	base := mkFactId(0, 0, 0, 0, 0)
-	got := base.WithReserved(6)
-	if got.Reserved() != 6 {
+	got := base.WithReserved(2)
+	if got.Reserved() != 2 {
 		t.Errorf("Reserved = %d", got.Reserved())
 	}
 	masked := base.WithReserved(9)
@@ -135,18 +136,20 @@ func TestFactId_WithReserved(t *testing.T) {
 }
 
 func TestFactId_IncVersion(t *testing.T) {
-	f := mkFactId(FactIdVersionMask, 0, 0, 0, 0)
-	next := f.IncVersion()
-	if next.Version() != 0 {
-		t.Errorf("IncVersion wrap: got %d want 0", next.Version())
-	}
-	if next.FactPoint() != f.FactPoint() || next.InstrId() != f.InstrId() {
-		t.Errorf("IncVersion changed non-version fields")
-	}
 	low := mkFactId(41, 2, 3, 4, 1)
-	if low.IncVersion().Version() != 42 {
+	next := low.IncVersion()
+	if next.Version() != 42 {
 		t.Errorf("IncVersion increment failed")
 	}
+	if next.FactPoint() != low.FactPoint() || next.InstrId() != low.InstrId() {
+		t.Errorf("IncVersion changed non-version fields")
+	}
+	defer func() {
+		if recover() == nil {
+			t.Errorf("IncVersion of the last version should panic")
+		}
+	}()
+	mkFactId(FactIdVersionMask, 0, 0, 0, 0).IncVersion()
 }
 
 func TestFactId_ZeroVersion(t *testing.T) {
@@ -201,7 +204,7 @@ type factFields struct {
 }
 
 func fieldSnapshot(f FactId) factFields {
-	return factFields{f.Version(), f.FactPoint(), f.InstrId(), f.AnalysisId(), f.Reserved()}
+	return factFields{f.Version(), f.FactPoint(), f.InstrId(), uint64(f.AnalysisId()), f.Reserved()}
 }
 
 func TestFactId_const_layout(t *testing.T) {
@@ -209,16 +212,16 @@ func TestFactId_const_layout(t *testing.T) {
 	if FactIdVersionShift != 0 || FactIdVersionBits != 15 {
 		t.Fatal("version field layout changed")
 	}
-	if FactIdUniqueShift != 15 || FactIdUB_BitCount != 34 {
+	if FactIdUniqueShift != 15 || FactIdUB_BitCount != 35 {
 		t.Fatal("unique field layout changed")
 	}
-	if FactIdAnalysisShift != 49 || FactIdAnalysisBits != 12 {
+	if FactIdAnalysisShift != 50 || FactIdAnalysisBits != 12 {
 		t.Fatal("analysis field layout changed")
 	}
-	if FactIdReservedShift != 61 || FactIdReservedBits != 3 {
+	if FactIdReservedShift != 62 || FactIdReservedBits != 2 {
 		t.Fatal("reserved field layout changed")
 	}
-	if FactIdUB_PointShift != 15 || FactIdUB_EntityIdShift != 17 {
+	if FactIdUB_PointShift != 15 || FactIdUB_EntityIdShift != 18 {
 		t.Fatal("fact kind / instr id layout changed")
 	}
 }
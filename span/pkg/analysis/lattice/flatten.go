@@ -0,0 +1,112 @@
+package lattice
+
+// This file defines when a ChainedLattice is flattened.
+//
+// A lookup in a chained lattice walks up its parents until it finds the
+// key, so it costs O(depth) in a long chain (e.g. a fact per instruction,
+// each based on the fact of the previous one). A FlattenPolicy bounds the
+// cost: a lattice is flattened when it is created if it is deeper than
+// MaxDepth, or if the lookups in its parent reached the parents of the parent
+// MaxParentLookups times (the new lattice would walk the same chain). The
+// parents are still shared by the lattices that are shallow or rarely
+// queried, which is where the sharing saves memory.
+//
+// A lookup never modifies the facts of a lattice, since the facts (e.g. in
+// an analysis.AnalysisFactMap) may be read concurrently: only its lookup
+// count changes, atomically.
+
+import "sync/atomic"
+
+// FlattenPolicy decides when a chained lattice is flattened.
+// A zero bound disables the corresponding flattening.
+type FlattenPolicy struct {
+	// The most parents of a lattice, a deeper lattice is flattened when created.
+	MaxDepth int
+	// The lookups that may reach the parents of a lattice before the lattices
+	// based on it are flattened when created.
+	MaxParentLookups int
+	// Cache the values found in the parents, in each lattice (if supported).
+	// The cache assumes that the parents are not modified after a lattice is
+	// based on them (see ChainedLattice.ParentFactId). A lookup fills the
+	// cache, so the lattices are then not safe for concurrent lookups.
+	CacheLookups bool
+}
+
+// The policy of the lattices not given one (see FlattenTracker).
+var DefaultFlattenPolicy = FlattenPolicy{MaxDepth: 16, MaxParentLookups: 64}
+
+// A lattice with a FlattenTracker, to find the depth, the lookups and the
+// policy of a parent.
+type FlattenTracked interface {
+	ChainDepth() int
+	ParentLookups() int
+	FlattenPolicy() *FlattenPolicy
+}
+
+// FlattenTracker tracks the depth of a chained lattice and the lookups that
+// reached its parents, to apply a FlattenPolicy.
+// It is embedded in the chained lattices (like the *Base structures).
+type FlattenTracker struct {
+	policy        *FlattenPolicy
+	depth         int
+	parentLookups atomic.Int32
+}
+
+// ChainDepth returns the number of parents of the lattice.
+func (t *FlattenTracker) ChainDepth() int {
+	return t.depth
+}
+
+// FlattenPolicy returns the policy of the lattice (DefaultFlattenPolicy if not set).
+func (t *FlattenTracker) FlattenPolicy() *FlattenPolicy {
+	if t.policy == nil {
+		return &DefaultFlattenPolicy
+	}
+	return t.policy
+}
+
+// SetFlattenPolicy sets the policy of the lattice, inherited by the lattices based on it.
+func (t *FlattenTracker) SetFlattenPolicy(policy *FlattenPolicy) {
+	t.policy = policy
+}
+
+// ParentLookups returns the number of the lookups that reached the parents.
+func (t *FlattenTracker) ParentLookups() int {
+	return int(t.parentLookups.Load())
+}
+
+// TrackParent records the (new) parent of the lattice, inheriting its
+// policy unless one is set. It returns true if the lattice is now deeper
+// than the policy allows, or if the lookups in the parent reached its
+// parents too often, i.e. it should be flattened.
+func (t *FlattenTracker) TrackParent(parent LatticeWithFactId) bool {
+	t.depth = 0
+	t.parentLookups.Store(0)
+	if parent == nil {
+		return false
+	}
+	t.depth = 1
+	parentLookups := 0
+	if p, ok := parent.(FlattenTracked); ok {
+		t.depth += p.ChainDepth()
+		parentLookups = p.ParentLookups()
+		if t.policy == nil {
+			t.policy = p.FlattenPolicy()
+		}
+	}
+	policy := t.FlattenPolicy()
+	return (policy.MaxDepth > 0 && t.depth > policy.MaxDepth) ||
+		(policy.MaxParentLookups > 0 && parentLookups >= policy.MaxParentLookups)
+}
+
+// ParentLookup counts a lookup that reached the parents.
+// It is safe for concurrent lookups.
+func (t *FlattenTracker) ParentLookup() {
+	t.parentLookups.Add(1)
+}
+
+// Flattened records that the lattice no longer has a parent.
+func (t *FlattenTracker) Flattened() {
+	t.depth = 0
+	t.parentLookups.Store(0)
+}
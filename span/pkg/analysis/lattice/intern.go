@@ -0,0 +1,113 @@
+package lattice
+
+// This file defines the hash-consing (interning) of immutable lattice values.
+//
+// Most program points in a function carry the same facts as their
+// neighbours. An Interner keeps a single canonical object for each distinct
+// (structurally equal) value, so that the fact maps share references instead
+// of holding a copy per program point, and Equals on interned values is a
+// pointer comparison (see Equals).
+//
+// Only ConstLattice values are interned: a value that can be modified in
+// place (e.g. by Meet) must not be shared.
+
+import (
+	"sync"
+)
+
+// A HashedLattice is an immutable lattice value with a structural hash.
+// Values that are Equals must have the same hash.
+type HashedLattice interface {
+	ConstLattice
+	Hash() uint64
+}
+
+// Interner hash-conses HashedLattice values. It is safe for concurrent use.
+type Interner struct {
+	mu     sync.Mutex
+	table  map[uint64][]HashedLattice // hash -> values with the hash
+	size   int
+	hits   uint64
+	misses uint64
+}
+
+func NewInterner() *Interner {
+	return &Interner{table: make(map[uint64][]HashedLattice)}
+}
+
+// Intern returns the canonical value equal to l, registering l if it is new.
+func (in *Interner) Intern(l HashedLattice) HashedLattice {
+	h := l.Hash()
+	in.mu.Lock()
+	defer in.mu.Unlock()
+	bucket := in.table[h]
+	for _, v := range bucket {
+		// Equals is checked both ways, as it may not check the type of the other.
+		if v == l || (v.Equals(l) && l.Equals(v)) {
+			in.hits++
+			return v
+		}
+	}
+	in.table[h] = append(bucket, l)
+	in.size++
+	in.misses++
+	return l
+}
+
+// InternLattice interns l if it is a HashedLattice, else returns it as is.
+// A nil (Top) is returned as is.
+func (in *Interner) InternLattice(l Lattice) Lattice {
+	if h, ok := l.(HashedLattice); ok && h != nil {
+		return in.Intern(h)
+	}
+	return l
+}
+
+// InternPair returns the pair with both its values interned.
+func (in *Interner) InternPair(p Pair) Pair {
+	p.lats[0] = in.InternLattice(p.lats[0])
+	p.lats[1] = in.InternLattice(p.lats[1])
+	return p
+}
+
+// Len returns the number of distinct values interned.
+func (in *Interner) Len() int {
+	in.mu.Lock()
+	defer in.mu.Unlock()
+	return in.size
+}
+
+// Stats returns the number of Intern calls that found an existing value
+// (hits), and that registered a new value (misses).
+func (in *Interner) Stats() (hits, misses uint64) {
+	in.mu.Lock()
+	defer in.mu.Unlock()
+	return in.hits, in.misses
+}
+
+// The FNV-1a 64 bit offset and prime, used to combine the hashed words.
+const (
+	hashOffset uint64 = 14695981039346656037
+	hashPrime  uint64 = 1099511628211
+)
+
+// HashMix combines the word v into the hash h (start with HashSeed()).
+func HashMix(h, v uint64) uint64 {
+	for range 8 {
+		h ^= v & 0xff
+		h *= hashPrime
+		v >>= 8
+	}
+	return h
+}
+
+func HashSeed() uint64 {
+	return hashOffset
+}
+
+func hashBool(b bool) uint64 {
+	if b {
+		return 1
+	}
+	return 0
+}
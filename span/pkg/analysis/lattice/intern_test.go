@@ -0,0 +1,46 @@
+package lattice
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestInterner(t *testing.T) {
+	in := NewInterner()
+	r1 := NewRangeLT(spir.K_VK_TINT32, 1, 10)
+	r2 := NewRangeLT(spir.K_VK_TINT32, 1, 10)
+	r3 := NewRangeLT(spir.K_VK_TINT32, 1, 11)
+
+	if got := in.Intern(r1); got != r1 {
+		t.Fatal("expected the first value to be the canonical one")
+	}
+	if got := in.Intern(r2); got != r1 {
+		t.Error("expected an equal value to intern to the canonical one")
+	}
+	if got := in.Intern(r3); got != r3 {
+		t.Error("expected a different value to be registered")
+	}
+	eids := *spir.NewEidSet(false, false, 3, 5)
+	s1, s2 := NewMaySetLattice(eids, false), NewMaySetLattice(eids, false)
+	if in.InternLattice(s1) != Lattice(s1) || in.InternLattice(s2) != Lattice(s1) {
+		t.Error("expected equal may-sets to share a value")
+	}
+	if in.InternLattice(&TopBotLatticeTop) != Lattice(&TopBotLatticeTop) {
+		t.Error("expected the Top to be registered")
+	}
+	if in.InternLattice(nil) != nil {
+		t.Error("expected nil to be returned as is")
+	}
+
+	pair := in.InternPair(NewPair(NewRangeLT(spir.K_VK_TINT32, 1, 10), r3, NIL_FACT_ID))
+	if pair.L1() != Lattice(r1) || pair.L2() != Lattice(r3) {
+		t.Error("expected the pair values to be interned")
+	}
+	if hits, misses := in.Stats(); hits != 4 || misses != 4 || in.Len() != 4 {
+		t.Errorf("expected (4 hits, 4 misses, 4 values), got (%d, %d, %d)", hits, misses, in.Len())
+	}
+	if !Equals(pair.L1(), r1) {
+		t.Error("expected an interned value to equal itself")
+	}
+}
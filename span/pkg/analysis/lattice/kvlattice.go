@@ -24,7 +24,9 @@ type KVLattice interface {
 }
 
 // EntityIdMapKVLattice is a default implementation of KVLattice using a map[EntityId]ConstLattice.
+// The lookups through its parents are bounded by its FlattenPolicy.
 type EntityIdMapKVLattice struct {
+	FlattenTracker
 	factId         FactId
 	parent         KVLattice
 	parentFactId   FactId
@@ -32,6 +34,15 @@ type EntityIdMapKVLattice struct {
 	maxEntityCount int
 	kv             map[spir.EntityId]ConstLattice
 	defaultValue   ConstLattice
+	mods           uint64 // the modifications of kv, to invalidate the caches of the children
+	cache          map[spir.EntityId]kvCacheEntry
+	cacheMods      uint64 // the mods of the parent when the cache was filled
+}
+
+// A value found in the parents (or not).
+type kvCacheEntry struct {
+	value ConstLattice
+	found bool
 }
 
 // NewKVLatticeImpl creates a new KVLattice with the specified parent lattice.
@@ -43,7 +54,7 @@ func NewKVLatticeImpl(parent KVLattice, factId FactId, maxEntityCount int) *Enti
 	if parent != nil {
 		parentFactId = parent.ParentFactId()
 	}
-	return &EntityIdMapKVLattice{
+	kv := &EntityIdMapKVLattice{
 		parent:         parent,
 		parentFactId:   parentFactId,
 		factId:         factId,
@@ -51,6 +62,10 @@ func NewKVLatticeImpl(parent KVLattice, factId FactId, maxEntityCount int) *Enti
 		kv:             make(map[spir.EntityId]ConstLattice),
 		defaultValue:   nil,
 	}
+	if parent != nil && kv.TrackParent(parent) {
+		kv.Flatten(true) // too deep, or the parent is queried too often
+	}
+	return kv
 }
 
 func (kv *EntityIdMapKVLattice) HasDefaultValue() bool {
@@ -110,14 +125,38 @@ func (kv *EntityIdMapKVLattice) MaxEntityCount() int {
 
 // Get retrieves the ConstLattice value associated with the key, or
 // recursively queries the parent if not found.
+// It does not modify the lattice, unless its policy caches the lookups.
 func (kv *EntityIdMapKVLattice) Get(key spir.EntityId) (ConstLattice, bool) {
 	if val, ok := kv.kv[key]; ok {
 		return val, true
 	}
-	if kv.parent != nil {
-		return kv.parent.Get(key)
+	if kv.parent == nil {
+		return nil, false
+	}
+	kv.ParentLookup()
+	if kv.FlattenPolicy().CacheLookups {
+		return kv.cachedParentGet(key)
+	}
+	return kv.parent.Get(key)
+}
+
+// cachedParentGet looks up the key in the parents through the cache.
+// The cache is dropped if the parent was modified since it was filled.
+func (kv *EntityIdMapKVLattice) cachedParentGet(key spir.EntityId) (ConstLattice, bool) {
+	var parentMods uint64
+	if p, ok := kv.parent.(*EntityIdMapKVLattice); ok {
+		parentMods = p.mods
+	}
+	if kv.cache == nil || kv.cacheMods != parentMods {
+		kv.cache = make(map[spir.EntityId]kvCacheEntry)
+		kv.cacheMods = parentMods
 	}
-	return nil, false
+	if entry, ok := kv.cache[key]; ok {
+		return entry.value, entry.found
+	}
+	val, found := kv.parent.Get(key)
+	kv.cache[key] = kvCacheEntry{value: val, found: found}
+	return val, found
 }
 
 // AllKeysPresent adds all the keys present in the lattice to the given set.
@@ -142,6 +181,7 @@ func (kv *EntityIdMapKVLattice) Set(key spir.EntityId, value ConstLattice, must
 			return false
 		}
 		kv.kv[key] = value // regardless of may/must, set the value to the new value.
+		kv.mods++
 		return true
 	}
 
@@ -151,6 +191,7 @@ func (kv *EntityIdMapKVLattice) Set(key spir.EntityId, value ConstLattice, must
 			return false
 		}
 		kv.kv[key] = value
+		kv.mods++
 		return true
 	}
 
@@ -158,6 +199,7 @@ func (kv *EntityIdMapKVLattice) Set(key spir.EntityId, value ConstLattice, must
 	newValue, change := ConstMeet(oldValue, value)
 	if change {
 		kv.kv[key] = newValue
+		kv.mods++
 	}
 	return change
 }
@@ -173,8 +215,13 @@ func (kv *EntityIdMapKVLattice) Flatten(self bool) (LatticeWithFactId, bool) {
 	if !self {
 		// Make a new object and copy the kv map, but use same parent
 		out = &EntityIdMapKVLattice{
-			parent: kv.parent,
-			kv:     make(map[spir.EntityId]ConstLattice, len(kv.kv)),
+			FlattenTracker: FlattenTracker{policy: kv.policy},
+			factId:         kv.factId,
+			parent:         kv.parent,
+			scopeEid:       kv.scopeEid,
+			maxEntityCount: kv.maxEntityCount,
+			kv:             make(map[spir.EntityId]ConstLattice, len(kv.kv)),
+			defaultValue:   kv.defaultValue,
 		}
 		for id, v := range kv.kv {
 			out.kv[id] = v
@@ -212,9 +259,29 @@ func (kv *EntityIdMapKVLattice) Flatten(self bool) (LatticeWithFactId, bool) {
 	}
 
 	out.parent = nil // Remove the parent, since the lattice is now flattened.
+	out.parentFactId = NIL_FACT_ID
+	out.cache = nil
+	out.Flattened()
+	if changed {
+		out.mods++
+	}
 	return out, changed
 }
 
+// The estimated bytes of an entry of the map (or the cache) of an
+// EntityIdMapKVLattice: the key, the value interface and the map overhead.
+const kvEntryBytes = 40
+
+// SizeBytes estimates the bytes held by the lattice: its entries and their
+// values (the values in the parents are not counted).
+func (kv *EntityIdMapKVLattice) SizeBytes() int64 {
+	size := 4*LatticeBytes /* the fields */ + int64(len(kv.kv)+len(kv.cache))*kvEntryBytes
+	for _, value := range kv.kv {
+		size += SizeBytes(value)
+	}
+	return size
+}
+
 func (kv *EntityIdMapKVLattice) IsTop() bool {
 	return len(kv.kv) == 0 && IsParentTop(kv) /*all entities are top, since no entities are present*/
 }
@@ -242,7 +309,7 @@ func (kv *EntityIdMapKVLattice) WeakerThan(other Lattice) bool {
 		return false
 	}
 	if !SameParent(kv, oth) {
-		return false
+		return kv.allValues(oth, WeakerThan)
 	}
 
 	for id, value := range kv.kv {
@@ -266,7 +333,7 @@ func (kv *EntityIdMapKVLattice) Equals(other Lattice) bool {
 		return false
 	}
 	if !SameParent(kv, oth) {
-		return false
+		return kv.allValues(oth, Equals)
 	}
 
 	for id, value := range kv.kv {
@@ -284,6 +351,22 @@ func (kv *EntityIdMapKVLattice) Equals(other Lattice) bool {
 	return true
 }
 
+// allValues compares the values of all the keys of the two lattices with
+// cmp, e.g. if they have different parents (or one was flattened).
+func (kv *EntityIdMapKVLattice) allValues(oth *EntityIdMapKVLattice, cmp func(l1, l2 Lattice) bool) bool {
+	allKeys := spir.NewEidSet(false, false)
+	kv.AllKeysPresent(allKeys)
+	oth.AllKeysPresent(allKeys)
+	for _, eid := range allKeys.Iterator {
+		kvValue, _ := kv.Get(eid)
+		othValue, _ := oth.Get(eid)
+		if !cmp(kvValue, othValue) {
+			return false
+		}
+	}
+	return true
+}
+
 func (kv *EntityIdMapKVLattice) Meet(other Lattice) (Lattice, bool) {
 	oth, ok := other.(*EntityIdMapKVLattice)
 	if !ok {
@@ -353,6 +436,29 @@ func (kv *EntityIdMapKVLattice) Widen(other Lattice) (Lattice, bool) {
 	return kv, changed
 }
 
+func (kv *EntityIdMapKVLattice) Narrow(other Lattice) (Lattice, bool) {
+	oth, ok := other.(*EntityIdMapKVLattice)
+	if !ok {
+		panic(fmt.Sprintf("EntityIdMapKVLattice.Narrow: other is not a EntityIdMapKVLattice: %T", other))
+	}
+
+	// Get all the keys present in the current lattice.
+	// The keys not present are Top, which is not narrowed.
+	allKeys := spir.NewEidSet(false, false)
+	kv.AllKeysPresent(allKeys)
+	changed := false
+	for _, eid := range allKeys.Iterator {
+		kvValue, _ := kv.Get(eid)
+		othValue, _ := oth.Get(eid)
+		newValue, change := ConstNarrow(kvValue, othValue)
+		if change {
+			kv.setOrDeleteTop(eid, newValue)
+			changed = true
+		}
+	}
+	return kv, changed
+}
+
 func (kv *EntityIdMapKVLattice) String() string {
 	kv.requireFlat("String")
 	keys := make([]spir.EntityId, 0, len(kv.kv))
@@ -371,6 +477,7 @@ func (kv *EntityIdMapKVLattice) String() string {
 }
 
 func (kv *EntityIdMapKVLattice) setOrDeleteTop(id spir.EntityId, value Lattice) {
+	kv.mods++
 	if IsTop(value) {
 		delete(kv.kv, id)
 		return
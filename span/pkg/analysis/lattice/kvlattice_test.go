@@ -0,0 +1,152 @@
+package lattice
+
+import (
+	"fmt"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// benchKV returns a flat KV lattice of n variables, mapped to ranges
+// starting at lo (and 10 wide).
+func benchKV(n int, lo int32) *EntityIdMapKVLattice {
+	kv := NewKVLatticeImpl(nil, NIL_FACT_ID, n)
+	for i := range n {
+		kv.Set(spir.EntityId(i+1), mkRange(spir.K_VK_TINT32, lo+int32(i), lo+int32(i)+10), true)
+	}
+	return kv
+}
+
+var benchKVSizes = []int{16, 256, 4096}
+
+func BenchmarkKVLattice_Meet(b *testing.B) {
+	for _, n := range benchKVSizes {
+		b.Run(fmt.Sprintf("n=%d/converged", n), func(b *testing.B) {
+			kv, other := benchKV(n, -5), benchKV(n, 0)
+			kv.Meet(other)
+			b.ReportAllocs()
+			for b.Loop() {
+				kv.Meet(other) // no change, as at a join after convergence
+			}
+		})
+		b.Run(fmt.Sprintf("n=%d/changed", n), func(b *testing.B) {
+			kv, other := benchKV(n, 0), benchKV(n, 5)
+			b.ReportAllocs()
+			for b.Loop() {
+				cp, _ := kv.Flatten(false) // the copy is included
+				cp.Meet(other)
+			}
+		})
+	}
+}
+
+func BenchmarkKVLattice_Join(b *testing.B) {
+	for _, n := range benchKVSizes {
+		b.Run(fmt.Sprintf("n=%d", n), func(b *testing.B) {
+			kv, other := benchKV(n, 0), benchKV(n, 5)
+			b.ReportAllocs()
+			for b.Loop() {
+				cp, _ := kv.Flatten(false) // the copy is included
+				cp.Join(other)
+			}
+		})
+	}
+}
+
+// BenchmarkKVLattice_Flatten flattens a lattice setting a few keys over a
+// chain of parents, each setting n/depth keys.
+func BenchmarkKVLattice_Flatten(b *testing.B) {
+	for _, n := range benchKVSizes {
+		for _, depth := range []int{1, 8} {
+			b.Run(fmt.Sprintf("n=%d/depth=%d", n, depth), func(b *testing.B) {
+				var parent KVLattice
+				for d := range depth {
+					kv := NewKVLatticeImpl(parent, NIL_FACT_ID, n)
+					for i := d; i < n; i += depth {
+						kv.Set(spir.EntityId(i+1), mkRange(spir.K_VK_TINT32, int32(i), int32(i)+10), true)
+					}
+					parent = kv
+				}
+				child := NewKVLatticeImpl(parent, NIL_FACT_ID, n)
+				child.Set(spir.EntityId(1), mkRange(spir.K_VK_TINT32, int32(0), int32(1)), true)
+				b.ReportAllocs()
+				for b.Loop() {
+					child.Flatten(false)
+				}
+			})
+		}
+	}
+}
+
+// kvChain returns a chain of depth lattices setting the keys 1..depth,
+// the key d to [d, d] in the d-th lattice.
+func kvChain(policy *FlattenPolicy, depth int) *EntityIdMapKVLattice {
+	var kv *EntityIdMapKVLattice
+	for d := 1; d <= depth; d++ {
+		var parent KVLattice
+		if kv != nil {
+			parent = kv
+		}
+		kv = NewKVLatticeImpl(parent, NIL_FACT_ID, depth)
+		if d == 1 {
+			kv.SetFlattenPolicy(policy)
+		}
+		kv.Set(spir.EntityId(d), mkRange(spir.K_VK_TINT32, int32(d), int32(d)), true)
+	}
+	return kv
+}
+
+func checkKVChain(t *testing.T, kv *EntityIdMapKVLattice, depth int) {
+	t.Helper()
+	for d := 1; d <= depth; d++ {
+		got, ok := kv.Get(spir.EntityId(d))
+		if want := mkRange(spir.K_VK_TINT32, int32(d), int32(d)); !ok || !Equals(got, want) {
+			t.Errorf("Get(%d): expected %v, got %v", d, want, got)
+		}
+	}
+	if _, ok := kv.Get(spir.EntityId(depth + 1)); ok {
+		t.Errorf("Get(%d): expected no value", depth+1)
+	}
+}
+
+func TestKVLattice_flattenPolicy(t *testing.T) {
+	t.Run("depth", func(t *testing.T) {
+		kv := kvChain(&FlattenPolicy{MaxDepth: 3}, 10)
+		if kv.ChainDepth() > 3 {
+			t.Errorf("expected a depth of at most 3, got %d", kv.ChainDepth())
+		}
+		checkKVChain(t, kv, 10)
+	})
+	t.Run("lookups", func(t *testing.T) {
+		kv := kvChain(&FlattenPolicy{MaxParentLookups: 4}, 10)
+		checkKVChain(t, kv, 10)
+		if kv.Parent() == nil || kv.ParentLookups() < 4 {
+			t.Errorf("expected the lookups counted, without modifying the lattice")
+		}
+		child := NewKVLatticeImpl(kv, NIL_FACT_ID, 10)
+		if child.Parent() != nil {
+			t.Errorf("expected a lattice based on a queried parent to be flattened")
+		}
+		checkKVChain(t, child, 10)
+	})
+	t.Run("cache", func(t *testing.T) {
+		kv := kvChain(&FlattenPolicy{CacheLookups: true}, 10)
+		checkKVChain(t, kv, 10)
+		checkKVChain(t, kv, 10) // from the cache
+		if kv.Parent() == nil || len(kv.cache) == 0 {
+			t.Errorf("expected the lookups in the parents cached")
+		}
+		parent := kv.Parent().(*EntityIdMapKVLattice)
+		parent.Set(spir.EntityId(1), mkRange(spir.K_VK_TINT32, int32(0), int32(0)), true)
+		if got, _ := kv.Get(spir.EntityId(1)); !Equals(got, mkRange(spir.K_VK_TINT32, int32(0), int32(0))) {
+			t.Errorf("expected the cache invalidated by a change of the parent, got %v", got)
+		}
+	})
+	t.Run("equals flattened", func(t *testing.T) {
+		kv := kvChain(&FlattenPolicy{}, 5)
+		flat, _ := kv.Flatten(false)
+		if !kv.Equals(flat) || !flat.Equals(kv) {
+			t.Errorf("expected a lattice to equal its flattened copy")
+		}
+	})
+}
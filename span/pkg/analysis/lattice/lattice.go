@@ -71,9 +71,15 @@ func WeakerThan(l1, l2 Lattice) bool {
 }
 
 func Equals(l1, l2 Lattice) bool {
+	if l1 == l2 {
+		return true // the same (e.g. interned) value
+	}
 	if (IsTop(l1) && IsTop(l2)) || (IsBot(l1) && IsBot(l2)) {
 		return true
 	}
+	if l1 == nil || l2 == nil {
+		return false // nil is Top, and the other is not Top
+	}
 	return l1.Equals(l2)
 }
 
@@ -111,6 +117,52 @@ func Widen(l1, l2 Lattice) (Lattice, bool) {
 	return l1.Widen(l2)
 }
 
+// A NarrowingLattice has a narrowing operator, to recover the precision lost
+// by widening: Narrow(other) refines the receiver (a widened value) towards
+// other (a more precise value computed from it), in finitely many steps.
+// For example, a range lattice refines only its unbounded ends.
+type NarrowingLattice interface {
+	Lattice
+	Narrow(other Lattice) (Lattice, bool)
+}
+
+// Narrow narrows l1 towards l2. A lattice without a narrowing operator is
+// not narrowed, i.e. l1 is returned unchanged.
+func Narrow(l1, l2 Lattice) (Lattice, bool) {
+	if IsTop(l1) {
+		return l1, false
+	}
+	if IsTop(l2) {
+		return l2, true
+	}
+	if nl, ok := l1.(NarrowingLattice); ok {
+		return nl.Narrow(l2)
+	}
+	return l1, false
+}
+
+// A SizedLattice estimates the bytes it holds, e.g. by the number of the
+// elements of a set or of the entries of a map (see SizeBytes).
+type SizedLattice interface {
+	Lattice
+	SizeBytes() int64
+}
+
+// The estimated bytes of a lattice that is not a SizedLattice.
+const LatticeBytes = 32
+
+// SizeBytes estimates the bytes held by l: its own estimate if it is
+// a SizedLattice, else LatticeBytes (and none for a nil Top).
+func SizeBytes(l Lattice) int64 {
+	if l == nil {
+		return 0
+	}
+	if sl, ok := l.(SizedLattice); ok {
+		return sl.SizeBytes()
+	}
+	return LatticeBytes
+}
+
 func String(l Lattice) string {
 	if l == nil {
 		return "nil_Top"
@@ -154,6 +206,14 @@ func ConstWiden(l1, l2 ConstLattice) (ConstLattice, bool) {
 	return lat.(ConstLattice), change
 }
 
+func ConstNarrow(l1, l2 ConstLattice) (ConstLattice, bool) {
+	lat, change := Narrow(l1, l2)
+	if change && l1 != nil {
+		errs.Assert(l1 != lat, "Constant lattice should not change")
+	}
+	return lat.(ConstLattice), change
+}
+
 // A LatticeWithFactId is a lattice that has a fact id.
 // The fact id is used to identify the fact in the data flow analysis,
 // and to track the history of changes for the fact (versioning).
@@ -14,11 +14,11 @@ type MaySetLattice struct {
 	maySet spir.EidSet
 }
 
-var _ ConstLattice = (*MaySetLattice)(nil)
+var _ HashedLattice = (*MaySetLattice)(nil)
 
 // NewMaySetLattice creates a MaySetLattice containing the given EntityIds.
 func NewMaySetLattice(eids spir.EidSet, isBot bool) *MaySetLattice {
-	eidSet := *spir.NewEidSet(false)
+	eidSet := *spir.NewEidSet(false, false)
 	for _, id := range eids.Iterator {
 		eidSet.Add(id)
 	}
@@ -55,7 +55,15 @@ func (l *MaySetLattice) Equals(other Lattice) bool {
 	if !ok {
 		return false
 	}
-	return l.maySet.Equals(oth.maySet)
+	return l == oth || l.maySet.Equals(oth.maySet)
+}
+
+func (l *MaySetLattice) Hash() uint64 {
+	h := HashSeed() // isBot is not compared by Equals
+	for _, id := range l.maySet.Iterator {
+		h = HashMix(h, uint64(id))
+	}
+	return h
 }
 
 func (l *MaySetLattice) Meet(other Lattice) (Lattice, bool) {
@@ -88,6 +96,16 @@ func (l *MaySetLattice) Widen(other Lattice) (Lattice, bool) {
 	return ConstMeet(l, other.(ConstLattice))
 }
 
+// ElemSet adds the EntityIds in the may-set to set, and returns set.
+func (l *MaySetLattice) ElemSet(set *spir.EidSet) *spir.EidSet {
+	set.UnionWith(l.maySet)
+	return set
+}
+
+func (l *MaySetLattice) SizeBytes() int64 {
+	return LatticeBytes + l.maySet.SizeBytes()
+}
+
 func (l *MaySetLattice) String() string {
 	return fmt.Sprintf("MaySetLattice{%s, isBot: %t}", l.maySet.String(), l.isBot)
 }
@@ -70,6 +70,11 @@ func (l Pair) Lats(idx int) Lattice {
 	}
 }
 
+// SizeBytes estimates the bytes held by the two lattices of the pair.
+func (l Pair) SizeBytes() int64 {
+	return SizeBytes(l.lats[0]) + SizeBytes(l.lats[1])
+}
+
 func (l Pair) IsTop() bool {
 	return IsTop(l.lats[0]) && IsTop(l.lats[1])
 }
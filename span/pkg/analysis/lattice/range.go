@@ -33,6 +33,11 @@ func NewRangeLT(typ spir.ValKind, min, max uint64) *RangeLattice {
 	}
 }
 
+// Bounds returns the type and the (encoded) endpoints of the range.
+func (l *RangeLattice) Bounds() (typ spir.ValKind, min, max uint64) {
+	return l.typ, l.min, l.max
+}
+
 func (l *RangeLattice) String() string {
 	switch l.typ {
 	case spir.K_VK_TFLOAT:
@@ -87,12 +92,19 @@ func (l *RangeLattice) Equals(other Lattice) bool {
 	if !ok {
 		return false
 	}
+	if l == ol {
+		return true
+	}
 	if l.typ != ol.typ {
 		return false
 	}
 	return l.min == ol.min && l.max == ol.max
 }
 
+func (l *RangeLattice) Hash() uint64 {
+	return HashMix(HashMix(HashMix(HashSeed(), uint64(l.typ)), l.min), l.max)
+}
+
 // Meet computes the meet (GLB: wider union) of two RangeLTs.
 func (l *RangeLattice) Meet(other Lattice) (Lattice, bool) {
 	ol, ok := other.(*RangeLattice)
@@ -121,18 +133,48 @@ func (l *RangeLattice) Join(other Lattice) (Lattice, bool) {
 	return &RangeLattice{typ: l.typ, min: newMin, max: newMax}, changed
 }
 
-// Widen expands to full (bot) range if other is weaker, otherwise behaves as meet.
+// Widen extends the ends of l that other extends to the ends of the full
+// (bot) range, keeping the stable ends; otherwise it behaves as meet.
 func (l *RangeLattice) Widen(other Lattice) (Lattice, bool) {
 	ol, ok := other.(*RangeLattice)
 	if !ok || l.typ != ol.typ {
 		return l, false
 	}
-	if ol.WeakerThan(l) {
-		fullMin, fullMax := fullRangeForKind(l.typ)
-		changed := l.min != fullMin || l.max != fullMax
-		return &RangeLattice{typ: l.typ, min: fullMin, max: fullMax}, changed
+	if l.IsTop() || ol.IsTop() {
+		return l.Meet(other)
+	}
+	fullMin, fullMax := fullRangeForKind(l.typ)
+	newMin, newMax := l.min, l.max
+	if compareMin(l.typ, ol.min, l.min) < 0 {
+		newMin = fullMin
+	}
+	if compareMax(l.typ, ol.max, l.max) > 0 {
+		newMax = fullMax
+	}
+	if newMin == l.min && newMax == l.max {
+		return l, false
+	}
+	return &RangeLattice{typ: l.typ, min: newMin, max: newMax}, true
+}
+
+// Narrow replaces the unbounded (full range) ends of l with those of other.
+func (l *RangeLattice) Narrow(other Lattice) (Lattice, bool) {
+	ol, ok := other.(*RangeLattice)
+	if !ok || l.typ != ol.typ {
+		return l, false
+	}
+	fullMin, fullMax := fullRangeForKind(l.typ)
+	newMin, newMax := l.min, l.max
+	if l.min == fullMin {
+		newMin = ol.min
+	}
+	if l.max == fullMax {
+		newMax = ol.max
+	}
+	if newMin == l.min && newMax == l.max {
+		return l, false
 	}
-	return l.Meet(other)
+	return &RangeLattice{typ: l.typ, min: newMin, max: newMax}, true
 }
 
 // Convert uint64 bit patterns to value, then compare.
@@ -167,6 +167,29 @@ func TestRangeLT_Widen(t *testing.T) {
 	if changed2 != mChanged {
 		t.Errorf("Widen changed=%v, want same as Meet changed=%v", changed2, mChanged)
 	}
+	// Only the unstable end is widened.
+	got3, _ := base.Widen(mkRange(spir.K_VK_TUINT32, uint32(10), uint32(200)))
+	if !got3.(*RangeLattice).Equals(NewRangeLT(spir.K_VK_TUINT32, ToUint64(spir.K_VK_TUINT32, uint32(10)), fullMax)) {
+		t.Errorf("Widen should keep the stable min: got %v", got3)
+	}
+}
+
+func TestRangeLT_Narrow(t *testing.T) {
+	fullMin, fullMax := fullRangeForKind(spir.K_VK_TINT32)
+	widened := NewRangeLT(spir.K_VK_TINT32, ToUint64(spir.K_VK_TINT32, int32(1)), fullMax)
+	got, changed := widened.Narrow(mkRange(spir.K_VK_TINT32, int32(0), int32(10)))
+	if !changed || !got.(*RangeLattice).Equals(mkRange(spir.K_VK_TINT32, int32(1), int32(10))) {
+		t.Errorf("Narrow should refine only the unbounded max: got %v, changed=%v", got, changed)
+	}
+	// The bounded ends are kept.
+	got2, changed2 := got.(*RangeLattice).Narrow(mkRange(spir.K_VK_TINT32, int32(5), int32(6)))
+	if changed2 || got2 != got {
+		t.Errorf("Narrow of a bounded range should not change: got %v, changed=%v", got2, changed2)
+	}
+	full := NewRangeLT(spir.K_VK_TINT32, fullMin, fullMax)
+	if got3, _ := Narrow(full, nil); got3 != nil {
+		t.Errorf("Narrow towards Top should be Top, got %v", got3)
+	}
 }
 
 // --- Step 8: Corner Case for Empty/Top Ranges ---
@@ -373,3 +396,30 @@ func Test_fullRangeForKind(t *testing.T) {
 		}
 	}
 }
+
+// --- Benchmarks ---
+
+func BenchmarkRangeLT_ops(b *testing.B) {
+	x := mkRange(spir.K_VK_TINT32, int32(-10), int32(100))
+	y := mkRange(spir.K_VK_TINT32, int32(0), int32(200))
+	ops := []struct {
+		name string
+		op   func(Lattice) (Lattice, bool)
+	}{
+		{"Meet", x.Meet}, {"Join", x.Join}, {"Widen", x.Widen}, {"Narrow", x.Narrow},
+	}
+	for _, op := range ops {
+		b.Run(op.name, func(b *testing.B) {
+			b.ReportAllocs()
+			for b.Loop() {
+				op.op(y)
+			}
+		})
+	}
+	b.Run("Equals", func(b *testing.B) {
+		b.ReportAllocs()
+		for b.Loop() {
+			x.Equals(y)
+		}
+	})
+}
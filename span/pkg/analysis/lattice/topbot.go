@@ -46,9 +46,16 @@ func (l *TopBotLT) Equals(other Lattice) bool {
 	if other == nil {
 		return false
 	}
+	if other == Lattice(l) {
+		return true
+	}
 	return l.top == other.IsTop() && l.bot == other.IsBot()
 }
 
+func (l *TopBotLT) Hash() uint64 {
+	return HashMix(HashMix(HashSeed(), hashBool(l.top)), hashBool(l.bot))
+}
+
 func (l *TopBotLT) Join(other Lattice) (Lattice, bool) {
 	if other == nil || l.top {
 		return l, false
@@ -0,0 +1,262 @@
+package analysis
+
+// This file defines a driver that runs an intra-procedural analysis
+// on all the functions of a TU concurrently, on a bounded pool of workers.
+//
+// Each function is analyzed with its own spir.Context (the current scope
+// is a per function state), so the workers share only the read-only TU.
+// The results are placed at the function's position in the sorted list of
+// function ids, which makes the merged output independent of the scheduling.
+
+import (
+	"fmt"
+	"runtime"
+	"sync"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A function that returns a fresh analysis object.
+// An analysis object carries its instance id, hence each function needs its own.
+type AnalysisFactory func() Analysis
+
+// The converged facts of an analysis on a single function.
+type FuncResult struct {
+	FuncId  spir.EntityId
+	CtxId   spir.ContextId
+	Context *spir.Context
+	FactMap AnalysisFactMap
+	Change  lattice.FactChanged
+}
+
+// The fixed point solver used for an intra-procedural analysis.
+type SolverMode uint8
+
+const (
+	// The lattice based solver (IntraPAN).
+	GenericSolver SolverMode = iota
+	// The bit-vector solver (BitVectorIntraPAN), for a BitVectorAnalysis.
+	// Other analyses fall back to the GenericSolver.
+	BitVectorSolver
+	// The def-use driven solver (SparsePAN), for a SparseAnalysis.
+	// Other analyses fall back to the GenericSolver.
+	SparseSolver
+)
+
+func ParseSolverMode(name string) (SolverMode, error) {
+	switch name {
+	case "generic":
+		return GenericSolver, nil
+	case "bitvector":
+		return BitVectorSolver, nil
+	case "sparse":
+		return SparseSolver, nil
+	}
+	return 0, fmt.Errorf("unknown solver %q (expected generic, bitvector or sparse)", name)
+}
+
+type ParallelIntraPAN struct {
+	tu          *spir.TU
+	newAnalysis AnalysisFactory
+	// Number of worker goroutines. Defaults to runtime.GOMAXPROCS(0).
+	workers          int
+	skipCallsKnob    bool
+	meetAtBasicBlock bool
+	solver           SolverMode
+	// Keep only the facts at the boundaries of the blocks (see KeepBoundaryFacts).
+	boundaryFactsOnly bool
+	// The budget the fact maps are published into (nil: they are returned).
+	budget *FactBudget
+}
+
+func NewParallelIntraPAN(tu *spir.TU, newAnalysis AnalysisFactory,
+	skipCallsKnob bool, meetAtBasicBlock bool) *ParallelIntraPAN {
+	return &ParallelIntraPAN{
+		tu:               tu,
+		newAnalysis:      newAnalysis,
+		workers:          runtime.GOMAXPROCS(0),
+		skipCallsKnob:    skipCallsKnob,
+		meetAtBasicBlock: meetAtBasicBlock,
+	}
+}
+
+func (p *ParallelIntraPAN) Workers() int {
+	return p.workers
+}
+
+// SetWorkers sets the size of the worker pool; a value < 1 selects GOMAXPROCS.
+func (p *ParallelIntraPAN) SetWorkers(workers int) {
+	if workers < 1 {
+		workers = runtime.GOMAXPROCS(0)
+	}
+	p.workers = workers
+}
+
+func (p *ParallelIntraPAN) SetSolverMode(solver SolverMode) {
+	p.solver = solver
+}
+
+// SetBoundaryFactsOnly keeps only the facts at the entry and the exit of the
+// blocks in the results (the others can be recomputed, see FactRecomputer).
+func (p *ParallelIntraPAN) SetBoundaryFactsOnly(boundaryFactsOnly bool) {
+	p.boundaryFactsOnly = boundaryFactsOnly
+}
+
+// SetFactBudget publishes the fact map of each function into the budget as
+// soon as it converges, instead of returning it in its result (nil disables).
+func (p *ParallelIntraPAN) SetFactBudget(budget *FactBudget) {
+	p.budget = budget
+}
+
+// AnalyzeTU analyzes all the functions (with a body) in the TU.
+// The results are in ascending order of the function ids.
+func (p *ParallelIntraPAN) AnalyzeTU() []FuncResult {
+	var funcs []*spir.Function
+	for _, fid := range p.tu.FunctionIds() {
+		if fun := p.tu.GetFunctionById(fid); fun.Body() != nil {
+			funcs = append(funcs, fun)
+		}
+	}
+	return p.AnalyzeFunctions(funcs)
+}
+
+// AnalyzeFunctions analyzes the given functions; result i belongs to funcs[i].
+func (p *ParallelIntraPAN) AnalyzeFunctions(funcs []*spir.Function) []FuncResult {
+	results := make([]FuncResult, len(funcs))
+	RunOrdered(len(funcs), p.workers,
+		func(i int) FuncResult { return p.analyzeFunction(funcs[i]) },
+		func(i int, res FuncResult) error {
+			results[i] = res
+			return nil
+		})
+	return results
+}
+
+// RunOrdered runs work(i) for each i in [0, n) on a pool of workers (a value
+// < 1 selects GOMAXPROCS), and calls emit(i, result) in the ascending order
+// of i, as soon as the results up to i are available. At most two results
+// per worker wait to be emitted, so the results can be streamed out (e.g.
+// written) without retaining them all. It stops at the first error of emit,
+// and returns it.
+func RunOrdered[T any](n, workers int, work func(i int) T, emit func(i int, res T) error) error {
+	if workers < 1 {
+		workers = runtime.GOMAXPROCS(0)
+	}
+	workers = min(workers, n)
+	if workers <= 1 {
+		for i := range n {
+			if err := emit(i, work(i)); err != nil {
+				return err
+			}
+		}
+		return nil
+	}
+
+	results := make([]chan T, n) // each written once, by a worker
+	for i := range results {
+		results[i] = make(chan T, 1)
+	}
+	window := make(chan struct{}, 2*workers) // the results not emitted yet
+	next := make(chan int)
+	stop := make(chan struct{})
+	var wg sync.WaitGroup
+	for range workers {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range next {
+				results[i] <- work(i)
+			}
+		}()
+	}
+	go func() {
+		defer close(next)
+		for i := range n {
+			select {
+			case window <- struct{}{}:
+			case <-stop:
+				return
+			}
+			select {
+			case next <- i:
+			case <-stop:
+				return
+			}
+		}
+	}()
+
+	var err error
+	for i := range n {
+		res := <-results[i]
+		<-window
+		if err = emit(i, res); err != nil {
+			break
+		}
+	}
+	close(stop)
+	wg.Wait()
+	return err
+}
+
+func (p *ParallelIntraPAN) analyzeFunction(fun *spir.Function) FuncResult {
+	res := AnalyzeFunctionWithSolver(p.tu, fun, p.newAnalysis(), p.solver,
+		p.skipCallsKnob, p.meetAtBasicBlock)
+	retainResult(&res, fun, p.boundaryFactsOnly, p.budget)
+	return res
+}
+
+// AnalyzeFunction runs the given analysis (intra-procedurally) on the body of
+// the function, with a fresh context of its own, until it converges.
+func AnalyzeFunction(tu *spir.TU, fun *spir.Function, an Analysis,
+	skipCallsKnob bool, meetAtBasicBlock bool) FuncResult {
+	return AnalyzeFunctionWithSolver(tu, fun, an, GenericSolver, skipCallsKnob, meetAtBasicBlock)
+}
+
+// AnalyzeFunctionWithSolver is AnalyzeFunction with the given solver.
+func AnalyzeFunctionWithSolver(tu *spir.TU, fun *spir.Function, an Analysis,
+	solver SolverMode, skipCallsKnob bool, meetAtBasicBlock bool) FuncResult {
+	return AnalyzeFunctionWithStats(tu, fun, an, solver, skipCallsKnob, meetAtBasicBlock, nil)
+}
+
+// AnalyzeFunctionWithStats is AnalyzeFunctionWithSolver counting the work of
+// the solver into stats (if not nil).
+func AnalyzeFunctionWithStats(tu *spir.TU, fun *spir.Function, an Analysis,
+	solver SolverMode, skipCallsKnob bool, meetAtBasicBlock bool, stats *EngineStats) FuncResult {
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+
+	ctxId := spir.GetNextContextId()
+	var intra Analyzer
+	bvAn, isBitVector := an.(BitVectorAnalysis)
+	spAn, isSparse := an.(SparseAnalysis)
+	switch {
+	case solver == BitVectorSolver && isBitVector:
+		intra = NewBitVectorIntraPAN(ctxId, bvAn, fun.Body(), ctx)
+	case solver == SparseSolver && isSparse:
+		intra = NewSparsePAN(ctxId, spAn, fun.Body(), ctx)
+	default:
+		intra = NewIntraPAN(ctxId, an, fun.Body(), ctx, skipCallsKnob, meetAtBasicBlock)
+	}
+	if statsAn, ok := intra.(StatsAnalyzer); ok && stats != nil {
+		statsAn.SetStats(stats)
+	}
+	change := intra.AnalyzeGraph()
+
+	return FuncResult{
+		FuncId:  fun.Id(),
+		CtxId:   ctxId,
+		Context: ctx,
+		FactMap: *intra.FactMap(),
+		Change:  change,
+	}
+}
+
+// MergeInto publishes the fact maps of the results into the given context,
+// in the order of the results, keyed by their context ids.
+func MergeInto(ctx *spir.Context, results []FuncResult) {
+	for _, res := range results {
+		ctx.SetInfo(uint64(res.CtxId), res.FactMap)
+	}
+}
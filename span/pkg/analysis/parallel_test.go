@@ -0,0 +1,115 @@
+package analysis
+
+import (
+	"errors"
+	"slices"
+	"sync/atomic"
+	"testing"
+	"time"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+type testForwardClient struct {
+	AnalysisClientBase
+}
+
+func (c *testForwardClient) NewNonNilTopLattice(factId lattice.FactId) lattice.Lattice {
+	return &lattice.TopBotLatticeTop
+}
+
+func newTestForwardClient() Analysis {
+	return &testForwardClient{}
+}
+
+func TestParallelIntraPANDeterministic(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_A()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+
+	funcs := make([]*spir.Function, 32)
+	for i := range funcs {
+		funcs[i] = main
+	}
+
+	serial := NewParallelIntraPAN(tu, newTestForwardClient, false, false)
+	serial.SetWorkers(1)
+	parallel := NewParallelIntraPAN(tu, newTestForwardClient, false, false)
+	parallel.SetWorkers(4)
+
+	want := serial.AnalyzeFunctions(funcs)
+	got := parallel.AnalyzeFunctions(funcs)
+	if len(got) != len(want) {
+		t.Fatalf("expected %d results, got %d", len(want), len(got))
+	}
+
+	seenCtx := make(map[spir.ContextId]bool)
+	for i := range got {
+		if got[i].FuncId != want[i].FuncId || got[i].Change != want[i].Change {
+			t.Errorf("result %d: expected (%v, %v), got (%v, %v)", i,
+				want[i].FuncId, want[i].Change, got[i].FuncId, got[i].Change)
+		}
+		if len(got[i].FactMap) != len(want[i].FactMap) {
+			t.Errorf("result %d: expected %d facts, got %d", i, len(want[i].FactMap), len(got[i].FactMap))
+		}
+		for insnId, wantPair := range want[i].FactMap {
+			gotPair := got[i].FactMap[insnId]
+			if !lattice.Equals(gotPair.L1(), wantPair.L1()) || !lattice.Equals(gotPair.L2(), wantPair.L2()) {
+				t.Errorf("result %d: facts differ at insn %v", i, insnId)
+			}
+		}
+		if seenCtx[got[i].CtxId] {
+			t.Errorf("result %d: context id %v reused", i, got[i].CtxId)
+		}
+		seenCtx[got[i].CtxId] = true
+	}
+
+	ctx := spir.NewContext(tu)
+	MergeInto(ctx, got)
+	if _, ok := ctx.GetInfo(uint64(got[0].CtxId)); !ok {
+		t.Errorf("merged context is missing the facts of context %v", got[0].CtxId)
+	}
+}
+
+func TestRunOrdered(t *testing.T) {
+	for _, workers := range []int{1, 4} {
+		var running, maxRunning atomic.Int32
+		var got []int
+		err := RunOrdered(100, workers, func(i int) int {
+			if r := running.Add(1); r > maxRunning.Load() {
+				maxRunning.Store(r)
+			}
+			defer running.Add(-1)
+			time.Sleep(time.Duration(100-i) * time.Microsecond) // the later ones finish first
+			return i * i
+		}, func(i int, res int) error {
+			if res != i*i {
+				t.Errorf("workers=%d: expected the result of %d, got %d", workers, i, res)
+			}
+			got = append(got, i)
+			return nil
+		})
+		if err != nil || len(got) != 100 || !slices.IsSorted(got) {
+			t.Errorf("workers=%d: expected the results emitted in order, got %v (%v)", workers, got, err)
+		}
+		if maxRunning.Load() > int32(workers) {
+			t.Errorf("workers=%d: %d ran concurrently", workers, maxRunning.Load())
+		}
+	}
+
+	// The first error of emit stops the run.
+	errStop := errors.New("stop")
+	emitted := 0
+	err := RunOrdered(100, 4, func(i int) int { return i }, func(i int, res int) error {
+		emitted++
+		if i == 10 {
+			return errStop
+		}
+		return nil
+	})
+	if err != errStop || emitted != 11 {
+		t.Errorf("expected to stop at the error, got %v after %d results", err, emitted)
+	}
+}
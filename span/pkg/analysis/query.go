@@ -0,0 +1,252 @@
+package analysis
+
+// This file defines the demand driven queries of the fact of an analysis at
+// an instruction of a function (e.g. "is x live here?"), without solving the
+// whole function:
+//  1. The fact at an instruction of a forward analysis depends only on the
+//     blocks reaching its block (and those of a backward analysis, only on
+//     the blocks reached from its block). Such a region is closed: all the
+//     predecessors (successors) of its blocks are in it. So the facts computed
+//     by an IntraPAN restricted to the region are those of the whole function.
+//  2. The analyzed region of a function is memoized across the queries: a
+//     query in it is a lookup, and a query out of it extends it with the new
+//     slice, analyzing only the new blocks (the facts of the region analyzed
+//     before are final, and flow into the new blocks).
+//  3. Once the region would exceed a fraction of the blocks of the function,
+//     the whole function is solved instead (by IntraPAN, as by AnalyzeFunction).
+
+import (
+	"fmt"
+	"sync"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The default fraction of the blocks of a function over which
+// a query solves the whole function (see PointQueries.SetMaxRegion).
+const DefaultMaxQueryRegion = 0.5
+
+// The counters of the queries answered by a PointQueries.
+type QueryStats struct {
+	Queries   uint64 // the queries answered
+	Hits      uint64 // the queries answered from the facts computed before
+	Solves    uint64 // the regions analyzed (or extended)
+	Fallbacks uint64 // the functions solved entirely
+	BBs       uint64 // the blocks added to the analyzed regions
+}
+
+// The memoized facts of an analysis on a function.
+type querySolution struct {
+	newAnalysis AnalysisFactory
+	intra       *IntraPAN
+	insnBB      map[spir.InsnId]spir.BasicBlockId
+	order       []spir.BasicBlockId // the blocks in the visiting order of the analysis
+	full        bool                // the whole function is solved
+}
+
+type queryKey struct {
+	funcId   spir.EntityId
+	analysis string
+}
+
+// PointQueries answers the queries of the facts of the analyses at the
+// instructions of the functions of a TU. It is safe for concurrent use.
+type PointQueries struct {
+	mu               sync.Mutex
+	tu               *spir.TU
+	analyses         map[string]AnalysisFactory
+	skipCallsKnob    bool
+	meetAtBasicBlock bool
+	maxRegion        float64
+	solutions        map[queryKey]*querySolution
+	stats            QueryStats
+}
+
+func NewPointQueries(tu *spir.TU, skipCallsKnob bool, meetAtBasicBlock bool) *PointQueries {
+	return &PointQueries{
+		tu:               tu,
+		analyses:         make(map[string]AnalysisFactory),
+		skipCallsKnob:    skipCallsKnob,
+		meetAtBasicBlock: meetAtBasicBlock,
+		maxRegion:        DefaultMaxQueryRegion,
+		solutions:        make(map[queryKey]*querySolution),
+	}
+}
+
+// AddAnalysis registers the analysis queried with the name.
+func (q *PointQueries) AddAnalysis(name string, newAnalysis AnalysisFactory) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	q.analyses[name] = newAnalysis
+}
+
+// SetMaxRegion sets the fraction of the blocks of a function over which
+// the whole function is solved (0 always solves it; 1 never falls back).
+func (q *PointQueries) SetMaxRegion(fraction float64) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	q.maxRegion = fraction
+}
+
+func (q *PointQueries) Stats() QueryStats {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	return q.stats
+}
+
+// Forget drops the memoized facts of the function (e.g. once it is edited).
+func (q *PointQueries) Forget(funcId spir.EntityId) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	for key := range q.solutions {
+		if key.funcId == funcId {
+			delete(q.solutions, key)
+		}
+	}
+}
+
+// Query returns the (IN, OUT) fact of the analysis at the instruction of the function.
+func (q *PointQueries) Query(fun *spir.Function, insnId spir.InsnId, analysis string) (lattice.Pair, error) {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	if fun.Body() == nil {
+		return lattice.Pair{}, fmt.Errorf("function %s has no body", fun.Name())
+	}
+	key := queryKey{funcId: fun.Id(), analysis: analysis}
+	sol, ok := q.solutions[key]
+	if !ok {
+		newAnalysis, ok := q.analyses[analysis]
+		if !ok {
+			return lattice.Pair{}, fmt.Errorf("unknown analysis %q", analysis)
+		}
+		sol = q.newSolution(fun, newAnalysis)
+		q.solutions[key] = sol
+	}
+
+	bbId, ok := sol.insnBB[insnId]
+	if !ok {
+		return lattice.Pair{}, fmt.Errorf("instruction %v is not in function %s", insnId, fun.Name())
+	}
+	q.stats.Queries++
+	if sol.full || sol.intra.region[bbId] {
+		q.stats.Hits++
+		return sol.intra.storedFact(insnId), nil
+	}
+
+	newBBs, size := sol.slice(bbId)
+	if float64(size) > q.maxRegion*float64(len(sol.order)) {
+		q.solveAll(sol, fun)
+	} else {
+		q.stats.Solves++
+		q.stats.BBs += uint64(len(newBBs))
+		sol.intra.analyzeRegion(newBBs)
+	}
+	return sol.intra.storedFact(insnId), nil
+}
+
+// newIntra creates an IntraPAN of a fresh analysis object on the function,
+// with a fresh context of its own (as AnalyzeFunction).
+func (q *PointQueries) newIntra(fun *spir.Function, newAnalysis AnalysisFactory) *IntraPAN {
+	ctx := spir.NewContext(q.tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an := newAnalysis()
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+
+	intra := newIntraPAN(spir.GetNextContextId(), an, fun.Body(), ctx, q.skipCallsKnob, q.meetAtBasicBlock)
+	intra.initialize()
+	return intra
+}
+
+// newSolution creates the (empty) solution of the analysis on the function.
+func (q *PointQueries) newSolution(fun *spir.Function, newAnalysis AnalysisFactory) *querySolution {
+	intra := q.newIntra(fun, newAnalysis)
+	intra.region = make(map[spir.BasicBlockId]bool)
+	sol := &querySolution{
+		newAnalysis: newAnalysis,
+		intra:       intra,
+		insnBB:      make(map[spir.InsnId]spir.BasicBlockId),
+		order:       spir.GetBBWorklist(fun.Body(), intra.analysis.VisitingOrder()),
+	}
+	for _, bbId := range sol.order {
+		bb := fun.Body().BasicBlock(bbId)
+		for i := range bb.InsnCount() {
+			sol.insnBB[bb.Insn(i).Id()] = bbId
+		}
+	}
+	return sol
+}
+
+// solveAll solves the whole function, from scratch (as AnalyzeFunction).
+func (q *PointQueries) solveAll(sol *querySolution, fun *spir.Function) {
+	q.stats.Fallbacks++
+	q.stats.BBs += uint64(len(sol.order))
+	intra := q.newIntra(fun, sol.newAnalysis)
+	intra.AnalyzeGraph()
+	sol.intra, sol.full = intra, true
+}
+
+// slice returns the blocks of the slice of the block (the blocks reaching it
+// for a forward analysis, else the blocks reached from it) not analyzed yet,
+// in the visiting order, and the size of the analyzed region with them.
+func (sol *querySolution) slice(bbId spir.BasicBlockId) ([]spir.BasicBlockId, int) {
+	backward := sol.intra.analysis.VisitingOrder() == spir.PostOrder
+	region := sol.intra.region
+	seen := map[spir.BasicBlockId]bool{bbId: true}
+	stack := []*spir.BasicBlock{sol.intra.graph.BasicBlock(bbId)}
+	for len(stack) > 0 {
+		bb := stack[len(stack)-1]
+		stack = stack[:len(stack)-1]
+		next, count := bb.Pred, bb.PredCount()
+		if backward {
+			next, count = bb.Succ, bb.SuccCount()
+		}
+		for i := range count {
+			// The analyzed region is closed: its slices are in it.
+			if nb := next(i); !seen[nb.Id()] && !region[nb.Id()] {
+				seen[nb.Id()] = true
+				stack = append(stack, nb)
+			}
+		}
+	}
+
+	var newBBs []spir.BasicBlockId
+	for _, id := range sol.order {
+		if seen[id] {
+			newBBs = append(newBBs, id) // Skips the unreachable blocks.
+		}
+	}
+	return newBBs, len(region) + len(newBBs)
+}
+
+// analyzeRegion adds the blocks to the region analyzed, and analyzes them
+// until they converge, the region analyzed before being final: its facts
+// flow into the new blocks, but not the other way around.
+func (intra *IntraPAN) analyzeRegion(newBBs []spir.BasicBlockId) {
+	for _, bbId := range newBBs {
+		intra.region[bbId] = true
+	}
+
+	backward := intra.analysis.VisitingOrder() == spir.PostOrder
+	for _, bbId := range newBBs {
+		bb := intra.graph.BasicBlock(bbId)
+		if !backward {
+			// The blocks not analyzed yet have Top facts.
+			entry := intra.GetFactMapValue(bb.EntryInsnId())
+			intra.SetFactMapValue(bb.EntryInsnId(), lattice.NewPair(intra.predsOutFact(bb), entry.L2(), entry.FactId()))
+			continue
+		}
+		for i := range bb.SuccCount() {
+			succ := bb.Succ(i)
+			exit := intra.GetFactMapValue(bb.ExitInsnId())
+			intra.SetFactMapValue(bb.ExitInsnId(),
+				SetPredOutFact(bb, exit, i, intra.GetFactMapValue(succ.EntryInsnId()).L1()))
+		}
+	}
+
+	// Only the new blocks are pending; the rest of the worklist is scratch.
+	worklist := make([]spir.BasicBlockId, len(intra.region))
+	copy(worklist, newBBs)
+	intra.wl = &BBWorklist{graph: intra.graph, worklist: worklist, stackTop: len(newBBs) - 1}
+	intra.AnalyzeGraph()
+}
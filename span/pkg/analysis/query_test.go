@@ -0,0 +1,61 @@
+package analysis
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestPointQueries(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_Loops(3) // init, 3 loops (head and body), ret and exit
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	c1, c1000 := tu.NewConst(1, spir.Int32QT), tu.NewConst(1000, spir.Int32QT)
+	newRange := func() Analysis {
+		return &testRangeClient{v: tu.GetEntityId("i"), bound: 1000, lits: map[spir.EntityId]int32{c1: 1, c1000: 1000}}
+	}
+	newBackward := func() Analysis { return &testBackwardClient{} }
+
+	queries := NewPointQueries(tu, false, false)
+	queries.AddAnalysis("range", newRange)
+	queries.AddAnalysis("backward", newBackward)
+	want := map[string]AnalysisFactMap{
+		"range":    AnalyzeFunction(tu, main, newRange(), false, false).FactMap,
+		"backward": AnalyzeFunction(tu, main, newBackward(), false, false).FactMap,
+	}
+
+	head1 := main.Body().EntryBlock().TrueSucc()
+	body1 := head1.TrueSucc()
+	head3 := head1.FalseSucc().FalseSucc()
+	retBB := head3.FalseSucc()
+	query := func(bb *spir.BasicBlock, analysis string, wantStats QueryStats) {
+		t.Helper()
+		insnId := bb.ExitInsnId()
+		got, err := queries.Query(main, insnId, analysis)
+		if err != nil {
+			t.Fatalf("query %v: %v", insnId, err)
+		}
+		fact := want[analysis][insnId]
+		if !lattice.Equals(got.L1(), fact.L1()) || !lattice.Equals(got.L2(), fact.L2()) {
+			t.Errorf("%s at %v: expected %v, got %v", analysis, insnId, fact, got)
+		}
+		if stats := queries.Stats(); stats != wantStats {
+			t.Errorf("%s at %v: expected the stats %+v, got %+v", analysis, insnId, wantStats, stats)
+		}
+	}
+
+	// Forward: the blocks reaching body1 (init, head1, body1).
+	query(body1, "range", QueryStats{Queries: 1, Solves: 1, BBs: 3})
+	query(head1, "range", QueryStats{Queries: 2, Hits: 1, Solves: 1, BBs: 3})
+	// The blocks reaching ret are all but exit: the function is solved.
+	query(retBB, "range", QueryStats{Queries: 3, Hits: 1, Solves: 1, Fallbacks: 1, BBs: 12})
+	// Backward: the blocks reached from ret (ret, exit), then from head3.
+	query(retBB, "backward", QueryStats{Queries: 4, Hits: 1, Solves: 2, Fallbacks: 1, BBs: 14})
+	query(head3, "backward", QueryStats{Queries: 5, Hits: 1, Solves: 3, Fallbacks: 1, BBs: 16})
+
+	if _, err := queries.Query(main, head1.ExitInsnId(), "unknown"); err == nil {
+		t.Errorf("expected an error for an unknown analysis")
+	}
+}
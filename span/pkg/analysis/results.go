@@ -0,0 +1,227 @@
+package analysis
+
+// This file defines the writers used to stream the results of an analysis.
+// A result is written (and flushed) as soon as a function's analysis converges,
+// so that the memory held does not grow with the number of functions analyzed
+// and a consumer can start reading before the whole TU has been analyzed.
+//
+// Three formats are supported:
+//  1. JSON: one JSON object per function, one per line (JSON lines).
+//  2. Binary: a magic header followed by one length-prefixed record per function.
+//  3. Facts: the facts encoded by their lattice kinds, with an index (see factsresults.go).
+
+import (
+	"bufio"
+	"encoding/binary"
+	"encoding/json"
+	"fmt"
+	"io"
+	"slices"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+type ResultFormat uint8
+
+const (
+	JSONResultFormat   ResultFormat = 1
+	BinaryResultFormat ResultFormat = 2
+	FactsResultFormat  ResultFormat = 3
+)
+
+func ParseResultFormat(name string) (ResultFormat, error) {
+	switch name {
+	case "json":
+		return JSONResultFormat, nil
+	case "bin", "binary":
+		return BinaryResultFormat, nil
+	case "facts":
+		return FactsResultFormat, nil
+	}
+	return 0, fmt.Errorf("unknown result format %q (expected json, bin or facts)", name)
+}
+
+// Magic bytes at the start of a binary result stream.
+const BinaryResultMagic = "SPNR"
+
+// Header information written with each function's result.
+type ResultHeader struct {
+	TUName       string
+	AnalysisName string
+	FuncName     string
+}
+
+// A ResultWriter streams the per function results of analyses.
+type ResultWriter interface {
+	WriteFuncResult(header ResultHeader, res *FuncResult) error
+	// WriteRenderedResult writes a result rendered earlier (e.g. loaded from a ResultStore).
+	WriteRenderedResult(header ResultHeader, res *RenderedResult) error
+	// Close completes the output (e.g. the index of the facts format).
+	// Closing it again does nothing.
+	Close() error
+}
+
+func NewResultWriter(w io.Writer, format ResultFormat) (ResultWriter, error) {
+	switch format {
+	case JSONResultFormat:
+		return &jsonResultWriter{w: bufio.NewWriter(w)}, nil
+	case BinaryResultFormat:
+		bw := &binaryResultWriter{w: bufio.NewWriter(w)}
+		if _, err := bw.w.WriteString(BinaryResultMagic); err != nil {
+			return nil, err
+		}
+		return bw, nil
+	case FactsResultFormat:
+		fw := newFactsResultWriter(bufio.NewWriter(w))
+		if err := fw.writeHeader(); err != nil {
+			return nil, err
+		}
+		return fw, nil
+	}
+	return nil, fmt.Errorf("unknown result format %d", format)
+}
+
+// SortedInsnIds returns the instruction ids in the fact map in ascending order.
+func (fm AnalysisFactMap) SortedInsnIds() []spir.InsnId {
+	ids := make([]spir.InsnId, 0, len(fm))
+	for id := range fm {
+		ids = append(ids, id)
+	}
+	slices.Sort(ids)
+	return ids
+}
+
+// The IN and OUT facts of an instruction, rendered as strings.
+type RenderedFact struct {
+	InsnId spir.InsnId `json:"insn"`
+	In     string      `json:"in"`
+	Out    string      `json:"out"`
+}
+
+// The facts of a function as written by a ResultWriter,
+// in the ascending order of the instruction ids.
+type RenderedResult struct {
+	FuncId spir.EntityId  `json:"funcId"`
+	Facts  []RenderedFact `json:"facts"`
+}
+
+func RenderFuncResult(res *FuncResult) *RenderedResult {
+	rendered := &RenderedResult{
+		FuncId: res.FuncId,
+		Facts:  make([]RenderedFact, 0, len(res.FactMap)),
+	}
+	for _, insnId := range res.FactMap.SortedInsnIds() {
+		pair := res.FactMap[insnId]
+		rendered.Facts = append(rendered.Facts, RenderedFact{
+			InsnId: insnId,
+			In:     lattice.String(pair.L1()),
+			Out:    lattice.String(pair.L2()),
+		})
+	}
+	return rendered
+}
+
+type jsonFuncResult struct {
+	TU       string         `json:"tu"`
+	Analysis string         `json:"analysis"`
+	Func     string         `json:"func"`
+	FuncId   spir.EntityId  `json:"funcId"`
+	Facts    []RenderedFact `json:"facts"`
+}
+
+type jsonResultWriter struct {
+	w *bufio.Writer
+}
+
+func (jw *jsonResultWriter) WriteFuncResult(header ResultHeader, res *FuncResult) error {
+	return jw.WriteRenderedResult(header, RenderFuncResult(res))
+}
+
+func (jw *jsonResultWriter) WriteRenderedResult(header ResultHeader, res *RenderedResult) error {
+	out := jsonFuncResult{
+		TU:       header.TUName,
+		Analysis: header.AnalysisName,
+		Func:     header.FuncName,
+		FuncId:   res.FuncId,
+		Facts:    res.Facts,
+	}
+	data, err := json.Marshal(out)
+	if err != nil {
+		return err
+	}
+	data = append(data, '\n')
+	if _, err := jw.w.Write(data); err != nil {
+		return err
+	}
+	return jw.w.Flush()
+}
+
+func (jw *jsonResultWriter) Close() error {
+	return jw.w.Flush()
+}
+
+// The binary record of a function is:
+//
+//	uvarint(record length) | uvarint(func id) | str(tu) | str(analysis) | str(func)
+//	uvarint(fact count) | { uvarint(insn id) | str(in) | str(out) }*
+//
+// where str(s) is uvarint(len(s)) followed by the bytes of s.
+type binaryResultWriter struct {
+	w   *bufio.Writer
+	buf []byte
+}
+
+func appendStr(buf []byte, s string) []byte {
+	buf = binary.AppendUvarint(buf, uint64(len(s)))
+	return append(buf, s...)
+}
+
+func (bw *binaryResultWriter) WriteFuncResult(header ResultHeader, res *FuncResult) error {
+	rec := bw.buf[:0]
+	rec = binary.AppendUvarint(rec, uint64(res.FuncId))
+	rec = appendStr(rec, header.TUName)
+	rec = appendStr(rec, header.AnalysisName)
+	rec = appendStr(rec, header.FuncName)
+	rec = binary.AppendUvarint(rec, uint64(len(res.FactMap)))
+	for _, insnId := range res.FactMap.SortedInsnIds() {
+		pair := res.FactMap[insnId]
+		rec = binary.AppendUvarint(rec, uint64(insnId))
+		rec = appendStr(rec, lattice.String(pair.L1()))
+		rec = appendStr(rec, lattice.String(pair.L2()))
+	}
+	return bw.writeRecord(rec)
+}
+
+func (bw *binaryResultWriter) WriteRenderedResult(header ResultHeader, res *RenderedResult) error {
+	rec := bw.buf[:0]
+	rec = binary.AppendUvarint(rec, uint64(res.FuncId))
+	rec = appendStr(rec, header.TUName)
+	rec = appendStr(rec, header.AnalysisName)
+	rec = appendStr(rec, header.FuncName)
+	rec = binary.AppendUvarint(rec, uint64(len(res.Facts)))
+	for _, fact := range res.Facts {
+		rec = binary.AppendUvarint(rec, uint64(fact.InsnId))
+		rec = appendStr(rec, fact.In)
+		rec = appendStr(rec, fact.Out)
+	}
+	return bw.writeRecord(rec)
+}
+
+func (bw *binaryResultWriter) writeRecord(rec []byte) error {
+	bw.buf = rec // reuse the buffer for the next record
+
+	var lenBuf [binary.MaxVarintLen64]byte
+	n := binary.PutUvarint(lenBuf[:], uint64(len(rec)))
+	if _, err := bw.w.Write(lenBuf[:n]); err != nil {
+		return err
+	}
+	if _, err := bw.w.Write(rec); err != nil {
+		return err
+	}
+	return bw.w.Flush()
+}
+
+func (bw *binaryResultWriter) Close() error {
+	return bw.w.Flush()
+}
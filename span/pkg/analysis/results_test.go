@@ -0,0 +1,166 @@
+package analysis
+
+import (
+	"bufio"
+	"bytes"
+	"encoding/binary"
+	"encoding/json"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestResultWriters(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_A()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	res := AnalyzeFunction(tu, main, newTestForwardClient(), false, false)
+	header := ResultHeader{TUName: "a.spir.pb", AnalysisName: "test", FuncName: main.Name()}
+
+	// JSON: one object per line
+	var jsonBuf bytes.Buffer
+	jw, err := NewResultWriter(&jsonBuf, JSONResultFormat)
+	if err != nil {
+		t.Fatal(err)
+	}
+	for range 2 {
+		if err := jw.WriteFuncResult(header, &res); err != nil {
+			t.Fatal(err)
+		}
+	}
+	scanner := bufio.NewScanner(&jsonBuf)
+	lines := 0
+	for scanner.Scan() {
+		var got jsonFuncResult
+		if err := json.Unmarshal(scanner.Bytes(), &got); err != nil {
+			t.Fatalf("line %d: %v", lines, err)
+		}
+		if got.Func != spir.K_MAIN_FUNC_NAME || got.FuncId != main.Id() || len(got.Facts) != len(res.FactMap) {
+			t.Errorf("line %d: unexpected result %+v", lines, got)
+		}
+		lines++
+	}
+	if lines != 2 {
+		t.Errorf("expected 2 lines, got %d", lines)
+	}
+
+	// Binary: magic, then length prefixed records
+	var binBuf bytes.Buffer
+	bw, err := NewResultWriter(&binBuf, BinaryResultFormat)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := bw.WriteFuncResult(header, &res); err != nil {
+		t.Fatal(err)
+	}
+	data := binBuf.Bytes()
+	if string(data[:len(BinaryResultMagic)]) != BinaryResultMagic {
+		t.Fatalf("missing magic: %q", data[:len(BinaryResultMagic)])
+	}
+	data = data[len(BinaryResultMagic):]
+	recLen, n := binary.Uvarint(data)
+	if n <= 0 || int(recLen) != len(data)-n {
+		t.Fatalf("bad record length %d (n=%d) for %d bytes", recLen, n, len(data))
+	}
+	fid, _ := binary.Uvarint(data[n:])
+	if spir.EntityId(fid) != main.Id() {
+		t.Errorf("expected func id %v, got %v", main.Id(), fid)
+	}
+}
+
+func TestFactsResultWriter(t *testing.T) {
+	a, b, c := spir.EntityId(5), spir.EntityId(9), spir.EntityId(200)
+	setAC := spir.NewEidSet(false, false)
+	setAC.Add(a)
+	setAC.Add(c)
+	setB := spir.NewEidSet(false, false)
+	setB.Add(b)
+	kv := lattice.NewKVLatticeImpl(nil, lattice.NIL_FACT_ID, 4)
+	kv.Set(b, lattice.NewRangeLT(spir.K_VK_TINT32, lattice.Int32ToUint64(-1), 7), true)
+
+	res := &FuncResult{FuncId: 42, FactMap: AnalysisFactMap{
+		3: lattice.NewPair(nil, lattice.NewRangeLT(spir.K_VK_TINT32, lattice.Int32ToUint64(-2), 3), lattice.NIL_FACT_ID),
+		1: lattice.NewPair(lattice.NewMaySetLattice(*setAC, false), lattice.NewMaySetLattice(*setB, false), lattice.NIL_FACT_ID),
+		2: lattice.NewPair(&lattice.TopBotLatticeBot, kv, lattice.NIL_FACT_ID),
+	}}
+	header := ResultHeader{TUName: "a.spir.pb", AnalysisName: "test", FuncName: "f"}
+
+	var buf bytes.Buffer
+	fw, err := NewResultWriter(&buf, FactsResultFormat)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := fw.WriteFuncResult(header, res); err != nil {
+		t.Fatal(err)
+	}
+	if err := fw.Close(); err != nil {
+		t.Fatal(err)
+	}
+	size := buf.Len()
+	if err := fw.Close(); err != nil || buf.Len() != size {
+		t.Fatalf("expected a second close to write nothing, got %d more bytes (%v)", buf.Len()-size, err)
+	}
+
+	data := buf.Bytes()
+	le := binary.LittleEndian
+	if string(data[:8]) != FactsResultMagic || le.Uint32(data[8:]) != FactsResultVersion {
+		t.Fatalf("bad header %q", data[:factsHeaderSize])
+	}
+	if len(data)%8 != 0 || string(data[len(data)-8:]) != FactsResultMagic {
+		t.Fatalf("bad footer (%d bytes)", len(data))
+	}
+	footer := data[len(data)-factsFooterSize:]
+	indexOffset, funcCount := le.Uint64(footer[16:]), le.Uint64(footer[24:])
+	if funcCount != 1 {
+		t.Fatalf("expected 1 function, got %d", funcCount)
+	}
+	entry := data[indexOffset : indexOffset+factsIndexEntrySize]
+	chunk := data[le.Uint64(entry):]
+	if spir.EntityId(le.Uint32(entry[8:])) != res.FuncId {
+		t.Errorf("expected func id %v, got %v", res.FuncId, le.Uint32(entry[8:]))
+	}
+	insns, universe, words, kvs := le.Uint32(entry[24:]), le.Uint32(entry[28:]), le.Uint32(entry[32:]), le.Uint32(entry[36:])
+	if insns != 3 || universe != 3 || words != 2 || kvs != 1 {
+		t.Fatalf("expected 3 insns, 3 universe, 2 words and 1 kv, got %d %d %d %d", insns, universe, words, kvs)
+	}
+
+	const records = 16 // after the insn ids, padded to 8 bytes
+	for i, want := range []uint32{1, 2, 3} {
+		if got := le.Uint32(chunk[4*i:]); got != want {
+			t.Errorf("insn %d: expected id %d, got %d", i, want, got)
+		}
+	}
+	record := func(i int) []byte { return chunk[records+i*factsRecordSize:] }
+	in := func(i int) []byte { return record(i) }
+	out := func(i int) []byte { return record(3 + i) }
+	if FactKind(in(0)[0]) != SetFact || le.Uint32(in(0)[4:]) != 2 || FactKind(out(0)[0]) != SetFact {
+		t.Errorf("insn 1: expected sets, got kinds %d and %d", in(0)[0], out(0)[0])
+	}
+	if FactKind(in(1)[0]) != TopBotFact || in(1)[1] != FactFlagBot || FactKind(out(1)[0]) != KVFact {
+		t.Errorf("insn 2: expected a bot and a kv, got kinds %d and %d", in(1)[0], out(1)[0])
+	}
+	if FactKind(in(2)[0]) != NilFact || FactKind(out(2)[0]) != RangeFact ||
+		lattice.Uint64ToInt32(le.Uint64(out(2)[8:])) != -2 || le.Uint64(out(2)[16:]) != 3 {
+		t.Errorf("insn 3: expected nil and [-2, 3], got %v", out(2)[:factsRecordSize])
+	}
+	pos := records + 6*factsRecordSize
+
+	for i, want := range []spir.EntityId{a, b, c} {
+		if got := spir.EntityId(le.Uint32(chunk[pos+4*i:])); got != want {
+			t.Errorf("universe %d: expected %v, got %v", i, want, got)
+		}
+	}
+	pos += 16
+	inWord, outWord := le.Uint64(chunk[pos+8*int(le.Uint64(in(0)[8:])):]), le.Uint64(chunk[pos+8*int(le.Uint64(out(0)[8:])):])
+	if inWord != 0b101 || outWord != 0b010 {
+		t.Errorf("expected the bitsets 101 and 010, got %b and %b", inWord, outWord)
+	}
+	pos += 16
+
+	kvEntry := chunk[pos:]
+	if spir.EntityId(le.Uint32(kvEntry)) != b || FactKind(kvEntry[8]) != RangeFact || le.Uint64(kvEntry[24:]) != 7 {
+		t.Errorf("expected the entry %v: [-1, 7], got %v", b, kvEntry[:factsKVRecordSize])
+	}
+}
@@ -0,0 +1,553 @@
+package analysis
+
+// This file defines a sparse (def-use driven) engine for the forward
+// analyses whose facts map each entity to a value, as in an
+// EntityIdMapKVLattice (e.g. constant or range propagation).
+//
+// Instead of a whole fact at each program point, the engine keeps a value
+// per definition of a variable:
+//  1. The definitions (defs) are: an entry def of each variable used or
+//     defined in the function, a strong def for each assignment to a
+//     variable, and a clobber def for each variable a call or a store
+//     through a pointer may modify (as decided by the client).
+//  2. The reaching defs are computed once with bit vectors (over the defs)
+//     at the basic block boundaries. A walk over each block then connects
+//     each operand of a def to the defs reaching it (def-use chains).
+//  3. The value of a def is computed from the values of the defs reaching
+//     its operands, and is propagated along the def-use edges only.
+//
+// A clobber def is a weak update: it does not kill the other defs of the
+// variable, so the value at a use is the meet of all the reaching defs.
+// A point query walks back to the reaching defs of the entity, hence the
+// memory held is proportional to the defs and uses (plus the reaching defs
+// bits at block entries), not to the instructions times the variables.
+
+import (
+	"slices"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// A SparseAnalysis is a forward analysis computing a value per variable.
+// The engine ignores its VisitingOrder.
+type SparseAnalysis interface {
+	Analysis
+
+	// EntryValue returns the value of the variable at the function entry.
+	EntryValue(eid spir.EntityId, ctx *spir.Context) lattice.ConstLattice
+	// DefValue returns the value the instruction assigns to its lhs variable.
+	// The operand function returns the value of a variable at the instruction
+	// (nil, i.e. Top, for the non-variables such as the literals, and for the
+	// arguments of a call, see sparseInsnUses).
+	DefValue(insn spir.Insn, operand func(spir.EntityId) lattice.ConstLattice,
+		ctx *spir.Context) lattice.ConstLattice
+	// ClobberValue returns the value the instruction (a call or a store
+	// through a pointer) may assign to the variable, or nil if it doesn't
+	// modify the variable.
+	ClobberValue(insn spir.Insn, eid spir.EntityId, ctx *spir.Context) lattice.ConstLattice
+}
+
+// The number of updates of a def before its value is widened.
+const SparseWidenDelay = 3
+
+type sparseDefKind uint8
+
+const (
+	sparseEntryDef sparseDefKind = iota
+	sparseStrongDef
+	sparseClobberDef
+)
+
+// The reaching defs of an operand of a def.
+type sparseUse struct {
+	eid  spir.EntityId
+	defs []int32
+}
+
+type sparseDef struct {
+	kind    sparseDefKind
+	eid     spir.EntityId
+	insn    spir.Insn
+	pos     int32 // position of insn in its basic block (-1 for an entry def)
+	updates int32
+	value   lattice.ConstLattice
+	uses    []sparseUse // of a strong def
+	users   []int32     // the strong defs using this def
+}
+
+// SparsePAN is the sparse counterpart of IntraPAN, for a SparseAnalysis.
+type SparsePAN struct {
+	ctxId    spir.ContextId
+	context  *spir.Context
+	analysis SparseAnalysis
+	graph    spir.Graph
+	interner *lattice.Interner
+
+	vars    []spir.EntityId           // the variables tracked, sorted
+	defsOf  map[spir.EntityId][]int32 // variable -> its defs
+	defs    []sparseDef               // entry defs first, then in block order
+	bbs     []*spir.BasicBlock        // in reverse post order
+	bbDefs  [][2]int32                // the range of defs of each block
+	bbIn    []bitVec                  // the defs reaching each block's entry
+	insnPos map[spir.InsnId][2]int32  // instruction -> (block index, position)
+	solved  bool
+
+	current *sparseDef // the def being evaluated (see operand)
+	factMap AnalysisFactMap
+
+	stats  *EngineStats // the performance counters (nil: not counted)
+	visits []int        // of each def (only if counted)
+}
+
+func NewSparsePAN(ctxId spir.ContextId, analysis SparseAnalysis,
+	graph spir.Graph, context *spir.Context) *SparsePAN {
+	sp := &SparsePAN{
+		ctxId:    ctxId,
+		context:  context,
+		analysis: analysis,
+		graph:    graph,
+		interner: lattice.NewInterner(),
+		defsOf:   make(map[spir.EntityId][]int32),
+		insnPos:  make(map[spir.InsnId][2]int32),
+	}
+	sp.build()
+	return sp
+}
+
+// InsnDefs classifies the definitions of an instruction: the variable it
+// assigns (NIL_ID if none), and if it may modify other variables (a call or
+// a store through a pointer). A SparseAnalysis may use it in its AnalyzeInsn,
+// to define the same facts with IntraPAN.
+func InsnDefs(insn spir.Insn) (lhsVar spir.EntityId, clobbers bool) {
+	switch insn.InsnKind() {
+	case spir.K_IK_IASGN_SIMPLE, spir.K_IK_IASGN_RHS_OP, spir.K_IK_IASGN_CALL:
+		lhs := insn.LhsX()
+		if lhs.IsSimple() && lhs.GetOpr1().Kind().IsVariable() {
+			lhsVar = lhs.GetOpr1()
+		} else {
+			clobbers = true
+		}
+		return lhsVar, clobbers || insn.InsnKind() == spir.K_IK_IASGN_CALL
+	case spir.K_IK_IASGN_LHS_OP, spir.K_IK_IASGN_SELF, spir.K_IK_IASGN_PHI, spir.K_IK_ICALL:
+		return spir.NIL_ID, true
+	}
+	return spir.NIL_ID, false
+}
+
+// sparseInsnUses calls yield on the variables read by the instruction.
+// The arguments of a call are not yielded: the instruction holds only the id
+// of its call site (the arguments are in the TU). Hence the DefValue of an
+// assignment of a call can't depend on the values of its arguments.
+func sparseInsnUses(insn spir.Insn, yield func(eid spir.EntityId)) {
+	var eids [4]spir.EntityId
+	if insn.IsAssign() && insn.InsnKind() != spir.K_IK_IASGN_SELF {
+		if rhs := insn.RhsX(); !rhs.IsCall() { // the operands of a call are its ids
+			eids[0], eids[1] = rhs.GetOperands()
+		}
+		if lhs := insn.LhsX(); !lhs.IsSimple() {
+			eids[2], eids[3] = lhs.GetOperands() // e.g. p in *p = x
+		}
+	} else if insn.InsnKind() != spir.K_IK_ICALL {
+		eids[0], eids[1], eids[2] = insn.GetOperands()
+	}
+	for _, eid := range eids {
+		if eid != spir.NIL_ID && eid.Kind().IsVariable() {
+			yield(eid)
+		}
+	}
+}
+
+func (sp *SparsePAN) newDef(def sparseDef) int32 {
+	d := int32(len(sp.defs))
+	sp.defs = append(sp.defs, def)
+	sp.defsOf[def.eid] = append(sp.defsOf[def.eid], d)
+	return d
+}
+
+func (sp *SparsePAN) intern(l lattice.ConstLattice) lattice.ConstLattice {
+	if h, ok := l.(lattice.HashedLattice); ok && h != nil {
+		return sp.interner.Intern(h)
+	}
+	return l
+}
+
+// build creates the defs, computes the reaching defs and the def-use chains.
+func (sp *SparsePAN) build() {
+	order := spir.GetBBWorklist(sp.graph, spir.ReversePostOrder)
+	slices.Reverse(order) // the worklist is popped from its end
+	bbIndex := make(map[spir.BasicBlockId]int32, len(order))
+	for _, bbId := range order {
+		if _, ok := bbIndex[bbId]; !ok {
+			bbIndex[bbId] = int32(len(sp.bbs))
+			sp.bbs = append(sp.bbs, sp.graph.BasicBlock(bbId))
+		}
+	}
+
+	// 1. The variables tracked, and their entry defs.
+	vars := spir.NewEidSet(false, false)
+	for _, bb := range sp.bbs {
+		for i := range bb.InsnCount() {
+			insn := bb.Insn(i)
+			if lhsVar, _ := InsnDefs(insn); lhsVar != spir.NIL_ID {
+				vars.Add(lhsVar)
+			}
+			sparseInsnUses(insn, func(eid spir.EntityId) { vars.Add(eid) })
+		}
+	}
+	sp.vars = vars.Values()
+	for _, eid := range sp.vars {
+		sp.newDef(sparseDef{kind: sparseEntryDef, eid: eid, pos: -1,
+			value: sp.intern(sp.analysis.EntryValue(eid, sp.context))})
+	}
+
+	// 2. The defs of the instructions, in block order.
+	sp.bbDefs = make([][2]int32, len(sp.bbs))
+	for b, bb := range sp.bbs {
+		sp.bbDefs[b][0] = int32(len(sp.defs))
+		for i := range bb.InsnCount() {
+			insn := bb.Insn(i)
+			sp.insnPos[insn.Id()] = [2]int32{int32(b), int32(i)}
+			lhsVar, clobbers := InsnDefs(insn)
+			if clobbers { // before the strong def, e.g. of x in x = f()
+				for _, eid := range sp.vars {
+					if cv := sp.analysis.ClobberValue(insn, eid, sp.context); cv != nil {
+						sp.newDef(sparseDef{kind: sparseClobberDef, eid: eid, insn: insn,
+							pos: int32(i), value: sp.intern(cv)})
+					}
+				}
+			}
+			if lhsVar != spir.NIL_ID {
+				sp.newDef(sparseDef{kind: sparseStrongDef, eid: lhsVar, insn: insn, pos: int32(i)})
+			}
+		}
+		sp.bbDefs[b][1] = int32(len(sp.defs))
+	}
+
+	sp.computeReachingDefs(bbIndex)
+	sp.connectDefUses()
+}
+
+// applyDef updates the reaching defs with the def.
+func (sp *SparsePAN) applyDef(reaching bitVec, d int32) {
+	if sp.defs[d].kind == sparseStrongDef {
+		for _, other := range sp.defsOf[sp.defs[d].eid] {
+			reaching.unset(other)
+		}
+	}
+	reaching.set(d)
+}
+
+// computeReachingDefs computes the defs reaching the entry of each block.
+func (sp *SparsePAN) computeReachingDefs(bbIndex map[spir.BasicBlockId]int32) {
+	words := bitVecWords(len(sp.defs))
+	slab := make([]uint64, 2*words*len(sp.bbs))
+	sp.bbIn = make([]bitVec, len(sp.bbs))
+	out := make([]bitVec, len(sp.bbs))
+	preds := make([][]int32, len(sp.bbs))
+	succs := make([][]int32, len(sp.bbs))
+	for b, bb := range sp.bbs {
+		sp.bbIn[b], out[b] = bitVec(slab[:words:words]), bitVec(slab[words:2*words:2*words])
+		slab = slab[2*words:]
+		for i := range bb.PredCount() {
+			if p, ok := bbIndex[bb.Pred(i).Id()]; ok {
+				preds[b] = append(preds[b], p)
+				succs[p] = append(succs[p], int32(b))
+			}
+		}
+	}
+
+	entry := sp.graph.EntryBlock()
+	queue := make([]int32, 0, len(sp.bbs))
+	inQueue := make([]bool, len(sp.bbs))
+	for b := range sp.bbs {
+		queue = append(queue, int32(b))
+		inQueue[b] = true
+	}
+	tmp := make(bitVec, words)
+	for len(queue) > 0 {
+		b := queue[0]
+		queue = queue[1:]
+		inQueue[b] = false
+
+		in := sp.bbIn[b]
+		clear(in)
+		if sp.bbs[b] == entry {
+			for d := range len(sp.vars) { // the entry defs
+				in.set(int32(d))
+			}
+		}
+		for _, p := range preds[b] {
+			in.or(out[p])
+		}
+		copy(tmp, in)
+		for d := sp.bbDefs[b][0]; d < sp.bbDefs[b][1]; d++ {
+			sp.applyDef(tmp, d)
+		}
+		if slices.Equal(tmp, out[b]) {
+			continue
+		}
+		copy(out[b], tmp)
+		for _, s := range succs[b] {
+			if !inQueue[s] {
+				inQueue[s] = true
+				queue = append(queue, s)
+			}
+		}
+	}
+}
+
+// connectDefUses links the operands of each strong def to their reaching defs.
+func (sp *SparsePAN) connectDefUses() {
+	for b := range sp.bbs {
+		reaching := slices.Clone(sp.bbIn[b])
+		for d := sp.bbDefs[b][0]; d < sp.bbDefs[b][1]; d++ {
+			def := &sp.defs[d]
+			if def.kind == sparseStrongDef {
+				sparseInsnUses(def.insn, func(eid spir.EntityId) {
+					if slices.ContainsFunc(def.uses, func(u sparseUse) bool { return u.eid == eid }) {
+						return
+					}
+					use := sparseUse{eid: eid}
+					for _, r := range sp.defsOf[eid] {
+						if reaching.has(r) {
+							use.defs = append(use.defs, r)
+							sp.defs[r].users = append(sp.defs[r].users, d)
+						}
+					}
+					def.uses = append(def.uses, use)
+				})
+			}
+			sp.applyDef(reaching, d)
+		}
+	}
+}
+
+func meetConst(l1, l2 lattice.ConstLattice) lattice.ConstLattice {
+	if l1 == nil {
+		return l2
+	}
+	if l2 == nil {
+		return l1
+	}
+	l, _ := lattice.Meet(l1, l2)
+	return l.(lattice.ConstLattice)
+}
+
+func (sp *SparsePAN) meetDefs(defs []int32) lattice.ConstLattice {
+	var val lattice.ConstLattice
+	for _, d := range defs {
+		val = meetConst(val, sp.defs[d].value)
+	}
+	if sp.stats != nil {
+		sp.stats.Meets += uint64(len(defs))
+	}
+	return val
+}
+
+// operand returns the value of the variable at the def being evaluated.
+func (sp *SparsePAN) operand(eid spir.EntityId) lattice.ConstLattice {
+	for _, u := range sp.current.uses {
+		if u.eid == eid {
+			return sp.meetDefs(u.defs)
+		}
+	}
+	return nil
+}
+
+// AnalyzeGraph computes the values of the strong defs, propagating the
+// changes along the def-use edges. A def updated more than
+// SparseWidenDelay times is widened.
+func (sp *SparsePAN) AnalyzeGraph() lattice.FactChanged {
+	factChange := lattice.NoChange
+	if !sp.solved {
+		factChange = lattice.Changed
+	}
+	sp.solved = true
+
+	queue := make([]int32, 0, len(sp.defs))
+	inQueue := make([]bool, len(sp.defs))
+	for d := range sp.defs {
+		if sp.defs[d].kind == sparseStrongDef {
+			queue = append(queue, int32(d))
+			inQueue[d] = true
+		}
+	}
+	operand := sp.operand
+	for len(queue) > 0 {
+		d := queue[0]
+		queue = queue[1:]
+		inQueue[d] = false
+
+		def := &sp.defs[d]
+		sp.current = def
+		val := sp.analysis.DefValue(def.insn, operand, sp.context)
+		if sp.stats != nil {
+			sp.stats.visit(sp.visits[d])
+			sp.visits[d]++
+			sp.stats.InsnTransfers++
+		}
+		if def.updates >= SparseWidenDelay && def.value != nil && val != nil {
+			widened, _ := lattice.Widen(def.value, val)
+			val = widened.(lattice.ConstLattice)
+			if sp.stats != nil {
+				sp.stats.Widens++
+			}
+		}
+		if lattice.Equals(def.value, val) {
+			continue
+		}
+		def.value = sp.intern(val)
+		def.updates++
+		factChange = lattice.Changed
+		for _, u := range def.users {
+			if sp.stats != nil {
+				sp.stats.Changes++
+			}
+			if !inQueue[u] {
+				inQueue[u] = true
+				queue = append(queue, u)
+				if sp.stats != nil {
+					sp.stats.push(sp.visits[u])
+				}
+			}
+		}
+	}
+	sp.current = nil
+	sp.factMap = nil // stale
+	return factChange
+}
+
+// SetStats sets the performance counters to count the work into (nil
+// disables counting). A visit is an evaluation of a def.
+func (sp *SparsePAN) SetStats(stats *EngineStats) {
+	sp.stats = stats
+	if stats != nil && sp.visits == nil {
+		sp.visits = make([]int, len(sp.defs))
+	}
+}
+
+// valueBefore returns the value of the variable before the instruction at
+// position pos of the block b, by walking back to its reaching defs.
+func (sp *SparsePAN) valueBefore(b int32, pos int32, eid spir.EntityId) (lattice.ConstLattice, bool) {
+	defsOf, ok := sp.defsOf[eid]
+	if !ok {
+		return nil, false // not tracked
+	}
+	var val lattice.ConstLattice
+	for d := sp.bbDefs[b][1] - 1; d >= sp.bbDefs[b][0]; d-- {
+		def := &sp.defs[d]
+		if def.pos >= pos || def.eid != eid {
+			continue
+		}
+		val = meetConst(val, def.value)
+		if def.kind == sparseStrongDef {
+			return val, true
+		}
+	}
+	for _, d := range defsOf {
+		if sp.bbIn[b].has(d) {
+			val = meetConst(val, sp.defs[d].value)
+		}
+	}
+	return val, true
+}
+
+// ValueAt returns the value of the variable at the IN (or the OUT, if out)
+// of the instruction. It is false if the variable is not tracked or the
+// instruction is not in the graph.
+func (sp *SparsePAN) ValueAt(insnId spir.InsnId, eid spir.EntityId, out bool) (lattice.ConstLattice, bool) {
+	pos, ok := sp.insnPos[insnId]
+	if !ok {
+		return nil, false
+	}
+	if out {
+		pos[1]++
+	}
+	return sp.valueBefore(pos[0], pos[1], eid)
+}
+
+// Vars returns the variables tracked (sorted). Do not modify.
+func (sp *SparsePAN) Vars() []spir.EntityId {
+	return sp.vars
+}
+
+// DefCount returns the number of defs (including the entry defs).
+func (sp *SparsePAN) DefCount() int {
+	return len(sp.defs)
+}
+
+// KVFact materializes the IN (or the OUT, if out) fact of the instruction
+// as a flat KV lattice of the tracked variables (nil if not in the graph).
+func (sp *SparsePAN) KVFact(insnId spir.InsnId, out bool) *lattice.EntityIdMapKVLattice {
+	if _, ok := sp.insnPos[insnId]; !ok {
+		return nil
+	}
+	point := uint64(lattice.FactIdUB_Point_IN)
+	if out {
+		point = lattice.FactIdUB_Point_OUT
+	}
+	factId := lattice.NIL_FACT_ID.WithFactPoint(point).
+		WithAnalysisId(sp.analysis.InstanceId().AnalysisId()).
+		WithUBEntityId(spir.EntityId(insnId))
+	kv := lattice.NewKVLatticeImpl(nil, factId, max(len(sp.vars), 1))
+	for _, eid := range sp.vars {
+		if val, _ := sp.ValueAt(insnId, eid, out); val != nil {
+			kv.Set(eid, val, true)
+		}
+	}
+	return kv
+}
+
+func (sp *SparsePAN) materialize() {
+	sp.factMap = make(AnalysisFactMap, len(sp.insnPos))
+	factId := lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+		WithAnalysisId(sp.analysis.InstanceId().AnalysisId())
+	for insnId := range sp.insnPos {
+		sp.factMap[insnId] = lattice.NewPair(sp.KVFact(insnId, false), sp.KVFact(insnId, true),
+			factId.WithUBEntityId(spir.EntityId(insnId)))
+	}
+	// Replace the fact map of a previous solve, if any.
+	sp.context.RemoveInfo(uint64(sp.ctxId))
+	sp.context.SetInfo(uint64(sp.ctxId), sp.factMap)
+}
+
+func (sp *SparsePAN) Context() *spir.Context {
+	return sp.context
+}
+
+func (sp *SparsePAN) GetAnalysis() Analysis {
+	return sp.analysis
+}
+
+func (sp *SparsePAN) GetContextId() spir.ContextId {
+	return sp.ctxId
+}
+
+func (sp *SparsePAN) Graph() spir.Graph {
+	return sp.graph
+}
+
+// FactMap materializes the facts of all the instructions (on the first call
+// after AnalyzeGraph). Prefer ValueAt or KVFact for a few program points.
+func (sp *SparsePAN) FactMap() *AnalysisFactMap {
+	if sp.factMap == nil {
+		sp.materialize()
+	}
+	return &sp.factMap
+}
+
+func (sp *SparsePAN) SetFactMapValue(insnId spir.InsnId, fact lattice.Pair) {
+	(*sp.FactMap())[insnId] = fact
+}
+
+func (sp *SparsePAN) GetFactMapValue(insnId spir.InsnId) lattice.Pair {
+	factMap := *sp.FactMap()
+	if _, ok := factMap[insnId]; !ok {
+		factMap[insnId] = lattice.NewPair(nil, nil,
+			lattice.NIL_FACT_ID.WithFactPoint(lattice.FactIdUB_Point_INOUT).
+				WithAnalysisId(sp.analysis.InstanceId().AnalysisId()).
+				WithUBEntityId(spir.EntityId(insnId)))
+	}
+	return factMap[insnId]
+}
@@ -0,0 +1,161 @@
+package analysis
+
+import (
+	"slices"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The sources of the value of a variable: the variables (at the entry) and
+// the literals it is computed from, and the callees that may modify it.
+type testSourcesClient struct {
+	testForwardClient
+	clobbered spir.EntityId // the variable modified by the calls
+}
+
+func sources(eids ...spir.EntityId) lattice.ConstLattice {
+	return lattice.NewMaySetLattice(*spir.NewEidSet(false, false, eids...), false)
+}
+
+func (c *testSourcesClient) EntryValue(eid spir.EntityId, ctx *spir.Context) lattice.ConstLattice {
+	return sources(eid)
+}
+
+func (c *testSourcesClient) DefValue(insn spir.Insn,
+	operand func(spir.EntityId) lattice.ConstLattice, ctx *spir.Context) lattice.ConstLattice {
+	val := sources()
+	eid1, eid2 := insn.RhsX().GetOperands()
+	for _, eid := range []spir.EntityId{eid1, eid2} {
+		switch {
+		case eid == spir.NIL_ID:
+		case eid.Kind().IsVariable():
+			val = meetConst(val, operand(eid))
+		default: // a literal
+			val = meetConst(val, sources(eid))
+		}
+	}
+	return val
+}
+
+func (c *testSourcesClient) ClobberValue(insn spir.Insn, eid spir.EntityId,
+	ctx *spir.Context) lattice.ConstLattice {
+	if eid != c.clobbered {
+		return nil
+	}
+	return sources(insn.GetCallExpr().GetCallee())
+}
+
+func TestSparsePAN(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewTU()
+	int32QT := spir.NewQualVT(&spir.Int32VT, spir.K_QK_QNIL)
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	f := tu.NewFunction("f", funcQT, nil, nil)
+	g := tu.NewVar("g", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, int32QT)
+	x := tu.NewVar("x", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, int32QT)
+	y := tu.NewVar("y", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, int32QT)
+	c10 := tu.NewConst(10, int32QT)
+
+	bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 5)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(g), spir.ValX(y)), nil)                      // g = y
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(x), spir.BinX(spir.K_XK_XADD, g, c10)), nil) // x = g + 10
+	tu.AddInsn(bb, spir.CallI(spir.CallX(f.Id(), tu.NewCallSiteId())), nil)            // f()
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(y), spir.ValX(g)), nil)                      // y = g
+	tu.AddInsn(bb, spir.ReturnI(spir.ValX(x)), nil)                                    // return x
+	main := tu.NewFunction(spir.K_MAIN_FUNC_NAME, funcQT, nil, bb)
+
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(main.Id())
+	sp := NewSparsePAN(spir.GetNextContextId(), &testSourcesClient{clobbered: g}, bb, ctx)
+	if change := sp.AnalyzeGraph(); change != lattice.Changed {
+		t.Fatalf("expected a change, got %v", change)
+	}
+	if got, want := sp.Vars(), spir.NewEidSet(false, false, g, x, y).Values(); !slices.Equal(got, want) {
+		t.Errorf("expected the variables %v to be tracked, got %v", want, got)
+	}
+	// 3 entry defs, 3 strong defs and the clobber of g.
+	if sp.DefCount() != 7 {
+		t.Errorf("expected 7 defs, got %d", sp.DefCount())
+	}
+
+	for _, tc := range []struct {
+		insn int
+		eid  spir.EntityId
+		out  bool
+		want lattice.ConstLattice
+	}{
+		{0, g, false, sources(g)},
+		{0, g, true, sources(y)},
+		{1, x, true, sources(y, c10)},
+		{2, g, false, sources(y)},
+		{3, g, false, sources(y, f.Id())}, // a weak update by the call
+		{3, y, true, sources(y, f.Id())},
+		{4, x, false, sources(y, c10)},
+	} {
+		got, ok := sp.ValueAt(bb.Insn(tc.insn).Id(), tc.eid, tc.out)
+		if !ok || !lattice.Equals(got, tc.want) {
+			t.Errorf("insn %d (out %t), %v: expected %v, got %v", tc.insn, tc.out, tc.eid, tc.want, got)
+		}
+	}
+	if _, ok := sp.ValueAt(bb.Insn(0).Id(), c10, false); ok {
+		t.Error("expected no value for an untracked entity")
+	}
+
+	kv := sp.KVFact(bb.Insn(4).Id(), false)
+	if val, _ := kv.Get(x); !lattice.Equals(val, sources(y, c10)) {
+		t.Errorf("expected x to be {y, 10} in the KV fact, got %v", val)
+	}
+	if got := len(*sp.FactMap()); got != 5 {
+		t.Errorf("expected 5 materialized facts, got %d", got)
+	}
+	if change := sp.AnalyzeGraph(); change != lattice.NoChange {
+		t.Errorf("expected no change on a re-analysis, got %v", change)
+	}
+}
+
+// The values flow along the CFG edges to the uses.
+func TestSparsePAN_cfg(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_B_1()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	res := AnalyzeFunctionWithSolver(tu, main, &testSourcesClient{}, SparseSolver, false, false)
+	if len(res.FactMap) != 5 {
+		t.Fatalf("expected 5 facts, got %d", len(res.FactMap))
+	}
+
+	cfg := main.Body()
+	t1Def := cfg.EntryBlock().Insn(0) // t1 = 0 < argc
+	t1 := t1Def.LhsX().GetOpr1()
+	_, argc := t1Def.RhsX().GetOperands() // the literal 0 is an immediate NIL_ID
+	exitFact := res.FactMap[cfg.ExitBlock().ExitInsnId()].L1().(*lattice.EntityIdMapKVLattice)
+	if val, _ := exitFact.Get(t1); !lattice.Equals(val, sources(argc)) {
+		t.Errorf("expected t1 to be {argc} at the exit, got %v", val)
+	}
+}
+
+// A second solve replaces the fact map of the first in the context.
+func TestSparsePAN_resolve(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_B_1()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	ctx := spir.NewContext(tu)
+	ctx.SetCurrentScopeEid(main.Id())
+	ctxId := spir.GetNextContextId()
+	sp := NewSparsePAN(ctxId, &testSourcesClient{}, main.Body(), ctx)
+
+	sp.AnalyzeGraph()
+	exitId := main.Body().ExitBlock().ExitInsnId()
+	sp.SetFactMapValue(exitId, lattice.NewPair(nil, nil, lattice.NIL_FACT_ID)) // a stale fact
+	sp.AnalyzeGraph()
+	want := (*sp.FactMap())[exitId]
+	value, ok := ctx.GetInfo(uint64(ctxId))
+	if !ok {
+		t.Fatalf("no fact map in the context")
+	}
+	if got := value.(AnalysisFactMap)[exitId]; got.L1() != want.L1() || got.L1() == nil {
+		t.Errorf("expected the fact map of the second solve in the context, got %v", got)
+	}
+}
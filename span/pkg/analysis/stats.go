@@ -0,0 +1,118 @@
+package analysis
+
+// This file defines the performance counters of the solvers, and a report
+// of the counters and the time taken per function and per analysis.
+//
+// The counters are collected only if an EngineStats is given to the solver
+// (see StatsAnalyzer); otherwise each counting site costs a nil check.
+
+import (
+	"cmp"
+	"encoding/json"
+	"io"
+	"slices"
+	"time"
+)
+
+// EngineStats counts the work done by a solver to analyze a function.
+type EngineStats struct {
+	BBVisits      uint64 `json:"bbVisits"`      // basic blocks analyzed (worklist pops)
+	InsnTransfers uint64 `json:"insnTransfers"` // transfer functions applied
+	Meets         uint64 `json:"meets"`         // lattice meets at the joins
+	Widens        uint64 `json:"widens"`        // lattice widenings and narrowings
+	Changes       uint64 `json:"changes"`       // changed facts propagated to a successor
+	Pushes        uint64 `json:"pushes"`        // worklist pushes
+	RePushes      uint64 `json:"rePushes"`      // worklist pushes of a block analyzed before
+	Iterations    uint64 `json:"iterations"`    // the most times a block was analyzed
+}
+
+// Add accumulates the counters of other (Iterations is the maximum).
+func (s *EngineStats) Add(other *EngineStats) {
+	s.BBVisits += other.BBVisits
+	s.InsnTransfers += other.InsnTransfers
+	s.Meets += other.Meets
+	s.Widens += other.Widens
+	s.Changes += other.Changes
+	s.Pushes += other.Pushes
+	s.RePushes += other.RePushes
+	s.Iterations = max(s.Iterations, other.Iterations)
+}
+
+// visit counts a visit of a block (or a def), given its number of visits so far.
+func (s *EngineStats) visit(visits int) {
+	s.BBVisits++
+	s.Iterations = max(s.Iterations, uint64(visits)+1)
+}
+
+// push counts a worklist push of a block (or a def) with the given number of visits.
+func (s *EngineStats) push(visits int) {
+	s.Pushes++
+	if visits > 0 {
+		s.RePushes++
+	}
+}
+
+// A StatsAnalyzer is an Analyzer that counts its work into the given stats
+// (nil disables the counting, the default).
+type StatsAnalyzer interface {
+	Analyzer
+	SetStats(stats *EngineStats)
+}
+
+// The time taken and the counters of an analysis of a function.
+type FuncStats struct {
+	TUName       string        `json:"tu"`
+	FuncName     string        `json:"function"`
+	AnalysisName string        `json:"analysis"`
+	Elapsed      time.Duration `json:"elapsedNs"`
+	Counters     EngineStats   `json:"counters"`
+	// The result was loaded from a ResultStore, hence the counters are zero.
+	Loaded bool `json:"loaded,omitempty"`
+}
+
+// The totals of an analysis over all the functions.
+type AnalysisStats struct {
+	Functions int           `json:"functions"`
+	Loaded    int           `json:"loaded,omitempty"` // the functions of the results loaded
+	Elapsed   time.Duration `json:"elapsedNs"`
+	Counters  EngineStats   `json:"counters"`
+}
+
+// StatsReport collects the FuncStats of a run, to be written as JSON.
+type StatsReport struct {
+	Solver    string                    `json:"solver"`
+	Elapsed   time.Duration             `json:"elapsedNs"`
+	Analyses  map[string]*AnalysisStats `json:"analyses"`
+	Functions []FuncStats               `json:"functions"` // the slowest first
+}
+
+func NewStatsReport(solver string) *StatsReport {
+	return &StatsReport{Solver: solver, Analyses: make(map[string]*AnalysisStats)}
+}
+
+func (r *StatsReport) Add(fs FuncStats) {
+	total, ok := r.Analyses[fs.AnalysisName]
+	if !ok {
+		total = &AnalysisStats{}
+		r.Analyses[fs.AnalysisName] = total
+	}
+	total.Functions++
+	if fs.Loaded {
+		total.Loaded++
+	}
+	total.Elapsed += fs.Elapsed
+	total.Counters.Add(&fs.Counters)
+	r.Elapsed += fs.Elapsed
+	r.Functions = append(r.Functions, fs)
+}
+
+// Write writes the report as (indented) JSON, with the functions sorted by
+// the time taken, the slowest first.
+func (r *StatsReport) Write(w io.Writer) error {
+	slices.SortStableFunc(r.Functions, func(a, b FuncStats) int {
+		return cmp.Compare(b.Elapsed, a.Elapsed)
+	})
+	enc := json.NewEncoder(w)
+	enc.SetIndent("", "  ")
+	return enc.Encode(r)
+}
@@ -0,0 +1,75 @@
+package analysis
+
+import (
+	"bytes"
+	"encoding/json"
+	"testing"
+	"time"
+
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestEngineStats(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_C()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	newClient := func() Analysis {
+		return &testRangeClient{
+			v:     tu.GetEntityId("i"),
+			bound: 1000,
+			lits:  map[spir.EntityId]int32{tu.NewConst(1, spir.Int32QT): 1, tu.NewConst(1000, spir.Int32QT): 1000},
+		}
+	}
+
+	stats := &EngineStats{}
+	AnalyzeFunctionWithStats(tu, main, newClient(), GenericSolver, false, false, stats)
+	// The 5 blocks are visited once, and the loop (head and body) is iterated.
+	if stats.BBVisits <= 5 || stats.Iterations < 2 || stats.RePushes == 0 {
+		t.Errorf("expected the loop to be iterated, got %+v", *stats)
+	}
+	if stats.InsnTransfers < stats.BBVisits || stats.Meets == 0 || stats.Widens == 0 {
+		t.Errorf("expected the transfers, meets and widenings to be counted, got %+v", *stats)
+	}
+	if stats.Pushes < stats.RePushes || stats.Changes < stats.Pushes {
+		t.Errorf("inconsistent worklist counters: %+v", *stats)
+	}
+
+	// The counters don't change the results.
+	want := AnalyzeFunctionWithSolver(tu, main, newClient(), GenericSolver, false, false)
+	got := AnalyzeFunctionWithStats(tu, main, newClient(), GenericSolver, false, false, &EngineStats{})
+	if len(got.FactMap) != len(want.FactMap) {
+		t.Errorf("expected %d facts, got %d", len(want.FactMap), len(got.FactMap))
+	}
+}
+
+func TestStatsReport(t *testing.T) {
+	report := NewStatsReport("generic")
+	report.Add(FuncStats{FuncName: "f", AnalysisName: "a", Elapsed: time.Millisecond,
+		Counters: EngineStats{BBVisits: 2, Iterations: 1}})
+	report.Add(FuncStats{FuncName: "g", AnalysisName: "a", Elapsed: 3 * time.Millisecond,
+		Counters: EngineStats{BBVisits: 5, Iterations: 4}})
+	report.Add(FuncStats{FuncName: "f", AnalysisName: "b", Elapsed: 2 * time.Millisecond, Loaded: true})
+
+	var buf bytes.Buffer
+	if err := report.Write(&buf); err != nil {
+		t.Fatal(err)
+	}
+	var got StatsReport
+	if err := json.Unmarshal(buf.Bytes(), &got); err != nil {
+		t.Fatalf("invalid report: %v\n%s", err, buf.String())
+	}
+	if got.Elapsed != 6*time.Millisecond || len(got.Functions) != 3 {
+		t.Fatalf("unexpected report: %s", buf.String())
+	}
+	if got.Functions[0].FuncName != "g" || got.Functions[2].Elapsed != time.Millisecond {
+		t.Errorf("expected the slowest function first, got %+v", got.Functions)
+	}
+	a := got.Analyses["a"]
+	if a == nil || a.Functions != 2 || a.Counters.BBVisits != 7 || a.Counters.Iterations != 4 {
+		t.Errorf("unexpected totals of analysis a: %+v", a)
+	}
+	if b := got.Analyses["b"]; b == nil || b.Loaded != 1 || !got.Functions[1].Loaded {
+		t.Errorf("expected the loaded result of analysis b, got %+v", b)
+	}
+}
@@ -0,0 +1,278 @@
+package analysis
+
+// This file defines a bottom-up inter-procedural driver for a SummaryAnalysis.
+//
+// The functions are analyzed in the bottom-up order of the SCCs of the call
+// graph (see spir.CallGraph), so that the summaries of the callees are ready
+// when a caller is analyzed. The functions of a (recursive) SCC are analyzed
+// repeatedly, starting from Top summaries for each other, until their
+// summaries stop changing. An SCC becomes ready once all the SCCs it calls
+// are done; the ready SCCs are analyzed concurrently on a pool of workers.
+
+import (
+	"fmt"
+	"runtime"
+	"sync"
+	"time"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The number of iterations over a recursive SCC after which the summaries
+// of its functions are widened.
+const SummaryWidenDelay = 3
+
+type SummaryScheduler struct {
+	tu               *spir.TU
+	cg               *spir.CallGraph
+	newAnalysis      AnalysisFactory
+	workers          int
+	meetAtBasicBlock bool
+	// The retention of the facts of the functions (see ParallelIntraPAN).
+	boundaryFactsOnly bool
+	budget            *FactBudget
+	collectStats      bool
+	stats             map[spir.EntityId]*funcSolverStats // filled by AnalyzeTU
+
+	mu        sync.RWMutex
+	summaries map[spir.EntityId]lattice.ConstLattice // of the functions in the SCCs done
+}
+
+// NewSummaryScheduler creates a scheduler for the TU; newAnalysis must
+// return a SummaryAnalysis.
+func NewSummaryScheduler(tu *spir.TU, newAnalysis AnalysisFactory,
+	meetAtBasicBlock bool) *SummaryScheduler {
+	if _, ok := newAnalysis().(SummaryAnalysis); !ok {
+		panic(fmt.Sprintf("SummaryScheduler: %T is not a SummaryAnalysis", newAnalysis()))
+	}
+	return &SummaryScheduler{
+		tu:               tu,
+		cg:               spir.NewCallGraph(tu),
+		newAnalysis:      newAnalysis,
+		workers:          runtime.GOMAXPROCS(0),
+		meetAtBasicBlock: meetAtBasicBlock,
+		summaries:        make(map[spir.EntityId]lattice.ConstLattice),
+	}
+}
+
+func (s *SummaryScheduler) CallGraph() *spir.CallGraph {
+	return s.cg
+}
+
+func (s *SummaryScheduler) Workers() int {
+	return s.workers
+}
+
+// SetWorkers sets the size of the worker pool; a value < 1 selects GOMAXPROCS.
+func (s *SummaryScheduler) SetWorkers(workers int) {
+	if workers < 1 {
+		workers = runtime.GOMAXPROCS(0)
+	}
+	s.workers = workers
+}
+
+// SetBoundaryFactsOnly keeps only the facts at the entry and the exit of the
+// blocks in the results (see ParallelIntraPAN.SetBoundaryFactsOnly).
+func (s *SummaryScheduler) SetBoundaryFactsOnly(boundaryFactsOnly bool) {
+	s.boundaryFactsOnly = boundaryFactsOnly
+}
+
+// SetFactBudget publishes the fact map of each function into the budget once
+// its SCC converges, instead of returning it in its result (nil disables).
+func (s *SummaryScheduler) SetFactBudget(budget *FactBudget) {
+	s.budget = budget
+}
+
+// SetCollectStats counts the work of the solver on each function, over all
+// the iterations of its SCC (see FuncStats).
+func (s *SummaryScheduler) SetCollectStats(collectStats bool) {
+	s.collectStats = collectStats
+}
+
+// The work of the solver on a function, over all its analyses (e.g. the
+// iterations of its SCC, or its value contexts).
+type funcSolverStats struct {
+	counters EngineStats
+	elapsed  time.Duration
+}
+
+// FuncStats returns the counters of the solver on an analyzed function and
+// the time taken (nil and 0 if they are not collected).
+func (s *SummaryScheduler) FuncStats(fid spir.EntityId) (*EngineStats, time.Duration) {
+	if stats, ok := s.stats[fid]; ok {
+		return &stats.counters, stats.elapsed
+	}
+	return nil, 0
+}
+
+// Summary returns the summary of an analyzed function.
+func (s *SummaryScheduler) Summary(fid spir.EntityId) (lattice.ConstLattice, bool) {
+	s.mu.RLock()
+	defer s.mu.RUnlock()
+	summary, ok := s.summaries[fid]
+	return summary, ok
+}
+
+// AnalyzeTU analyzes all the functions (with a body) in the TU bottom-up.
+// The results are in ascending order of the function ids.
+func (s *SummaryScheduler) AnalyzeTU() []FuncResult {
+	funcIds := s.cg.FuncIds()
+	results := make([]FuncResult, len(funcIds))
+	resultPos := make(map[spir.EntityId]int, len(funcIds))
+	for i, fid := range funcIds {
+		resultPos[fid] = i
+	}
+	if s.collectStats { // allocated here, each is then updated by one worker
+		s.stats = make(map[spir.EntityId]*funcSolverStats, len(funcIds))
+		for _, fid := range funcIds {
+			s.stats[fid] = &funcSolverStats{}
+		}
+	}
+
+	// The number of the SCCs called by each SCC that are not done yet.
+	sccs := s.cg.SCCs()
+	pending := make([]int, len(sccs))
+	callerSCCs := make([][]int, len(sccs))
+	for i, scc := range sccs {
+		calleeSCCs := make(map[int]bool)
+		for _, fid := range scc {
+			for _, callee := range s.cg.Callees(fid) {
+				if j, ok := s.cg.SCCIndex(callee); ok && j != i && !calleeSCCs[j] {
+					calleeSCCs[j] = true
+					callerSCCs[j] = append(callerSCCs[j], i)
+				}
+			}
+		}
+		pending[i] = len(calleeSCCs)
+	}
+	if len(sccs) == 0 {
+		return results
+	}
+
+	ready := make(chan int, len(sccs)) // never blocks: each SCC is sent once
+	for i := range sccs {
+		if pending[i] == 0 {
+			ready <- i
+		}
+	}
+	var mu sync.Mutex // guards pending and done
+	done := 0
+	var wg sync.WaitGroup
+	for range min(s.workers, len(sccs)) {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range ready {
+				// Each function is in one SCC, hence its result is written by one worker.
+				for _, res := range s.analyzeSCC(sccs[i]) {
+					results[resultPos[res.FuncId]] = res
+				}
+				mu.Lock()
+				for _, caller := range callerSCCs[i] {
+					if pending[caller]--; pending[caller] == 0 {
+						ready <- caller
+					}
+				}
+				if done++; done == len(sccs) {
+					close(ready)
+				}
+				mu.Unlock()
+			}
+		}()
+	}
+	wg.Wait()
+	return results
+}
+
+// The summaries of the callees of a function in an SCC being analyzed.
+type sccSummaries struct {
+	sched *SummaryScheduler
+	fid   spir.EntityId
+	scc   int
+	local map[spir.EntityId]lattice.ConstLattice // of the functions in the SCC
+}
+
+func (v *sccSummaries) CalleeSummaries(callSite spir.Insn) []CalleeSummary {
+	targets := v.sched.cg.CallTargets(v.fid, callSite.Id())
+	callees := make([]CalleeSummary, len(targets))
+	for i, target := range targets {
+		callees[i].FuncId = target
+		scc, hasBody := v.sched.cg.SCCIndex(target)
+		switch {
+		case !hasBody:
+		case scc == v.scc:
+			callees[i].Summary, callees[i].Known = v.local[target], true
+		default:
+			callees[i].Summary, callees[i].Known = v.sched.Summary(target)
+		}
+	}
+	return callees
+}
+
+// analyzeSCC analyzes the functions of the SCC until their summaries converge.
+func (s *SummaryScheduler) analyzeSCC(scc []spir.EntityId) []FuncResult {
+	sccIndex, _ := s.cg.SCCIndex(scc[0])
+	recursive := s.cg.IsRecursive(scc[0])
+	local := make(map[spir.EntityId]lattice.ConstLattice, len(scc))
+	results := make([]FuncResult, len(scc))
+	for iter := 0; ; iter++ {
+		changed := false
+		for i, fid := range scc {
+			view := &sccSummaries{sched: s, fid: fid, scc: sccIndex, local: local}
+			var summary lattice.ConstLattice
+			results[i], summary = s.analyzeFunction(s.tu.GetFunctionById(fid), view)
+			old := local[fid]
+			if iter >= SummaryWidenDelay && old != nil && summary != nil {
+				widened, _ := lattice.Widen(old, summary)
+				summary = widened.(lattice.ConstLattice)
+			}
+			if !lattice.Equals(old, summary) {
+				local[fid] = summary
+				changed = true
+			}
+		}
+		if !changed || !recursive {
+			break
+		}
+	}
+
+	s.mu.Lock()
+	for _, fid := range scc {
+		s.summaries[fid] = local[fid]
+	}
+	s.mu.Unlock()
+	for i, fid := range scc {
+		retainResult(&results[i], s.tu.GetFunctionById(fid), s.boundaryFactsOnly, s.budget)
+	}
+	return results
+}
+
+func (s *SummaryScheduler) analyzeFunction(fun *spir.Function,
+	summaries CallSummaries) (FuncResult, lattice.ConstLattice) {
+	an := s.newAnalysis()
+	ctx := spir.NewContext(s.tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+
+	ctxId := spir.GetNextContextId()
+	intra := NewIntraPAN(ctxId, an, fun.Body(), ctx, false, s.meetAtBasicBlock).(*IntraPAN)
+	intra.SetCallSummaries(summaries)
+	stats := s.stats[fun.Id()]
+	if stats != nil {
+		intra.SetStats(&stats.counters)
+	}
+	start := time.Now()
+	change := intra.AnalyzeGraph()
+	if stats != nil {
+		stats.elapsed += time.Since(start)
+	}
+
+	return FuncResult{
+		FuncId:  fun.Id(),
+		CtxId:   ctxId,
+		Context: ctx,
+		FactMap: *intra.FactMap(),
+		Change:  change,
+	}, an.(SummaryAnalysis).FuncSummary(fun, intra)
+}
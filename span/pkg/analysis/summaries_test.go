@@ -0,0 +1,118 @@
+package analysis
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The functions that may be entered (transitively) on the paths to a point.
+type testCallsClient struct {
+	testForwardClient
+}
+
+func (c *testCallsClient) BoundaryFact(graph spir.Graph, ctx *spir.Context) lattice.Pair {
+	return lattice.NewPair(sources(ctx.CurrentScopeEid()), nil, lattice.NIL_FACT_ID)
+}
+
+func (c *testCallsClient) FuncSummary(fun *spir.Function, analyzer Analyzer) lattice.ConstLattice {
+	out, _ := analyzer.GetFactMapValue(fun.Body().ExitBlock().ExitInsnId()).L2().(lattice.ConstLattice)
+	return out
+}
+
+func (c *testCallsClient) AnalyzeCall(insn spir.Insn, inOut lattice.Pair, callees []CalleeSummary,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	out, _ := inOut.L1().(lattice.ConstLattice)
+	for _, callee := range callees {
+		out = meetConst(out, sources(callee.FuncId))
+		if callee.Known {
+			out = meetConst(out, callee.Summary)
+		}
+	}
+	change := lattice.NoChange
+	if !lattice.Equals(out, inOut.L2()) {
+		change = lattice.OutChanged
+	}
+	return lattice.NewPair(inOut.L1(), out, inOut.FactId()), change
+}
+
+// A TU with:
+//
+//	g() { f(); }                   // f and g are mutually recursive
+//	f() { g(); ext(); }            // ext has no body
+//	h() { }
+//	main() { p = h; p(); f(); }    // an indirect call through p
+func newSummaryTestTU() (tu *spir.TU, main, f, g, h, ext *spir.Function) {
+	tu = spir.NewTU()
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	ext = tu.NewFunction("ext", funcQT, nil, nil)
+	newFunc := func(name string) (*spir.Function, *spir.BasicBlock) {
+		bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 4)
+		return tu.NewFunction(name, funcQT, nil, bb), bb
+	}
+	call := func(bb *spir.BasicBlock, callee spir.EntityId) {
+		tu.AddInsn(bb, spir.CallI(spir.CallX(callee, tu.NewCallSiteId())), nil)
+	}
+
+	var gbb, fbb, hbb, mainbb *spir.BasicBlock
+	g, gbb = newFunc("g")
+	f, fbb = newFunc("f")
+	h, hbb = newFunc("h")
+	main, mainbb = newFunc(spir.K_MAIN_FUNC_NAME)
+	p := tu.NewVar("p", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.NewQualVT(&spir.Int32VT, spir.K_QK_QNIL))
+
+	call(gbb, f.Id())
+	call(fbb, g.Id())
+	call(fbb, ext.Id())
+	tu.AddInsn(mainbb, spir.AssignI(spir.ValX(p), spir.ValX(h.Id())), nil)
+	call(mainbb, p)
+	call(mainbb, f.Id())
+	for _, bb := range []*spir.BasicBlock{gbb, fbb, hbb, mainbb} {
+		tu.AddInsn(bb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+	}
+	return tu, main, f, g, h, ext
+}
+
+func TestSummaryScheduler(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu, main, f, g, h, ext := newSummaryTestTU()
+	newClient := func() Analysis { return &testCallsClient{} }
+
+	want := map[spir.EntityId]lattice.ConstLattice{
+		h.Id():    sources(h.Id()),
+		f.Id():    sources(f.Id(), g.Id(), ext.Id()), // g through the recursion
+		g.Id():    sources(f.Id(), g.Id(), ext.Id()),
+		main.Id(): sources(main.Id(), f.Id(), g.Id(), h.Id(), ext.Id()),
+	}
+	for _, workers := range []int{1, 4} {
+		sched := NewSummaryScheduler(tu, newClient, false)
+		sched.SetWorkers(workers)
+		sched.SetCollectStats(true)
+		results := sched.AnalyzeTU()
+		if len(results) != len(want) {
+			t.Fatalf("workers %d: expected %d results, got %d", workers, len(want), len(results))
+		}
+		for i, fid := range sched.CallGraph().FuncIds() {
+			if results[i].FuncId != fid || len(results[i].FactMap) == 0 {
+				t.Errorf("workers %d: expected the facts of %v at %d, got %v", workers, fid, i, results[i].FuncId)
+			}
+			if got, _ := sched.Summary(fid); !lattice.Equals(got, want[fid]) {
+				t.Errorf("workers %d: summary of %v: expected %v, got %v", workers, fid, want[fid], got)
+			}
+			if stats, _ := sched.FuncStats(fid); stats == nil || stats.BBVisits == 0 {
+				t.Errorf("workers %d: expected the solver counters of %v, got %+v", workers, fid, stats)
+			}
+		}
+	}
+}
+
+func TestSummaryScheduler_notSummaryAnalysis(t *testing.T) {
+	defer func() {
+		if recover() == nil {
+			t.Error("expected a panic for an analysis without summaries")
+		}
+	}()
+	NewSummaryScheduler(spir.NewExampleTU_A(), newTestForwardClient, false)
+}
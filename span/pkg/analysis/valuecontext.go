@@ -0,0 +1,365 @@
+package analysis
+
+// This file defines the value contexts of a context sensitive
+// inter-procedural analysis.
+//
+// A value context is a function along with the fact at its entry. The
+// converged exit fact of a function depends only on its entry fact, hence
+// a call with the same entry fact as an earlier call (from anywhere) reuses
+// the exit fact of its value context instead of analyzing the function again.
+//
+// The contexts are kept in a ValueContextTable, bounded per function: the
+// least recently used context of a function is evicted to make room for a
+// new one (it is analyzed again if it is needed later).
+//
+// The facts of a function in all its contexts are met into a single result
+// of the function (see ValueContextAnalyzer.AnalyzeTU).
+
+import (
+	"container/list"
+	"fmt"
+	"hash/fnv"
+	"maps"
+	"sync"
+	"time"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The default bound on the number of value contexts kept per function.
+const DefaultMaxValueContexts = 64
+
+type ValueContext struct {
+	FuncId spir.EntityId
+	CtxId  spir.ContextId
+	Entry  lattice.Lattice
+	Exit   lattice.Lattice
+}
+
+// The value contexts of a function, in the order of their use.
+type funcValueContexts struct {
+	lru     *list.List                 // of *ValueContext, the most recently used first
+	buckets map[uint64][]*list.Element // entry fact hash -> contexts
+}
+
+// ValueContextTable maps (function, entry fact) to a value context.
+// It is safe for concurrent use.
+type ValueContextTable struct {
+	mu         sync.Mutex
+	maxPerFunc int
+	funcs      map[spir.EntityId]*funcValueContexts
+	hits       uint64
+	misses     uint64
+	evictions  uint64
+}
+
+// NewValueContextTable creates a table keeping at most maxPerFunc contexts
+// per function (DefaultMaxValueContexts if maxPerFunc < 1).
+func NewValueContextTable(maxPerFunc int) *ValueContextTable {
+	if maxPerFunc < 1 {
+		maxPerFunc = DefaultMaxValueContexts
+	}
+	return &ValueContextTable{
+		maxPerFunc: maxPerFunc,
+		funcs:      make(map[spir.EntityId]*funcValueContexts),
+	}
+}
+
+// EntryHash returns the hash of an entry fact used to index the contexts.
+// The facts that are not a lattice.HashedLattice are hashed by their text.
+func EntryHash(entry lattice.Lattice) uint64 {
+	if entry == nil {
+		return 0
+	}
+	if h, ok := entry.(lattice.HashedLattice); ok {
+		return h.Hash()
+	}
+	h := fnv.New64a()
+	h.Write([]byte(lattice.String(entry)))
+	return h.Sum64()
+}
+
+// Lookup returns the context of the function with the given entry fact.
+func (t *ValueContextTable) Lookup(fid spir.EntityId, entry lattice.Lattice) (*ValueContext, bool) {
+	t.mu.Lock()
+	defer t.mu.Unlock()
+	if fvc, ok := t.funcs[fid]; ok {
+		for _, elem := range fvc.buckets[EntryHash(entry)] {
+			if vc := elem.Value.(*ValueContext); lattice.Equals(vc.Entry, entry) {
+				fvc.lru.MoveToFront(elem)
+				t.hits++
+				return vc, true
+			}
+		}
+	}
+	t.misses++
+	return nil, false
+}
+
+// Insert adds (or replaces) the context of vc.FuncId with the entry vc.Entry,
+// evicting the least recently used context of the function if it is full.
+func (t *ValueContextTable) Insert(vc *ValueContext) {
+	t.mu.Lock()
+	defer t.mu.Unlock()
+	fvc, ok := t.funcs[vc.FuncId]
+	if !ok {
+		fvc = &funcValueContexts{lru: list.New(), buckets: make(map[uint64][]*list.Element)}
+		t.funcs[vc.FuncId] = fvc
+	}
+	hash := EntryHash(vc.Entry)
+	for _, elem := range fvc.buckets[hash] {
+		if lattice.Equals(elem.Value.(*ValueContext).Entry, vc.Entry) {
+			elem.Value = vc
+			fvc.lru.MoveToFront(elem)
+			return
+		}
+	}
+	if fvc.lru.Len() >= t.maxPerFunc {
+		oldest := fvc.lru.Back()
+		fvc.remove(oldest)
+		t.evictions++
+	}
+	fvc.buckets[hash] = append(fvc.buckets[hash], fvc.lru.PushFront(vc))
+}
+
+func (fvc *funcValueContexts) remove(elem *list.Element) {
+	hash := EntryHash(elem.Value.(*ValueContext).Entry)
+	bucket := fvc.buckets[hash]
+	for i, e := range bucket {
+		if e == elem {
+			bucket = append(bucket[:i], bucket[i+1:]...)
+			break
+		}
+	}
+	if len(bucket) == 0 {
+		delete(fvc.buckets, hash)
+	} else {
+		fvc.buckets[hash] = bucket
+	}
+	fvc.lru.Remove(elem)
+}
+
+// Len returns the number of contexts of the function.
+func (t *ValueContextTable) Len(fid spir.EntityId) int {
+	t.mu.Lock()
+	defer t.mu.Unlock()
+	if fvc, ok := t.funcs[fid]; ok {
+		return fvc.lru.Len()
+	}
+	return 0
+}
+
+// Stats returns the number of lookups that found a context (hits), that
+// didn't (misses), and the number of contexts evicted.
+func (t *ValueContextTable) Stats() (hits, misses, evictions uint64) {
+	t.mu.Lock()
+	defer t.mu.Unlock()
+	return t.hits, t.misses, t.evictions
+}
+
+// ValueContextAnalyzer analyzes the functions of a TU top-down, context
+// sensitively: a call is analyzed with the exit facts of the value contexts
+// of its targets for the IN fact at the call (see ContextCallSummaries).
+//
+// A call back into a context that is being analyzed (a recursive call with
+// the same entry fact) has an unknown target, to be over-approximated by
+// the analysis.
+type ValueContextAnalyzer struct {
+	tu               *spir.TU
+	cg               *spir.CallGraph
+	newAnalysis      AnalysisFactory
+	table            *ValueContextTable
+	meetAtBasicBlock bool
+	inProgress       []*ValueContext // the contexts being analyzed, innermost last
+
+	results      map[spir.EntityId]*FuncResult // the facts met over the contexts, by AnalyzeTU
+	collectStats bool
+	stats        map[spir.EntityId]*funcSolverStats
+	nestedTime   time.Duration // of the contexts analyzed within the current one
+}
+
+// NewValueContextAnalyzer creates an analyzer keeping at most
+// maxContextsPerFunc contexts per function; newAnalysis must return a
+// SummaryAnalysis. It is not safe for concurrent use.
+func NewValueContextAnalyzer(tu *spir.TU, newAnalysis AnalysisFactory,
+	maxContextsPerFunc int, meetAtBasicBlock bool) *ValueContextAnalyzer {
+	if _, ok := newAnalysis().(SummaryAnalysis); !ok {
+		panic(fmt.Sprintf("ValueContextAnalyzer: %T is not a SummaryAnalysis", newAnalysis()))
+	}
+	return &ValueContextAnalyzer{
+		tu:               tu,
+		cg:               spir.NewCallGraph(tu),
+		newAnalysis:      newAnalysis,
+		table:            NewValueContextTable(maxContextsPerFunc),
+		meetAtBasicBlock: meetAtBasicBlock,
+	}
+}
+
+func (va *ValueContextAnalyzer) Table() *ValueContextTable {
+	return va.table
+}
+
+// SetCollectStats counts the work of the solver on each function, over all
+// its contexts (see FuncStats).
+func (va *ValueContextAnalyzer) SetCollectStats(collectStats bool) {
+	va.collectStats = collectStats
+}
+
+// FuncStats returns the counters of the solver on an analyzed function and
+// the time taken, without that of its callees (nil and 0 if they are not
+// collected).
+func (va *ValueContextAnalyzer) FuncStats(fid spir.EntityId) (*EngineStats, time.Duration) {
+	if stats, ok := va.stats[fid]; ok {
+		return &stats.counters, stats.elapsed
+	}
+	return nil, 0
+}
+
+// AnalyzeTU analyzes the main function (if it has a body) and then each
+// function not reached from it, with the boundary fact of the analysis as
+// the entry fact. The result of a function has the meet of its facts over
+// all its contexts; the facts are not modified by the meet, since those of
+// a SummaryAnalysis are constant (like its summaries). The results are in
+// ascending order of the function ids.
+func (va *ValueContextAnalyzer) AnalyzeTU() []FuncResult {
+	va.results = make(map[spir.EntityId]*FuncResult)
+	defer func() { va.results = nil }()
+	if va.collectStats {
+		va.stats = make(map[spir.EntityId]*funcSolverStats)
+	}
+
+	funcIds := va.cg.FuncIds()
+	roots := make([]spir.EntityId, 0, len(funcIds)+1)
+	if main := va.tu.GetFunction(spir.K_MAIN_FUNC_NAME); main != nil && main.Body() != nil {
+		roots = append(roots, main.Id())
+	}
+	roots = append(roots, funcIds...)
+	for _, fid := range roots {
+		if _, ok := va.results[fid]; !ok {
+			fun := va.tu.GetFunctionById(fid)
+			va.AnalyzeFunction(fun, va.rootEntry(fun))
+		}
+	}
+
+	results := make([]FuncResult, len(funcIds))
+	for i, fid := range funcIds {
+		results[i] = *va.results[fid]
+	}
+	return results
+}
+
+// rootEntry returns the IN fact at the entry of the boundary fact of the function.
+func (va *ValueContextAnalyzer) rootEntry(fun *spir.Function) lattice.Lattice {
+	an := va.newAnalysis()
+	ctx := spir.NewContext(va.tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+	return an.BoundaryFact(fun.Body(), ctx).L1()
+}
+
+// mergeResult meets the facts of a context of the function into its result.
+func (va *ValueContextAnalyzer) mergeResult(res FuncResult) {
+	merged, ok := va.results[res.FuncId]
+	if !ok {
+		res.FactMap = maps.Clone(res.FactMap)
+		va.results[res.FuncId] = &res
+		return
+	}
+	for insnId, pair := range res.FactMap {
+		old, ok := merged.FactMap[insnId]
+		if !ok {
+			merged.FactMap[insnId] = pair
+			continue
+		}
+		l1, _ := lattice.Meet(old.L1(), pair.L1())
+		l2, _ := lattice.Meet(old.L2(), pair.L2())
+		old.SetLats(l1, l2)
+		merged.FactMap[insnId] = old
+	}
+	merged.Change = lattice.GetInOutChanged(merged.Change.HasChangedIn() || res.Change.HasChangedIn(),
+		merged.Change.HasChangedOut() || res.Change.HasChangedOut())
+}
+
+// AnalyzeFunction returns the value context of the function (with a body)
+// for the entry fact, analyzing the function only if it is not in the table.
+func (va *ValueContextAnalyzer) AnalyzeFunction(fun *spir.Function, entry lattice.Lattice) *ValueContext {
+	if vc, ok := va.table.Lookup(fun.Id(), entry); ok {
+		return vc
+	}
+
+	an := va.newAnalysis()
+	ctx := spir.NewContext(va.tu)
+	ctx.SetCurrentScopeEid(fun.Id())
+	an.SetInstanceId(an.InstanceId().WithFuncId(fun.Id()))
+	vc := &ValueContext{FuncId: fun.Id(), CtxId: spir.GetNextContextId(), Entry: entry}
+
+	va.inProgress = append(va.inProgress, vc)
+	intra := NewIntraPANWithEntry(vc.CtxId, an, fun.Body(), ctx, entry,
+		false, va.meetAtBasicBlock).(*IntraPAN)
+	intra.SetCallSummaries(&valueContextSummaries{va: va, fid: fun.Id()})
+	var stats *funcSolverStats
+	if va.stats != nil {
+		if stats = va.stats[fun.Id()]; stats == nil {
+			stats = &funcSolverStats{}
+			va.stats[fun.Id()] = stats
+		}
+		intra.SetStats(&stats.counters)
+	}
+	start, outerNestedTime := time.Now(), va.nestedTime
+	va.nestedTime = 0
+	change := intra.AnalyzeGraph()
+	elapsed := time.Since(start)
+	if stats != nil {
+		stats.elapsed += elapsed - va.nestedTime
+	}
+	va.nestedTime = outerNestedTime + elapsed
+	va.inProgress = va.inProgress[:len(va.inProgress)-1]
+
+	vc.Exit = intra.GetFactMapValue(fun.Body().ExitBlock().ExitInsnId()).L2()
+	va.table.Insert(vc)
+	if va.results != nil {
+		va.mergeResult(FuncResult{FuncId: fun.Id(), CtxId: vc.CtxId, Context: ctx,
+			FactMap: *intra.FactMap(), Change: change})
+	}
+	return vc
+}
+
+func (va *ValueContextAnalyzer) isInProgress(fid spir.EntityId, entry lattice.Lattice) bool {
+	for _, vc := range va.inProgress {
+		if vc.FuncId == fid && lattice.Equals(vc.Entry, entry) {
+			return true
+		}
+	}
+	return false
+}
+
+// The value contexts of the callees of a function.
+type valueContextSummaries struct {
+	va  *ValueContextAnalyzer
+	fid spir.EntityId
+}
+
+// CalleeSummaries returns the targets of the call, all unknown: the value
+// contexts need the entry fact (see CalleeExitFacts).
+func (v *valueContextSummaries) CalleeSummaries(callSite spir.Insn) []CalleeSummary {
+	targets := v.va.cg.CallTargets(v.fid, callSite.Id())
+	callees := make([]CalleeSummary, len(targets))
+	for i, target := range targets {
+		callees[i].FuncId = target
+	}
+	return callees
+}
+
+func (v *valueContextSummaries) CalleeExitFacts(callSite spir.Insn, entry lattice.Lattice) []CalleeSummary {
+	callees := v.CalleeSummaries(callSite)
+	for i := range callees {
+		fun := v.va.tu.GetFunctionById(callees[i].FuncId)
+		if fun == nil || fun.Body() == nil || v.va.isInProgress(fun.Id(), entry) {
+			continue
+		}
+		exit, _ := v.va.AnalyzeFunction(fun, entry).Exit.(lattice.ConstLattice)
+		callees[i].Summary, callees[i].Known = exit, true
+	}
+	return callees
+}
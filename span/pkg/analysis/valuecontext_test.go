@@ -0,0 +1,133 @@
+package analysis
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func TestValueContextTable_lru(t *testing.T) {
+	fid := spir.EntityId(1)
+	a, b, c := sources(spir.EntityId(10)), sources(spir.EntityId(11)), sources(spir.EntityId(12))
+	table := NewValueContextTable(2)
+	table.Insert(&ValueContext{FuncId: fid, Entry: a, Exit: a})
+	table.Insert(&ValueContext{FuncId: fid, Entry: b, Exit: b})
+	if vc, ok := table.Lookup(fid, sources(spir.EntityId(10))); !ok || vc.Exit != a {
+		t.Fatal("expected the context with an equal entry fact")
+	}
+	table.Insert(&ValueContext{FuncId: fid, Entry: c, Exit: c}) // evicts b, the least recently used
+	if _, ok := table.Lookup(fid, b); ok {
+		t.Error("expected the least recently used context to be evicted")
+	}
+	if _, ok := table.Lookup(fid, a); !ok {
+		t.Error("expected the recently used context to be kept")
+	}
+	if _, ok := table.Lookup(spir.EntityId(2), a); ok {
+		t.Error("expected no context for another function")
+	}
+	if got := table.Len(fid); got != 2 {
+		t.Errorf("expected 2 contexts, got %d", got)
+	}
+	if hits, misses, evictions := table.Stats(); hits != 2 || misses != 2 || evictions != 1 {
+		t.Errorf("expected 2 hits, 2 misses and 1 eviction, got %d, %d and %d", hits, misses, evictions)
+	}
+}
+
+// A TU with:
+//
+//	f() { ext(); }                 // ext has no body
+//	r() { r(); }
+//	main() { f(); f(); f(); r(); }
+//	u() { f(); }                   // not reached from main
+func newValueContextTestTU() (tu *spir.TU, main, f, r, u, ext *spir.Function) {
+	tu = spir.NewTU()
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	ext = tu.NewFunction("ext", funcQT, nil, nil)
+	newFunc := func(name string, callees ...spir.EntityId) *spir.Function {
+		bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, uint(len(callees)+1))
+		fun := tu.NewFunction(name, funcQT, nil, bb)
+		for _, callee := range callees {
+			if callee == spir.NIL_ID { // a recursive call
+				callee = fun.Id()
+			}
+			tu.AddInsn(bb, spir.CallI(spir.CallX(callee, tu.NewCallSiteId())), nil)
+		}
+		tu.AddInsn(bb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+		return fun
+	}
+	f = newFunc("f", ext.Id())
+	r = newFunc("r", spir.NIL_ID)
+	main = newFunc(spir.K_MAIN_FUNC_NAME, f.Id(), f.Id(), f.Id(), r.Id())
+	u = newFunc("u", f.Id())
+	return tu, main, f, r, u, ext
+}
+
+func TestValueContextAnalyzer(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu, main, f, r, _, ext := newValueContextTestTU()
+	va := NewValueContextAnalyzer(tu, func() Analysis { return &testCallsClient{} }, 0, false)
+	vc := va.AnalyzeFunction(main, sources(main.Id()))
+	// f is entered with {main}, then twice with {main, f, ext}: the last call
+	// reuses the context of the second.
+	if got := va.Table().Len(f.Id()); got != 2 {
+		t.Errorf("expected 2 contexts of f, got %d", got)
+	}
+	if hits, misses, _ := va.Table().Stats(); hits != 1 || misses != 4 {
+		t.Errorf("expected 1 hit and 4 misses, got %d and %d", hits, misses)
+	}
+	// The recursive call of r (with the same entry) has an unknown target.
+	rEntry := sources(main.Id(), f.Id(), ext.Id())
+	rvc, ok := va.Table().Lookup(r.Id(), rEntry)
+	if !ok || !lattice.Equals(rvc.Exit, sources(main.Id(), f.Id(), ext.Id(), r.Id())) {
+		t.Errorf("unexpected context of r: %+v", rvc)
+	}
+	if !lattice.Equals(vc.Exit, sources(main.Id(), f.Id(), ext.Id(), r.Id())) {
+		t.Errorf("unexpected exit fact of main: %v", vc.Exit)
+	}
+	if again := va.AnalyzeFunction(main, sources(main.Id())); again != vc {
+		t.Error("expected the context of main to be reused")
+	}
+}
+
+func TestValueContextAnalyzer_AnalyzeTU(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu, main, f, r, u, ext := newValueContextTestTU()
+	va := NewValueContextAnalyzer(tu, func() Analysis { return &testCallsClient{} }, 0, false)
+	va.SetCollectStats(true)
+	results := va.AnalyzeTU()
+
+	funcIds := va.cg.FuncIds()
+	if len(results) != 4 || len(funcIds) != 4 {
+		t.Fatalf("expected the results of 4 functions, got %d", len(results))
+	}
+	for i, fid := range funcIds {
+		if results[i].FuncId != fid || len(results[i].FactMap) == 0 {
+			t.Errorf("expected the facts of %v at %d, got %v", fid, i, results[i].FuncId)
+		}
+	}
+	// u is analyzed from its boundary fact, and the entry fact of f is
+	// the meet of those of its contexts.
+	if _, ok := va.Table().Lookup(u.Id(), sources(u.Id())); !ok {
+		t.Error("expected a context of u for its boundary fact")
+	}
+	var fRes FuncResult
+	for _, res := range results {
+		if res.FuncId == f.Id() {
+			fRes = res
+		}
+	}
+	want := sources(main.Id(), f.Id(), ext.Id(), u.Id())
+	if got := fRes.FactMap[f.Body().EntryBlock().EntryInsnId()].L1(); !lattice.Equals(got, want) {
+		t.Errorf("expected the entry fact %v of f, got %v", want, got)
+	}
+	for _, fid := range []spir.EntityId{main.Id(), f.Id(), r.Id(), u.Id()} {
+		if stats, _ := va.FuncStats(fid); stats == nil || stats.BBVisits == 0 {
+			t.Errorf("expected the solver counters of %v, got %+v", fid, stats)
+		}
+	}
+	if stats, _ := va.FuncStats(f.Id()); stats.BBVisits < 3 { // a visit per context
+		t.Errorf("expected the visits of the 3 contexts of f, got %d", stats.BBVisits)
+	}
+}
@@ -0,0 +1,118 @@
+package analysis
+
+import (
+	"math"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The (int32) range of the variable v, assigned a literal or incremented by
+// one, and compared with a literal bound by `cond = v < bound; if (cond)`.
+type testRangeClient struct {
+	testForwardClient
+	v          spir.EntityId
+	bound      int32
+	lits       map[spir.EntityId]int32
+	condVisits int // the number of times the condition is analyzed
+}
+
+func int32Range(min, max int32) *lattice.RangeLattice {
+	return lattice.NewRangeLT(spir.K_VK_TINT32, lattice.Int32ToUint64(min), lattice.Int32ToUint64(max))
+}
+
+func (c *testRangeClient) BoundaryFact(graph spir.Graph, ctx *spir.Context) lattice.Pair {
+	return lattice.NewPair(int32Range(math.MinInt32, math.MaxInt32), nil, lattice.NIL_FACT_ID)
+}
+
+// shift adds n to the bounded ends of the range (saturating).
+func shift(r *lattice.RangeLattice, n int32) *lattice.RangeLattice {
+	_, lo, hi := r.Bounds()
+	add := func(b uint64) int32 {
+		v := lattice.Uint64ToInt32(b)
+		if v == math.MinInt32 || v == math.MaxInt32 {
+			return v
+		}
+		return int32(min(max(int64(v)+int64(n), math.MinInt32), math.MaxInt32))
+	}
+	return int32Range(add(lo), add(hi))
+}
+
+func (c *testRangeClient) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	in := inOut.L1()
+	out := in
+	switch {
+	case in == nil:
+	case insn.IsIf():
+		c.condVisits++
+		trueFact, _ := lattice.Join(in, int32Range(math.MinInt32, c.bound-1))
+		falseFact, _ := lattice.Join(in, int32Range(c.bound, math.MaxInt32))
+		pair := lattice.NewPair(trueFact, falseFact, inOut.FactId())
+		out = &pair
+	case insn.IsAssign():
+		if lhs, _ := insn.LhsX().GetOperands(); lhs != c.v {
+			break
+		}
+		if eid1, eid2 := insn.RhsX().GetOperands(); eid2 == spir.NIL_ID {
+			out = int32Range(c.lits[eid1], c.lits[eid1])
+		} else {
+			out = shift(in.(*lattice.RangeLattice), c.lits[eid2])
+		}
+	}
+	change := lattice.NoChange
+	if !lattice.Equals(inOut.L2(), out) {
+		change = lattice.OutChanged
+	}
+	return lattice.NewPair(in, out, inOut.FactId()), change
+}
+
+func TestIntraPAN_widening(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_C()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	headBB := main.Body().EntryBlock().TrueSucc()
+	retBB := headBB.FalseSucc()
+	c1, c1000 := tu.NewConst(1, spir.Int32QT), tu.NewConst(1000, spir.Int32QT)
+
+	tests := []struct {
+		name        string
+		delay       int
+		narrowSteps int
+		head, ret   *lattice.RangeLattice
+		maxVisits   int
+	}{
+		{"widen", DefaultWidenDelay, 0, int32Range(1, math.MaxInt32), int32Range(1000, math.MaxInt32), 10},
+		{"widen and narrow", DefaultWidenDelay, 1, int32Range(1, 1000), int32Range(1000, 1000), 10},
+		{"no widening", -1, 0, int32Range(1, 1000), int32Range(1000, 1000), 1000},
+	}
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			client := &testRangeClient{
+				v:     tu.GetEntityId("i"),
+				bound: 1000,
+				lits:  map[spir.EntityId]int32{c1: 1, c1000: 1000},
+			}
+			ctx := spir.NewContext(tu)
+			ctx.SetCurrentScopeEid(main.Id())
+			intra := NewIntraPAN(spir.GetNextContextId(), client, main.Body(), ctx, false, false).(*IntraPAN)
+			intra.SetWidening(tt.delay, tt.narrowSteps)
+			if got := intra.WidenPoints(); len(got) != 1 || got[0] != headBB.Id() {
+				t.Fatalf("expected the widening point %v, got %v", headBB.Id(), got)
+			}
+			intra.AnalyzeGraph()
+
+			if got := intra.GetFactMapValue(headBB.EntryInsnId()).L1(); !lattice.Equals(got, tt.head) {
+				t.Errorf("loop head: expected %v, got %v", tt.head, got)
+			}
+			if got := intra.GetFactMapValue(retBB.EntryInsnId()).L1(); !lattice.Equals(got, tt.ret) {
+				t.Errorf("loop exit: expected %v, got %v", tt.ret, got)
+			}
+			if client.condVisits > tt.maxVisits {
+				t.Errorf("expected at most %d visits of the loop head, got %d", tt.maxVisits, client.condVisits)
+			}
+		})
+	}
+}
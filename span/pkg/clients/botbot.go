@@ -19,8 +19,12 @@ func (c *ForwardBotBotClient) BoundaryFact(graph spir.Graph, context *spir.Conte
 	return lattice.NewPair(&lattice.TopBotLatticeBot, &lattice.TopBotLatticeTop, lattice.NIL_FACT_ID)
 }
 
+func (c *ForwardBotBotClient) NewNonNilTopLattice(factId lattice.FactId) lattice.Lattice {
+	return &lattice.TopBotLatticeTop
+}
+
 // Just propagate the IN data flow value to the OUT fact.
-func (c *ForwardBotBotClient) Analyze(instruction spir.Insn,
+func (c *ForwardBotBotClient) AnalyzeInsn(instruction spir.Insn,
 	inOut lattice.Pair, context *spir.Context) (lattice.Pair, lattice.FactChanged) {
 	factChange := lattice.NoChange
 	if !lattice.Equals(inOut.L1(), inOut.L2()) {
@@ -34,18 +38,28 @@ type BackwardBotBotClient struct {
 	analysis.AnalysisClientBase
 }
 
+func (c *BackwardBotBotClient) VisitingOrder() spir.GraphVisitingOrder {
+	return spir.PostOrder // For backward flow analysis.
+}
+
 // Explicitly overrides (though not necessary -- good for demo)
 func (c *BackwardBotBotClient) BoundaryFact(graph spir.Graph, context *spir.Context) lattice.Pair {
 	return lattice.NewPair(&lattice.TopBotLatticeTop, &lattice.TopBotLatticeBot, lattice.NIL_FACT_ID)
 }
 
+func (c *BackwardBotBotClient) NewNonNilTopLattice(factId lattice.FactId) lattice.Lattice {
+	return &lattice.TopBotLatticeTop
+}
+
 // Just propagate the OUT data flow value to the IN fact.
-func (c *BackwardBotBotClient) Analyze(instruction spir.Insn,
+func (c *BackwardBotBotClient) AnalyzeInsn(instruction spir.Insn,
 	inOut lattice.Pair, context *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	// At a branch, merge the facts along the true and false edges.
+	out, _ := lattice.Meet(analysis.SplitBranchFact(inOut.L2()))
 	factChange := lattice.NoChange
-	if !lattice.Equals(inOut.L1(), inOut.L2()) {
+	if !lattice.Equals(inOut.L1(), out) {
 		factChange = lattice.InChanged // could also be NopInChanged
 	}
-	inOut = lattice.NewPair(inOut.L2(), inOut.L2(), lattice.NIL_FACT_ID)
+	inOut = lattice.NewPair(out, inOut.L2(), lattice.NIL_FACT_ID)
 	return inOut, factChange
 }
@@ -13,8 +13,10 @@ import (
 // (Strong) Live Variables lattice type
 // The variables marked live at the program point are in gen,
 // and the variables marked dead at a program point are in kill.
+// The lookups through the parents are bounded by its lattice.FlattenPolicy.
 type LiveVarsLT struct {
 	lattice.ScopedLatticeBase
+	lattice.FlattenTracker
 	gen    spir.EidSet
 	kill   spir.EidSet
 	islive bool
@@ -31,9 +33,14 @@ func NewLiveVarsLT(parent *LiveVarsLT, factId lattice.FactId, maxEntityCount int
 	}
 
 	lvt.SetFactId(factId)
-	lvt.SetParent(parent)
 	lvt.SetParentFactId(parentFactId)
 	lvt.SetMaxEntityCount(maxEntityCount)
+	if parent != nil {
+		lvt.SetParent(parent) // avoid storing a typed nil as the parent
+		if lvt.TrackParent(parent) {
+			lvt.flatten() // too deep, or the parent is queried too often
+		}
+	}
 	return lvt
 }
 
@@ -45,6 +52,8 @@ func (lvfs *LiveVarsLT) SetDefaultLiveness(islive bool) {
 	lvfs.islive = islive
 }
 
+// IsLive returns the liveness of the variable, looking it up in the parents
+// if needed. It does not modify the lattice.
 func (lvfs *LiveVarsLT) IsLive(id spir.EntityId) bool {
 	isGen := lvfs.gen.Contains(id)
 	if isGen {
@@ -57,6 +66,7 @@ func (lvfs *LiveVarsLT) IsLive(id spir.EntityId) bool {
 	}
 
 	if lvfs.Parent() != nil {
+		lvfs.ParentLookup()
 		return lvfs.Parent().(*LiveVarsLT).IsLive(id)
 	}
 	return lvfs.islive // unknown (over-approximate) FIXME: panic here?
@@ -136,13 +146,16 @@ func (lvfs *LiveVarsLT) Meet(other lattice.Lattice) (lattice.Lattice, bool) {
 		return lvfs, false
 	}
 
+	otherGen, otherKill := otherLV.gen, otherLV.kill
 	if lvfs.Parent() != otherLV.Parent() {
-		panic(fmt.Sprintf("LiveVarsLT.Meet: parent is not the same for %s and %s",
-			lattice.String(lvfs), lattice.String(otherLV)))
+		// E.g. one of them was flattened: compare the flattened facts.
+		lvfs.flatten()
+		gen, kill, _ := otherLV.resolve()
+		otherGen, otherKill = *gen, *kill
 	}
 
-	genChanged := lvfs.gen.UnionWith(otherLV.gen)
-	killChanged := lvfs.kill.IntersectionWith(otherLV.kill)
+	genChanged := lvfs.gen.UnionWith(otherGen)
+	killChanged := lvfs.kill.IntersectionWith(otherKill)
 	changed := genChanged || killChanged
 	lvfs.SetFactId(lvfs.FactId().CondIncVersion(changed))
 	return lvfs, changed
@@ -156,13 +169,15 @@ func (lvfs *LiveVarsLT) Join(other lattice.Lattice) (lattice.Lattice, bool) {
 		return lvfs, false
 	}
 
+	otherGen, otherKill := otherLV.gen, otherLV.kill
 	if lvfs.Parent() != otherLV.Parent() {
-		panic(fmt.Sprintf("LiveVarsLT.Meet: parent is not the same for %s and %s",
-			lattice.String(lvfs), lattice.String(otherLV)))
+		lvfs.flatten()
+		gen, kill, _ := otherLV.resolve()
+		otherGen, otherKill = *gen, *kill
 	}
 
-	genChanged := lvfs.gen.IntersectionWith(otherLV.gen)
-	killChanged := lvfs.kill.UnionWith(otherLV.kill)
+	genChanged := lvfs.gen.IntersectionWith(otherGen)
+	killChanged := lvfs.kill.UnionWith(otherKill)
 	changed := genChanged || killChanged
 	lvfs.SetFactId(lvfs.FactId().CondIncVersion(changed))
 	return lvfs, changed
@@ -179,10 +194,21 @@ func (lvfs *LiveVarsLT) Equals(other lattice.Lattice) bool {
 	if !ok {
 		panic(fmt.Sprintf("LiveVarsLT.Equals: other is not a LiveVarsLT: %T", other))
 	}
-	return lvfs.Parent() == otherLV.Parent() && lvfs.gen.Equals(otherLV.gen) && lvfs.kill.Equals(otherLV.kill)
+	if lvfs.Parent() != otherLV.Parent() {
+		gen, kill, islive := lvfs.resolve()
+		otherGen, otherKill, otherIslive := otherLV.resolve()
+		return gen.Equals(*otherGen) && kill.Equals(*otherKill) && islive == otherIslive
+	}
+	return lvfs.gen.Equals(otherLV.gen) && lvfs.kill.Equals(otherLV.kill)
 }
 
 // String returns a string representation of the lattice element.
+// SizeBytes estimates the bytes held by the fact: its gen and kill sets
+// (the sets of the parents are not counted).
+func (lvfs *LiveVarsLT) SizeBytes() int64 {
+	return 2*lattice.LatticeBytes + lvfs.gen.SizeBytes() + lvfs.kill.SizeBytes()
+}
+
 func (lvfs *LiveVarsLT) String() string {
 	lvSet := spir.NewEidSet(false, false)
 	lvfs.LiveSet(lvSet)
@@ -199,29 +225,72 @@ func (lvfs *LiveVarsLT) LiveSet(lvSet *spir.EidSet) *spir.EidSet {
 	return lvSet
 }
 
+// ElemSet adds the live variables to lvSet (see analysis.SetLattice).
+func (lvfs *LiveVarsLT) ElemSet(lvSet *spir.EidSet) *spir.EidSet {
+	return lvfs.LiveSet(lvSet)
+}
+
 // Flatten removes all the parents and brings all the facts into the current object.
-// FIXME
-func (lvfs *LiveVarsLT) Flatten(self bool) (lattice.Lattice, bool) {
+func (lvfs *LiveVarsLT) Flatten(self bool) (lattice.LatticeWithFactId, bool) {
 	if lvfs.Parent() == nil {
 		return lvfs, false
 	}
-	lvSet := spir.NewEidSet(false, false)
-	lvfs.LiveSet(lvSet) // Get all the live variables at this program point
 	if self {
-		genChanged := !lvfs.gen.Equals(*lvSet)
-		lvfs.gen = *lvSet
-		killChanged := lvfs.kill.Clear()
-		changed := genChanged || killChanged
+		changed := lvfs.flatten()
 		lvfs.SetFactId(lvfs.FactId().CondIncVersion(changed))
-		lvfs.SetParent(nil)
 		return lvfs, changed
 	}
-	newLvfs := NewLiveVarsLT(lvfs.Parent().(*LiveVarsLT), lvfs.FactId().ZeroVersion(), lvfs.MaxEntityCount())
-	newLvfs.gen = *lvSet
-	newLvfs.islive = lvfs.islive
+	newLvfs := NewLiveVarsLT(nil, lvfs.FactId().ZeroVersion(), lvfs.MaxEntityCount())
+	gen, kill, islive := lvfs.resolve()
+	newLvfs.gen, newLvfs.kill, newLvfs.islive = *gen, *kill, islive
 	return newLvfs, true
 }
 
+// flatten flattens the lattice in place, keeping its fact id (the liveness
+// is the same). It returns true if the gen or kill sets changed.
+func (lvfs *LiveVarsLT) flatten() bool {
+	if lvfs.Parent() == nil {
+		return false
+	}
+	gen, kill, islive := lvfs.resolve()
+	changed := !lvfs.gen.Equals(*gen) || !lvfs.kill.Equals(*kill)
+	maxEntityCount := lvfs.MaxEntityCount() // of the root, kept without the parents
+	lvfs.gen, lvfs.kill, lvfs.islive = *gen, *kill, islive
+	lvfs.SetParent(nil)
+	lvfs.SetMaxEntityCount(maxEntityCount)
+	lvfs.SetParentFactId(lattice.NIL_FACT_ID)
+	lvfs.Flattened()
+	return changed
+}
+
+// resolve returns the gen and kill sets, and the default liveness, that
+// decide IsLive for the lattice without its parents.
+func (lvfs *LiveVarsLT) resolve() (gen, kill *spir.EidSet, islive bool) {
+	// The chain up to the root, or to a universal kill hiding the rest.
+	chain := []*LiveVarsLT{lvfs}
+	for lv := lvfs; !lv.kill.IsUniversal() && lv.Parent() != nil; {
+		lv = lv.Parent().(*LiveVarsLT)
+		chain = append(chain, lv)
+	}
+
+	gen, kill = spir.NewEidSet(false, false), spir.NewEidSet(false, false)
+	islive = chain[len(chain)-1].islive
+	for i := len(chain) - 1; i >= 0; i-- {
+		lv := chain[i]
+		if lv.kill.IsUniversal() {
+			gen, kill = lv.gen.Duplicate(false), spir.NewEidSet(false, true)
+			continue
+		}
+		if !kill.IsUniversal() {
+			kill.SubtractWith(lv.gen)
+			kill.UnionWith(lv.kill)
+		}
+		gen.SubtractWith(lv.kill)
+		gen.UnionWith(lv.gen)
+	}
+	return gen, kill, islive
+}
+
 func (lvfs *LiveVarsLT) SetActiveEids(eids *spir.EidSet) {
 	lvfs.SetMaxEntityCount(eids.Len())
 }
@@ -230,7 +299,7 @@ func (lvfs *LiveVarsLT) MaxEntityCount() int {
 	if lvfs.Parent() != nil {
 		return lvfs.Parent().(*LiveVarsLT).MaxEntityCount()
 	}
-	return lvfs.MaxEntityCount()
+	return lvfs.ScopedLatticeBase.MaxEntityCount()
 }
 
 // (Strong) Live Variables analysis
@@ -250,13 +319,14 @@ func (c *LiveVarsAn) BoundaryFact(graph spir.Graph, ctx *spir.Context) lattice.P
 	// Generate the boundary information for the given graph.
 	factId := lattice.NIL_FACT_ID.WithAnalysisId(c.AnalysisId()).
 		WithUBEntityId(ctx.CurrentScopeEid())
-	var exitFact *LiveVarsLT = nil
+	var exitFact lattice.Lattice = nil // an untyped nil, i.e. Top
 	// For any function apart from main, the exit fact contains all the globals.
 	if !ctx.IsCurrFuncMain() {
 		globals := ctx.TU().GlobalVars()
-		exitFact = NewLiveVarsLT(nil /*parent*/, factId.WithFactPoint(lattice.FactIdUB_Point_OUT), globals.Len())
-		exitFact.gen = globals
-		exitFact.islive = false
+		exitLV := NewLiveVarsLT(nil /*parent*/, factId.WithFactPoint(lattice.FactIdUB_Point_OUT), globals.Len())
+		exitLV.gen = globals
+		exitLV.islive = false
+		exitFact = exitLV
 	}
 	return lattice.NewPair(nil, exitFact, factId.WithFactPoint(lattice.FactIdUB_Point_INOUT))
 }
@@ -267,7 +337,9 @@ func (c *LiveVarsAn) NewNonNilTopLattice(factId lattice.FactId) lattice.Lattice
 
 func (c *LiveVarsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair, ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
 	factChange := lattice.NoChange
-	changed := false
+	// The first IN fact (from the OUT fact) is a change from Top,
+	// even if the instruction neither generates nor kills.
+	changed := inOut.L1() == nil
 	l1 := GetL1(inOut, false)
 
 	// For each instruction kind:
@@ -277,7 +349,7 @@ func (c *LiveVarsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair, ctx *spir.C
 		// Statement with one to three operands that must be marked live.
 		eid1, eid2, eid3 := insn.GetOperands()
 		l1 = GetL1(inOut, true)
-		changed = l1.Gen3(eid1, eid2, eid3)
+		changed = l1.Gen3(eid1, eid2, eid3) || changed
 		if ik == spir.K_IK_IUSE_KILL {
 			// Hard kill all the variables at this program point.
 			l1.kill.MakeUniversal()
@@ -290,7 +362,7 @@ func (c *LiveVarsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair, ctx *spir.C
 		// Statements with single operand that must be marked live.
 		eid1, _, _ := insn.GetOperands()
 		if !eid1.Kind().IsLiteral() {
-			changed := l1.Gen(eid1)
+			changed = l1.Gen(eid1) || changed
 			if changed {
 				factChange = lattice.InChanged
 			}
@@ -300,7 +372,7 @@ func (c *LiveVarsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair, ctx *spir.C
 		// LHS has a simple variable use, and rhs has one or two operands.
 		lhsVar := insn.LhsX().GetOpr1()
 		lhsIsLive := IsLiveAtOut(inOut, lhsVar)
-		changed = l1.Kill(lhsVar)
+		changed = l1.Kill(lhsVar) || changed
 		if lhsIsLive {
 			eid1, eid2 := insn.RhsX().GetOperands()
 			changed = l1.Gen3(eid1, eid2, spir.NIL_ID) || changed
@@ -319,6 +391,54 @@ func (c *LiveVarsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair, ctx *spir.C
 	return inOut, factChange
 }
 
+// Implement the analysis.BitVectorAnalysis interface for LiveVarsAn.
+// InsnTransfer mirrors AnalyzeInsn; the strong liveness of an assignment
+// is a conditional gen of the rhs operands on the lhs.
+
+func (c *LiveVarsAn) MeetIsUnion() bool {
+	return true
+}
+
+func (c *LiveVarsAn) BoundaryEids(graph spir.Graph, ctx *spir.Context) []spir.EntityId {
+	if ctx.IsCurrFuncMain() {
+		return nil
+	}
+	// The set of the globals is fixed: it has no Values.
+	globals := ctx.TU().GlobalVars()
+	eids := make([]spir.EntityId, 0, globals.Len())
+	globals.Iterator(func(_ int, eid spir.EntityId) bool {
+		eids = append(eids, eid)
+		return true
+	})
+	return eids
+}
+
+func (c *LiveVarsAn) InsnTransfer(insn spir.Insn, ctx *spir.Context, t *analysis.BitTransfer) {
+	ik := insn.InsnKind()
+	switch ik {
+	case spir.K_IK_IUSE, spir.K_IK_IUSE_KILL:
+		eid1, eid2, eid3 := insn.GetOperands()
+		t.Gen = append(t.Gen, eid1, eid2, eid3)
+		t.KillAll = ik == spir.K_IK_IUSE_KILL
+	case spir.K_IK_IRETURN, spir.K_IK_ICOND:
+		if eid1, _, _ := insn.GetOperands(); !eid1.Kind().IsLiteral() {
+			t.Gen = append(t.Gen, eid1)
+		}
+	case spir.K_IK_IASGN_RHS_OP, spir.K_IK_IASGN_SIMPLE:
+		lhsVar := insn.LhsX().GetOpr1()
+		eid1, eid2 := insn.RhsX().GetOperands()
+		t.Kill = append(t.Kill, lhsVar)
+		t.CondOn = lhsVar
+		t.CondGen = append(t.CondGen, eid1, eid2)
+	}
+}
+
+func (c *LiveVarsAn) NewBitVectorFact(eids *spir.EidSet, factId lattice.FactId) lattice.Lattice {
+	lv := NewLiveVarsLT(nil, factId, eids.Len())
+	lv.gen = *eids
+	return lv
+}
+
 func GetL1(inOut lattice.Pair, reset bool) *LiveVarsLT {
 	if inOut.L1() != nil {
 		l1 := inOut.L1().(*LiveVarsLT)
@@ -328,12 +448,38 @@ func GetL1(inOut lattice.Pair, reset bool) *LiveVarsLT {
 		return l1
 	}
 	// Otherwise, create a new LiveVarsLT and return it.
-	return NewLiveVarsLT(inOut.L2().(*LiveVarsLT), inOut.FactId().WithFactPoint(lattice.FactIdUB_Point_IN), 0)
+	return NewLiveVarsLT(GetL2(inOut), inOut.FactId().WithFactPoint(lattice.FactIdUB_Point_IN), 0)
+}
+
+// GetL2 returns the OUT fact (nil if it is Top).
+// At a branch, the facts along the true and false edges are merged.
+func GetL2(inOut lattice.Pair) *LiveVarsLT {
+	trueFact, falseFact := analysis.SplitBranchFact(inOut.L2())
+	trueLV, _ := trueFact.(*LiveVarsLT)
+	falseLV, _ := falseFact.(*LiveVarsLT)
+	if falseLV == nil || trueLV == falseLV {
+		return trueLV
+	}
+	if trueLV == nil {
+		return falseLV
+	}
+
+	lvSet := spir.NewEidSet(false, false)
+	trueLV.LiveSet(lvSet)
+	falseLvSet := spir.NewEidSet(false, false)
+	falseLV.LiveSet(falseLvSet)
+	lvSet.UnionWith(*falseLvSet)
+
+	merged := NewLiveVarsLT(nil, trueLV.FactId(), trueLV.MaxEntityCount())
+	merged.gen = *lvSet
+	merged.islive = trueLV.islive || falseLV.islive
+	return merged
 }
 
 func IsLiveAtOut(inOut lattice.Pair, eid spir.EntityId) bool {
-	if inOut.L2() == nil {
+	out := GetL2(inOut)
+	if out == nil {
 		return false
 	}
-	return inOut.L2().(*LiveVarsLT).IsLive(eid)
+	return out.IsLive(eid)
 }
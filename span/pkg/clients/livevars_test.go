@@ -0,0 +1,118 @@
+package clients
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+func liveSet(l lattice.Lattice) *spir.EidSet {
+	lvSet := spir.NewEidSet(false, false)
+	if lv, ok := l.(*LiveVarsLT); ok && lv != nil {
+		lv.LiveSet(lvSet)
+	}
+	return lvSet
+}
+
+// The bit-vector solver should compute the same live sets as the generic one.
+func TestLiveVars_bitVectorSolver(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	for tuName, newTU := range map[string]func() *spir.TU{
+		"A": spir.NewExampleTU_A, "B_1": spir.NewExampleTU_B_1,
+	} {
+		tu := newTU()
+		main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+		want := analysis.AnalyzeFunction(tu, main, &LiveVarsAn{}, false, false)
+		got := analysis.AnalyzeFunctionWithSolver(tu, main, &LiveVarsAn{},
+			analysis.BitVectorSolver, false, false)
+
+		// The generic solver stops within a block once the facts don't change,
+		// so it may not have facts for all the instructions.
+		if len(got.FactMap) < len(want.FactMap) {
+			t.Fatalf("TU %s: expected at least %d facts, got %d", tuName, len(want.FactMap), len(got.FactMap))
+		}
+		nonEmpty := false
+		for insnId, wantPair := range want.FactMap {
+			gotPair := got.FactMap[insnId]
+			wantIn, wantOut := liveSet(wantPair.L1()), liveSet(GetL2(wantPair))
+			gotIn, gotOut := liveSet(gotPair.L1()), liveSet(gotPair.L2())
+			if !gotIn.Equals(*wantIn) || !gotOut.Equals(*wantOut) {
+				t.Errorf("TU %s, insn %v: expected %v -> %v, got %v -> %v",
+					tuName, insnId, wantIn, wantOut, gotIn, gotOut)
+			}
+			nonEmpty = nonEmpty || !wantIn.IsEmpty()
+		}
+		if !nonEmpty {
+			t.Errorf("TU %s: expected some live variables", tuName)
+		}
+	}
+}
+
+// The globals are live at the exit of a function other than main,
+// with both the solvers.
+func TestLiveVars_bitVectorSolverGlobals(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_Globals()
+	f := tu.GetFunction("f")
+	g := tu.GetEntityId("g")
+	want := analysis.AnalyzeFunction(tu, f, &LiveVarsAn{}, false, false)
+	got := analysis.AnalyzeFunctionWithSolver(tu, f, &LiveVarsAn{}, analysis.BitVectorSolver, false, false)
+
+	for insnId, wantPair := range want.FactMap {
+		gotPair := got.FactMap[insnId]
+		wantIn, wantOut := liveSet(wantPair.L1()), liveSet(GetL2(wantPair))
+		gotIn, gotOut := liveSet(gotPair.L1()), liveSet(gotPair.L2())
+		if !gotIn.Equals(*wantIn) || !gotOut.Equals(*wantOut) {
+			t.Errorf("insn %v: expected %v -> %v, got %v -> %v", insnId, wantIn, wantOut, gotIn, gotOut)
+		}
+	}
+	entryIn := liveSet(got.FactMap[f.Body().EntryBlock().EntryInsnId()].L1())
+	if !entryIn.Contains(g) || !entryIn.Contains(tu.GetEntityId("a")) {
+		t.Errorf("expected a and g live at the entry, got %v", entryIn)
+	}
+}
+
+// A chain of facts (e.g. one per instruction) is bounded by the flatten
+// policy, without changing the liveness.
+func TestLiveVarsLT_flattenPolicy(t *testing.T) {
+	policy := &lattice.FlattenPolicy{MaxDepth: 4, MaxParentLookups: 3}
+	root := NewLiveVarsLT(nil, lattice.NIL_FACT_ID, 16)
+	root.SetFlattenPolicy(policy)
+	root.Gen(spir.EntityId(1))
+	root.Gen(spir.EntityId(2))
+
+	lv := root
+	for i := 3; i <= 10; i++ {
+		lv = NewLiveVarsLT(lv, lattice.NIL_FACT_ID, 0)
+		lv.Gen(spir.EntityId(i))
+		lv.Kill(spir.EntityId(i - 1))
+		if lv.ChainDepth() > policy.MaxDepth {
+			t.Fatalf("expected a depth of at most %d, got %d", policy.MaxDepth, lv.ChainDepth())
+		}
+	}
+	want := map[spir.EntityId]bool{1: true, 2: false, 9: false, 10: true, 11: false}
+	parent, depth := lv.Parent(), lv.ChainDepth()
+	for id, live := range want {
+		if lv.IsLive(id) != live {
+			t.Errorf("IsLive(%v): expected %v", id, live)
+		}
+	}
+	if lv.Parent() != parent || lv.ChainDepth() != depth || lv.ParentLookups() < policy.MaxParentLookups {
+		t.Errorf("expected the lookups counted, without modifying the lattice")
+	}
+
+	// A lattice based on a lattice queried too often is flattened.
+	child := NewLiveVarsLT(lv, lattice.NIL_FACT_ID, 0)
+	if child.Parent() != nil || child.MaxEntityCount() != 16 {
+		t.Errorf("expected a flattened lattice with the entity count of the root, got depth %d, count %d",
+			child.ChainDepth(), child.MaxEntityCount())
+	}
+	for id, live := range want {
+		if child.IsLive(id) != live {
+			t.Errorf("child: IsLive(%v): expected %v", id, live)
+		}
+	}
+}
@@ -0,0 +1,274 @@
+package clients
+
+// (May) Reaching Definitions Analysis Client
+//
+// The fact of a variable is the may-set of the ids of the instructions that
+// may have defined it last. An assignment to the variable kills its other
+// definitions. Without a points-to analysis, a call or a store through a
+// pointer is assumed to (maybe) define only the global variables.
+//
+// It is solved by IntraPAN and by the sparse solver (see analysis.SparsePAN).
+// It is also a SummaryAnalysis: the summary of a function is the reaching
+// definitions at its exit, whose definitions of the globals reach its calls.
+
+import (
+	"fmt"
+	"maps"
+	"slices"
+	"strings"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// Reaching definitions lattice type
+// It maps each variable to the may-set of its reaching definitions; a variable
+// not in the map has no reaching definition (Top). It is immutable.
+type ReachDefsLT struct {
+	defs map[spir.EntityId]lattice.ConstLattice // of *lattice.MaySetLattice
+}
+
+var _ lattice.SizedLattice = (*ReachDefsLT)(nil)
+var _ lattice.ConstLattice = (*ReachDefsLT)(nil)
+
+// The may-set of the definition by the instruction.
+func reachDef(insn spir.Insn) lattice.ConstLattice {
+	return lattice.NewMaySetLattice(*spir.NewEidSet(false, false, spir.EntityId(insn.Id())), false)
+}
+
+// Get returns the reaching definitions of the variable (nil if none).
+func (l *ReachDefsLT) Get(eid spir.EntityId) lattice.ConstLattice {
+	return l.defs[eid]
+}
+
+func (l *ReachDefsLT) IsConstLattice() bool {
+	return true
+}
+
+func (l *ReachDefsLT) IsTop() bool {
+	return len(l.defs) == 0
+}
+
+// IsBot is false, since the lattice does not carry the universe of the definitions.
+func (l *ReachDefsLT) IsBot() bool {
+	return false
+}
+
+func (l *ReachDefsLT) WeakerThan(other lattice.Lattice) bool {
+	oth, ok := other.(*ReachDefsLT)
+	if !ok {
+		return false
+	}
+	for eid, defs := range oth.defs {
+		if lDefs := l.defs[eid]; lDefs == nil || !lattice.WeakerThan(lDefs, defs) {
+			return false
+		}
+	}
+	return true
+}
+
+func (l *ReachDefsLT) Equals(other lattice.Lattice) bool {
+	oth, ok := other.(*ReachDefsLT)
+	if !ok {
+		return false
+	}
+	return l == oth || maps.EqualFunc(l.defs, oth.defs, func(d1, d2 lattice.ConstLattice) bool {
+		return lattice.Equals(d1, d2)
+	})
+}
+
+// Meet returns the union of the definitions of each variable.
+func (l *ReachDefsLT) Meet(other lattice.Lattice) (lattice.Lattice, bool) {
+	oth, ok := other.(*ReachDefsLT)
+	if !ok {
+		return l, false
+	}
+	var defs map[spir.EntityId]lattice.ConstLattice // copied on the first change
+	for eid, othDefs := range oth.defs {
+		newDefs, changed := lattice.ConstMeet(l.defs[eid], othDefs)
+		if changed {
+			if defs == nil {
+				defs = maps.Clone(l.defs)
+			}
+			defs[eid] = newDefs
+		}
+	}
+	if defs == nil {
+		return l, false
+	}
+	return &ReachDefsLT{defs: defs}, true
+}
+
+// Join returns the intersection of the definitions of each variable.
+func (l *ReachDefsLT) Join(other lattice.Lattice) (lattice.Lattice, bool) {
+	oth, ok := other.(*ReachDefsLT)
+	if !ok {
+		return l, false
+	}
+	defs := make(map[spir.EntityId]lattice.ConstLattice, len(l.defs))
+	changed := false
+	for eid, lDefs := range l.defs {
+		othDefs := oth.defs[eid]
+		if othDefs == nil { // no definition (Top) in the other
+			changed = true
+			continue
+		}
+		newDefs, change := lattice.ConstJoin(lDefs, othDefs)
+		changed = changed || change
+		if !lattice.IsTop(newDefs) {
+			defs[eid] = newDefs
+		}
+	}
+	if !changed {
+		return l, false
+	}
+	return &ReachDefsLT{defs: defs}, true
+}
+
+// The domain is finite: the widening is Meet.
+func (l *ReachDefsLT) Widen(other lattice.Lattice) (lattice.Lattice, bool) {
+	return l.Meet(other)
+}
+
+// SizeBytes estimates the bytes held by the fact: its variables and their
+// definitions.
+func (l *ReachDefsLT) SizeBytes() int64 {
+	size := int64(lattice.LatticeBytes)
+	for _, defs := range l.defs {
+		size += lattice.LatticeBytes + lattice.SizeBytes(defs)
+	}
+	return size
+}
+
+func (l *ReachDefsLT) String() string {
+	parts := make([]string, 0, len(l.defs))
+	for _, eid := range slices.Sorted(maps.Keys(l.defs)) {
+		parts = append(parts, fmt.Sprintf("%s: %s", eid, lattice.String(l.defs[eid])))
+	}
+	return fmt.Sprintf("ReachDefsLT{%s}", strings.Join(parts, ", "))
+}
+
+// Reaching Definitions Analysis
+// It is a forward analysis, a SparseAnalysis and a SummaryAnalysis.
+type ReachDefsAn struct {
+	analysis.AnalysisClientBase
+}
+
+var _ analysis.SparseAnalysis = (*ReachDefsAn)(nil)
+var _ analysis.SummaryAnalysis = (*ReachDefsAn)(nil)
+
+// The entry and the exit facts are Top: no definition reaches the entry.
+func (an *ReachDefsAn) BoundaryFact(graph spir.Graph, ctx *spir.Context) lattice.Pair {
+	return lattice.NewPair(nil, nil, lattice.NIL_FACT_ID.WithAnalysisId(an.AnalysisId()).
+		WithUBEntityId(ctx.CurrentScopeEid()).
+		WithFactPoint(lattice.FactIdUB_Point_INOUT))
+}
+
+func (an *ReachDefsAn) NewNonNilTopLattice(factId lattice.FactId) lattice.Lattice {
+	return &ReachDefsLT{}
+}
+
+func (an *ReachDefsAn) AnalyzeInsn(insn spir.Insn, inOut lattice.Pair,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	out := inOut.L1()
+	lhsVar, clobbers := analysis.InsnDefs(insn)
+	if lhsVar != spir.NIL_ID || clobbers {
+		var defs map[spir.EntityId]lattice.ConstLattice
+		if in, ok := out.(*ReachDefsLT); ok {
+			defs = maps.Clone(in.defs)
+		}
+		if defs == nil {
+			defs = make(map[spir.EntityId]lattice.ConstLattice)
+		}
+		def := reachDef(insn)
+		if clobbers { // a weak update of the globals
+			globals := ctx.TU().GlobalVars()
+			for _, eid := range globals.Iterator {
+				defs[eid], _ = lattice.ConstMeet(defs[eid], def)
+			}
+		}
+		if lhsVar != spir.NIL_ID { // a strong update
+			defs[lhsVar] = def
+		}
+		out = &ReachDefsLT{defs: defs}
+	}
+
+	factChange := lattice.NoChange
+	if !lattice.Equals(inOut.L2(), out) {
+		factChange = lattice.OutChanged
+	}
+	return lattice.NewPair(inOut.L1(), out, inOut.FactId()), factChange
+}
+
+// EntryValue is nil (Top): no definition reaches the entry.
+func (an *ReachDefsAn) EntryValue(eid spir.EntityId, ctx *spir.Context) lattice.ConstLattice {
+	return nil
+}
+
+func (an *ReachDefsAn) DefValue(insn spir.Insn, operand func(spir.EntityId) lattice.ConstLattice,
+	ctx *spir.Context) lattice.ConstLattice {
+	return reachDef(insn)
+}
+
+func (an *ReachDefsAn) ClobberValue(insn spir.Insn, eid spir.EntityId, ctx *spir.Context) lattice.ConstLattice {
+	globals := ctx.TU().GlobalVars()
+	if !globals.Contains(eid) {
+		return nil
+	}
+	return reachDef(insn)
+}
+
+// FuncSummary is the fact at the exit of the function.
+func (an *ReachDefsAn) FuncSummary(fun *spir.Function, analyzer analysis.Analyzer) lattice.ConstLattice {
+	out, _ := analyzer.GetFactMapValue(fun.Body().ExitBlock().ExitInsnId()).L2().(lattice.ConstLattice)
+	return out
+}
+
+// AnalyzeCall adds the definitions of the globals in the summaries of the
+// callees to those before the call (a callee may not define them on all its
+// paths). A callee without a body, or a call with unknown targets, may define
+// any global at the call as in AnalyzeInsn.
+func (an *ReachDefsAn) AnalyzeCall(insn spir.Insn, inOut lattice.Pair, callees []analysis.CalleeSummary,
+	ctx *spir.Context) (lattice.Pair, lattice.FactChanged) {
+	var defs map[spir.EntityId]lattice.ConstLattice
+	if in, ok := inOut.L1().(*ReachDefsLT); ok {
+		defs = maps.Clone(in.defs)
+	}
+	if defs == nil {
+		defs = make(map[spir.EntityId]lattice.ConstLattice)
+	}
+	def := reachDef(insn)
+	globals := ctx.TU().GlobalVars()
+	unknown := len(callees) == 0
+	for _, callee := range callees {
+		if !callee.Known {
+			unknown = true
+			continue
+		}
+		summary, _ := callee.Summary.(*ReachDefsLT) // nil (Top) until analyzed
+		if summary == nil {
+			continue
+		}
+		for eid, calleeDefs := range summary.defs {
+			if globals.Contains(eid) { // the locals of the callee are out of scope
+				defs[eid], _ = lattice.ConstMeet(defs[eid], calleeDefs)
+			}
+		}
+	}
+	if unknown {
+		for _, eid := range globals.Iterator {
+			defs[eid], _ = lattice.ConstMeet(defs[eid], def)
+		}
+	}
+	if lhsVar, _ := analysis.InsnDefs(insn); lhsVar != spir.NIL_ID { // a strong update
+		defs[lhsVar] = def
+	}
+
+	out := lattice.Lattice(&ReachDefsLT{defs: defs})
+	factChange := lattice.NoChange
+	if !lattice.Equals(inOut.L2(), out) {
+		factChange = lattice.OutChanged
+	}
+	return lattice.NewPair(inOut.L1(), out, inOut.FactId()), factChange
+}
@@ -0,0 +1,170 @@
+package clients
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// The reaching definitions of the variables in the fact (a ReachDefsLT of
+// IntraPAN, or a KV lattice materialized by the sparse solver).
+func reachDefsOf(l lattice.Lattice, eids *spir.EidSet) map[spir.EntityId]lattice.ConstLattice {
+	defs := make(map[spir.EntityId]lattice.ConstLattice)
+	switch l := l.(type) {
+	case *ReachDefsLT:
+		for eid, d := range l.defs {
+			defs[eid] = d
+			eids.Add(eid)
+		}
+	case *lattice.EntityIdMapKVLattice:
+		keys := spir.NewEidSet(false, false)
+		l.AllKeysPresent(keys)
+		for _, eid := range keys.Iterator {
+			defs[eid], _ = l.Get(eid)
+			eids.Add(eid)
+		}
+	}
+	return defs
+}
+
+// A TU with globals and a call (see TestSparsePAN):
+//
+//	g = y; x = g + 10; f(); y = g; return x;
+func newReachDefsTestTU() *spir.TU {
+	tu := spir.NewTU()
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	f := tu.NewFunction("f", funcQT, nil, nil)
+	g := tu.NewVar("g", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	x := tu.NewVar("x", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	y := tu.NewVar("y", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	c10 := tu.NewConst(10, spir.Int32QT)
+
+	bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 5)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(g), spir.ValX(y)), nil)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(x), spir.BinX(spir.K_XK_XADD, g, c10)), nil)
+	tu.AddInsn(bb, spir.CallI(spir.CallX(f.Id(), tu.NewCallSiteId())), nil)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(y), spir.ValX(g)), nil)
+	tu.AddInsn(bb, spir.ReturnI(spir.ValX(x)), nil)
+	tu.NewFunction(spir.K_MAIN_FUNC_NAME, funcQT, nil, bb)
+	return tu
+}
+
+// The sparse solver should compute the same reaching definitions as IntraPAN.
+func TestReachDefs_sparseSolver(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	for tuName, newTU := range map[string]func() *spir.TU{
+		"B_1": spir.NewExampleTU_B_1, "Loops": func() *spir.TU { return spir.NewExampleTU_Loops(3) },
+		"calls": newReachDefsTestTU,
+	} {
+		tu := newTU()
+		main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+		want := analysis.AnalyzeFunction(tu, main, &ReachDefsAn{}, false, false)
+		got := analysis.AnalyzeFunctionWithSolver(tu, main, &ReachDefsAn{}, analysis.SparseSolver, false, false)
+
+		nonEmpty := false
+		for insnId, wantPair := range want.FactMap {
+			gotPair := got.FactMap[insnId]
+			for i, lats := range [][2]lattice.Lattice{{wantPair.L1(), gotPair.L1()}, {wantPair.L2(), gotPair.L2()}} {
+				eids := spir.NewEidSet(false, false)
+				wantDefs, gotDefs := reachDefsOf(lats[0], eids), reachDefsOf(lats[1], eids)
+				for _, eid := range eids.Iterator {
+					if !lattice.Equals(wantDefs[eid], gotDefs[eid]) {
+						t.Errorf("TU %s, insn %v (%d), %v: expected the defs %v, got %v",
+							tuName, insnId, i, eid, wantDefs[eid], gotDefs[eid])
+					}
+				}
+				nonEmpty = nonEmpty || len(wantDefs) > 0
+			}
+		}
+		if !nonEmpty {
+			t.Errorf("TU %s: expected some reaching definitions", tuName)
+		}
+	}
+}
+
+func TestReachDefs_loop(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewExampleTU_C()
+	main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+	initBB := main.Body().EntryBlock()
+	headBB := initBB.TrueSucc()
+	bodyBB := headBB.TrueSucc()
+	res := analysis.AnalyzeFunction(tu, main, &ReachDefsAn{}, false, false)
+
+	i := tu.GetEntityId("i")
+	want := lattice.NewMaySetLattice(*spir.NewEidSet(false, false,
+		spir.EntityId(initBB.Insn(0).Id()), spir.EntityId(bodyBB.Insn(0).Id())), false)
+	head := res.FactMap[headBB.EntryInsnId()].L1().(*ReachDefsLT)
+	if got := head.Get(i); !lattice.Equals(got, want) {
+		t.Errorf("expected the defs %v of i at the loop head, got %v", want, got)
+	}
+}
+
+// The definitions of the globals in a callee reach after its calls, and a
+// call to a function without a body may define any global.
+//
+//	f() { g = 1; }
+//	main() { g = 0; f(); x = g; ext(); return x; }
+func TestReachDefs_interproc(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := spir.NewTU()
+	funcQT := spir.NewQualVT(spir.NewFunctionVT(spir.Int32QT, nil, nil, false, ""), spir.K_QK_QNIL)
+	g := tu.NewVar("g", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	x := tu.NewVar("x", spir.K_EK_EVAR_GLBL, spir.NIL_ID, spir.NIL_ID, spir.Int32QT)
+	ext := tu.NewFunction("ext", funcQT, nil, nil)
+
+	fbb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 2)
+	tu.AddInsn(fbb, spir.AssignI(spir.ValX(g), spir.ValX(tu.NewConst(1, spir.Int32QT))), nil)
+	tu.AddInsn(fbb, spir.ReturnI(spir.ValX(spir.NIL_ID)), nil)
+	f := tu.NewFunction("f", funcQT, nil, fbb)
+
+	bb := spir.NewBasicBlock(tu.GetUniqueBBId(), 0, spir.NIL_ID, 5)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(g), spir.ValX(tu.NewConst(0, spir.Int32QT))), nil)
+	tu.AddInsn(bb, spir.CallI(spir.CallX(f.Id(), tu.NewCallSiteId())), nil)
+	tu.AddInsn(bb, spir.AssignI(spir.ValX(x), spir.ValX(g)), nil)
+	tu.AddInsn(bb, spir.CallI(spir.CallX(ext.Id(), tu.NewCallSiteId())), nil)
+	tu.AddInsn(bb, spir.ReturnI(spir.ValX(x)), nil)
+	main := tu.NewFunction(spir.K_MAIN_FUNC_NAME, funcQT, nil, bb)
+
+	newReachDefs := func() analysis.Analysis { return &ReachDefsAn{} }
+	defsOf := func(insns ...spir.Insn) lattice.ConstLattice {
+		eids := spir.NewEidSet(false, false)
+		for _, insn := range insns {
+			eids.Add(spir.EntityId(insn.Id()))
+		}
+		return lattice.NewMaySetLattice(*eids, false)
+	}
+	sched := analysis.NewSummaryScheduler(tu, newReachDefs, false)
+	sched.AnalyzeTU()
+	if summary, _ := sched.Summary(f.Id()); !lattice.Equals(summary.(*ReachDefsLT).Get(g), defsOf(fbb.Insn(0))) {
+		t.Errorf("unexpected summary of f: %v", summary)
+	}
+
+	// The value contexts of f compute the same facts here.
+	for _, mode := range []analysis.InterprocMode{analysis.SummariesMode, analysis.ValueContextsMode} {
+		tuAnalyzer, ok := analysis.NewTUAnalyzer(tu, newReachDefs, mode, 0)
+		if !ok {
+			t.Fatalf("mode %d: expected an analyzer of the TU", mode)
+		}
+		var factMap analysis.AnalysisFactMap
+		for _, res := range tuAnalyzer.AnalyzeTU() {
+			if res.FuncId == main.Id() {
+				factMap = res.FactMap
+			}
+		}
+		afterF := factMap[bb.Insn(2).Id()].L1().(*ReachDefsLT)
+		if got, want := afterF.Get(g), defsOf(bb.Insn(0), fbb.Insn(0)); !lattice.Equals(got, want) {
+			t.Errorf("mode %d: expected the defs %v of g after f(), got %v", mode, want, got)
+		}
+		if got := afterF.Get(x); got != nil {
+			t.Errorf("mode %d: expected no def of x after f(), got %v", mode, got)
+		}
+		afterExt := factMap[bb.Insn(4).Id()].L1().(*ReachDefsLT)
+		if got, want := afterExt.Get(x), defsOf(bb.Insn(2), bb.Insn(3)); !lattice.Equals(got, want) {
+			t.Errorf("mode %d: expected the defs %v of x after ext(), got %v", mode, want, got)
+		}
+	}
+}
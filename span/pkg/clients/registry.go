@@ -0,0 +1,49 @@
+package clients
+
+// This file maintains a registry of the analysis clients by name.
+// The names are used to select the analyses from the command line.
+
+import (
+	"slices"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/analysis/lattice"
+)
+
+type registeredClient struct {
+	analysisId lattice.AnalysisId
+	factory    analysis.AnalysisFactory
+}
+
+// The analysis ids are fixed here so that the facts of
+// different clients never share a lattice.AnalysisId.
+var registry = map[string]registeredClient{
+	"livevars":    {1, func() analysis.Analysis { return &LiveVarsAn{} }},
+	"botbot-fwd":  {2, func() analysis.Analysis { return &ForwardBotBotClient{} }},
+	"botbot-back": {3, func() analysis.Analysis { return &BackwardBotBotClient{} }},
+	"reachdefs":   {4, func() analysis.Analysis { return &ReachDefsAn{} }},
+}
+
+// AnalysisNames returns the names of all the registered clients in sorted order.
+func AnalysisNames() []string {
+	names := make([]string, 0, len(registry))
+	for name := range registry {
+		names = append(names, name)
+	}
+	slices.Sort(names)
+	return names
+}
+
+// AnalysisFactory returns a factory for the client registered with the given name.
+// The analyses created have their analysis id set.
+func AnalysisFactory(name string) (analysis.AnalysisFactory, bool) {
+	client, ok := registry[name]
+	if !ok {
+		return nil, false
+	}
+	return func() analysis.Analysis {
+		an := client.factory()
+		an.SetInstanceId(an.InstanceId().WithAnalysisId(client.analysisId))
+		return an
+	}, true
+}
@@ -0,0 +1,43 @@
+package clients
+
+import (
+	"testing"
+
+	"github.com/adhuliya/span/pkg/analysis"
+	"github.com/adhuliya/span/pkg/logger"
+	"github.com/adhuliya/span/pkg/spir"
+)
+
+// Every registered client should run to a fixed point on the example TUs.
+func TestRegisteredClientsOnExampleTUs(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tus := map[string]func() *spir.TU{
+		"A":   spir.NewExampleTU_A,
+		"B_1": spir.NewExampleTU_B_1,
+	}
+	insnCounts := map[string]int{"A": 2, "B_1": 5}
+
+	for tuName, newTU := range tus {
+		for _, name := range AnalysisNames() {
+			newAnalysis, ok := AnalysisFactory(name)
+			if !ok {
+				t.Fatalf("no factory for %s", name)
+			}
+			tu := newTU()
+			main := tu.GetFunction(spir.K_MAIN_FUNC_NAME)
+			an := newAnalysis()
+			if an.InstanceId().AnalysisId() == 0 {
+				t.Errorf("%s: analysis id is not set", name)
+			}
+			res := analysis.AnalyzeFunction(tu, main, an, false, false)
+			if len(res.FactMap) != insnCounts[tuName] {
+				t.Errorf("TU %s, %s: expected %d facts, got %d",
+					tuName, name, insnCounts[tuName], len(res.FactMap))
+			}
+		}
+	}
+
+	if _, ok := AnalysisFactory("no-such-analysis"); ok {
+		t.Errorf("expected no factory for an unknown analysis")
+	}
+}
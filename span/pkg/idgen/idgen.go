@@ -1,7 +1,9 @@
 package idgen
 
 import (
+	"cmp"
 	"fmt"
+	"slices"
 )
 
 // This file defines the ID generation structure and functions.
@@ -177,6 +179,84 @@ func (gen *IDGenerator) AllocateID(prefix uint16, seqIdBitLen uint8) uint32 {
 	return constructFullId(poolId, seqId)
 }
 
+// IDBlock is a contiguous block of sequence ids reserved in a pool by
+// ReserveIDs, handed out in order by Next without looking up the pool.
+type IDBlock struct {
+	gen    *IDGenerator
+	poolId poolId_t
+	next   uint32 // the next sequence id to hand out
+	end    uint32 // the last sequence id of the block (next > end if exhausted)
+}
+
+// ReserveIDs reserves a block of (at most) count ids of the pool, to allocate
+// many ids cheaply (e.g. converting a TU). The block is taken from the start
+// of the first free range, so that the ids are the same as those of count
+// calls to AllocateID; if the range is smaller, the block is smaller and
+// IDBlock.Next falls back to AllocateID.
+// The unused ids of the block must be given back with IDBlock.Release.
+func (gen *IDGenerator) ReserveIDs(prefix uint16, seqIdBitLen uint8, count uint32) *IDBlock {
+	poolId := validateAndEncodePoolId(prefix, seqIdBitLen)
+	pool := gen.getOrCreatePool(poolId)
+	block := &IDBlock{gen: gen, poolId: poolId, next: 1, end: 0}
+	if count == 0 || pool.from > pool.to {
+		return block
+	}
+
+	block.next = pool.from
+	block.end = pool.to
+	if pool.to-pool.from >= count {
+		block.end = pool.from + count - 1
+		pool.from += count
+		return block
+	}
+
+	// The whole range is taken.
+	if pool.next != nil {
+		tmp := pool.next
+		pool.from, pool.to, pool.next = tmp.from, tmp.to, tmp.next
+		emptyIDPool(tmp)
+	} else {
+		pool.from = maxSeqIdValue(seqIdBitLen)
+		pool.to = maxSeqIdValue(seqIdBitLen) - 1
+	}
+	return block
+}
+
+// Next returns the next id of the block, or of the pool if the block is exhausted.
+func (b *IDBlock) Next() uint32 {
+	if b.next > b.end {
+		return b.gen.AllocateID(b.poolId.Prefix(), b.poolId.SeqIdBitLen())
+	}
+	seqId := b.next
+	b.next++
+	return constructFullId(b.poolId, seqId)
+}
+
+// Remaining returns the number of ids left in the block.
+func (b *IDBlock) Remaining() uint32 {
+	if b.next > b.end {
+		return 0
+	}
+	return b.end - b.next + 1
+}
+
+// Release gives the unused ids of the block back to the pool.
+func (b *IDBlock) Release() {
+	if b.next > b.end {
+		return
+	}
+	pool := b.gen.idPools[b.poolId]
+	if pool.from == b.end+1 && pool.from <= pool.to {
+		// The common case: the ids after the block were not allocated.
+		pool.from = b.next
+	} else {
+		for seqId := b.next; seqId <= b.end; seqId++ {
+			b.gen.freeID(constructFullId(b.poolId, seqId), b.poolId)
+		}
+	}
+	b.next = b.end + 1
+}
+
 // FreeID puts an id back to the free id sequence or the id pool.
 // It returns true if the ID is successfully freed.
 func (gen *IDGenerator) FreeID(fullId uint32, seqIdBitLen uint8) bool {
@@ -301,3 +381,53 @@ func (gen *IDGenerator) ReserveID(fullId uint32, seqIdBitLen uint8) bool {
 	}
 	return false // Not found in any pool
 }
+
+// A range [From, To] of free sequence ids in a pool.
+// An exhausted pool has From > To.
+type FreeRange struct {
+	From uint32
+	To   uint32
+}
+
+// PoolState is the state of a single pool of ids.
+// It is used to save and restore the state of an IDGenerator (e.g. in a snapshot).
+type PoolState struct {
+	PoolId uint32
+	Free   []FreeRange // nil if the pool has no free list
+}
+
+// State returns the state of all the pools, sorted by the pool id.
+func (gen *IDGenerator) State() []PoolState {
+	states := make([]PoolState, 0, len(gen.idPools))
+	for poolId, pool := range gen.idPools {
+		state := PoolState{PoolId: uint32(poolId)}
+		for ; pool != nil; pool = pool.next {
+			state.Free = append(state.Free, FreeRange{From: pool.from, To: pool.to})
+		}
+		states = append(states, state)
+	}
+	slices.SortFunc(states, func(a, b PoolState) int {
+		return cmp.Compare(a.PoolId, b.PoolId)
+	})
+	return states
+}
+
+// NewIDGeneratorFromState creates an IDGenerator with the given pool states.
+// The generator allocates the same ids as the one the states were taken from.
+func NewIDGeneratorFromState(states []PoolState) *IDGenerator {
+	gen := NewIDGenerator()
+	for _, state := range states {
+		var head, tail *freeIdPool
+		for _, r := range state.Free {
+			pool := newIDPool(r.From, r.To)
+			if head == nil {
+				head = pool
+			} else {
+				tail.next = pool
+			}
+			tail = pool
+		}
+		gen.idPools[poolId_t(state.PoolId)] = head
+	}
+	return gen
+}
@@ -2,6 +2,8 @@
 package idgen
 
 import (
+	"fmt"
+	"math/rand/v2"
 	"testing"
 )
 
@@ -534,3 +536,151 @@ func TestIDGenerator_ReserveIDRemoveSingletonSecondBlockWithPrev(t *testing.T) {
 		t.Fatal("ReserveID(53) should remove a singleton block when a previous free block exists")
 	}
 }
+
+func TestIDGenerator_StateRoundTrip(t *testing.T) {
+	gen := NewIDGenerator()
+	prefixA, prefixB := uint16(0x0300), uint16(0x0301)
+	bits := uint8(20)
+	for range 5 {
+		_ = gen.AllocateID(prefixA, bits)
+	}
+	_ = gen.AllocateID(prefixB, bits)
+	poolId := validateAndEncodePoolId(prefixA, bits)
+	if !gen.FreeID(constructFullId(poolId, 3), bits) {
+		t.Fatal("FreeID(seq 3) should succeed")
+	}
+
+	states := gen.State()
+	if len(states) != 2 || states[0].PoolId > states[1].PoolId {
+		t.Fatalf("State() should return 2 pools sorted by id, got %v", states)
+	}
+	restored := NewIDGeneratorFromState(states)
+	for range 4 {
+		for _, prefix := range []uint16{prefixA, prefixB} {
+			want := gen.AllocateID(prefix, bits)
+			if got := restored.AllocateID(prefix, bits); got != want {
+				t.Fatalf("restored generator allocated 0x%X, want 0x%X", got, want)
+			}
+		}
+	}
+}
+
+// A block reserves the same ids as the allocations one by one, and gives
+// the unused ones back.
+func TestIDGenerator_ReserveIDs(t *testing.T) {
+	const prefix, bitLen = uint16(3), uint8(20)
+	want := NewIDGenerator()
+	got := NewIDGenerator()
+	for range 3 {
+		want.AllocateID(prefix, bitLen)
+		got.AllocateID(prefix, bitLen)
+	}
+
+	block := got.ReserveIDs(prefix, bitLen, 10)
+	if block.Remaining() != 10 {
+		t.Fatalf("expected 10 ids in the block, got %d", block.Remaining())
+	}
+	for i := range 6 {
+		if w, g := want.AllocateID(prefix, bitLen), block.Next(); w != g {
+			t.Fatalf("id %d: expected %d, got %d", i, w, g)
+		}
+	}
+	block.Release()
+	if block.Remaining() != 0 {
+		t.Errorf("expected no ids left after the release, got %d", block.Remaining())
+	}
+	if w, g := want.AllocateID(prefix, bitLen), got.AllocateID(prefix, bitLen); w != g {
+		t.Errorf("after the release: expected %d, got %d", w, g)
+	}
+	if fmt.Sprint(want.State()) != fmt.Sprint(got.State()) {
+		t.Errorf("expected the state %v, got %v", want.State(), got.State())
+	}
+}
+
+// A block larger than the first free range takes the range, and then
+// allocates from the pool.
+func TestIDGenerator_ReserveIDsFragmented(t *testing.T) {
+	const prefix, bitLen = uint16(3), uint8(20)
+	want := NewIDGenerator()
+	got := NewIDGenerator()
+	for _, gen := range []*IDGenerator{want, got} {
+		ids := make([]uint32, 10)
+		for i := range ids {
+			ids[i] = gen.AllocateID(prefix, bitLen)
+		}
+		gen.FreeID(ids[2], bitLen)
+		gen.FreeID(ids[3], bitLen)
+		gen.FreeID(ids[7], bitLen)
+	}
+
+	block := got.ReserveIDs(prefix, bitLen, 5)
+	if block.Remaining() != 2 {
+		t.Fatalf("expected the 2 ids of the first free range, got %d", block.Remaining())
+	}
+	for i := range 5 {
+		if w, g := want.AllocateID(prefix, bitLen), block.Next(); w != g {
+			t.Fatalf("id %d: expected %d, got %d", i, w, g)
+		}
+	}
+	block.Release()
+	if fmt.Sprint(want.State()) != fmt.Sprint(got.State()) {
+		t.Errorf("expected the state %v, got %v", want.State(), got.State())
+	}
+}
+
+const benchPrefix, benchSeqIdBitLen = uint16(0x07A5), uint8(20)
+
+func BenchmarkIDGenerator_AllocateID(b *testing.B) {
+	for _, n := range []int{1 << 10, 1 << 14, 1 << 18} {
+		b.Run(fmt.Sprintf("n=%d", n), func(b *testing.B) {
+			b.ReportAllocs()
+			for b.Loop() {
+				gen := NewIDGenerator()
+				for range n {
+					gen.AllocateID(benchPrefix, benchSeqIdBitLen)
+				}
+			}
+		})
+	}
+}
+
+// BenchmarkIDGenerator_churn frees a random quarter of n live ids and
+// allocates them again, which fragments the free pools.
+func BenchmarkIDGenerator_churn(b *testing.B) {
+	for _, n := range []int{1 << 10, 1 << 14} {
+		b.Run(fmt.Sprintf("n=%d", n), func(b *testing.B) {
+			r := rand.New(rand.NewPCG(1, 1))
+			gen := NewIDGenerator()
+			ids := make([]uint32, n)
+			for i := range ids {
+				ids[i] = gen.AllocateID(benchPrefix, benchSeqIdBitLen)
+			}
+			b.ReportAllocs()
+			for b.Loop() {
+				r.Shuffle(len(ids), func(i, j int) { ids[i], ids[j] = ids[j], ids[i] })
+				for _, id := range ids[:n/4] {
+					gen.FreeID(id, benchSeqIdBitLen)
+				}
+				for i := range ids[:n/4] {
+					ids[i] = gen.AllocateID(benchPrefix, benchSeqIdBitLen)
+				}
+			}
+		})
+	}
+}
+
+func BenchmarkIDGenerator_ReserveIDs(b *testing.B) {
+	for _, n := range []int{1 << 10, 1 << 14, 1 << 18} {
+		b.Run(fmt.Sprintf("n=%d", n), func(b *testing.B) {
+			b.ReportAllocs()
+			for b.Loop() {
+				gen := NewIDGenerator()
+				block := gen.ReserveIDs(benchPrefix, benchSeqIdBitLen, uint32(n))
+				for range n {
+					block.Next()
+				}
+				block.Release()
+			}
+		})
+	}
+}
@@ -0,0 +1,11 @@
+package logger
+
+import "log/slog"
+
+// Lazy is a log value computed only if the record is logged,
+// e.g. logger.Lazy(func() any { return lattice.String(fact) }).
+type Lazy func() any
+
+func (f Lazy) LogValue() slog.Value {
+	return slog.AnyValue(f())
+}
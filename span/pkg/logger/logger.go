@@ -7,6 +7,9 @@ import (
 
 var logger *slog.Logger
 
+// Whether the traces are logged, i.e. the level is debug (see Tracing).
+var tracing bool
+
 type LogConfig struct {
 	Level        string
 	ShowTime     bool // FIXME: handle this
@@ -60,6 +63,7 @@ func Initialize(config *LogConfig) error {
 	}
 
 	logger = slog.New(handler)
+	tracing = level <= slog.LevelDebug
 	logger.Info("Logger initialized",
 		slog.String("level", config.Level),
 		slog.Bool("show_time", config.ShowTime),
@@ -0,0 +1,40 @@
+//go:build !notrace
+
+package logger
+
+// This file defines the tracing of the hot paths (e.g. the analysis of each
+// instruction), logged at the debug level. The hot paths guard a trace with
+// the cheap check of Tracing, so that its arguments are not even evaluated
+// otherwise:
+//
+//	if logger.Tracing() {
+//		logger.Trace("After analysis", "OutFact", logger.Lazy(func() any { return lattice.String(out) }))
+//	}
+//
+// Building with the `notrace` tag compiles the traces out entirely
+// (see trace_off.go).
+
+import (
+	"context"
+	"log/slog"
+	"runtime"
+	"time"
+)
+
+// Tracing reports whether the traces are logged.
+func Tracing() bool {
+	return tracing
+}
+
+// Trace logs the message and the key-value pairs at the debug level, with
+// the source location of its caller.
+func Trace(msg string, args ...any) {
+	if !tracing {
+		return
+	}
+	var pcs [1]uintptr
+	runtime.Callers(2, pcs[:]) // skip runtime.Callers and Trace
+	r := slog.NewRecord(time.Now(), slog.LevelDebug, msg, pcs[0])
+	r.Add(args...)
+	_ = logger.Handler().Handle(context.Background(), r)
+}
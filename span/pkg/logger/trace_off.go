@@ -0,0 +1,11 @@
+//go:build notrace
+
+package logger
+
+// Tracing is always false with the `notrace` build tag, so the guarded
+// traces are removed by the compiler.
+func Tracing() bool {
+	return false
+}
+
+func Trace(msg string, args ...any) {}
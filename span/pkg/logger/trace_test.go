@@ -0,0 +1,26 @@
+package logger
+
+import "testing"
+
+func TestTrace_lazy(t *testing.T) {
+	evaluated := false
+	lazy := Lazy(func() any { evaluated = true; return "fact" })
+
+	Initialize(NewLogConfig("info"))
+	if Tracing() {
+		t.Fatalf("expected no tracing at the info level")
+	}
+	Trace("not logged", "fact", lazy)
+	if evaluated {
+		t.Errorf("a lazy value of a trace not logged was evaluated")
+	}
+
+	Initialize(NewLogConfig("debug"))
+	if !Tracing() {
+		t.Skip("the traces are compiled out (notrace)")
+	}
+	Trace("logged", "fact", lazy)
+	if !evaluated {
+		t.Errorf("a lazy value of a trace logged was not evaluated")
+	}
+}
@@ -3,7 +3,9 @@ package spir
 import (
 	"fmt"
 	"path/filepath"
+	"slices"
 	"strings"
+	"sync"
 
 	"github.com/adhuliya/span/pkg/idgen"
 )
@@ -167,7 +169,8 @@ type TU struct {
 	entityIdMap map[uint64]EntityId
 
 	// 6. Cached information
-	globalVars *EidSet
+	globalVarsOnce sync.Once // GlobalVars may be called by concurrent analyses
+	globalVars     *EidSet
 }
 
 func NewTU() *TU {
@@ -220,10 +223,25 @@ func (tu *TU) NewCallSiteId() CallSiteId {
 }
 
 func (tu *TU) AddInsn(bb *BasicBlock, insn Insn, srcLoc *SrcLoc) {
+	tu.setInsnId(&insn)
+	tu.setInsnInfo(bb, insn, srcLoc)
+	bb.insns = append(bb.insns, insn)
+}
+
+// setInsnId allocates a new id to the instruction.
+func (tu *TU) setInsnId(insn *Insn) {
 	insnId := InsnId(tu.idGen.AllocateID(insn.GetInsnPrefix16(),
 		K_EK_EINSN0.SeqIdBitLen()))
-	tu.entityInfo[EntityId(insnId)] = &InsnInfo{bbId: bb.id, SrcLoc: *srcLoc}
-	bb.insns = append(bb.insns, insn)
+	insn.SetInsnId(insnId)
+}
+
+// setInsnInfo records the basic block (and the source location) of the instruction.
+func (tu *TU) setInsnInfo(bb *BasicBlock, insn Insn, srcLoc *SrcLoc) {
+	info := &InsnInfo{bbId: bb.id}
+	if srcLoc != nil {
+		info.SrcLoc = *srcLoc
+	}
+	tu.entityInfo[EntityId(insn.Id())] = info
 }
 
 func (tu *TU) GetUniqueBBId() BasicBlockId {
@@ -257,6 +275,9 @@ func (tu *TU) NewVar(name string, eKind EntityKind, eid EntityId, parentId Entit
 	tu.namesToId[name] = entityId
 	tu.idsToName[entityId] = name
 	tu.variables[entityId] = valInfo
+	if parentId == NIL_ID {
+		tu.globalVarsOnce, tu.globalVars = sync.Once{}, nil // a new global
+	}
 	return entityId
 }
 
@@ -304,8 +325,32 @@ func (tu *TU) NewFunction(name string, funcType QualType,
 	return fun
 }
 
+// SetBody sets the body of the function to the CFG of the instruction
+// sequence (see ConstructCFG). The instructions of the sequence (but the
+// labels), and the basic blocks, get new ids. A block without instructions
+// (e.g. the exit block) gets a Nop, as the analyses need the entry and the
+// exit instructions of every block.
 func (fun *Function) SetBody(tu *TU, insnSeq []Insn) {
-	fun.body = ConstructCFG(insnSeq)
+	for i := range insnSeq {
+		if !insnSeq[i].IsLabel() {
+			tu.setInsnId(&insnSeq[i])
+		}
+	}
+
+	cfg := ConstructCFG(insnSeq)
+	cfg.id, cfg.tu, cfg.fid = tu.GetUniqueCFGId(), tu, fun.fid
+	for _, bb := range cfg.basicBlocks {
+		bb.id, bb.fid = tu.GetUniqueBBId(), fun.fid
+		if len(bb.insns) == 0 {
+			nop := NopI()
+			tu.setInsnId(&nop)
+			bb.insns = []Insn{nop}
+		}
+		for _, insn := range bb.insns {
+			tu.setInsnInfo(bb, insn, nil)
+		}
+	}
+	fun.body = cfg
 }
 
 func (fun *Function) Id() EntityId {
@@ -328,6 +373,26 @@ func (fun *Function) Body() Graph {
 	return fun.body
 }
 
+// Callees returns the functions called directly in the body (sorted, unique).
+// The targets of the calls through function pointers are not included.
+func (fun *Function) Callees() []EntityId {
+	if fun.body == nil {
+		return nil
+	}
+	callees := NewEidSet(false, false)
+	for _, bbId := range GetBBWorklist(fun.body, NoOrder) {
+		for _, insn := range fun.body.BasicBlock(bbId).insns {
+			if !insn.HasCallExpr() {
+				continue
+			}
+			if callee := insn.GetCallExpr().GetCallee(); callee.Kind().IsFunction() {
+				callees.Add(callee)
+			}
+		}
+	}
+	return callees.Values()
+}
+
 func (tu *TU) GlobalInitFuncId() EntityId {
 	return tu.globalInit
 }
@@ -342,20 +407,18 @@ func (tu *TU) GetFunction(name string) *Function {
 }
 
 func (tu *TU) GlobalVars() EidSet {
-	if tu.globalVars != nil {
-		return *tu.globalVars
-	}
-
-	globals := &EidSet{}
-	// FIXME: Check the logic. This is not correct. The global variables are not always the ones with parentId == NIL_ID.
-	for eid, variable := range tu.variables {
-		if variable.parentId == NIL_ID {
-			globals.Add(eid)
+	tu.globalVarsOnce.Do(func() {
+		globals := &EidSet{}
+		// FIXME: Check the logic. This is not correct. The global variables are not always the ones with parentId == NIL_ID.
+		for eid, variable := range tu.variables {
+			if variable.parentId == NIL_ID {
+				globals.Add(eid)
+			}
 		}
-	}
-	globals.MakeFixed()     // the set is now fixed and cannot be modified after creation
-	tu.globalVars = globals // cache the result
-	return *globals
+		globals.MakeFixed()     // the set is now fixed and cannot be modified after creation
+		tu.globalVars = globals // cache the result
+	})
+	return *tu.globalVars
 }
 
 func (tu *TU) AddSrcFile(fullPath string) FileId {
@@ -387,6 +450,16 @@ func (tu *TU) GetSrcFileId(fullPath string) FileId {
 	return FileId(NIL_ID)
 }
 
+// FunctionIds returns the ids of all the functions in the TU in ascending order.
+func (tu *TU) FunctionIds() []EntityId {
+	ids := make([]EntityId, 0, len(tu.functions))
+	for id := range tu.functions {
+		ids = append(ids, id)
+	}
+	slices.Sort(ids)
+	return ids
+}
+
 func (tu *TU) GetFunctionById(id EntityId) *Function {
 	if fun, ok := tu.functions[id]; ok {
 		return fun
@@ -0,0 +1,229 @@
+package spir
+
+// This file defines the call graph of a TU, built from its call instructions.
+//
+// A direct call has a single target: the function named in the call.
+// A call through a function pointer may target any function whose address
+// is taken in the TU, i.e. any function used as a value (e.g. `p = f`,
+// `p = &f`, `return f`) rather than only as a callee. This is conservative:
+// the pointer analyses are not used to narrow down the targets.
+//
+// The strongly connected components (SCCs) of the call graph are the sets
+// of mutually recursive functions. They are listed bottom-up: an SCC comes
+// after all the SCCs it calls, so that the callees can be summarized first.
+
+import (
+	"slices"
+)
+
+// A call instruction and its possible targets.
+type CallSite struct {
+	Insn     Insn
+	Indirect bool       // a call through a function pointer
+	Targets  []EntityId // sorted
+}
+
+type CallGraph struct {
+	funcIds      []EntityId // the functions with a body, sorted
+	callSites    map[EntityId][]CallSite
+	callSiteOf   map[InsnId]int // call insn -> its position in callSites of its function
+	callees      map[EntityId][]EntityId
+	callers      map[EntityId][]EntityId
+	addressTaken []EntityId
+	sccs         [][]EntityId // bottom-up
+	sccOf        map[EntityId]int
+}
+
+// forEachInsn calls yield on the instructions of the (reachable) blocks of g.
+func forEachInsn(g Graph, yield func(insn Insn)) {
+	for _, bbId := range GetBBWorklist(g, NoOrder) {
+		for _, insn := range g.BasicBlock(bbId).insns {
+			yield(insn)
+		}
+	}
+}
+
+// functionValues calls yield on the functions used as values in the instruction.
+func functionValues(insn Insn, yield func(fid EntityId)) {
+	var exprs [2]Expr
+	switch {
+	case insn.IsAssign() && insn.InsnKind() != K_IK_IASGN_SELF && insn.InsnKind() != K_IK_IASGN_PHI:
+		exprs[0] = insn.LhsX()
+		if rhs := insn.RhsX(); !rhs.IsCall() {
+			exprs[1] = rhs
+		}
+	case insn.IsReturn():
+		exprs[0] = insn.GetFirstHalfExpr()
+	}
+	for _, expr := range exprs {
+		if expr == NIL_X {
+			continue
+		}
+		eid1, eid2 := expr.GetOperands()
+		for _, eid := range []EntityId{eid1, eid2} {
+			if eid != NIL_ID && eid.Kind().IsFunction() {
+				yield(eid)
+			}
+		}
+	}
+}
+
+func NewCallGraph(tu *TU) *CallGraph {
+	cg := &CallGraph{
+		callSites:  make(map[EntityId][]CallSite),
+		callSiteOf: make(map[InsnId]int),
+		callees:    make(map[EntityId][]EntityId),
+		callers:    make(map[EntityId][]EntityId),
+		sccOf:      make(map[EntityId]int),
+	}
+
+	// 1. The direct calls, and the functions whose address is taken.
+	addressTaken := NewEidSet(false, false)
+	for _, fid := range tu.FunctionIds() {
+		fun := tu.GetFunctionById(fid)
+		if fun.body == nil {
+			continue
+		}
+		cg.funcIds = append(cg.funcIds, fid)
+		forEachInsn(fun.body, func(insn Insn) {
+			functionValues(insn, func(f EntityId) { addressTaken.Add(f) })
+			if !insn.HasCallExpr() {
+				return
+			}
+			site := CallSite{Insn: insn}
+			if callee := insn.GetCallExpr().GetCallee(); callee.Kind().IsFunction() {
+				site.Targets = []EntityId{callee}
+			} else {
+				site.Indirect = true
+			}
+			cg.callSiteOf[insn.Id()] = len(cg.callSites[fid])
+			cg.callSites[fid] = append(cg.callSites[fid], site)
+		})
+	}
+	cg.addressTaken = addressTaken.Values()
+
+	// 2. The targets of the indirect calls, and the edges.
+	for _, fid := range cg.funcIds {
+		callees := NewEidSet(false, false)
+		sites := cg.callSites[fid]
+		for i := range sites {
+			if sites[i].Indirect {
+				sites[i].Targets = cg.addressTaken
+			}
+			for _, target := range sites[i].Targets {
+				callees.Add(target)
+			}
+		}
+		cg.callees[fid] = callees.Values()
+		for _, callee := range cg.callees[fid] {
+			cg.callers[callee] = append(cg.callers[callee], fid)
+		}
+	}
+
+	cg.computeSCCs()
+	return cg
+}
+
+// computeSCCs computes the SCCs with Tarjan's algorithm, which completes an
+// SCC only after all the SCCs reachable from it, i.e. in bottom-up order.
+func (cg *CallGraph) computeSCCs() {
+	index := make(map[EntityId]int, len(cg.funcIds))
+	lowLink := make(map[EntityId]int, len(cg.funcIds))
+	onStack := make(map[EntityId]bool, len(cg.funcIds))
+	var stack []EntityId
+
+	var visit func(fid EntityId)
+	visit = func(fid EntityId) {
+		index[fid] = len(index)
+		lowLink[fid] = index[fid]
+		stack = append(stack, fid)
+		onStack[fid] = true
+		for _, callee := range cg.callees[fid] {
+			if _, hasBody := slices.BinarySearch(cg.funcIds, callee); !hasBody {
+				continue
+			}
+			if _, visited := index[callee]; !visited {
+				visit(callee)
+				lowLink[fid] = min(lowLink[fid], lowLink[callee])
+			} else if onStack[callee] {
+				lowLink[fid] = min(lowLink[fid], index[callee])
+			}
+		}
+		if lowLink[fid] != index[fid] {
+			return
+		}
+		var scc []EntityId
+		for {
+			top := stack[len(stack)-1]
+			stack = stack[:len(stack)-1]
+			onStack[top] = false
+			cg.sccOf[top] = len(cg.sccs)
+			scc = append(scc, top)
+			if top == fid {
+				break
+			}
+		}
+		slices.Sort(scc)
+		cg.sccs = append(cg.sccs, scc)
+	}
+	for _, fid := range cg.funcIds {
+		if _, visited := index[fid]; !visited {
+			visit(fid)
+		}
+	}
+}
+
+// FuncIds returns the functions with a body (sorted). Do not modify.
+func (cg *CallGraph) FuncIds() []EntityId {
+	return cg.funcIds
+}
+
+// CallSites returns the calls in the function. Do not modify.
+func (cg *CallGraph) CallSites(fid EntityId) []CallSite {
+	return cg.callSites[fid]
+}
+
+// CallTargets returns the possible targets of the call instruction of the
+// function (nil if it is not a call in the function). Do not modify.
+func (cg *CallGraph) CallTargets(fid EntityId, insnId InsnId) []EntityId {
+	i, ok := cg.callSiteOf[insnId]
+	if !ok || i >= len(cg.callSites[fid]) || cg.callSites[fid][i].Insn.Id() != insnId {
+		return nil
+	}
+	return cg.callSites[fid][i].Targets
+}
+
+// Callees returns the functions the function may call (sorted). Do not modify.
+func (cg *CallGraph) Callees(fid EntityId) []EntityId {
+	return cg.callees[fid]
+}
+
+// Callers returns the functions with a body that may call the function
+// (sorted). Do not modify.
+func (cg *CallGraph) Callers(fid EntityId) []EntityId {
+	return cg.callers[fid]
+}
+
+// AddressTaken returns the functions whose address is taken (sorted),
+// i.e. the possible targets of a call through a function pointer.
+func (cg *CallGraph) AddressTaken() []EntityId {
+	return cg.addressTaken
+}
+
+// SCCs returns the SCCs of the functions with a body, bottom-up
+// (each SCC is sorted). Do not modify.
+func (cg *CallGraph) SCCs() [][]EntityId {
+	return cg.sccs
+}
+
+// SCCIndex returns the position of the function's SCC in SCCs().
+func (cg *CallGraph) SCCIndex(fid EntityId) (int, bool) {
+	i, ok := cg.sccOf[fid]
+	return i, ok
+}
+
+// IsRecursive returns true if the function is in a cycle of calls.
+func (cg *CallGraph) IsRecursive(fid EntityId) bool {
+	i, ok := cg.sccOf[fid]
+	return ok && (len(cg.sccs[i]) > 1 || slices.Contains(cg.callees[fid], fid))
+}
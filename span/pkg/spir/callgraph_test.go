@@ -0,0 +1,99 @@
+package spir
+
+import (
+	"slices"
+	"testing"
+)
+
+// A TU with:
+//
+//	g() { f(); }                   // f and g are mutually recursive
+//	f() { g(); ext(); }            // ext has no body
+//	h() { }
+//	main() { p = h; p(); f(); }    // an indirect call through p
+func newCallGraphTestTU() (tu *TU, main, f, g, h, ext *Function) {
+	tu = NewTU()
+	funcQT := NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL)
+	ext = tu.NewFunction("ext", funcQT, nil, nil)
+	newFunc := func(name string) (*Function, *BasicBlock) {
+		bb := NewBasicBlock(tu.GetUniqueBBId(), 0, NIL_ID, 4)
+		return tu.NewFunction(name, funcQT, nil, bb), bb
+	}
+	call := func(bb *BasicBlock, callee EntityId) {
+		tu.AddInsn(bb, CallI(CallX(callee, tu.NewCallSiteId())), nil)
+	}
+
+	var gbb, fbb, hbb, mainbb *BasicBlock
+	g, gbb = newFunc("g")
+	f, fbb = newFunc("f")
+	h, hbb = newFunc("h")
+	main, mainbb = newFunc(K_MAIN_FUNC_NAME)
+	p := tu.NewVar("p", K_EK_EVAR_GLBL, NIL_ID, NIL_ID, NewQualVT(&PointerVT{BasicVT: BasicVT{kind: K_VK_TPTR_TO_FUNC, size: 8, align: 8}, pointee: funcQT}, K_QK_QNIL))
+
+	call(gbb, f.Id())
+	call(fbb, g.Id())
+	call(fbb, ext.Id())
+	tu.AddInsn(mainbb, AssignI(ValX(p), ValX(h.Id())), nil)
+	call(mainbb, p)
+	call(mainbb, f.Id())
+	for _, bb := range []*BasicBlock{gbb, fbb, hbb, mainbb} {
+		tu.AddInsn(bb, ReturnI(ValX(NIL_ID)), nil)
+	}
+	return tu, main, f, g, h, ext
+}
+
+func TestCallGraph(t *testing.T) {
+	tu, main, f, g, h, ext := newCallGraphTestTU()
+	cg := NewCallGraph(tu)
+
+	sorted := func(eids ...EntityId) []EntityId {
+		return NewEidSet(false, false, eids...).Values()
+	}
+	if got, want := cg.FuncIds(), sorted(main.Id(), f.Id(), g.Id(), h.Id()); !slices.Equal(got, want) {
+		t.Errorf("expected the functions %v, got %v", want, got)
+	}
+	if got := cg.AddressTaken(); !slices.Equal(got, []EntityId{h.Id()}) {
+		t.Errorf("expected only h to be address taken, got %v", got)
+	}
+	if got, want := cg.Callees(main.Id()), sorted(f.Id(), h.Id()); !slices.Equal(got, want) {
+		t.Errorf("expected main to call %v, got %v", want, got)
+	}
+	if got, want := cg.Callees(f.Id()), sorted(g.Id(), ext.Id()); !slices.Equal(got, want) {
+		t.Errorf("expected f to call %v, got %v", want, got)
+	}
+	if got := cg.Callers(f.Id()); !slices.Equal(got, sorted(main.Id(), g.Id())) {
+		t.Errorf("expected f to be called by main and g, got %v", got)
+	}
+
+	sites := cg.CallSites(main.Id())
+	if len(sites) != 2 || !sites[0].Indirect || sites[1].Indirect {
+		t.Fatalf("expected an indirect and a direct call in main, got %+v", sites)
+	}
+	if got := cg.CallTargets(main.Id(), sites[0].Insn.Id()); !slices.Equal(got, []EntityId{h.Id()}) {
+		t.Errorf("expected the indirect call to target h, got %v", got)
+	}
+	if got := cg.CallTargets(f.Id(), sites[0].Insn.Id()); got != nil {
+		t.Errorf("expected no targets for a call in another function, got %v", got)
+	}
+
+	// Bottom-up: {f, g} and {h} before {main}.
+	sccs := cg.SCCs()
+	if len(sccs) != 3 {
+		t.Fatalf("expected 3 SCCs, got %v", sccs)
+	}
+	fg, _ := cg.SCCIndex(f.Id())
+	if gi, _ := cg.SCCIndex(g.Id()); gi != fg || !slices.Equal(sccs[fg], sorted(f.Id(), g.Id())) {
+		t.Errorf("expected f and g in one SCC, got %v", sccs)
+	}
+	mi, _ := cg.SCCIndex(main.Id())
+	hi, _ := cg.SCCIndex(h.Id())
+	if mi != 2 || hi == mi {
+		t.Errorf("expected main's SCC to be the last, got %v", sccs)
+	}
+	if !cg.IsRecursive(f.Id()) || cg.IsRecursive(main.Id()) || cg.IsRecursive(h.Id()) {
+		t.Error("expected only f and g to be recursive")
+	}
+	if _, ok := cg.SCCIndex(ext.Id()); ok {
+		t.Error("expected no SCC for a function without a body")
+	}
+}
@@ -4,17 +4,26 @@ package spir
 // The context object is used to store the state of the SPAN IR.
 // It maintains the necessary state information for the underlying TranslationUnit(s).
 
+import (
+	"sync"
+	"sync/atomic"
+)
+
 type ContextId uint64
 
-var contextIdCounter ContextId = 0
+var contextIdCounter atomic.Uint64
 
+// GetNextContextId returns a fresh context id; it is safe for concurrent use.
 func GetNextContextId() ContextId {
-	contextIdCounter++
-	return contextIdCounter
+	return ContextId(contextIdCounter.Add(1))
 }
 
+// Context is not meant to be shared by analyses running on different functions
+// concurrently (the current scope is per function), but the info store is
+// guarded so that a context may be read while workers publish into it.
 type Context struct {
 	tu              *TU
+	infoMu          sync.RWMutex
 	info            map[uint64]any // key is the instance id / context id
 	currentScopeEid EntityId
 }
@@ -31,6 +40,8 @@ func (c *Context) TU() *TU {
 }
 
 func (c *Context) SetInfo(key uint64, value any) bool {
+	c.infoMu.Lock()
+	defer c.infoMu.Unlock()
 	if _, ok := c.info[key]; ok {
 		return false
 	}
@@ -40,11 +51,15 @@ func (c *Context) SetInfo(key uint64, value any) bool {
 }
 
 func (c *Context) GetInfo(key uint64) (any, bool) {
+	c.infoMu.RLock()
+	defer c.infoMu.RUnlock()
 	value, ok := c.info[key]
 	return value, ok
 }
 
 func (c *Context) RemoveInfo(key uint64) bool {
+	c.infoMu.Lock()
+	defer c.infoMu.Unlock()
 	if _, ok := c.info[key]; !ok {
 		return false
 	}
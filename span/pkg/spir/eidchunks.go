@@ -0,0 +1,441 @@
+package spir
+
+/* Defines the chunked (roaring bitmap like) representation of an EidSet.
+
+The elements are grouped by their upper 16 bits (the key of a chunk, i.e.
+mostly the kind prefix of the ids). The lower 16 bits (mostly the sequence id)
+of the elements of a chunk are held in one of two containers:
+ 1. A sorted []uint16, for a sparse chunk.
+ 2. A bitmap over [0, the largest element], for a dense chunk.
+
+The container is selected by the density of the chunk: a bitmap is used once
+it is not larger than the array (see normalize). The sequence ids of an entity
+kind are allocated contiguously from 1, so the (large) sets of variables of a
+function are mostly a few dense bitmaps.
+*/
+
+import (
+	"cmp"
+	"math/bits"
+	"slices"
+)
+
+type eidChunk struct {
+	key  uint16
+	card int      // number of elements in the chunk
+	vals []uint16 // sorted lower 16 bits of the elements, if bits == nil
+	bits []uint64 // bitmap of the lower 16 bits of the elements, if not nil
+}
+
+// The number of bitmap words to hold the lower 16 bits upto low.
+func wordsUpto(low uint16) int {
+	return int(low>>6) + 1
+}
+
+// A bitmap (8 bytes per word) is used when it is not larger than the array
+// (2 bytes per element). It is changed back to an array when it gets twice
+// as large as the array, so that a chunk doesn't flip on every update.
+func bitmapIsSmaller(words, card int) bool {
+	return 4*words <= card
+}
+
+func bitmapIsLarger(words, card int) bool {
+	return 2*words > card
+}
+
+func eidKey(x EntityId) uint16 {
+	return uint16(x >> 16)
+}
+
+func eidLow(x EntityId) uint16 {
+	return uint16(x)
+}
+
+func (c *eidChunk) eid(low uint16) EntityId {
+	return EntityId(c.key)<<16 | EntityId(low)
+}
+
+func (c *eidChunk) contains(low uint16) bool {
+	if c.bits != nil {
+		w := int(low >> 6)
+		return w < len(c.bits) && c.bits[w]&(1<<(low&63)) != 0
+	}
+	_, found := slices.BinarySearch(c.vals, low)
+	return found
+}
+
+func (c *eidChunk) add(low uint16) bool {
+	if c.bits != nil {
+		if w := wordsUpto(low); w > len(c.bits) {
+			c.bits = append(c.bits, make([]uint64, w-len(c.bits))...)
+		}
+		word, bit := &c.bits[low>>6], uint64(1)<<(low&63)
+		if *word&bit != 0 {
+			return false
+		}
+		*word |= bit
+		c.card++
+		if bitmapIsLarger(len(c.bits), c.card) {
+			c.toArray() // a far away element was added
+		}
+		return true
+	}
+	i, found := slices.BinarySearch(c.vals, low)
+	if found {
+		return false
+	}
+	c.vals = slices.Insert(c.vals, i, low)
+	c.card++
+	if bitmapIsSmaller(wordsUpto(c.vals[c.card-1]), c.card) {
+		c.toBitmap()
+	}
+	return true
+}
+
+func (c *eidChunk) remove(low uint16) bool {
+	if c.bits != nil {
+		w := int(low >> 6)
+		if w >= len(c.bits) || c.bits[w]&(1<<(low&63)) == 0 {
+			return false
+		}
+		c.bits[w] &^= 1 << (low & 63)
+		c.card--
+		if bitmapIsLarger(len(c.bits), c.card) {
+			c.toArray()
+		}
+		return true
+	}
+	i, found := slices.BinarySearch(c.vals, low)
+	if !found {
+		return false
+	}
+	c.vals = slices.Delete(c.vals, i, i+1)
+	c.card--
+	return true
+}
+
+func (c *eidChunk) toBitmap() {
+	c.bits = make([]uint64, wordsUpto(c.vals[len(c.vals)-1]))
+	for _, v := range c.vals {
+		c.bits[v>>6] |= 1 << (v & 63)
+	}
+	c.vals = nil
+}
+
+func (c *eidChunk) toArray() {
+	c.vals = make([]uint16, 0, c.card)
+	c.forEach(func(low uint16) bool {
+		c.vals = append(c.vals, low)
+		return true
+	})
+	c.bits = nil
+}
+
+// normalize selects the container by the density of the chunk.
+// The trailing zero words of a bitmap are dropped.
+func (c *eidChunk) normalize() {
+	switch {
+	case c.card == 0:
+		c.vals, c.bits = nil, nil
+	case c.bits != nil:
+		for c.bits[len(c.bits)-1] == 0 {
+			c.bits = c.bits[:len(c.bits)-1]
+		}
+		if bitmapIsLarger(len(c.bits), c.card) {
+			c.toArray()
+		}
+	case bitmapIsSmaller(wordsUpto(c.vals[c.card-1]), c.card):
+		c.toBitmap()
+	}
+}
+
+// forEach calls yield on the lower 16 bits of the elements in ascending order.
+func (c *eidChunk) forEach(yield func(low uint16) bool) bool {
+	if c.bits == nil {
+		for _, v := range c.vals {
+			if !yield(v) {
+				return false
+			}
+		}
+		return true
+	}
+	for i, word := range c.bits {
+		for word != 0 {
+			t := bits.TrailingZeros64(word)
+			if !yield(uint16(i*64 + t)) {
+				return false
+			}
+			word &= word - 1
+		}
+	}
+	return true
+}
+
+func (c eidChunk) clone() eidChunk {
+	c.vals = slices.Clone(c.vals)
+	c.bits = slices.Clone(c.bits)
+	return c
+}
+
+func popCount(words []uint64) int {
+	n := 0
+	for _, w := range words {
+		n += bits.OnesCount64(w)
+	}
+	return n
+}
+
+func chunkUnion(a, b *eidChunk) eidChunk {
+	res := eidChunk{key: a.key}
+	if a.bits == nil && b.bits == nil {
+		res.vals = unionSorted(make([]uint16, 0, a.card+b.card), a.vals, b.vals)
+		res.card = len(res.vals)
+	} else {
+		if a.bits == nil {
+			a, b = b, a // a is a bitmap
+		}
+		words := len(a.bits)
+		if b.bits != nil {
+			words = max(words, len(b.bits))
+		} else if b.card > 0 {
+			words = max(words, wordsUpto(b.vals[b.card-1]))
+		}
+		res.bits = make([]uint64, words)
+		copy(res.bits, a.bits)
+		if b.bits != nil {
+			for i, w := range b.bits {
+				res.bits[i] |= w
+			}
+		} else {
+			for _, v := range b.vals {
+				res.bits[v>>6] |= 1 << (v & 63)
+			}
+		}
+		res.card = popCount(res.bits)
+	}
+	res.normalize()
+	return res
+}
+
+func chunkIntersection(a, b *eidChunk) eidChunk {
+	res := eidChunk{key: a.key}
+	switch {
+	case a.bits == nil && b.bits == nil:
+		res.vals = intersectSorted(make([]uint16, 0, min(a.card, b.card)), a.vals, b.vals)
+		res.card = len(res.vals)
+	case a.bits != nil && b.bits != nil:
+		res.bits = make([]uint64, min(len(a.bits), len(b.bits)))
+		for i := range res.bits {
+			res.bits[i] = a.bits[i] & b.bits[i]
+		}
+		res.card = popCount(res.bits)
+		res.normalize()
+	default:
+		if a.bits != nil {
+			a, b = b, a // a is an array
+		}
+		res.vals = make([]uint16, 0, a.card)
+		for _, v := range a.vals {
+			if b.contains(v) {
+				res.vals = append(res.vals, v)
+			}
+		}
+		res.card = len(res.vals)
+	}
+	return res
+}
+
+func chunkDifference(a, b *eidChunk) eidChunk {
+	res := eidChunk{key: a.key}
+	switch {
+	case a.bits == nil && b.bits == nil:
+		res.vals = subtractSorted(make([]uint16, 0, a.card), a.vals, b.vals)
+		res.card = len(res.vals)
+	case a.bits == nil:
+		res.vals = make([]uint16, 0, a.card)
+		for _, v := range a.vals {
+			if !b.contains(v) {
+				res.vals = append(res.vals, v)
+			}
+		}
+		res.card = len(res.vals)
+	default:
+		res.bits = slices.Clone(a.bits)
+		if b.bits != nil {
+			for i, w := range b.bits[:min(len(b.bits), len(res.bits))] {
+				res.bits[i] &^= w
+			}
+		} else {
+			for _, v := range b.vals {
+				if int(v>>6) < len(res.bits) {
+					res.bits[v>>6] &^= 1 << (v & 63)
+				}
+			}
+		}
+		res.card = popCount(res.bits)
+		res.normalize()
+	}
+	return res
+}
+
+// chunkSubsetEq returns true if every element of a is in b.
+func chunkSubsetEq(a, b *eidChunk) bool {
+	if a.card > b.card {
+		return false
+	}
+	switch {
+	case a.bits == nil && b.bits == nil:
+		return isSubsetSorted(a.vals, b.vals)
+	case a.bits != nil && b.bits != nil:
+		for i, w := range a.bits {
+			if i >= len(b.bits) {
+				if w != 0 {
+					return false
+				}
+				continue
+			}
+			if w&^b.bits[i] != 0 {
+				return false
+			}
+		}
+		return true
+	}
+	return a.forEach(b.contains)
+}
+
+// chunksOf groups the (sorted and unique) elements into chunks.
+func chunksOf(elems []EntityId) []eidChunk {
+	var chunks []eidChunk
+	for i := 0; i < len(elems); {
+		key := eidKey(elems[i])
+		j := i
+		for j < len(elems) && eidKey(elems[j]) == key {
+			j++
+		}
+		c := eidChunk{key: key, card: j - i, vals: make([]uint16, j-i)}
+		for k, x := range elems[i:j] {
+			c.vals[k] = eidLow(x)
+		}
+		c.normalize()
+		chunks = append(chunks, c)
+		i = j
+	}
+	return chunks
+}
+
+// mergeChunks combines the chunks with the same key using op;
+// the chunks present only in a (or only in b) are kept if keepA (or keepB).
+// The empty chunks are dropped. The result shares no memory with a or b.
+func mergeChunks(a, b []eidChunk, keepA, keepB bool,
+	op func(a, b *eidChunk) eidChunk) []eidChunk {
+	res := make([]eidChunk, 0, max(len(a), len(b)))
+	i, j := 0, 0
+	for i < len(a) || j < len(b) {
+		switch {
+		case j == len(b) || (i < len(a) && a[i].key < b[j].key):
+			if keepA {
+				res = append(res, a[i].clone())
+			}
+			i++
+		case i == len(a) || b[j].key < a[i].key:
+			if keepB {
+				res = append(res, b[j].clone())
+			}
+			j++
+		default:
+			if c := op(&a[i], &b[j]); c.card > 0 {
+				res = append(res, c)
+			}
+			i++
+			j++
+		}
+	}
+	return res
+}
+
+// chunksSubsetEq returns true if every element of a is in b.
+func chunksSubsetEq(a, b []eidChunk) bool {
+	j := 0
+	for i := range a {
+		for j < len(b) && b[j].key < a[i].key {
+			j++
+		}
+		if j == len(b) || b[j].key != a[i].key || !chunkSubsetEq(&a[i], &b[j]) {
+			return false
+		}
+	}
+	return true
+}
+
+func unionSorted[T cmp.Ordered](dst, a, b []T) []T {
+	i, j := 0, 0
+	for i < len(a) && j < len(b) {
+		switch {
+		case a[i] < b[j]:
+			dst = append(dst, a[i])
+			i++
+		case b[j] < a[i]:
+			dst = append(dst, b[j])
+			j++
+		default:
+			dst = append(dst, a[i])
+			i++
+			j++
+		}
+	}
+	dst = append(dst, a[i:]...)
+	return append(dst, b[j:]...)
+}
+
+func intersectSorted[T cmp.Ordered](dst, a, b []T) []T {
+	i, j := 0, 0
+	for i < len(a) && j < len(b) {
+		switch {
+		case a[i] < b[j]:
+			i++
+		case b[j] < a[i]:
+			j++
+		default:
+			dst = append(dst, a[i])
+			i++
+			j++
+		}
+	}
+	return dst
+}
+
+func subtractSorted[T cmp.Ordered](dst, a, b []T) []T {
+	i, j := 0, 0
+	for i < len(a) && j < len(b) {
+		switch {
+		case a[i] < b[j]:
+			dst = append(dst, a[i])
+			i++
+		case a[i] > b[j]:
+			j++
+		default:
+			i++
+			j++
+		}
+	}
+	return append(dst, a[i:]...)
+}
+
+func isSubsetSorted[T cmp.Ordered](a, b []T) bool {
+	if len(a) > len(b) {
+		return false
+	}
+	i, j := 0, 0
+	for i < len(a) && j < len(b) {
+		switch {
+		case a[i] < b[j]:
+			return false // element in a that's not in b
+		case a[i] > b[j]:
+			j++
+		default:
+			i++
+			j++
+		}
+	}
+	return i == len(a)
+}
@@ -5,19 +5,37 @@ package spir
 */
 
 import (
+	"cmp"
 	"fmt"
 	"slices"
 	"strings"
+	"unsafe"
 )
 
-// EidSet is a set of uint32 values that always maintains its slice sorted.
+// EidSet is a set of uint32 values with two representations, chosen by its size:
+//  1. A sorted slice (data), for small sets (at most eidSetArrayMax elements).
+//  2. Chunks of the elements grouped by their upper 16 bits (see eidchunks.go),
+//     each a sorted []uint16 (sparse) or a bitmap (dense), for large sets.
+//
+// A large set switches back to a slice only when it shrinks to half the
+// threshold, so that a set at the threshold doesn't flip on every update.
 // All operations are performed assuming the sorted invariant.
 type EidSet struct {
 	fixed        bool
 	universalSet bool // If true, the set is the universe of all EntityIds.
 	data         []EntityId
+	chunks       []eidChunk // The elements, if not nil (then data is nil)
+	n            int        // Number of elements in the chunks
 }
 
+const (
+	// The crossover measured by the EidSet benchmarks: with dense ids
+	// (contiguous sequence ids, the common case) the chunks are faster from
+	// ~256 elements on; with sparse ids the two are close up to ~4096.
+	eidSetArrayMax   = 256
+	eidSetArrayMinCh = eidSetArrayMax / 2
+)
+
 // Iterator allows external code to "yield" each EntityId, emulating generator semantics.
 // The yield callback should return true to continue, false to stop iteration early.
 // Usage example:
@@ -27,8 +45,22 @@ type EidSet struct {
 //	    return true // return false to stop early
 //	})
 func (s *EidSet) Iterator(yield func(index int, id EntityId) bool) {
-	for i := 0; i < len(s.data); i++ {
-		if !yield(i, s.data[i]) {
+	if s.chunks == nil {
+		for i := 0; i < len(s.data); i++ {
+			if !yield(i, s.data[i]) {
+				return
+			}
+		}
+		return
+	}
+	index := 0
+	for ci := range s.chunks {
+		c := &s.chunks[ci]
+		more := c.forEach(func(low uint16) bool {
+			index++
+			return yield(index-1, c.eid(low))
+		})
+		if !more {
 			return
 		}
 	}
@@ -36,7 +68,7 @@ func (s *EidSet) Iterator(yield func(index int, id EntityId) bool) {
 
 // IsEmpty returns true if the set has no elements.
 func (s *EidSet) IsEmpty() bool {
-	return len(s.data) == 0
+	return s.Len() == 0
 }
 
 // IsFixed returns true if the set is fixed.
@@ -58,7 +90,7 @@ func (s *EidSet) MakeUniversal() bool {
 	changed := false
 	if !s.universalSet {
 		s.universalSet = true
-		s.data = nil   // the data is not required for a universal set, so we can clear it
+		s.setData(nil) // the data is not required for a universal set, so we can clear it
 		s.fixed = true // a universal set is fixed and cannot be modified after creation
 		changed = true
 	}
@@ -71,9 +103,24 @@ func (s *EidSet) IsUniversal() bool {
 
 // Len returns the number of elements in the set.
 func (s *EidSet) Len() int {
+	if s.chunks != nil {
+		return s.n
+	}
 	return len(s.data)
 }
 
+// SizeBytes estimates the bytes held by the elements of the set.
+func (s *EidSet) SizeBytes() int64 {
+	if s.chunks == nil {
+		return int64(cap(s.data)) * int64(unsafe.Sizeof(EntityId(0)))
+	}
+	size := int64(cap(s.chunks)) * int64(unsafe.Sizeof(eidChunk{}))
+	for i := range s.chunks {
+		size += int64(cap(s.chunks[i].vals))*2 + int64(cap(s.chunks[i].bits))*8
+	}
+	return size
+}
+
 // NewEidSet creates a new EidSet from the given elements.
 // It allocates a minimum size of 4 elements.
 func NewEidSet(fixed bool, universalSet bool, elems ...EntityId) *EidSet {
@@ -85,6 +132,7 @@ func NewEidSet(fixed bool, universalSet bool, elems ...EntityId) *EidSet {
 	set.data = append(set.data, elems...)
 	// Remove duplicates and sort
 	set.sortAndUnique()
+	set.adapt()
 	return set
 }
 
@@ -94,13 +142,74 @@ func (s *EidSet) Clear() bool {
 		panic("cannot clear a fixed EidSet")
 	}
 	// Release the underlying array memory as well.
-	changed := len(s.data) > 0
+	changed := s.Len() > 0
 	if changed {
-		s.data = s.data[:0]
+		s.setData(nil)
 	}
 	return changed
 }
 
+// setData replaces the elements with the given sorted and unique slice.
+func (s *EidSet) setData(data []EntityId) {
+	s.data, s.chunks, s.n = data, nil, 0
+}
+
+// setChunks replaces the elements with the given chunks,
+// and selects the representation by the number of elements.
+func (s *EidSet) setChunks(chunks []eidChunk) {
+	n := 0
+	for i := range chunks {
+		n += chunks[i].card
+	}
+	s.data, s.chunks, s.n = nil, chunks, n
+	if s.chunks == nil {
+		s.chunks = []eidChunk{}
+	}
+	s.adapt()
+}
+
+// adapt switches the representation if the set grew (or shrunk) enough.
+func (s *EidSet) adapt() {
+	switch {
+	case s.chunks == nil && len(s.data) > eidSetArrayMax:
+		s.toChunks()
+	case s.chunks != nil && s.n <= eidSetArrayMinCh:
+		s.toArray()
+	}
+}
+
+func (s *EidSet) toChunks() {
+	chunks := chunksOf(s.data)
+	if chunks == nil {
+		chunks = []eidChunk{}
+	}
+	s.data, s.chunks, s.n = nil, chunks, len(s.data)
+}
+
+func (s *EidSet) toArray() {
+	data := make([]EntityId, 0, s.Len())
+	s.Iterator(func(_ int, id EntityId) bool {
+		data = append(data, id)
+		return true
+	})
+	s.setData(data)
+}
+
+// view returns the elements as chunks (without converting s).
+func (s *EidSet) view() []eidChunk {
+	if s.chunks != nil {
+		return s.chunks
+	}
+	return chunksOf(s.data)
+}
+
+// chunkIndex returns the position of the chunk with the key (or where it should be).
+func (s *EidSet) chunkIndex(key uint16) (int, bool) {
+	return slices.BinarySearchFunc(s.chunks, key, func(c eidChunk, key uint16) int {
+		return cmp.Compare(c.key, key)
+	})
+}
+
 // sortAndUnique sorts the data and removes duplicates in-place.
 func (s *EidSet) sortAndUnique() {
 	if len(s.data) == 0 {
@@ -120,6 +229,16 @@ func (s *EidSet) sortAndUnique() {
 // increasing order and are unique.
 // An empty or single-element set is trivially sorted and unique.
 func (s *EidSet) IsSortedAndUnique() bool {
+	if s.chunks != nil {
+		for i := range s.chunks {
+			c := &s.chunks[i]
+			if (i > 0 && c.key <= s.chunks[i-1].key) || (c.bits == nil &&
+				(len(c.vals) != c.card || !slices.IsSorted(c.vals))) {
+				return false
+			}
+		}
+		return true
+	}
 	n := len(s.data)
 	if n == 0 || n == 1 {
 		return true
@@ -137,6 +256,10 @@ func (s *EidSet) Contains(x EntityId) bool {
 	if s.universalSet {
 		return true
 	}
+	if s.chunks != nil {
+		i, found := s.chunkIndex(eidKey(x))
+		return found && s.chunks[i].contains(eidLow(x))
+	}
 	_, found := slices.BinarySearch(s.data, x)
 	return found
 }
@@ -146,6 +269,17 @@ func (s *EidSet) Add(x EntityId) bool {
 	if s.fixed {
 		panic("cannot add to a fixed EidSet")
 	}
+	if s.chunks != nil {
+		i, found := s.chunkIndex(eidKey(x))
+		if !found {
+			s.chunks = slices.Insert(s.chunks, i, eidChunk{key: eidKey(x)})
+		}
+		if !s.chunks[i].add(eidLow(x)) {
+			return false
+		}
+		s.n++
+		return true
+	}
 	i, found := slices.BinarySearch(s.data, x)
 	if found {
 		return false // no change
@@ -154,6 +288,7 @@ func (s *EidSet) Add(x EntityId) bool {
 	s.data = append(s.data, 0)
 	copy(s.data[i+1:], s.data[i:])
 	s.data[i] = x
+	s.adapt()
 	return true // element added
 }
 
@@ -162,6 +297,18 @@ func (s *EidSet) Remove(x EntityId) bool {
 	if s.fixed {
 		panic("cannot remove from a fixed EidSet")
 	}
+	if s.chunks != nil {
+		i, found := s.chunkIndex(eidKey(x))
+		if !found || !s.chunks[i].remove(eidLow(x)) {
+			return false
+		}
+		if s.chunks[i].card == 0 {
+			s.chunks = slices.Delete(s.chunks, i, i+1)
+		}
+		s.n--
+		s.adapt()
+		return true
+	}
 	i, found := slices.BinarySearch(s.data, x)
 	if !found {
 		return false // no change
@@ -176,9 +323,16 @@ func (s *EidSet) UnionWith(b EidSet) bool {
 	if s.fixed {
 		panic("cannot union with a fixed EidSet. Use Union instead.")
 	}
-	if len(b.data) == 0 {
+	if b.Len() == 0 {
 		return false // no change
 	}
+	if s.chunks != nil || b.chunks != nil || len(s.data)+len(b.data) > eidSetArrayMax {
+		union, changed := s.Union(b)
+		if changed {
+			s.data, s.chunks, s.n = union.data, union.chunks, union.n
+		}
+		return changed
+	}
 	// Optimization: prepare capacity before merging
 	// In-place union without allocating a merged slice
 	changed := false
@@ -225,41 +379,30 @@ func (s EidSet) Union(b EidSet) (*EidSet, bool) {
 		return &EidSet{universalSet: true}, true /*changed*/
 	}
 
+	if s.chunks != nil || b.chunks != nil {
+		union := &EidSet{}
+		union.setChunks(mergeChunks(s.view(), b.view(), true, true, chunkUnion))
+		return union, union.Len() != s.Len()
+	}
+
 	// Handle empty set cases.
 	if len(s.data) == 0 && len(b.data) == 0 {
 		return &EidSet{data: []EntityId{}}, false
 	}
 	if len(s.data) == 0 {
-		return &EidSet{data: append([]EntityId(nil), b.data...)}, true
+		return NewEidSet(false, false, b.data...), true
 	}
 	if len(b.data) == 0 {
 		return &EidSet{data: append([]EntityId(nil), s.data...)}, false
 	}
 
 	// Merge the two sets, but do not mutate sources.
-	merged := make([]EntityId, 0, len(s.data)+len(b.data))
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		aVal, bVal := s.data[i], b.data[j]
-		switch {
-		case aVal < bVal:
-			merged = append(merged, aVal)
-			i++
-		case bVal < aVal:
-			merged = append(merged, bVal)
-			j++
-		default:
-			merged = append(merged, aVal)
-			i++
-			j++
-		}
-	}
-	merged = append(merged, s.data[i:]...)
-	merged = append(merged, b.data[j:]...)
+	merged := unionSorted(make([]EntityId, 0, len(s.data)+len(b.data)), s.data, b.data)
 
 	// changed is true iff merged length differs from s.data length
 	changed := len(merged) != len(s.data)
 	eidSet := &EidSet{data: merged}
+	eidSet.adapt()
 	return eidSet, changed
 }
 
@@ -271,21 +414,12 @@ func (s EidSet) Intersection(b EidSet) (*EidSet, bool) {
 	case b.universalSet:
 		return s.Duplicate(false), true /*changed*/
 	}
-	intersection := make([]EntityId, 0, min(len(s.data), len(b.data)))
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		aVal, bVal := s.data[i], b.data[j]
-		switch {
-		case aVal < bVal:
-			i++
-		case bVal < aVal:
-			j++
-		default:
-			intersection = append(intersection, aVal)
-			i++
-			j++
-		}
+	if s.chunks != nil || b.chunks != nil {
+		intersection := &EidSet{}
+		intersection.setChunks(mergeChunks(s.view(), b.view(), false, false, chunkIntersection))
+		return intersection, intersection.Len() != s.Len()
 	}
+	intersection := intersectSorted(make([]EntityId, 0, min(len(s.data), len(b.data))), s.data, b.data)
 	changed := len(intersection) != len(s.data)
 	return &EidSet{data: intersection}, changed
 }
@@ -299,7 +433,7 @@ func (s *EidSet) IntersectionWith(b EidSet) bool {
 	}
 	result, changed := s.Intersection(b)
 	if changed {
-		s.data = result.data
+		s.data, s.chunks, s.n = result.data, result.chunks, result.n
 	}
 	return changed
 }
@@ -307,24 +441,12 @@ func (s *EidSet) IntersectionWith(b EidSet) bool {
 // Subtract returns a new EidSet containing elements in s that are not in b.
 // Also returns a bool indicating if the result differs from s.data.
 func (s EidSet) Subtract(b EidSet) (*EidSet, bool) {
-	diff := make([]EntityId, 0, len(s.data))
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		aVal, bVal := s.data[i], b.data[j]
-		switch {
-		case aVal < bVal:
-			diff = append(diff, aVal)
-			i++
-		case aVal > bVal:
-			j++
-		default:
-			// Element present in both, skip
-			i++
-			j++
-		}
+	if s.chunks != nil || b.chunks != nil {
+		diff := &EidSet{}
+		diff.setChunks(mergeChunks(s.view(), b.view(), true, false, chunkDifference))
+		return diff, diff.Len() != s.Len()
 	}
-	// Append the rest of s's elements (since b is exhausted)
-	diff = append(diff, s.data[i:]...)
+	diff := subtractSorted(make([]EntityId, 0, len(s.data)), s.data, b.data)
 	changed := len(diff) != len(s.data)
 	return &EidSet{data: diff}, changed
 }
@@ -335,80 +457,46 @@ func (s *EidSet) SubtractWith(b EidSet) bool {
 	if s.fixed {
 		panic("cannot modify a fixed EidSet with SubtractWith. Use Subtract instead.")
 	}
-	out := make([]EntityId, 0, len(s.data))
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		aVal, bVal := s.data[i], b.data[j]
-		switch {
-		case aVal < bVal:
-			out = append(out, aVal)
-			i++
-		case aVal > bVal:
-			j++
-		default:
-			// Element present in both, skip
-			i++
-			j++
-		}
-	}
-	// Append the rest of s's elements (since b is exhausted)
-	out = append(out, s.data[i:]...)
-	changed := len(out) != len(s.data)
-	s.data = out
+	result, changed := s.Subtract(b)
+	s.data, s.chunks, s.n = result.data, result.chunks, result.n
 	return changed
 }
 
 // IsSubset checks if the set s is a (proper) subset of set b.
 // Proper subset: all elements in s are in b, and s != b.
 func (s EidSet) IsSubset(b EidSet) bool {
-	if len(s.data) == 0 {
-		return len(b.data) > 0 // empty set is proper subset of any non-empty set
+	if s.Len() == 0 {
+		return b.Len() > 0 // empty set is proper subset of any non-empty set
 	}
-	if len(s.data) >= len(b.data) {
+	if s.Len() >= b.Len() {
 		return false
 	}
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		if s.data[i] < b.data[j] {
-			return false // element in s that's not in b
-		} else if s.data[i] > b.data[j] {
-			j++
-		} else {
-			i++
-			j++
-		}
-	}
-	return i == len(s.data)
+	return s.IsSubsetEq(b)
 }
 
 // IsSubsetEq checks if the set s is a subset (possibly equal) of set b.
 // Returns true if every element of s is in b (s may equal b).
 func (s EidSet) IsSubsetEq(b EidSet) bool {
-	if len(s.data) == 0 {
+	if s.Len() == 0 {
 		return true // empty set is subset of any set
 	}
-	if len(s.data) > len(b.data) {
+	if s.Len() > b.Len() {
 		return false
 	}
-	i, j := 0, 0
-	for i < len(s.data) && j < len(b.data) {
-		if s.data[i] < b.data[j] {
-			return false // element in s that's not in b
-		} else if s.data[i] > b.data[j] {
-			j++
-		} else {
-			i++
-			j++
-		}
+	if s.chunks != nil || b.chunks != nil {
+		return chunksSubsetEq(s.view(), b.view())
 	}
-	return i == len(s.data)
+	return isSubsetSorted(s.data, b.data)
 }
 
 // Equals checks if the set s is equal to set b.
 func (s EidSet) Equals(b EidSet) bool {
-	if len(s.data) != len(b.data) {
+	if s.Len() != b.Len() {
 		return false
 	}
+	if s.chunks != nil || b.chunks != nil {
+		return s.IsSubsetEq(b)
+	}
 	for i, v := range s.data {
 		if v != b.data[i] {
 			return false
@@ -419,31 +507,49 @@ func (s EidSet) Equals(b EidSet) bool {
 
 // Duplicate returns a new copy of the set.
 func (s EidSet) Duplicate(fixed bool) *EidSet {
+	if s.chunks != nil {
+		chunks := make([]eidChunk, len(s.chunks))
+		for i := range s.chunks {
+			chunks[i] = s.chunks[i].clone()
+		}
+		return &EidSet{fixed: fixed || s.universalSet, universalSet: s.universalSet,
+			chunks: chunks, n: s.n}
+	}
 	return NewEidSet(fixed, s.universalSet, s.data...)
 }
 
 // Values returns the backing slice (sorted, do not mutate).
+// A large set has no backing slice, a new slice is returned.
 func (s EidSet) Values() []EntityId {
 	if s.fixed {
 		panic("cannot get values from a fixed EidSet")
 	}
+	if s.chunks != nil {
+		values := make([]EntityId, 0, s.n)
+		s.Iterator(func(_ int, id EntityId) bool {
+			values = append(values, id)
+			return true
+		})
+		return values
+	}
 	return s.data
 }
 
 // String returns a string representation of the EidSet.
 // Example output: "{1,2,3}" for a set containing EntityIds 1,2,3.
 func (s EidSet) String() string {
-	if len(s.data) == 0 {
+	if s.Len() == 0 {
 		return "{}"
 	}
 	var builder strings.Builder
 	builder.WriteByte('{')
-	for i, v := range s.data {
+	s.Iterator(func(i int, v EntityId) bool {
 		if i > 0 {
 			builder.WriteByte(',')
 		}
 		fmt.Fprintf(&builder, "%v", v)
-	}
+		return true
+	})
 	builder.WriteByte('}')
 	return builder.String()
 }
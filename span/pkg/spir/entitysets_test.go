@@ -1,6 +1,7 @@
 package spir
 
 import (
+	"fmt"
 	"math/rand/v2"
 	"slices"
 	"strings"
@@ -20,7 +21,7 @@ func eids(xs ...uint32) []EntityId {
 // TestNewEidSet_sortsDedupesAndCapacity covers basic construction guarantees for EidSet.
 func TestNewEidSet_sortsDedupesAndCapacity(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(3, 1, 2, 1, 3)...)
+	s := NewEidSet(false, false, eids(3, 1, 2, 1, 3)...)
 	if !slices.Equal(s.Values(), eids(1, 2, 3)) {
 		t.Fatalf("Values: got %v", s.Values())
 	}
@@ -32,7 +33,7 @@ func TestNewEidSet_sortsDedupesAndCapacity(t *testing.T) {
 // TestNewEidSet_empty checks construction of an empty EidSet.
 func TestNewEidSet_empty(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false)
+	s := NewEidSet(false, false)
 	if !s.IsEmpty() {
 		t.Fatal("expected empty")
 	}
@@ -44,7 +45,7 @@ func TestNewEidSet_empty(t *testing.T) {
 // TestEidSet_IsEmpty_Clear checks IsEmpty and Clear.
 func TestEidSet_IsEmpty_Clear(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(1)...)
+	s := NewEidSet(false, false, eids(1)...)
 	if s.IsEmpty() {
 		t.Fatal("not empty")
 	}
@@ -60,13 +61,13 @@ func TestEidSet_IsEmpty_Clear(t *testing.T) {
 // TestEidSet_IsSortedAndUnique checks that the sorted and unique invariant holds.
 func TestEidSet_IsSortedAndUnique(t *testing.T) {
 	t.Parallel()
-	if !NewEidSet(false).IsSortedAndUnique() {
+	if !NewEidSet(false, false).IsSortedAndUnique() {
 		t.Fatal("empty")
 	}
-	if !NewEidSet(false, eids(7)...).IsSortedAndUnique() {
+	if !NewEidSet(false, false, eids(7)...).IsSortedAndUnique() {
 		t.Fatal("single")
 	}
-	s := NewEidSet(false, eids(1, 2, 3)...)
+	s := NewEidSet(false, false, eids(1, 2, 3)...)
 	if !s.IsSortedAndUnique() {
 		t.Fatal("valid")
 	}
@@ -75,7 +76,7 @@ func TestEidSet_IsSortedAndUnique(t *testing.T) {
 // TestEidSet_Contains_Add_Remove covers containership, as well as addition/removal of elements.
 func TestEidSet_Contains_Add_Remove(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(2, 4)...)
+	s := NewEidSet(false, false, eids(2, 4)...)
 	if !s.Contains(2) || s.Contains(3) {
 		t.Fatalf("Contains: %+v", s.Values())
 	}
@@ -96,8 +97,8 @@ func TestEidSet_Contains_Add_Remove(t *testing.T) {
 // TestEidSet_Union tests creation of new set via union.
 func TestEidSet_Union(t *testing.T) {
 	t.Parallel()
-	a := *NewEidSet(false, eids(1, 3)...)
-	b := *NewEidSet(false, eids(2, 3)...)
+	a := *NewEidSet(false, false, eids(1, 3)...)
+	b := *NewEidSet(false, false, eids(2, 3)...)
 	u, ch := a.Union(b)
 	if !slices.Equal(u.Values(), eids(1, 2, 3)) {
 		t.Fatalf("union values: %v", u.Values())
@@ -105,16 +106,16 @@ func TestEidSet_Union(t *testing.T) {
 	if !ch {
 		t.Fatal("changed should be true when merged length != len(a)")
 	}
-	empty := *NewEidSet(false)
+	empty := *NewEidSet(false, false)
 	u2, ch2 := empty.Union(empty)
 	if !u2.IsEmpty() || ch2 {
 		t.Fatalf("two empties: empty=%v ch=%v", u2.IsEmpty(), ch2)
 	}
-	u3, ch3 := empty.Union(*NewEidSet(false, eids(1)...))
+	u3, ch3 := empty.Union(*NewEidSet(false, false, eids(1)...))
 	if !slices.Equal(u3.Values(), eids(1)) || !ch3 {
 		t.Fatalf("left empty: %v %v", u3.Values(), ch3)
 	}
-	u4p, ch4b := NewEidSet(false, eids(1)...).Union(empty)
+	u4p, ch4b := NewEidSet(false, false, eids(1)...).Union(empty)
 	if !slices.Equal(u4p.Values(), eids(1)) || ch4b {
 		t.Fatalf("right empty: %v ch=%v", u4p.Values(), ch4b)
 	}
@@ -123,11 +124,11 @@ func TestEidSet_Union(t *testing.T) {
 // TestEidSet_UnionWith tests in-place union.
 func TestEidSet_UnionWith(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(1, 5)...)
-	if s.UnionWith(*NewEidSet(false)) {
+	s := NewEidSet(false, false, eids(1, 5)...)
+	if s.UnionWith(*NewEidSet(false, false)) {
 		t.Fatal("union empty should not change")
 	}
-	if !s.UnionWith(*NewEidSet(false, eids(2, 5, 7)...)) {
+	if !s.UnionWith(*NewEidSet(false, false, eids(2, 5, 7)...)) {
 		t.Fatal("expected change")
 	}
 	if !slices.Equal(s.Values(), eids(1, 2, 5, 7)) {
@@ -141,8 +142,8 @@ func TestEidSet_UnionWith(t *testing.T) {
 // TestEidSet_Intersection tests creation of intersection set.
 func TestEidSet_Intersection(t *testing.T) {
 	t.Parallel()
-	a := *NewEidSet(false, eids(1, 2, 4)...)
-	b := *NewEidSet(false, eids(2, 3, 4)...)
+	a := *NewEidSet(false, false, eids(1, 2, 4)...)
+	b := *NewEidSet(false, false, eids(2, 3, 4)...)
 	in, ch := a.Intersection(b)
 	if !slices.Equal(in.Values(), eids(2, 4)) {
 		t.Fatalf("got %v", in.Values())
@@ -150,7 +151,7 @@ func TestEidSet_Intersection(t *testing.T) {
 	if !ch {
 		t.Fatal("intersection shorter than a")
 	}
-	in2, _ := a.Intersection(*NewEidSet(false))
+	in2, _ := a.Intersection(*NewEidSet(false, false))
 	if !in2.IsEmpty() {
 		t.Fatal("no overlap")
 	}
@@ -159,15 +160,15 @@ func TestEidSet_Intersection(t *testing.T) {
 // TestEidSet_IntersectionWith tests in-place intersection operation.
 func TestEidSet_IntersectionWith(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(1, 2, 3)...)
-	if !s.IntersectionWith(*NewEidSet(false, eids(2, 4)...)) {
+	s := NewEidSet(false, false, eids(1, 2, 3)...)
+	if !s.IntersectionWith(*NewEidSet(false, false, eids(2, 4)...)) {
 		t.Fatal("expected change")
 	}
 	if !slices.Equal(s.Values(), eids(2)) {
 		t.Fatalf("got %v", s.Values())
 	}
-	s2 := NewEidSet(false, eids(1)...)
-	if s2.IntersectionWith(*NewEidSet(false, eids(1)...)) {
+	s2 := NewEidSet(false, false, eids(1)...)
+	if s2.IntersectionWith(*NewEidSet(false, false, eids(1)...)) {
 		t.Fatal("same set should not report change")
 	}
 }
@@ -175,8 +176,8 @@ func TestEidSet_IntersectionWith(t *testing.T) {
 // TestEidSet_Subtract tests set subtraction.
 func TestEidSet_Subtract(t *testing.T) {
 	t.Parallel()
-	a := *NewEidSet(false, eids(1, 2, 3)...)
-	b := *NewEidSet(false, eids(2, 4)...)
+	a := *NewEidSet(false, false, eids(1, 2, 3)...)
+	b := *NewEidSet(false, false, eids(2, 4)...)
 	d, ch := a.Subtract(b)
 	if !slices.Equal(d.Values(), eids(1, 3)) || !ch {
 		t.Fatalf("Subtract: %v ch=%v", d.Values(), ch)
@@ -186,8 +187,8 @@ func TestEidSet_Subtract(t *testing.T) {
 // TestEidSet_SubtractWith tests in-place subtraction.
 func TestEidSet_SubtractWith(t *testing.T) {
 	t.Parallel()
-	s := NewEidSet(false, eids(1, 2, 3)...)
-	if !s.SubtractWith(*NewEidSet(false, eids(2)...)) {
+	s := NewEidSet(false, false, eids(1, 2, 3)...)
+	if !s.SubtractWith(*NewEidSet(false, false, eids(2)...)) {
 		t.Fatal("expected change")
 	}
 	if !slices.Equal(s.Values(), eids(1, 3)) {
@@ -198,18 +199,18 @@ func TestEidSet_SubtractWith(t *testing.T) {
 // TestEidSet_IsSubset_IsSubsetEq tests IsSubset and IsSubsetEq behavior.
 func TestEidSet_IsSubset_IsSubsetEq(t *testing.T) {
 	t.Parallel()
-	small := *NewEidSet(false, eids(1, 2)...)
-	big := *NewEidSet(false, eids(0, 1, 2, 3)...)
+	small := *NewEidSet(false, false, eids(1, 2)...)
+	big := *NewEidSet(false, false, eids(0, 1, 2, 3)...)
 	if !small.IsSubsetEq(big) || !small.IsSubset(big) {
 		t.Fatal("small in big")
 	}
 	if big.IsSubset(small) {
 		t.Fatal("big not proper subset of small")
 	}
-	if !(*NewEidSet(false)).IsSubsetEq(*NewEidSet(false, eids(1)...)) {
+	if !(*NewEidSet(false, false)).IsSubsetEq(*NewEidSet(false, false, eids(1)...)) {
 		t.Fatal("empty subseteq nonempty")
 	}
-	if (*NewEidSet(false)).IsSubset(*NewEidSet(false)) {
+	if (*NewEidSet(false, false)).IsSubset(*NewEidSet(false, false)) {
 		t.Fatal("empty not proper subset of empty")
 	}
 	if !small.IsSubsetEq(small) || small.IsSubset(small) {
@@ -220,9 +221,9 @@ func TestEidSet_IsSubset_IsSubsetEq(t *testing.T) {
 // TestEidSet_Equals_Duplicate_String tests equality, duplication, and string representation.
 func TestEidSet_Equals_Duplicate_String(t *testing.T) {
 	t.Parallel()
-	a := *NewEidSet(false, eids(1, 2)...)
-	b := *NewEidSet(false, eids(1, 2)...)
-	if !a.Equals(b) || a.Equals(*NewEidSet(false, eids(2)...)) {
+	a := *NewEidSet(false, false, eids(1, 2)...)
+	b := *NewEidSet(false, false, eids(1, 2)...)
+	if !a.Equals(b) || a.Equals(*NewEidSet(false, false, eids(2)...)) {
 		t.Fatal("Equals")
 	}
 	d := a.Duplicate(false)
@@ -234,8 +235,8 @@ func TestEidSet_Equals_Duplicate_String(t *testing.T) {
 	if !strings.HasPrefix(got, "{") || !strings.HasSuffix(got, "}") || strings.Count(got, ",") != 1 {
 		t.Fatalf("String (two sorted elements): %q", got)
 	}
-	if NewEidSet(false).String() != "{}" {
-		t.Fatalf("empty string: %q", NewEidSet(false).String())
+	if NewEidSet(false, false).String() != "{}" {
+		t.Fatalf("empty string: %q", NewEidSet(false, false).String())
 	}
 }
 
@@ -260,8 +261,8 @@ func TestEidSet_LargeRandomized(t *testing.T) {
 	// Generate two large random slices, with overlap.
 	sliceA := randomSlice(setSize)
 	sliceB := randomSlice(setSize)
-	setA := NewEidSet(false, eids(sliceA...)...)
-	setB := NewEidSet(false, eids(sliceB...)...)
+	setA := NewEidSet(false, false, eids(sliceA...)...)
+	setB := NewEidSet(false, false, eids(sliceB...)...)
 
 	// 1. Test invariants.
 	if !setA.IsSortedAndUnique() || !setB.IsSortedAndUnique() {
@@ -353,3 +354,190 @@ func TestEidSet_LargeRandomized(t *testing.T) {
 		t.Error("SubtractWith violated invariants on large set")
 	}
 }
+
+// sortedKeys returns the elements of a Go set, sorted.
+func sortedKeys(m map[EntityId]bool) []EntityId {
+	out := make([]EntityId, 0, len(m))
+	for k := range m {
+		out = append(out, k)
+	}
+	slices.Sort(out)
+	return out
+}
+
+// TestEidSet_AdaptiveRepresentations checks the operations against Go's map
+// semantics for sets in (and switching between) all the representations:
+// small slices, sparse chunks and dense (bitmap) chunks, over several keys.
+func TestEidSet_AdaptiveRepresentations(t *testing.T) {
+	t.Parallel()
+	rng := rand.New(rand.NewPCG(7, 11))
+	// Ids of two kinds (upper 16 bits), with dense low bits.
+	randomIds := func(size int, spread uint32) []EntityId {
+		out := make([]EntityId, size)
+		for i := range out {
+			out[i] = EntityId((1+rng.Uint32N(2))<<16 | rng.Uint32N(spread))
+		}
+		return out
+	}
+
+	for _, size := range []int{10, 400, 3000, 20000} {
+		for _, spread := range []uint32{1 << 8, 1 << 13, 1 << 16} {
+			idsA, idsB := randomIds(size, spread), randomIds(size/2+1, spread)
+			setA := &EidSet{}
+			goA, goB := map[EntityId]bool{}, map[EntityId]bool{}
+			for _, x := range idsA {
+				if setA.Add(x) == goA[x] {
+					t.Fatalf("size=%d: Add(%v) reported a wrong change", size, x)
+				}
+				goA[x] = true
+			}
+			setB := NewEidSet(false, false, idsB...)
+			for _, x := range idsB {
+				goB[x] = true
+			}
+
+			if !slices.Equal(setA.Values(), sortedKeys(goA)) || setA.Len() != len(goA) {
+				t.Fatalf("size=%d spread=%d: Add mismatch", size, spread)
+			}
+			if !setA.IsSortedAndUnique() || !setB.IsSortedAndUnique() {
+				t.Fatalf("size=%d spread=%d: invariants violated", size, spread)
+			}
+			for _, x := range idsB {
+				if setA.Contains(x) != goA[x] {
+					t.Fatalf("size=%d spread=%d: Contains(%v) mismatch", size, spread, x)
+				}
+			}
+
+			union, inter, diff := map[EntityId]bool{}, map[EntityId]bool{}, map[EntityId]bool{}
+			for x := range goA {
+				union[x] = true
+				if goB[x] {
+					inter[x] = true
+				} else {
+					diff[x] = true
+				}
+			}
+			for x := range goB {
+				union[x] = true
+			}
+			u, _ := setA.Union(*setB)
+			i, _ := setA.Intersection(*setB)
+			d, _ := setA.Subtract(*setB)
+			if !slices.Equal(u.Values(), sortedKeys(union)) ||
+				!slices.Equal(i.Values(), sortedKeys(inter)) ||
+				!slices.Equal(d.Values(), sortedKeys(diff)) {
+				t.Fatalf("size=%d spread=%d: set operation mismatch", size, spread)
+			}
+			if !i.IsSubsetEq(*setA) || !i.IsSubsetEq(*setB) || !setA.IsSubsetEq(*u) ||
+				setA.IsSubsetEq(*d) != (len(inter) == 0) {
+				t.Fatalf("size=%d spread=%d: subset mismatch", size, spread)
+			}
+
+			inPlace := setA.Duplicate(false)
+			inPlace.UnionWith(*setB)
+			if !inPlace.Equals(*u) || !u.Equals(*inPlace) {
+				t.Fatalf("size=%d spread=%d: UnionWith mismatch", size, spread)
+			}
+			inPlace.SubtractWith(*setB)
+			if !inPlace.Equals(*d) {
+				t.Fatalf("size=%d spread=%d: SubtractWith mismatch", size, spread)
+			}
+
+			// Shrink back to a small set.
+			for _, x := range idsA {
+				setA.Remove(x)
+				delete(goA, x)
+				if len(goA) == 3 {
+					break
+				}
+			}
+			if !slices.Equal(setA.Values(), sortedKeys(goA)) || setA.chunks != nil {
+				t.Fatalf("size=%d spread=%d: Remove mismatch (or not a slice)", size, spread)
+			}
+		}
+	}
+}
+
+// The benchmarks below compare the slice (forced) and the chunked
+// representations, to locate the crossover points (eidSetArrayMax),
+// for dense ids (contiguous sequence ids of a kind) and sparse ids.
+
+func benchIds(n int, dense bool) []EntityId {
+	rng := rand.New(rand.NewPCG(1, 2))
+	ids := make([]EntityId, n)
+	for i := range ids {
+		if dense {
+			ids[i] = EntityId(1<<16 | rng.Uint32N(uint32(n)*2))
+		} else {
+			// Sparse sequence ids of a few kinds.
+			ids[i] = EntityId(rng.Uint32N(16)<<16 | rng.Uint32N(1<<16))
+		}
+	}
+	return ids
+}
+
+// benchSet returns a set of the given elements, as a slice or as chunks.
+func benchSet(ids []EntityId, chunked bool) *EidSet {
+	s := &EidSet{data: slices.Clone(ids)}
+	s.sortAndUnique()
+	if chunked {
+		s.toChunks()
+	}
+	return s
+}
+
+func benchmarkEidSetRepr(b *testing.B, op func(b *testing.B, ids []EntityId, chunked bool)) {
+	for _, n := range []int{64, 256, 1024, 4096, 16384} {
+		for _, dense := range []bool{true, false} {
+			for _, chunked := range []bool{false, true} {
+				name := fmt.Sprintf("n=%d/dense=%v/chunked=%v", n, dense, chunked)
+				b.Run(name, func(b *testing.B) {
+					op(b, benchIds(n, dense), chunked)
+				})
+			}
+		}
+	}
+}
+
+func BenchmarkEidSet_Add(b *testing.B) {
+	benchmarkEidSetRepr(b, func(b *testing.B, ids []EntityId, chunked bool) {
+		for b.Loop() {
+			s := &EidSet{data: []EntityId{}}
+			if chunked {
+				s.toChunks()
+			}
+			for _, x := range ids {
+				if chunked {
+					s.Add(x)
+				} else {
+					// Stay a slice: bypass adapt().
+					i, found := slices.BinarySearch(s.data, x)
+					if !found {
+						s.data = slices.Insert(s.data, i, x)
+					}
+				}
+			}
+		}
+	})
+}
+
+func BenchmarkEidSet_Contains(b *testing.B) {
+	benchmarkEidSetRepr(b, func(b *testing.B, ids []EntityId, chunked bool) {
+		s := benchSet(ids, chunked)
+		for b.Loop() {
+			for _, x := range ids {
+				s.Contains(x + 1)
+			}
+		}
+	})
+}
+
+func BenchmarkEidSet_Union(b *testing.B) {
+	benchmarkEidSetRepr(b, func(b *testing.B, ids []EntityId, chunked bool) {
+		half := len(ids) / 2
+		s1, s2 := benchSet(ids[:half], chunked), benchSet(ids[half/2:], chunked)
+		for b.Loop() {
+			s1.Union(*s2)
+		}
+	})
+}
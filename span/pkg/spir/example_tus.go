@@ -16,7 +16,7 @@ package spir
 func NewExampleTU_A() *TU {
 	tu := NewTU()
 
-	main := tu.NewFunction("main", NewQualVT(&Int32VT, K_QK_QNIL), nil, nil)
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
 
 	x := tu.NewVar("x", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
 	y := tu.NewVar("y", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
@@ -45,7 +45,7 @@ func NewExampleTU_A() *TU {
 func NewExampleTU_B_0() *TU {
 	tu := NewTU()
 
-	main := tu.NewFunction("main", NewQualVT(&Int32VT, K_QK_QNIL), nil, nil)
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
 
 	argc := tu.NewVar("argc", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
 	t1 := tu.NewVar("t1", K_EK_EVAR_LOCL_TMP, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
@@ -74,7 +74,7 @@ func NewExampleTU_B_0() *TU {
 func NewExampleTU_B_1() *TU {
 	tu := NewTU()
 
-	main := tu.NewFunction("main", NewQualVT(&Int32VT, K_QK_QNIL), nil, nil)
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
 
 	argc := tu.NewVar("argc", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
 	t1 := tu.NewVar("t1", K_EK_EVAR_LOCL_TMP, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
@@ -108,3 +108,209 @@ func NewExampleTU_B_1() *TU {
 
 	return tu
 }
+
+// This function creates a simple translation unit with a loop.
+//
+//	int main(int argc) {
+//	  int i = 1;
+//	  while (i < 1000) {
+//	    i = i + 1;
+//	  }
+//	  return i;
+//	}
+//
+// The edge from the loop body back to the loop head is a back edge.
+func NewExampleTU_C() *TU {
+	return NewExampleTU_Loops(1)
+}
+
+// This function creates a translation unit like NewExampleTU_C, with the
+// given number (> 0) of the same loop one after the other, e.g. to measure
+// the analyses on larger graphs (2 + 2*loops basic blocks).
+func NewExampleTU_Loops(loops int) *TU {
+	tu := NewTU()
+
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
+
+	i := tu.NewVar("i", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
+	t1 := tu.NewVar("t1", K_EK_EVAR_LOCL_TMP, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
+	c1 := tu.NewConst(1, NewQualVT(&Int32VT, K_QK_QNIL))
+	c1000 := tu.NewConst(1000, NewQualVT(&Int32VT, K_QK_QNIL))
+
+	initbb := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 1)
+	cfg := NewControlFlowGraph(tu, 0, main.fid)
+	cfg.AddBB(initbb)
+	cfg.SetEntryBB(initbb)
+	tu.AddInsn(initbb, AssignI(ValX(i), ValX(c1)), nil)
+
+	prev := initbb // the block before the next loop head
+	for range loops {
+		headbb := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 2)
+		bodybb := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 1)
+		cfg.AddBBs(headbb, bodybb)
+
+		prev.addSucc(headbb) // the false edge of the previous loop head, if any
+		headbb.addPred(prev).addPred(bodybb).addSucc(bodybb)
+		bodybb.addPred(headbb).addSucc(headbb) // the back edge
+
+		tu.AddInsn(headbb, AssignI(ValX(t1), BinX(K_XK_XLT, i, c1000)), nil)
+		tu.AddInsn(headbb, IfI(ValX(t1), BinX(K_XK_XVAL, EId(NIL_LABEL_ID), EId(NIL_LABEL_ID))), nil)
+		tu.AddInsn(bodybb, AssignI(ValX(i), BinX(K_XK_XADD, i, c1)), nil)
+		prev = headbb
+	}
+
+	retbb := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 1)
+	exit := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 1) // All CFGs have single exit block
+	cfg.AddBBs(retbb, exit)
+	cfg.SetExitBB(exit)
+	prev.addSucc(retbb)
+	retbb.addPred(prev).addSucc(exit)
+	exit.addPred(retbb)
+
+	tu.AddInsn(retbb, ReturnI(ValX(i)), nil)
+	tu.AddInsn(exit, NopI(), nil)
+
+	main.body = cfg // a control flow graph is a Graph
+
+	return tu
+}
+
+// This function creates a translation unit with a global variable and a
+// function other than main (whose globals are live at its exit):
+//
+//	int g;
+//	int f(int a) {
+//	  if (a < g) {
+//	    return a;
+//	  }
+//	  return 0;
+//	}
+//	int main() { return 0; }
+func NewExampleTU_Globals() *TU {
+	tu := NewTU()
+
+	funcQT := NewQualVT(NewFunctionVT(Int32QT, nil, []QualType{Int32QT}, false, ""), K_QK_QNIL)
+	f := tu.NewFunction("f", funcQT, nil, nil)
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
+
+	g := tu.NewVar("g", K_EK_EVAR_GLBL, NIL_ID, NIL_ID, NewQualVT(&Int32VT, K_QK_QNIL))
+	a := tu.NewVar("a", K_EK_EVAR_LOCL_ARG, NIL_ID, f.Id(), Int32QT)
+	t1 := tu.NewVar("t1", K_EK_EVAR_LOCL_TMP, NIL_ID, f.Id(), Int32QT)
+	c0 := tu.NewConst(0, Int32QT)
+	f.paramIds = []EntityId{a}
+
+	ifbb := NewBasicBlock(tu.GetUniqueBBId(), 0, f.fid, 2)
+	r0bb := NewBasicBlock(tu.GetUniqueBBId(), 0, f.fid, 1)
+	r1bb := NewBasicBlock(tu.GetUniqueBBId(), 0, f.fid, 1)
+	exit := NewBasicBlock(tu.GetUniqueBBId(), 0, f.fid, 1) // All CFGs have single exit block
+
+	cfg := NewControlFlowGraph(tu, 0, f.fid)
+	cfg.AddBBs(ifbb, r0bb, r1bb, exit)
+	cfg.SetEntryBB(ifbb)
+	cfg.SetExitBB(exit)
+
+	ifbb.addSucc(r0bb).addSucc(r1bb)
+	r0bb.addPred(ifbb).addSucc(exit)
+	r1bb.addPred(ifbb).addSucc(exit)
+	exit.addPred(r0bb).addPred(r1bb)
+
+	tu.AddInsn(ifbb, AssignI(ValX(t1), BinX(K_XK_XLT, a, g)), nil)
+	tu.AddInsn(ifbb, IfI(ValX(t1), BinX(K_XK_XVAL, EId(NIL_LABEL_ID), EId(NIL_LABEL_ID))), nil)
+	tu.AddInsn(r0bb, ReturnI(ValX(a)), nil)
+	tu.AddInsn(r1bb, ReturnI(ValX(c0)), nil)
+	tu.AddInsn(exit, NopI(), nil)
+	f.body = cfg
+
+	mbb := NewBasicBlock(tu.GetUniqueBBId(), 0, main.fid, 1)
+	tu.AddInsn(mbb, ReturnI(ValX(c0)), nil)
+	main.body = mbb
+
+	return tu
+}
+
+// This function creates the BitTU (as serialized in a .spir.pb file) of
+// the program of NewExampleTU_Globals, with the labels of the branches:
+//
+//	int g;
+//	int f(int a) {
+//	  t1 = a < g;
+//	  if (t1) goto L1; else goto L2;
+//	L1:
+//	  return a;
+//	L2:
+//	  return 0;
+//	}
+//	int main() { return 0; }
+func NewExampleBitTU_Globals() *BitTU {
+	const (
+		intType, funcType            = 100, 101
+		g, f, main, a, t1, c0        = 2, 3, 4, 5, 6, 7
+		labelTrue, labelFalse        = 8, 9
+		zero                  uint64 = 0
+	)
+	ptr := func(v uint64) *uint64 { return &v }
+	name := func(s string) *string { return &s }
+	val := func(eid uint64) *BitExpr {
+		return &BitExpr{Xkind: K_XK_XVAL, Oprnd1Eid: ptr(eid)}
+	}
+
+	bitTU := &BitTU{
+		TuName: "globals.c",
+		DataTypes: map[uint64]*BitDataType{
+			intType:  {Vkind: K_VK_TINT32, TypeId: intType},
+			funcType: {Vkind: K_VK_TPTR_TO_FUNC, TypeId: funcType, SubTypeEid: ptr(intType)},
+		},
+		EntityInfo: map[uint64]*BitEntityInfo{
+			g:          {Eid: g, Ekind: K_EK_EVAR_GLBL, Vkind: K_VK_TINT32, DataTypeEid: ptr(intType), StrVal: name("g:g")},
+			f:          {Eid: f, Ekind: K_EK_EFUNC, DataTypeEid: ptr(funcType), StrVal: name("f:f")},
+			main:       {Eid: main, Ekind: K_EK_EFUNC, DataTypeEid: ptr(funcType), StrVal: name(K_MAIN_FUNC_NAME)},
+			a:          {Eid: a, Ekind: K_EK_EVAR_LOCL_ARG, Vkind: K_VK_TINT32, DataTypeEid: ptr(intType), ParentEid: ptr(f), StrVal: name("v:f:a")},
+			t1:         {Eid: t1, Ekind: K_EK_EVAR_LOCL_TMP, Vkind: K_VK_TINT32, DataTypeEid: ptr(intType), ParentEid: ptr(f), StrVal: name("v:f:t1")},
+			c0:         {Eid: c0, Ekind: K_EK_ELIT_NUM, Vkind: K_VK_TINT32, DataTypeEid: ptr(intType), LowVal: ptr(zero)},
+			labelTrue:  {Eid: labelTrue, Ekind: K_EK_ELABEL, StrVal: name("L1")},
+			labelFalse: {Eid: labelFalse, Ekind: K_EK_ELABEL, StrVal: name("L2")},
+		},
+		Functions: []*BitFunc{
+			{Fid: f, Fname: "f:f", TypeEid: funcType, Insns: []*BitInsn{
+				{Ikind: K_IK_IASGN_RHS_OP, Expr1: val(t1), Expr2: &BitExpr{Xkind: K_XK_XLT, Oprnd1Eid: ptr(a), Oprnd2Eid: ptr(g)}},
+				{Ikind: K_IK_ICOND, Expr1: val(t1), Expr2: &BitExpr{Xkind: K_XK_XVAL, Oprnd1Eid: ptr(labelTrue), Oprnd2Eid: ptr(labelFalse)}},
+				{Ikind: K_IK_ILABEL, Expr1: val(labelTrue)},
+				{Ikind: K_IK_IRETURN, Expr1: val(a)},
+				{Ikind: K_IK_ILABEL, Expr1: val(labelFalse)},
+				{Ikind: K_IK_IRETURN, Expr1: val(c0)},
+			}},
+			{Fid: main, Fname: K_MAIN_FUNC_NAME, TypeEid: funcType, Insns: []*BitInsn{
+				{Ikind: K_IK_IRETURN, Expr1: val(c0)},
+			}},
+		},
+	}
+	return bitTU
+}
+
+// This function creates a translation unit with a straight line main of
+// n+2 instructions (e.g. to test the facts inside a block), in blocks of at
+// most 64 instructions (see ConstructCFG), followed by the exit block:
+//
+//	int main() {
+//	  int i = 1;
+//	  i = i + 1; // n times
+//	  return i;
+//	}
+func NewExampleTU_Straight(n int) *TU {
+	tu := NewTU()
+
+	main := tu.NewFunction(K_MAIN_FUNC_NAME, NewQualVT(NewFunctionVT(Int32QT, nil, nil, false, ""), K_QK_QNIL), nil, nil)
+
+	i := tu.NewVar("i", K_EK_EVAR_LOCL, NIL_ID, main.Id(), NewQualVT(&Int32VT, K_QK_QNIL))
+	c1 := tu.NewConst(1, NewQualVT(&Int32VT, K_QK_QNIL))
+
+	insns := make([]Insn, 0, n+2)
+	insns = append(insns, AssignI(ValX(i), ValX(c1)))
+	for range n {
+		insns = append(insns, AssignI(ValX(i), BinX(K_XK_XADD, i, c1)))
+	}
+	insns = append(insns, ReturnI(ValX(i)))
+	main.SetBody(tu, insns)
+
+	return tu
+}
@@ -119,11 +119,11 @@ func (expr Expr) GetXK() ExprKind {
 }
 
 func (expr Expr) GetCallSiteId() CallSiteId {
-	return CallSiteId(expr.GetOpr1())
+	return CallSiteId(expr.GetOpr2()) // see placeCallSiteId
 }
 
 func (expr Expr) GetCallee() EntityId {
-	return expr.GetOpr2()
+	return expr.GetOpr1() // see placeCallee
 }
 
 // A simple expression has no operator (including nil expressions).
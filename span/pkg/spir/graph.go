@@ -334,3 +334,40 @@ func GetBBWorklist(graph Graph, visitingOrder GraphVisitingOrder) []BasicBlockId
 
 	return orderedBBs
 }
+
+// A control flow edge between two basic blocks.
+type BBEdge struct {
+	From BasicBlockId
+	To   BasicBlockId
+}
+
+// GetBackEdges returns the back edges of the graph, i.e. the edges to a block
+// on the stack of a depth first traversal from the entry block (in the order
+// they are found). The target of a back edge is a loop head, and every cycle
+// in the graph contains a back edge. For a reducible graph, these are the
+// edges whose target dominates their source.
+func GetBackEdges(graph Graph) []BBEdge {
+	visited := make(map[BasicBlockId]bool, graph.BBCount())
+	onStack := make(map[BasicBlockId]bool, graph.BBCount())
+	var backEdges []BBEdge
+
+	var dfs func(blockId BasicBlockId)
+	dfs = func(blockId BasicBlockId) {
+		visited[blockId] = true
+		onStack[blockId] = true
+		for _, succ := range graph.BasicBlock(blockId).successors {
+			switch {
+			case onStack[succ.Id()]:
+				backEdges = append(backEdges, BBEdge{From: blockId, To: succ.Id()})
+			case !visited[succ.Id()]:
+				dfs(succ.Id())
+			}
+		}
+		onStack[blockId] = false
+	}
+
+	if entryBlock := graph.EntryBlock(); entryBlock != nil {
+		dfs(entryBlock.id)
+	}
+	return backEdges
+}
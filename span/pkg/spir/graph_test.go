@@ -2,6 +2,7 @@
 package spir
 
 import (
+	"fmt"
 	"reflect"
 	"testing"
 )
@@ -27,12 +28,20 @@ func (m *mockBasicBlock) basicBlockAdapter() *BasicBlock {
 	// This adapter is needed because the Graph interface returns *BasicBlock,
 	// but our mock uses mockBasicBlock. We create a temporary BasicBlock
 	// wrapper when needed by the Graph interface methods.
-	return &BasicBlock{
+	bb := &BasicBlock{
 		id:           m.mockId,
 		insns:        nil, // Not needed
 		predecessors: make([]*BasicBlock, len(m.mockPredecessors)),
 		successors:   make([]*BasicBlock, len(m.mockSuccessors)),
 	}
+	// Only the ids of the neighbours are needed; the graph resolves them.
+	for i, predId := range m.mockPredecessors {
+		bb.predecessors[i] = &BasicBlock{id: predId}
+	}
+	for i, succId := range m.mockSuccessors {
+		bb.successors[i] = &BasicBlock{id: succId}
+	}
+	return bb
 }
 
 type mockGraph struct {
@@ -45,7 +54,7 @@ type mockGraph struct {
 
 // BBCount implements [Graph].
 func (mg *mockGraph) BBCount() int {
-	panic("unimplemented")
+	return len(mg.mockBlocks)
 }
 
 func newMockGraph(entry, exit BasicBlockId) *mockGraph {
@@ -275,3 +284,155 @@ func TestReversePostOrder(t *testing.T) {
 		}
 	})
 }
+
+func TestGetBackEdges(t *testing.T) {
+	b1, b2, b3, b4, b5 := BasicBlockId(1), BasicBlockId(2), BasicBlockId(3), BasicBlockId(4), BasicBlockId(5)
+
+	// A -> B -> C -> D -> E (Exit)
+	//      ^----|    |
+	//      ^---------|
+	graph := newMockGraph(b1, b5)
+	graph.addBlock(b1, b2)
+	graph.addBlock(b2, b3)
+	graph.addBlock(b3, b2, b4)
+	graph.addBlock(b4, b2, b5)
+	graph.addBlock(b5)
+	want := []BBEdge{{From: b3, To: b2}, {From: b4, To: b2}}
+	if got := GetBackEdges(graph); !reflect.DeepEqual(got, want) {
+		t.Errorf("back edges: got %v, want %v", got, want)
+	}
+
+	// A -> B -> D (Exit), A -> C -> D: no loops.
+	acyclic := newMockGraph(b1, b4)
+	acyclic.addBlock(b1, b2, b3)
+	acyclic.addBlock(b2, b4)
+	acyclic.addBlock(b3, b4)
+	acyclic.addBlock(b4)
+	if got := GetBackEdges(acyclic); len(got) != 0 {
+		t.Errorf("expected no back edges in an acyclic graph, got %v", got)
+	}
+}
+
+// benchInsnSeq returns the instructions of a function with the given number
+// of loops (as emitted by the front end: with labels, ifs and gotos),
+// 7 instructions per loop.
+func benchInsnSeq(tu *TU, loops int) []Insn {
+	i := tu.NewVar("i", K_EK_EVAR_LOCL, NIL_ID, NIL_ID, NewQualVT(&Int32VT, K_QK_QNIL))
+	t1 := tu.NewVar("t1", K_EK_EVAR_LOCL_TMP, NIL_ID, NIL_ID, NewQualVT(&Int32VT, K_QK_QNIL))
+	c1 := tu.NewConst(1, NewQualVT(&Int32VT, K_QK_QNIL))
+	c1000 := tu.NewConst(1000, NewQualVT(&Int32VT, K_QK_QNIL))
+
+	insns := []Insn{AssignI(ValX(i), ValX(c1))}
+	for range loops {
+		head := EntityId(tu.GetUniqueLabelId())
+		body := EntityId(tu.GetUniqueLabelId())
+		exit := EntityId(tu.GetUniqueLabelId())
+		insns = append(insns,
+			LabelI(ValX(head)),
+			AssignI(ValX(t1), BinX(K_XK_XLT, i, c1000)),
+			IfI(ValX(t1), BinX(K_XK_XVAL, body, exit)),
+			LabelI(ValX(body)),
+			AssignI(ValX(i), BinX(K_XK_XADD, i, c1)),
+			GotoI(ValX(head)),
+			LabelI(ValX(exit)))
+	}
+	return append(insns, ReturnI(ValX(i)))
+}
+
+// checkCFGEdges checks that the predecessors mirror the successors.
+func checkCFGEdges(t *testing.T, cfg *ControlFlowGraph) {
+	t.Helper()
+	count := func(bbs []*BasicBlock, bb *BasicBlock) int {
+		n := 0
+		for _, b := range bbs {
+			if b == bb {
+				n++
+			}
+		}
+		return n
+	}
+	for _, bb := range cfg.basicBlocks {
+		for _, succ := range bb.successors {
+			if count(succ.predecessors, bb) != count(bb.successors, succ) {
+				t.Errorf("the edge %p -> %p is not a predecessor edge", bb, succ)
+			}
+		}
+		for _, pred := range bb.predecessors {
+			if count(pred.successors, bb) == 0 {
+				t.Errorf("the edge %p <- %p is not a successor edge", bb, pred)
+			}
+		}
+	}
+}
+
+func TestConstructCFG(t *testing.T) {
+	// assign; head: t1 = i < 1000; if t1 body exit; body: i = i + 1; goto head; exit: return i
+	cfg := ConstructCFG(benchInsnSeq(NewTU(), 1))
+	bbs := cfg.basicBlocks
+	if len(bbs) != 5 {
+		t.Fatalf("got %d basic blocks, want 5", len(bbs))
+	}
+	wantSuccs := [][]*BasicBlock{{bbs[1]}, {bbs[2], bbs[3]}, {bbs[1]}, {bbs[4]}, nil}
+	wantPreds := [][]*BasicBlock{nil, {bbs[0], bbs[2]}, {bbs[1]}, {bbs[1]}, {bbs[3]}}
+	for i, bb := range bbs {
+		if len(bb.successors) != len(wantSuccs[i]) || (len(bb.successors) > 0 && !reflect.DeepEqual(bb.successors, wantSuccs[i])) {
+			t.Errorf("bb%d: got %d successors, want %d", i, len(bb.successors), len(wantSuccs[i]))
+		}
+		if len(bb.predecessors) != len(wantPreds[i]) || (len(bb.predecessors) > 0 && !reflect.DeepEqual(bb.predecessors, wantPreds[i])) {
+			t.Errorf("bb%d: got %d predecessors, want %d", i, len(bb.predecessors), len(wantPreds[i]))
+		}
+	}
+	if cfg.EntryBlock() != bbs[0] || cfg.ExitBlock() != bbs[4] || len(bbs[1].labels) != 1 {
+		t.Errorf("wrong entry, exit or labels")
+	}
+	checkCFGEdges(t, cfg)
+
+	// An empty sequence: the entry is the exit.
+	if empty := ConstructCFG(nil); empty.EntryBlock() != empty.ExitBlock() || empty.BBCount() != 1 {
+		t.Errorf("an empty CFG has %d blocks", empty.BBCount())
+	}
+}
+
+func TestConstructCFG_splitLongBlocks(t *testing.T) {
+	tu := NewTU()
+	x := tu.NewVar("x", K_EK_EVAR_LOCL, NIL_ID, NIL_ID, NewQualVT(&Int32VT, K_QK_QNIL))
+	loop := EntityId(tu.GetUniqueLabelId())
+
+	// loop: 150 x 'x = x'; goto loop
+	insns := []Insn{LabelI(ValX(loop))}
+	for range 150 {
+		insns = append(insns, AssignI(ValX(x), ValX(x)))
+	}
+	insns = append(insns, GotoI(ValX(loop)))
+
+	cfg := ConstructCFG(insns)
+	bbs := cfg.basicBlocks
+	wantSizes := []int{64, 64, 23, 0} // the last one is the exit
+	if len(bbs) != len(wantSizes) {
+		t.Fatalf("got %d basic blocks, want %d", len(bbs), len(wantSizes))
+	}
+	for i, bb := range bbs {
+		if len(bb.insns) != wantSizes[i] {
+			t.Errorf("bb%d: got %d instructions, want %d", i, len(bb.insns), wantSizes[i])
+		}
+	}
+	if bbs[0].successors[0] != bbs[1] || bbs[1].successors[0] != bbs[2] || bbs[2].successors[0] != bbs[0] {
+		t.Errorf("the split blocks are not chained (with the back edge to the label)")
+	}
+	if len(bbs[0].predecessors) != 1 || bbs[0].predecessors[0] != bbs[2] {
+		t.Errorf("the loop head has predecessors %v", bbs[0].predecessors)
+	}
+	checkCFGEdges(t, cfg)
+}
+
+func BenchmarkConstructCFG(b *testing.B) {
+	for _, loops := range []int{10, 100, 1000, 10000} {
+		insns := benchInsnSeq(NewTU(), loops)
+		b.Run(fmt.Sprintf("insns=%d", len(insns)), func(b *testing.B) {
+			b.ReportAllocs()
+			for b.Loop() {
+				ConstructCFG(insns)
+			}
+		})
+	}
+}
@@ -117,7 +117,7 @@ func (i Insn) String() string {
 // BLOCK START: API to create instructions
 
 func (i *Insn) SetInsnId(id InsnId) {
-	i.firstHalf = (uint64(id) & InsnIdMask32) << InsnIdShift64
+	i.firstHalf = (i.firstHalf &^ InsnIdPosMask64) | ((uint64(id) & InsnIdMask32) << InsnIdShift64)
 }
 
 func NilI() Insn {
@@ -1,12 +1,131 @@
 package spir
 
-// This file defines the logic to link two Translation Units together.
+// This file defines the static linker, which links many TUs into one.
+//
+// The TUs are linked in three phases:
+//
+//  1. Each TU is scanned (in parallel) for its symbols, i.e. the externally
+//     visible functions and global variables, and for the entities that are
+//     shared by value across the TUs: the data types (keyed by their
+//     structure), the literals and the source files.
+//  2. The symbols and the shared entities are put into a global hash index,
+//     whose shards (by the hash of the key) are built in parallel.
+//     A declaration resolves to the definition of its name, and the
+//     structurally identical data types are unified. Then the new id of
+//     every entity of every TU is precomputed into a translation table of
+//     the TU, allocating the ids in blocks (see idgen.IDBlock).
+//  3. The functions, variables, etc. of each TU are copied (in parallel)
+//     with their ids rewritten through the table of the TU, and are merged
+//     into the linked TU.
+//
+// The static functions and variables are private to their TU, so they are
+// never resolved across the TUs. The type objects and the literal infos
+// are shared (not copied) by the linked TU and the given TUs.
+
+import (
+	"cmp"
+	"errors"
+	"fmt"
+	"runtime"
+	"slices"
+	"strconv"
+	"sync"
+
+	"github.com/adhuliya/span/pkg/idgen"
+)
+
+// The number of shards of the global index of the linker.
+const linkShards = 16
+
+// The rank of a symbol: a definition overrides a weak or a tentative
+// definition, which overrides a declaration.
+type linkRank uint8
+
+const (
+	linkDecl linkRank = iota
+	linkTentative
+	linkDef
+)
+
+// An externally visible function or global variable of a TU.
+type linkSymbol struct {
+	name   string
+	eid    EntityId
+	isFunc bool
+	rank   linkRank
+	entry  *linkEntry // set when the index is built
+}
+
+// An entity shared by value across the TUs (a data type, a literal or a
+// source file), with the key that identifies it.
+type linkShared struct {
+	key   string
+	eid   EntityId
+	entry *linkEntry // set when the index is built
+}
+
+// An entry of the global index: the first occurrence of the key (which is
+// given the new id), and the winning occurrence (which is copied).
+type linkEntry struct {
+	firstUnit, defUnit int
+	firstEid, defEid   EntityId
+	rank               linkRank
+	isFunc             bool
+	id                 EntityId // the new id
+}
+
+// A TU being linked, with its translation table.
+type linkUnit struct {
+	tu       *TU
+	identity bool // the TU is linked in place: it keeps its ids
+	symbols  [linkShards][]linkSymbol
+	shared   [linkShards][]linkShared
+	locals   []EntityId   // the other ids to renumber (sorted)
+	sites    []CallSiteId // the call sites (sorted)
+	ids      map[EntityId]EntityId
+	siteIds  map[CallSiteId]CallSiteId
+	winners  map[EntityId]bool // the symbols and the shared entities copied from this TU
+}
+
+// The entities of a TU to be put in the linked TU (see linkUnit.copy).
+type linkPart struct {
+	functions    []*Function
+	variables    []*ValueInfo
+	types        []linkKV[EntityId, QualType]
+	literals     []linkKV[EntityId, *LiteralInfo]
+	labels       []linkKV[LabelId, string]
+	callSites    []linkKV[CallSiteId, []EntityId]
+	names        []linkKV[string, EntityId]
+	idsToName    []linkKV[EntityId, string]
+	entityInfo   []linkKV[EntityId, *InsnInfo]
+	insnInfo     []linkKV[InsnId, InsnInfo]
+	srcLocations []linkKV[EntityId, SrcLoc]
+	files        []SrcFile
+	globalInit   []Insn
+	initHasBody  bool
+}
+
+type linkKV[K comparable, V any] struct {
+	key K
+	val V
+}
 
 // LinkTUs links a list of translation units together.
 // It creates a new translation unit that is the "union" of all the translation units in the given list.
 // It puts all the functions, data types and variables from the given TUs to the new TU.
 // It returns the new translation unit instance (or the first TU if modifyFirstTU is true).
-func LinkTUs(tuList []*TU, context *Context, modifyFirstTU bool) *TU {
+//
+// A declaration of a function or a global variable (in any TU) resolves to
+// its definition (in any TU). Two definitions of the same name are an error,
+// unless at most one of them is a strong definition (i.e. the others are
+// weak or tentative definitions). The global initializations of the TUs are
+// concatenated in the order of the list.
+// The given TUs are recorded as merged into the new TU, and must not be
+// modified afterwards.
+func LinkTUs(tuList []*TU, context *Context, modifyFirstTU bool) (*TU, error) {
+	if len(tuList) == 0 {
+		return nil, errors.New("no TUs to link")
+	}
 	var newTU *TU
 	if modifyFirstTU {
 		newTU = tuList[0]
@@ -14,7 +133,780 @@ func LinkTUs(tuList []*TU, context *Context, modifyFirstTU bool) *TU {
 		newTU = NewTU()
 	}
 
-	// Add linking logic here
+	// Phase 1: scan the TUs.
+	units := make([]*linkUnit, len(tuList))
+	linkParallel(len(units), func(i int) {
+		units[i] = newLinkUnit(tuList[i], modifyFirstTU && i == 0)
+	})
+
+	// Phase 2: resolve the symbols, unify the shared entities and
+	// precompute the translation tables.
+	shardErrs := make([]error, linkShards)
+	linkParallel(linkShards, func(shard int) {
+		shardErrs[shard] = linkShard(units, shard)
+	})
+	if err := errors.Join(shardErrs...); err != nil {
+		return nil, err
+	}
+	allocateLinkIds(newTU, units)
+
+	// Phase 3: copy the entities with their new ids.
+	parts := make([]*linkPart, len(units))
+	linkParallel(len(units), func(i int) {
+		if !units[i].identity {
+			parts[i] = units[i].copy(newTU)
+		}
+	})
+	mergeLinkParts(newTU, units, parts)
+
+	for _, tu := range tuList {
+		if tu == newTU {
+			continue
+		}
+		if tu.tuId == NIL_ID {
+			tu.tuId = newTU.GenerateEntityId(K_EK_ETU)
+		}
+		tu.parentTU = newTU
+		newTU.mergedTUs[tu.tuId] = tu
+	}
+	return newTU, nil
+}
+
+// linkParallel calls fn(0..n-1) using (at most) GOMAXPROCS goroutines.
+func linkParallel(n int, fn func(i int)) {
+	jobs := min(runtime.GOMAXPROCS(0), n)
+	next := make(chan int)
+	var wg sync.WaitGroup
+	for range jobs {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range next {
+				fn(i)
+			}
+		}()
+	}
+	for i := range n {
+		next <- i
+	}
+	close(next)
+	wg.Wait()
+}
+
+// linkShardOf returns the shard of the key (FNV-1a, to be deterministic).
+func linkShardOf(key string) int {
+	h := uint32(2166136261)
+	for i := 0; i < len(key); i++ {
+		h ^= uint32(key[i])
+		h *= 16777619
+	}
+	return int(h % linkShards)
+}
+
+// Is the function visible to the other TUs?
+func linkFuncIsSymbol(tu *TU, fun *Function) bool {
+	if fun.fid == tu.globalInit {
+		return false
+	}
+	return fun.funcType == nil || fun.funcType.GetQBits()&K_QK_QGLBL_STATIC == 0
+}
+
+// Is the variable a global visible to the other TUs?
+func linkVarIsSymbol(vi *ValueInfo) bool {
+	return vi.parentId == NIL_ID && vi.eid.Kind() == K_EK_EVAR_GLBL &&
+		(vi.qualType == nil || vi.qualType.GetQBits()&K_QK_QGLBL_STATIC == 0)
+}
+
+func linkFuncRank(fun *Function) linkRank {
+	var qBits QualBits
+	if fun.funcType != nil {
+		qBits = fun.funcType.GetQBits()
+	}
+	switch {
+	case qBits&K_QK_QNO_DEF != 0 || (fun.body == nil && len(fun.insns) == 0):
+		return linkDecl
+	case qBits&K_QK_QWEAK != 0:
+		return linkTentative
+	}
+	return linkDef
+}
+
+func linkVarRank(vi *ValueInfo) linkRank {
+	var qBits QualBits
+	if vi.qualType != nil {
+		qBits = vi.qualType.GetQBits()
+	}
+	switch {
+	case qBits&(K_QK_QEXTERNAL|K_QK_QNO_DEF) != 0:
+		return linkDecl
+	case qBits&(K_QK_QNO_INIT|K_QK_QWEAK) != 0:
+		return linkTentative
+	}
+	return linkDef
+}
+
+// newLinkUnit scans the TU for its symbols, shared entities and the other ids.
+func newLinkUnit(tu *TU, identity bool) *linkUnit {
+	u := &linkUnit{tu: tu, identity: identity}
+	claimed := make(map[EntityId]bool) // the symbols and the shared entities
+	locals := make(map[EntityId]bool)
+	sites := make(map[CallSiteId]bool)
+
+	addSymbol := func(name string, eid EntityId, isFunc bool, rank linkRank) {
+		shard := linkShardOf(name)
+		u.symbols[shard] = append(u.symbols[shard], linkSymbol{name: name, eid: eid, isFunc: isFunc, rank: rank})
+		claimed[eid] = true
+	}
+	addShared := func(key string, eid EntityId) {
+		shard := linkShardOf(key)
+		u.shared[shard] = append(u.shared[shard], linkShared{key: key, eid: eid})
+		claimed[eid] = true
+	}
+	addLocal := func(eid EntityId) {
+		if eid != NIL_ID {
+			locals[eid] = true
+		}
+	}
+	addOperand := func(eid EntityId) {
+		if eid.Kind() != K_EK_ELIT_NUM_IMM {
+			addLocal(eid) // e.g. the labels, which may not be in tu.labels
+		}
+	}
+	addInsn := func(insn Insn) {
+		addLocal(EntityId(insn.Id()))
+		addOperand(insn.GetFirstHalfEntityId())
+		expr := Expr(insn.secondHalf)
+		addOperand(expr.GetOpr1())
+		if expr.IsCall() {
+			sites[expr.GetCallSiteId()] = true
+		} else {
+			addOperand(expr.GetOpr2())
+		}
+	}
+	addBB := func(bb *BasicBlock) {
+		addLocal(EntityId(bb.id))
+		addLocal(EntityId(bb.scope))
+		for _, label := range bb.labels {
+			addLocal(EntityId(label))
+		}
+		for _, insn := range bb.insns {
+			addInsn(insn)
+		}
+	}
+
+	for fid, fun := range tu.functions {
+		if linkFuncIsSymbol(tu, fun) {
+			addSymbol(fun.fName, fid, true, linkFuncRank(fun))
+		} else if fid != tu.globalInit {
+			addLocal(fid)
+		}
+		for _, insn := range fun.insns {
+			addInsn(insn)
+		}
+		switch body := fun.body.(type) {
+		case *BasicBlock:
+			if body != nil {
+				addBB(body)
+			}
+		case *ControlFlowGraph:
+			if body != nil {
+				addLocal(EntityId(body.id))
+				addLocal(EntityId(body.scope))
+				for _, bb := range body.basicBlocks {
+					addBB(bb)
+				}
+			}
+		}
+	}
+	for eid, vi := range tu.variables {
+		if linkVarIsSymbol(vi) {
+			addSymbol(vi.name, eid, false, linkVarRank(vi))
+		} else {
+			addLocal(eid)
+		}
+	}
+	var buf []byte
+	for eid, qt := range tu.qualTypes {
+		buf = appendLinkTypeKey(append(buf[:0], 'T'), qt, 0)
+		addShared(string(buf), eid)
+	}
+	for eid, li := range tu.literals {
+		if eid.Kind() == K_EK_ELIT_NUM_IMM {
+			continue // the id is the value
+		}
+		buf = appendLinkTypeKey(append(buf[:0], 'L'), li.qualType, 0)
+		buf = strconv.AppendUint(append(buf, ':'), li.lowVal, 16)
+		buf = strconv.AppendUint(append(buf, ':'), li.highVal, 16)
+		buf = append(append(buf, ':'), li.strVal...)
+		addShared(string(buf), eid)
+	}
+	for id, file := range tu.srcFilesInfo.files {
+		addShared("F"+file.directory+file.name, EntityId(id))
+	}
+	for id := range tu.labels {
+		addLocal(EntityId(id))
+	}
+	for id := range tu.callSites {
+		sites[id] = true
+	}
+	for eid, info := range tu.entityInfo {
+		if _, ok := info.(*InsnInfo); ok {
+			addLocal(eid)
+		}
+	}
+	for id := range tu.insnInfo {
+		addLocal(EntityId(id))
+	}
+	for eid := range tu.srcLocations {
+		addLocal(eid)
+	}
+
+	// Sort everything, as the ids are allocated in this order.
+	for shard := range linkShards {
+		slices.SortFunc(u.symbols[shard], func(a, b linkSymbol) int { return cmp.Compare(a.eid, b.eid) })
+		slices.SortFunc(u.shared[shard], func(a, b linkShared) int { return cmp.Compare(a.eid, b.eid) })
+	}
+	u.locals = make([]EntityId, 0, len(locals))
+	for eid := range locals {
+		if !claimed[eid] && eid != tu.globalInit {
+			u.locals = append(u.locals, eid)
+		}
+	}
+	slices.Sort(u.locals)
+	u.sites = make([]CallSiteId, 0, len(sites))
+	for id := range sites {
+		if id != 0 {
+			u.sites = append(u.sites, id)
+		}
+	}
+	slices.Sort(u.sites)
+	return u
+}
+
+// linkShard builds a shard of the global index: it resolves the symbols
+// and unifies the shared entities of the shard, in the order of the TUs.
+func linkShard(units []*linkUnit, shard int) error {
+	var errs []error
+	symbols := make(map[string]*linkEntry)
+	for i, u := range units {
+		for j := range u.symbols[shard] {
+			sym := &u.symbols[shard][j]
+			entry, ok := symbols[sym.name]
+			if !ok {
+				entry = &linkEntry{firstUnit: i, firstEid: sym.eid, defUnit: i, defEid: sym.eid,
+					rank: sym.rank, isFunc: sym.isFunc}
+				symbols[sym.name] = entry
+			} else if entry.isFunc != sym.isFunc {
+				errs = append(errs, fmt.Errorf("symbol %q is a function and a variable (in %q and %q)",
+					sym.name, units[entry.defUnit].tu.tuName, u.tu.tuName))
+			} else if sym.rank > entry.rank {
+				entry.defUnit, entry.defEid, entry.rank = i, sym.eid, sym.rank
+			} else if sym.rank == linkDef && entry.rank == linkDef && entry.defUnit != i {
+				errs = append(errs, fmt.Errorf("multiple definitions of %q (in %q and %q)",
+					sym.name, units[entry.defUnit].tu.tuName, u.tu.tuName))
+			}
+			sym.entry = entry
+		}
+	}
+
+	shared := make(map[string]*linkEntry)
+	for i, u := range units {
+		for j := range u.shared[shard] {
+			sh := &u.shared[shard][j]
+			entry, ok := shared[sh.key]
+			if !ok {
+				entry = &linkEntry{firstUnit: i, firstEid: sh.eid, defUnit: i, defEid: sh.eid}
+				shared[sh.key] = entry
+			}
+			sh.entry = entry
+		}
+	}
+	return errors.Join(errs...)
+}
+
+// allocateLinkIds fills the translation tables of the units. The ids are
+// reserved in a block per pool (counted first), and are handed out in the
+// order of the units, so that linking the same TUs gives the same ids.
+func allocateLinkIds(newTU *TU, units []*linkUnit) {
+	// Call fn for each id that is given a new id, in order.
+	forEachNewId := func(fn func(u *linkUnit, eid EntityId)) {
+		for i, u := range units {
+			if u.identity {
+				continue
+			}
+			for shard := range linkShards {
+				for _, sym := range u.symbols[shard] {
+					if sym.entry.firstUnit == i && sym.entry.firstEid == sym.eid {
+						fn(u, sym.eid)
+					}
+				}
+				for _, sh := range u.shared[shard] {
+					if sh.entry.firstUnit == i && sh.entry.firstEid == sh.eid {
+						fn(u, sh.eid)
+					}
+				}
+			}
+			for _, eid := range u.locals {
+				fn(u, eid)
+			}
+		}
+	}
+
+	type poolKey struct {
+		prefix      uint16
+		seqIdBitLen uint8
+	}
+	keyOf := func(eid EntityId) poolKey {
+		return poolKey{eid.KindAndSubKind16(), eid.SeqIdBitLen()}
+	}
+	counts := make(map[poolKey]uint32)
+	forEachNewId(func(u *linkUnit, eid EntityId) { counts[keyOf(eid)]++ })
+	blocks := make(map[poolKey]*idgen.IDBlock, len(counts))
+	for key, count := range counts {
+		blocks[key] = newTU.idGen.ReserveIDs(key.prefix, key.seqIdBitLen, count)
+	}
+
+	for _, u := range units {
+		if !u.identity {
+			u.ids = make(map[EntityId]EntityId, len(u.locals))
+			u.ids[u.tu.globalInit] = newTU.globalInit
+		}
+		u.winners = make(map[EntityId]bool)
+	}
+	forEachNewId(func(u *linkUnit, eid EntityId) {
+		u.ids[eid] = EntityId(blocks[keyOf(eid)].Next())
+	})
+	for _, block := range blocks {
+		block.Release()
+	}
+
+	// The ids of the symbols and the shared entities are those of their
+	// first occurrence (or the ids in the TU linked in place).
+	for i, u := range units {
+		for shard := range linkShards {
+			for _, sym := range u.symbols[shard] {
+				if sym.entry.firstUnit == i && sym.entry.firstEid == sym.eid {
+					sym.entry.id = u.id(sym.eid)
+				}
+			}
+			for _, sh := range u.shared[shard] {
+				if sh.entry.firstUnit == i && sh.entry.firstEid == sh.eid {
+					sh.entry.id = u.id(sh.eid)
+				}
+			}
+		}
+	}
+	for i, u := range units {
+		for shard := range linkShards {
+			for _, sym := range u.symbols[shard] {
+				if !u.identity {
+					u.ids[sym.eid] = sym.entry.id
+				}
+				if sym.entry.defUnit == i && sym.entry.defEid == sym.eid {
+					u.winners[sym.eid] = true
+				}
+			}
+			for _, sh := range u.shared[shard] {
+				if !u.identity {
+					u.ids[sh.eid] = sh.entry.id
+				}
+				if sh.entry.firstUnit == i && sh.entry.firstEid == sh.eid {
+					u.winners[sh.eid] = true
+				}
+			}
+		}
+	}
+
+	var siteCount uint32
+	for _, u := range units {
+		if !u.identity {
+			siteCount += uint32(len(u.sites))
+		}
+	}
+	siteBlock := newTU.idGen.ReserveIDs(1, 25, siteCount) // see TU.NewCallSiteId
+	for _, u := range units {
+		if u.identity {
+			continue
+		}
+		u.siteIds = make(map[CallSiteId]CallSiteId, len(u.sites))
+		for _, id := range u.sites {
+			u.siteIds[id] = CallSiteId(siteBlock.Next())
+		}
+	}
+	siteBlock.Release()
+}
+
+// id returns the new id of the entity. The ids not in the table are kept
+// (e.g. the immediate literals, whose id is their value).
+func (u *linkUnit) id(eid EntityId) EntityId {
+	if newId, ok := u.ids[eid]; ok {
+		return newId
+	}
+	return eid
+}
+
+func (u *linkUnit) site(id CallSiteId) CallSiteId {
+	if newId, ok := u.siteIds[id]; ok {
+		return newId
+	}
+	return id
+}
+
+func (u *linkUnit) eids(eids []EntityId) []EntityId {
+	if eids == nil {
+		return nil
+	}
+	newEids := make([]EntityId, len(eids))
+	for i, eid := range eids {
+		newEids[i] = u.id(eid)
+	}
+	return newEids
+}
+
+// expr rewrites the operands of the expression (the call site of a call).
+func (u *linkUnit) expr(expr Expr) Expr {
+	opr2 := placeExprOpr2(u.id(expr.GetOpr2()))
+	if expr.IsCall() {
+		opr2 = placeCallSiteId(u.site(expr.GetCallSiteId()))
+	}
+	rest := uint64(expr) &^ (BinXOpr1Mask64 | BinXOpr2Mask64)
+	return Expr(rest | placeExprOpr1(u.id(expr.GetOpr1())) | opr2)
+}
+
+// insn rewrites the id and the operands of the instruction.
+func (u *linkUnit) insn(insn Insn) Insn {
+	first := insn.firstHalf&^FirstHalfExprMask64 | placeExprOpr1(u.id(insn.GetFirstHalfEntityId()))
+	newInsn := Insn{firstHalf: first, secondHalf: uint64(u.expr(Expr(insn.secondHalf)))}
+	if id := insn.Id(); id != 0 {
+		newInsn.SetInsnId(InsnId(u.id(EntityId(id))))
+	}
+	return newInsn
+}
+
+func (u *linkUnit) insns(insns []Insn) []Insn {
+	if insns == nil {
+		return nil
+	}
+	newInsns := make([]Insn, len(insns))
+	for i, insn := range insns {
+		newInsns[i] = u.insn(insn)
+	}
+	return newInsns
+}
+
+func (u *linkUnit) basicBlock(bb *BasicBlock) *BasicBlock {
+	newBB := &BasicBlock{
+		id:         BasicBlockId(u.id(EntityId(bb.id))),
+		scope:      ScopeId(u.id(EntityId(bb.scope))),
+		fid:        u.id(bb.fid),
+		insns:      u.insns(bb.insns),
+		insnBitMap: bb.insnBitMap,
+	}
+	if bb.labels != nil {
+		newBB.labels = make([]LabelId, len(bb.labels))
+		for i, label := range bb.labels {
+			newBB.labels[i] = LabelId(u.id(EntityId(label)))
+		}
+	}
+	return newBB
+}
+
+// graph copies the body of a function with the new ids.
+func (u *linkUnit) graph(g Graph, newTU *TU) Graph {
+	switch g := g.(type) {
+	case *BasicBlock:
+		if g != nil {
+			return u.basicBlock(g)
+		}
+	case *ControlFlowGraph:
+		if g != nil {
+			cfg := &ControlFlowGraph{
+				id:          CFGId(u.id(EntityId(g.id))),
+				tu:          newTU,
+				scope:       ScopeId(u.id(EntityId(g.scope))),
+				fid:         u.id(g.fid),
+				basicBlocks: make([]*BasicBlock, len(g.basicBlocks)),
+			}
+			newBBs := make(map[*BasicBlock]*BasicBlock, len(g.basicBlocks))
+			for i, bb := range g.basicBlocks {
+				cfg.basicBlocks[i] = u.basicBlock(bb)
+				newBBs[bb] = cfg.basicBlocks[i]
+			}
+			for i, bb := range g.basicBlocks {
+				newBB := cfg.basicBlocks[i]
+				for _, pred := range bb.predecessors {
+					newBB.predecessors = append(newBB.predecessors, newBBs[pred])
+				}
+				for _, succ := range bb.successors {
+					newBB.successors = append(newBB.successors, newBBs[succ])
+				}
+			}
+			cfg.entryBlock, cfg.exitBlock = newBBs[g.entryBlock], newBBs[g.exitBlock]
+			return cfg
+		}
+	}
+	return nil
+}
 
-	return newTU
+// qualType returns the type, with the parameter ids of a function type
+// rewritten (in a copy).
+func (u *linkUnit) qualType(qt QualType) QualType {
+	if qt == nil {
+		return nil
+	}
+	funcVT, ok := qt.GetVT().(*FunctionVT)
+	if !ok || len(funcVT.paramIds) == 0 {
+		return qt
+	}
+	newVT := *funcVT
+	newVT.paramIds = u.eids(funcVT.paramIds)
+	return NewQualVT(&newVT, qt.GetQBits())
+}
+
+func (u *linkUnit) srcLoc(loc SrcLoc) SrcLoc {
+	loc.fileId = FileId(u.id(EntityId(loc.fileId)))
+	return loc
+}
+
+// copy copies the entities of the TU (except the symbols and the shared
+// entities copied from another TU) with their new ids.
+func (u *linkUnit) copy(newTU *TU) *linkPart {
+	tu, part := u.tu, &linkPart{}
+	for _, fid := range tu.FunctionIds() {
+		fun := tu.functions[fid]
+		if fid == tu.globalInit {
+			part.globalInit = u.insns(fun.insns)
+			if len(fun.insns) == 0 && fun.body != nil {
+				part.globalInit = u.insns(graphInsns(fun.body))
+			}
+			part.initHasBody = fun.body != nil
+			continue
+		}
+		if linkFuncIsSymbol(tu, fun) && !u.winners[fid] {
+			continue
+		}
+		originTU := fun.originTU
+		if originTU == nil {
+			originTU = tu
+		}
+		part.functions = append(part.functions, &Function{
+			fid:      u.id(fid),
+			fName:    fun.fName,
+			originTU: originTU,
+			owningTU: newTU,
+			funcType: u.qualType(fun.funcType),
+			paramIds: u.eids(fun.paramIds),
+			insns:    u.insns(fun.insns),
+			body:     u.graph(fun.body, newTU),
+		})
+	}
+	for eid, vi := range tu.variables {
+		if linkVarIsSymbol(vi) && !u.winners[eid] {
+			continue
+		}
+		part.variables = append(part.variables, NewValueInfo(vi.name, u.id(eid), u.id(vi.parentId), vi.qualType))
+	}
+	for eid, qt := range tu.qualTypes {
+		if u.winners[eid] {
+			part.types = append(part.types, linkKV[EntityId, QualType]{u.id(eid), u.qualType(qt)})
+		}
+	}
+	for eid, li := range tu.literals {
+		if eid.Kind() == K_EK_ELIT_NUM_IMM || u.winners[eid] {
+			part.literals = append(part.literals, linkKV[EntityId, *LiteralInfo]{u.id(eid), li})
+		}
+	}
+	for id, file := range tu.srcFilesInfo.files {
+		if u.winners[EntityId(id)] {
+			file.id = FileId(u.id(EntityId(id)))
+			part.files = append(part.files, file)
+		}
+	}
+	for id, label := range tu.labels {
+		part.labels = append(part.labels, linkKV[LabelId, string]{LabelId(u.id(EntityId(id))), label})
+	}
+	for id, args := range tu.callSites {
+		part.callSites = append(part.callSites, linkKV[CallSiteId, []EntityId]{u.site(id), u.eids(args)})
+	}
+	for name, eid := range tu.namesToId {
+		part.names = append(part.names, linkKV[string, EntityId]{name, u.id(eid)})
+	}
+	for eid, name := range tu.idsToName {
+		part.idsToName = append(part.idsToName, linkKV[EntityId, string]{u.id(eid), name})
+	}
+	for eid, info := range tu.entityInfo {
+		if info, ok := info.(*InsnInfo); ok {
+			newInfo := &InsnInfo{SrcLoc: u.srcLoc(info.SrcLoc), bbId: BasicBlockId(u.id(EntityId(info.bbId)))}
+			part.entityInfo = append(part.entityInfo, linkKV[EntityId, *InsnInfo]{u.id(eid), newInfo})
+		}
+	}
+	for id, info := range tu.insnInfo {
+		newInfo := InsnInfo{SrcLoc: u.srcLoc(info.SrcLoc), bbId: BasicBlockId(u.id(EntityId(info.bbId)))}
+		part.insnInfo = append(part.insnInfo, linkKV[InsnId, InsnInfo]{InsnId(u.id(EntityId(id))), newInfo})
+	}
+	for eid, loc := range tu.srcLocations {
+		part.srcLocations = append(part.srcLocations, linkKV[EntityId, SrcLoc]{u.id(eid), u.srcLoc(loc)})
+	}
+	return part
+}
+
+// graphInsns returns the instructions of the graph, block by block.
+func graphInsns(g Graph) []Insn {
+	var insns []Insn
+	switch g := g.(type) {
+	case *BasicBlock:
+		if g != nil {
+			insns = append(insns, g.insns...)
+		}
+	case *ControlFlowGraph:
+		if g != nil {
+			for _, bb := range g.basicBlocks {
+				insns = append(insns, bb.insns...)
+			}
+		}
+	}
+	return insns
+}
+
+// mergeLinkParts puts the copied entities into the linked TU, in the order
+// of the TUs.
+func mergeLinkParts(newTU *TU, units []*linkUnit, parts []*linkPart) {
+	initFun := newTU.functions[newTU.globalInit]
+	initInsns := initFun.insns
+	initHasBody := initFun.body != nil
+	if len(initInsns) == 0 && initFun.body != nil {
+		initInsns = graphInsns(initFun.body)
+	}
+
+	for _, part := range parts {
+		if part == nil {
+			continue // the TU linked in place
+		}
+		for _, fun := range part.functions {
+			newTU.functions[fun.fid] = fun
+			newTU.entityInfo[fun.fid] = fun
+		}
+		for _, vi := range part.variables {
+			newTU.variables[vi.eid] = vi
+		}
+		for _, kv := range part.types {
+			newTU.qualTypes[kv.key] = kv.val
+		}
+		for _, kv := range part.literals {
+			newTU.literals[kv.key] = kv.val
+		}
+		for _, file := range part.files {
+			newTU.srcFilesInfo.files[file.id] = file
+			newTU.srcFilesInfo.fileIdMap[file.directory+file.name] = file.id
+		}
+		for _, kv := range part.labels {
+			newTU.labels[kv.key] = kv.val
+		}
+		for _, kv := range part.callSites {
+			newTU.callSites[kv.key] = kv.val
+		}
+		for _, kv := range part.names {
+			if _, ok := newTU.namesToId[kv.key]; !ok {
+				newTU.namesToId[kv.key] = kv.val
+			}
+		}
+		for _, kv := range part.idsToName {
+			newTU.idsToName[kv.key] = kv.val
+		}
+		for _, kv := range part.entityInfo {
+			newTU.entityInfo[kv.key] = kv.val
+		}
+		for _, kv := range part.insnInfo {
+			newTU.insnInfo[kv.key] = kv.val
+		}
+		for _, kv := range part.srcLocations {
+			newTU.srcLocations[kv.key] = kv.val
+		}
+		initInsns = append(initInsns, part.globalInit...)
+		initHasBody = initHasBody || part.initHasBody
+	}
+
+	// The symbols are found by their names (which hide the local names).
+	for _, u := range units {
+		for shard := range linkShards {
+			for _, sym := range u.symbols[shard] {
+				if u.winners[sym.eid] {
+					newTU.namesToId[sym.name] = sym.entry.id
+					newTU.idsToName[sym.entry.id] = sym.name
+				}
+			}
+		}
+	}
+
+	if len(parts) > 1 || parts[0] != nil {
+		initFun.insns = initInsns
+		if initHasBody {
+			initFun.body = ConstructCFG(initInsns)
+		}
+	}
+	newTU.globalVarsOnce, newTU.globalVars = sync.Once{}, nil
+}
+
+// appendLinkTypeKey appends the structural key of the type: the types with
+// the same key are the same type in the linked TU.
+// A record nested in another type is keyed by its name and size only,
+// which ends the recursion of the (self-referential) records; an anonymous
+// record is keyed by its members up to a depth.
+func appendLinkTypeKey(buf []byte, qt QualType, depth int) []byte {
+	if qt == nil {
+		return append(buf, 'n')
+	}
+	buf = strconv.AppendUint(append(buf, 'q'), uint64(qt.GetQBits()), 16)
+	return appendLinkVTKey(buf, qt.GetVT(), depth)
+}
+
+func appendLinkVTKey(buf []byte, vt ValueType, depth int) []byte {
+	const maxDepth = 8
+	if vt == nil {
+		return append(buf, 'n')
+	}
+	appendBasic := func(buf []byte, tag byte) []byte {
+		buf = strconv.AppendUint(append(buf, tag), uint64(vt.GetKind()), 16)
+		buf = strconv.AppendUint(append(buf, '.'), uint64(vt.GetSize()), 16)
+		return strconv.AppendUint(append(buf, '.'), uint64(vt.GetAlign()), 16)
+	}
+	switch vt := vt.(type) {
+	case BasicVT, *BasicVT:
+		return appendBasic(buf, 'b')
+	case *PointerVT:
+		buf = appendBasic(buf, 'p')
+		return appendLinkTypeKey(buf, vt.pointee, depth+1)
+	case *ArrayVT:
+		buf = strconv.AppendUint(append(appendBasic(buf, 'a'), '.'), uint64(vt.size), 16)
+		return appendLinkTypeKey(buf, vt.elemVT, depth+1)
+	case *VarArgsVT:
+		return appendLinkTypeKey(appendBasic(buf, 'v'), vt.elemVT, depth+1)
+	case *RecordVT:
+		buf = strconv.AppendQuote(appendBasic(buf, 'r'), vt.name)
+		if depth > 0 && (vt.name != "" || depth > maxDepth) {
+			return buf
+		}
+		names := make([]string, 0, len(vt.members))
+		for name := range vt.members {
+			names = append(names, name)
+		}
+		slices.Sort(names)
+		buf = append(buf, '{')
+		for _, name := range names {
+			buf = strconv.AppendQuote(buf, name)
+			buf = appendLinkTypeKey(buf, vt.members[name], depth+1)
+		}
+		return append(buf, '}')
+	case *FunctionVT:
+		buf = appendLinkTypeKey(appendBasic(buf, 'f'), vt.returnType, depth+1)
+		buf = append(buf, '(')
+		for _, param := range vt.paramTypes {
+			buf = appendLinkTypeKey(buf, param, depth+1)
+		}
+		if vt.varArgs {
+			buf = append(buf, '.', '.', '.')
+		}
+		return strconv.AppendQuote(append(buf, ')'), vt.callingConvention)
+	}
+	return fmt.Appendf(buf, "%T%v", vt, vt)
 }
@@ -0,0 +1,193 @@
+package spir
+
+import (
+	"strings"
+	"testing"
+)
+
+// A TU with (given the definition or the declaration of g and f):
+//
+//	struct node { struct node *next; int val; };
+//	int g;                          // or: extern int g;
+//	int f(int a) { return g; }      // or: int f(int);
+//	static int helper() { return 1; }
+//	int <fname>() { int x = f(g); return x; }
+func newLinkTestTU(fname string, defineG, defineF bool) *TU {
+	tu := NewTU()
+	tu.tuName = fname + ".c"
+	funcQT := NewQualVT(NewFunctionVT(Int32QT, nil, []QualType{Int32QT}, false, ""), K_QK_QNIL)
+
+	node := &RecordVT{BasicVT: BasicVT{kind: K_VK_TSTRUCT, size: 16, align: 8}, name: "node"}
+	nodePtr := NewQualVT(&PointerVT{BasicVT: BasicVT{kind: K_VK_TPTR_TO_PTR, size: 8, align: 8},
+		pointee: NewQualVT(node, K_QK_QNIL)}, K_QK_QNIL)
+	node.members = map[string]QualType{"next": nodePtr, "val": Int32QT}
+	for _, qt := range []QualType{NewQualVT(node, K_QK_QNIL), Int32QT} {
+		id := tu.idGen.AllocateID(GenKindPrefix16(K_EK_EDATA_TYPE, uint8(qt.GetVT().GetKind())),
+			K_EK_EDATA_TYPE.SeqIdBitLen())
+		tu.qualTypes[EntityId(id)] = qt
+	}
+
+	gQual := K_QK_QEXTERNAL
+	if defineG {
+		gQual = K_QK_QNIL
+	}
+	g := tu.NewVar("g", K_EK_EVAR_GLBL, NIL_ID, NIL_ID, NewQualVT(&Int32VT, gQual))
+
+	f := tu.NewFunction("f", funcQT, nil, nil)
+	if defineF {
+		a := tu.NewVar("a", K_EK_EVAR_LOCL_ARG, NIL_ID, f.Id(), Int32QT)
+		f.paramIds = []EntityId{a}
+		bb := NewBasicBlock(tu.GetUniqueBBId(), 0, f.Id(), 1)
+		tu.AddInsn(bb, ReturnI(ValX(g)), nil)
+		f.body = bb
+	}
+
+	helper := tu.NewFunction("helper", NewQualVT(funcQT.GetVT(), K_QK_QGLBL_STATIC), nil, nil)
+	hbb := NewBasicBlock(tu.GetUniqueBBId(), 0, helper.Id(), 1)
+	tu.AddInsn(hbb, ReturnI(ValX(tu.NewConst(1, Int32QT))), nil)
+	helper.body = hbb
+
+	fun := tu.NewFunction(fname, funcQT, nil, nil)
+	x := tu.NewVar("x", K_EK_EVAR_LOCL, NIL_ID, fun.Id(), Int32QT)
+	site := tu.NewCallSiteId()
+	tu.callSites[site] = []EntityId{g}
+	bb := NewBasicBlock(tu.GetUniqueBBId(), 0, fun.Id(), 2)
+	tu.AddInsn(bb, AssignI(ValX(x), CallX(f.Id(), site)), nil)
+	tu.AddInsn(bb, ReturnI(ValX(x)), nil)
+	fun.body = bb
+	return tu
+}
+
+// The linked functions with the name.
+func linkedFunctions(tu *TU, name string) []*Function {
+	var funs []*Function
+	for _, fid := range tu.FunctionIds() {
+		if fun := tu.functions[fid]; fun.fName == name {
+			funs = append(funs, fun)
+		}
+	}
+	return funs
+}
+
+func TestLinkTUs(t *testing.T) {
+	tu1 := newLinkTestTU(K_MAIN_FUNC_NAME, false, false) // uses g and f
+	tu2 := newLinkTestTU("other", true, true)            // defines g and f
+
+	tu, err := LinkTUs([]*TU{tu1, tu2}, nil, false)
+	if err != nil {
+		t.Fatalf("LinkTUs: %v", err)
+	}
+
+	// One g (the definition) and one f (the definition), two helpers.
+	var globals []EntityId
+	for eid, vi := range tu.variables {
+		if vi.name == "g" {
+			globals = append(globals, eid)
+			if vi.qualType.GetQBits()&K_QK_QEXTERNAL != 0 {
+				t.Errorf("g resolved to its declaration")
+			}
+		}
+	}
+	if len(globals) != 1 {
+		t.Fatalf("got %d globals g, want 1", len(globals))
+	}
+	g := globals[0]
+	fs := linkedFunctions(tu, "f")
+	if len(fs) != 1 || fs[0].body == nil {
+		t.Fatalf("got %d functions f (want 1 with a body)", len(fs))
+	}
+	f := fs[0]
+	if helpers := linkedFunctions(tu, "helper"); len(helpers) != 2 || helpers[0].fid == helpers[1].fid {
+		t.Errorf("got %d static helpers, want 2 with distinct ids", len(helpers))
+	}
+	if got := f.body.EntryBlock().insns[0].GetFirstHalfEntityId(); got != g {
+		t.Errorf("f returns %v, want g %v", got, g)
+	}
+	if len(f.paramIds) != 1 || tu.variables[f.paramIds[0]] == nil {
+		t.Errorf("the parameter of f is not remapped: %v", f.paramIds)
+	}
+
+	// Both callers call the definition of f with g.
+	for _, name := range []string{K_MAIN_FUNC_NAME, "other"} {
+		funs := linkedFunctions(tu, name)
+		if len(funs) != 1 {
+			t.Fatalf("got %d functions %s, want 1", len(funs), name)
+		}
+		bb := funs[0].body.EntryBlock()
+		call := bb.insns[0].GetCallExpr()
+		if call.GetCallee() != f.fid {
+			t.Errorf("%s calls %v, want f %v", name, call.GetCallee(), f.fid)
+		}
+		if args := tu.callSites[call.GetCallSiteId()]; len(args) != 1 || args[0] != g {
+			t.Errorf("%s calls f with %v, want [g %v]", name, args, g)
+		}
+		x := bb.insns[0].GetFirstHalfEntityId()
+		if vi := tu.variables[x]; vi == nil || vi.name != "x" || vi.parentId != funs[0].fid {
+			t.Errorf("the local x of %s is not remapped: %v", name, vi)
+		}
+		if bb.insns[1].GetFirstHalfEntityId() != x {
+			t.Errorf("%s returns %v, want x %v", name, bb.insns[1].GetFirstHalfEntityId(), x)
+		}
+	}
+	if tu.MainFuncId() != linkedFunctions(tu, K_MAIN_FUNC_NAME)[0].fid {
+		t.Errorf("main is not found by its name")
+	}
+
+	// The identical types are unified (including the recursive record).
+	if len(tu.qualTypes) != 2 {
+		t.Errorf("got %d types, want 2: %v", len(tu.qualTypes), tu.qualTypes)
+	}
+
+	// The instruction ids are unique.
+	seen := make(map[InsnId]bool)
+	for _, fun := range tu.functions {
+		if fun.body == nil {
+			continue
+		}
+		for _, bbId := range GetBBWorklist(fun.body, NoOrder) {
+			for _, insn := range fun.body.BasicBlock(bbId).insns {
+				if seen[insn.Id()] {
+					t.Errorf("duplicate instruction id %v", insn.Id())
+				}
+				seen[insn.Id()] = true
+			}
+		}
+	}
+
+	if tu1.parentTU != tu || tu2.parentTU != tu || len(tu.mergedTUs) != 2 {
+		t.Errorf("the TUs are not recorded as merged")
+	}
+}
+
+func TestLinkTUs_modifyFirstTU(t *testing.T) {
+	tu1 := newLinkTestTU(K_MAIN_FUNC_NAME, false, false)
+	tu2 := newLinkTestTU("other", true, true)
+	mainId, fId := tu1.MainFuncId(), tu1.GetEntityId("f")
+
+	tu, err := LinkTUs([]*TU{tu1, tu2}, nil, true)
+	if err != nil {
+		t.Fatalf("LinkTUs: %v", err)
+	}
+	if tu != tu1 {
+		t.Fatalf("the first TU is not linked in place")
+	}
+	if tu.MainFuncId() != mainId || tu.GetEntityId("f") != fId {
+		t.Errorf("the ids of the first TU changed")
+	}
+	if f := tu.functions[fId]; f.body == nil || tu.entityInfo[fId] != f {
+		t.Errorf("f is not resolved to its definition")
+	}
+	if other := linkedFunctions(tu, "other"); len(other) != 1 ||
+		other[0].body.EntryBlock().insns[0].GetCallExpr().GetCallee() != fId {
+		t.Errorf("the other TU does not call f %v", fId)
+	}
+}
+
+func TestLinkTUs_multipleDefinitions(t *testing.T) {
+	tu1 := newLinkTestTU(K_MAIN_FUNC_NAME, true, true)
+	tu2 := newLinkTestTU("other", false, true)
+	_, err := LinkTUs([]*TU{tu1, tu2}, nil, false)
+	if err == nil || !strings.Contains(err.Error(), `multiple definitions of "f"`) {
+		t.Errorf("got error %v, want multiple definitions of f", err)
+	}
+}
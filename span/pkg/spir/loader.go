@@ -0,0 +1,126 @@
+package spir
+
+// This file defines a loader for multiple SPIR protocol buffer files.
+// The files are read, unmarshalled and converted to internal TUs
+// by a bounded pool of workers; the results are collected in the input order.
+// Optionally, the converted TUs are cached as snapshots (see snapshot.go).
+
+import (
+	"errors"
+	"fmt"
+	"io/fs"
+	"runtime"
+	"strings"
+	"sync"
+	"time"
+
+	"github.com/adhuliya/span/pkg/logger"
+)
+
+// The extension of the SPIR protocol buffer files.
+const SpirProtoFileSuffix = ".spir.pb"
+
+// The result of loading a single SPIR file.
+// Either TU is set, or Err is set.
+type LoadResult struct {
+	File         string
+	TU           *TU
+	Err          error
+	Stats        LoadStats
+	FromSnapshot bool // The TU was decoded from a snapshot (see SnapshotCache)
+}
+
+// LoadSpirFile reads a SPIR protocol buffer file and converts it to an internal TU.
+func LoadSpirFile(file string) LoadResult {
+	return LoadSpirFileCached(file, nil)
+}
+
+// LoadSpirFileCached is LoadSpirFile, except that the TU is decoded from its
+// snapshot in the cache if present; otherwise the converted TU is stored in
+// the cache. A nil cache disables the snapshots.
+// A failure to use the cache is logged, and the file is converted as usual.
+func LoadSpirFileCached(file string, cache *SnapshotCache) LoadResult {
+	res := LoadResult{File: file}
+	if !strings.HasSuffix(file, SpirProtoFileSuffix) {
+		res.Err = fmt.Errorf("invalid file extension for: %s (expected %s)", file, SpirProtoFileSuffix)
+		return res
+	}
+
+	var key string
+	var peek func(data []byte) bool
+	if cache != nil {
+		peek = func(data []byte) bool {
+			key = SnapshotKey(data)
+			start := time.Now()
+			tu, err := cache.Load(key)
+			if err != nil {
+				if !errors.Is(err, fs.ErrNotExist) {
+					logger.Get().Warn("Ignoring the TU snapshot", "file", file, "error", err)
+				}
+				return false
+			}
+			res.TU, res.FromSnapshot = tu, true
+			res.Stats.ConvertTime = time.Since(start)
+			return true
+		}
+	}
+
+	bitTU, stats, err := readSpirProto(file, peek)
+	stats.ConvertTime = res.Stats.ConvertTime
+	res.Stats = stats
+	if err != nil {
+		res.Err = fmt.Errorf("failed to read SPIR proto file %s: %w", file, err)
+		return res
+	}
+	if res.FromSnapshot {
+		return res
+	}
+
+	start := time.Now()
+	res.TU = ConvertBitTUToInternalTU(bitTU)
+	res.Stats.ConvertTime = time.Since(start)
+	if res.TU == nil {
+		res.Err = fmt.Errorf("failed to convert to internal TU for file: %s", file)
+		return res
+	}
+	if cache != nil {
+		if err := cache.Store(key, res.TU); err != nil {
+			logger.Get().Warn("Failed to store the TU snapshot", "file", file, "error", err)
+		}
+	}
+	return res
+}
+
+// LoadSpirFiles loads the given files using (at most) jobs workers.
+// A value of jobs < 1 selects GOMAXPROCS workers.
+// The i-th result belongs to files[i]; an error in a file doesn't stop the others.
+func LoadSpirFiles(files []string, jobs int) []LoadResult {
+	return LoadSpirFilesCached(files, jobs, nil)
+}
+
+// LoadSpirFilesCached is LoadSpirFiles using the (possibly nil) snapshot cache.
+func LoadSpirFilesCached(files []string, jobs int, cache *SnapshotCache) []LoadResult {
+	if jobs < 1 {
+		jobs = runtime.GOMAXPROCS(0)
+	}
+	jobs = min(jobs, len(files))
+
+	results := make([]LoadResult, len(files))
+	next := make(chan int)
+	var wg sync.WaitGroup
+	for range jobs {
+		wg.Add(1)
+		go func() {
+			defer wg.Done()
+			for i := range next {
+				results[i] = LoadSpirFileCached(files[i], cache)
+			}
+		}()
+	}
+	for i := range files {
+		next <- i
+	}
+	close(next)
+	wg.Wait()
+	return results
+}
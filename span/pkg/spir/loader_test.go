@@ -0,0 +1,159 @@
+package spir
+
+import (
+	"errors"
+	"os"
+	"path/filepath"
+	"reflect"
+	"slices"
+	"strings"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/logger"
+)
+
+// TestLoadSpirFiles_errorsPerFile checks that errors are collected per file, in the input order.
+func TestLoadSpirFiles_errorsPerFile(t *testing.T) {
+	dir := t.TempDir()
+	badExt := filepath.Join(dir, "a.txt")
+	if err := os.WriteFile(badExt, []byte("not spir"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+
+	files := []string{
+		badExt,
+		filepath.Join(dir, "missing1.spir.pb"),
+		filepath.Join(dir, "b.json"),
+		filepath.Join(dir, "missing2.spir.pb"),
+	}
+	for _, jobs := range []int{0, 1, 3, 16} {
+		results := LoadSpirFiles(files, jobs)
+		if len(results) != len(files) {
+			t.Fatalf("jobs=%d: expected %d results, got %d", jobs, len(files), len(results))
+		}
+		for i, res := range results {
+			if res.File != files[i] {
+				t.Errorf("jobs=%d: result %d is for %s, want %s", jobs, i, res.File, files[i])
+			}
+			if res.Err == nil || res.TU != nil {
+				t.Errorf("jobs=%d: expected an error (and no TU) for %s", jobs, res.File)
+			}
+		}
+		if !strings.Contains(results[0].Err.Error(), "invalid file extension") {
+			t.Errorf("jobs=%d: unexpected error for %s: %v", jobs, files[0], results[0].Err)
+		}
+		if !errors.Is(results[1].Err, os.ErrNotExist) {
+			t.Errorf("jobs=%d: expected a not-exist error for %s: %v", jobs, files[1], results[1].Err)
+		}
+	}
+
+	if results := LoadSpirFiles(nil, 4); len(results) != 0 {
+		t.Errorf("expected no results for no files, got %d", len(results))
+	}
+}
+
+// TestReadAllInto checks reading into a pre-sized buffer, and growing it when too small.
+func TestReadAllInto(t *testing.T) {
+	data := strings.Repeat("spir", 1000)
+	for _, capacity := range []int{0, 1, len(data), len(data) + 1, 2 * len(data)} {
+		buf, err := readAllInto(make([]byte, 0, capacity), strings.NewReader(data))
+		if err != nil {
+			t.Fatalf("cap=%d: %v", capacity, err)
+		}
+		if string(buf) != data {
+			t.Errorf("cap=%d: read %d bytes, want %d", capacity, len(buf), len(data))
+		}
+		if capacity > len(data) && cap(buf) != capacity {
+			t.Errorf("cap=%d: buffer reallocated to %d", capacity, cap(buf))
+		}
+	}
+}
+
+// TestConvertBitTUToInternalTU_body checks that the converted functions
+// have a CFG, with ids, and an exit instruction in every block.
+func TestConvertBitTUToInternalTU_body(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	tu := ConvertBitTUToInternalTU(NewExampleBitTU_Globals())
+
+	f := tu.GetFunction("f:f")
+	if f == nil || tu.GetFunction(K_MAIN_FUNC_NAME) == nil {
+		t.Fatal("the functions are not found by their names")
+	}
+	cfg, ok := f.Body().(*ControlFlowGraph)
+	if !ok {
+		t.Fatalf("expected a CFG body, got %T", f.Body())
+	}
+	// if, L1, L2 and the exit.
+	if cfg.BBCount() != 4 {
+		t.Fatalf("expected 4 basic blocks, got %d", cfg.BBCount())
+	}
+	entry := cfg.EntryBlock()
+	if entry.SuccCount() != 2 || entry.TrueSucc().Insn(0).InsnKind() != K_IK_IRETURN {
+		t.Errorf("the branch of the entry block is not connected")
+	}
+	if exit := cfg.ExitBlock(); exit.InsnCount() != 1 || exit.Insn(0).InsnKind() != K_IK_INOP || exit.PredCount() != 2 {
+		t.Errorf("expected an exit block with a Nop, reached from the returns")
+	}
+
+	ids := map[InsnId]bool{}
+	bbIds := map[BasicBlockId]bool{}
+	for _, bbId := range GetBBWorklist(cfg, NoOrder) {
+		bb := cfg.BasicBlock(bbId)
+		if bb == nil || bbIds[bbId] {
+			t.Fatalf("basic block id %v is not unique", bbId)
+		}
+		bbIds[bbId] = true
+		for i := range bb.InsnCount() {
+			id := bb.Insn(i).Id()
+			if id == 0 || ids[id] {
+				t.Errorf("instruction id %v is not unique", id)
+			}
+			ids[id] = true
+		}
+	}
+}
+
+// The instructions of the functions with a body, printed (without the Nops
+// of the empty blocks, which a loaded TU adds), by function name.
+func functionInsnStrings(tu *TU) map[string][]string {
+	insns := map[string][]string{}
+	for _, fid := range tu.FunctionIds() {
+		fun := tu.functions[fid]
+		if fun.body == nil || fid == tu.globalInit {
+			continue
+		}
+		for _, insn := range graphInsns(fun.body) {
+			if insn.InsnKind() != K_IK_INOP {
+				insns[fun.fName] = append(insns[fun.fName], tu.InsnString(insn, false))
+			}
+		}
+	}
+	return insns
+}
+
+// TestConvertInternalTUToBitTU checks that a TU converted to a BitTU
+// (e.g. a linked TU, to save it) is read back with the same functions.
+func TestConvertInternalTUToBitTU(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	linked, err := LinkTUs([]*TU{newLinkTestTU(K_MAIN_FUNC_NAME, false, false),
+		newLinkTestTU("other", true, true)}, nil, false)
+	if err != nil {
+		t.Fatal(err)
+	}
+	for name, tu := range map[string]*TU{
+		"globals": ConvertBitTUToInternalTU(NewExampleBitTU_Globals()),
+		"linked":  linked,
+	} {
+		want := functionInsnStrings(tu)
+		got := functionInsnStrings(ConvertBitTUToInternalTU(ConvertInternalTUToBitTU(tu)))
+		// The immediate of helper is printed by its id, and read back as a literal.
+		if name == "linked" && !slices.Equal(got["helper"], []string{"return ((X) 1)", "return ((X) 1)"}) {
+			t.Errorf("%s: helper returns %v", name, got["helper"])
+		}
+		delete(want, "helper")
+		delete(got, "helper")
+		if len(want) == 0 || !reflect.DeepEqual(got, want) {
+			t.Errorf("%s: expected the functions %v, got %v", name, want, got)
+		}
+	}
+}
@@ -0,0 +1,979 @@
+package spir
+
+// This file defines a compact binary snapshot of a fully converted TU,
+// and a cache of such snapshots in a directory.
+//
+// Converting a BitTU allocates the ids of all the entities and builds the
+// types, functions and CFGs of the TU. A snapshot stores the result of the
+// conversion (along with the state of the id generator), so that reloading
+// an unchanged SPIR file is a single bulk decode.
+//
+// Layout: magic | uvarint(format version) | the sections of the TU (see
+// WriteTUSnapshot). Maps are written in the ascending order of their keys
+// so that the same TU always has the same snapshot.
+//
+// The types are shared between the entities (e.g. a pointer's pointee is
+// also in tu.qualTypes), hence every type (QualType or ValueType) is written
+// once and referred to by its position afterwards.
+
+import (
+	"bufio"
+	"cmp"
+	"crypto/sha256"
+	"encoding/binary"
+	"encoding/hex"
+	"errors"
+	"fmt"
+	"io"
+	"maps"
+	"os"
+	"path/filepath"
+	"runtime/debug"
+	"slices"
+
+	"github.com/adhuliya/span/pkg/idgen"
+)
+
+// Magic bytes at the start of a TU snapshot.
+const SnapshotMagic = "SPTU"
+
+// Incremented on every change to the layout of a snapshot.
+const SnapshotFormatVersion = 1
+
+// The file extension of the snapshots in a SnapshotCache.
+const SnapshotFileSuffix = ".sptu"
+
+// A sanity limit on the length of a string (or list) in a snapshot.
+const maxSnapshotLen = 1 << 28
+
+// Tags of the types in a snapshot.
+const (
+	snapTagQualVT   uint64 = 1
+	snapTagBasicVT  uint64 = 2 // a BasicVT value
+	snapTagBasicPtr uint64 = 3 // a *BasicVT
+	snapTagPointer  uint64 = 4
+	snapTagArray    uint64 = 5
+	snapTagRecord   uint64 = 6
+	snapTagFunction uint64 = 7
+	snapTagVarArgs  uint64 = 8
+)
+
+// Tags of the function bodies in a snapshot.
+const (
+	snapTagNilGraph uint64 = 0
+	snapTagBB       uint64 = 1
+	snapTagCFG      uint64 = 2
+)
+
+// Tags of the values in tu.entityInfo.
+const (
+	snapTagFunctionInfo uint64 = 1
+	snapTagInsnInfo     uint64 = 2
+)
+
+// EngineVersion identifies the build of the engine that converted a TU.
+// A snapshot is reused only by the same engine version, since a change
+// in the conversion logic may change the converted TU.
+func EngineVersion() string {
+	version := fmt.Sprintf("snapshot-v%d", SnapshotFormatVersion)
+	info, ok := debug.ReadBuildInfo()
+	if !ok {
+		return version
+	}
+	version += " " + info.Main.Version
+	for _, setting := range info.Settings {
+		if setting.Key == "vcs.revision" || setting.Key == "vcs.modified" {
+			version += " " + setting.Value
+		}
+	}
+	return version
+}
+
+// SnapshotKey returns the cache key of the TU converted from the given
+// SPIR file contents: a hash of the contents and the engine version.
+func SnapshotKey(data []byte) string {
+	h := sha256.New()
+	h.Write([]byte(EngineVersion()))
+	h.Write([]byte{0})
+	h.Write(data)
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+// FunctionHash returns a hash of the contents of the function: its id,
+// name, type, parameters and body (the ids of the entities used included).
+// Two functions with the same hash have the same facts for an analysis
+// that depends only on the function (and not on its callees).
+func FunctionHash(tu *TU, fun *Function) string {
+	h := sha256.New()
+	sw := &snapshotWriter{w: bufio.NewWriter(h), typeIds: make(map[any]uint64)}
+	sw.function(tu, fun)
+	if sw.err == nil {
+		sw.err = sw.w.Flush()
+	}
+	if sw.err != nil { // not expected while writing to a hash
+		panic(fmt.Sprintf("failed to hash function %s: %v", fun.fName, sw.err))
+	}
+	return hex.EncodeToString(h.Sum(nil))
+}
+
+// SnapshotCache stores the snapshots of TUs in a directory, by their keys.
+// It is safe for concurrent use (also by multiple processes), since a
+// snapshot is written to a temporary file that is then renamed.
+type SnapshotCache struct {
+	dir string
+}
+
+func NewSnapshotCache(dir string) (*SnapshotCache, error) {
+	if err := os.MkdirAll(dir, 0o755); err != nil {
+		return nil, fmt.Errorf("failed to create snapshot cache dir %s: %w", dir, err)
+	}
+	return &SnapshotCache{dir: dir}, nil
+}
+
+func (c *SnapshotCache) Dir() string {
+	return c.dir
+}
+
+func (c *SnapshotCache) path(key string) string {
+	return filepath.Join(c.dir, key+SnapshotFileSuffix)
+}
+
+// Load reads the TU with the given key.
+// The error satisfies errors.Is(err, fs.ErrNotExist) if there is no such snapshot.
+func (c *SnapshotCache) Load(key string) (*TU, error) {
+	file, err := os.Open(c.path(key))
+	if err != nil {
+		return nil, err
+	}
+	defer file.Close()
+	tu, err := ReadTUSnapshot(file)
+	if err != nil {
+		return nil, fmt.Errorf("invalid snapshot %s: %w", file.Name(), err)
+	}
+	return tu, nil
+}
+
+// Store writes the snapshot of the TU with the given key.
+func (c *SnapshotCache) Store(key string, tu *TU) error {
+	tmp, err := os.CreateTemp(c.dir, key+".*.tmp")
+	if err != nil {
+		return err
+	}
+	defer os.Remove(tmp.Name()) // no-op after a successful rename
+
+	err = WriteTUSnapshot(tmp, tu)
+	if closeErr := tmp.Close(); err == nil {
+		err = closeErr
+	}
+	if err != nil {
+		return err
+	}
+	return os.Rename(tmp.Name(), c.path(key))
+}
+
+// WriteTUSnapshot writes the snapshot of a (not linked) TU.
+func WriteTUSnapshot(w io.Writer, tu *TU) error {
+	if len(tu.mergedTUs) != 0 || tu.parentTU != nil {
+		return fmt.Errorf("cannot snapshot a linked TU: %s", tu.tuName)
+	}
+	sw := &snapshotWriter{w: bufio.NewWriter(w), typeIds: make(map[any]uint64)}
+	sw.w.WriteString(SnapshotMagic)
+	sw.uvarint(SnapshotFormatVersion)
+
+	// 1. Basic information
+	sw.uvarint(uint64(tu.tuId))
+	sw.str(tu.tuName)
+	sw.str(tu.tuAbspath)
+	sw.str(tu.origin)
+	sw.uvarint(uint64(tu.globalInit))
+
+	// 2. The ids allocated so far
+	writeSorted(sw, tu.entityIdMap, func(eid uint64, internalEid EntityId) {
+		sw.uvarint(eid)
+		sw.uvarint(uint64(internalEid))
+	})
+	pools := tu.idGen.State()
+	sw.uvarint(uint64(len(pools)))
+	for _, pool := range pools {
+		sw.uvarint(uint64(pool.PoolId))
+		sw.uvarint(uint64(len(pool.Free)))
+		for _, r := range pool.Free {
+			sw.uvarint(uint64(r.From))
+			sw.uvarint(uint64(r.To))
+		}
+	}
+
+	// 3. The entities
+	writeSorted(sw, tu.qualTypes, func(eid EntityId, qt QualType) {
+		sw.uvarint(uint64(eid))
+		sw.qualType(qt)
+	})
+	writeSorted(sw, tu.variables, func(eid EntityId, vi *ValueInfo) {
+		sw.uvarint(uint64(eid))
+		sw.str(vi.name)
+		sw.uvarint(uint64(vi.eid))
+		sw.uvarint(uint64(vi.parentId))
+		sw.qualType(vi.qualType)
+	})
+	writeSorted(sw, tu.literals, func(eid EntityId, li *LiteralInfo) {
+		sw.uvarint(uint64(eid))
+		sw.qualType(li.qualType)
+		sw.uvarint(li.lowVal)
+		sw.uvarint(li.highVal)
+		sw.str(li.strVal)
+	})
+	writeSorted(sw, tu.labels, func(id LabelId, label string) {
+		sw.uvarint(uint64(id))
+		sw.str(label)
+	})
+	writeSorted(sw, tu.functions, func(fid EntityId, fun *Function) {
+		sw.uvarint(uint64(fid))
+		sw.function(tu, fun)
+	})
+	writeSorted(sw, tu.callSites, func(id CallSiteId, args []EntityId) {
+		sw.uvarint(uint64(id))
+		sw.eids(args)
+	})
+
+	// 4. Meta information
+	writeSorted(sw, tu.namesToId, func(name string, eid EntityId) {
+		sw.str(name)
+		sw.uvarint(uint64(eid))
+	})
+	writeSorted(sw, tu.idsToName, func(eid EntityId, name string) {
+		sw.uvarint(uint64(eid))
+		sw.str(name)
+	})
+	writeSorted(sw, tu.entityInfo, func(eid EntityId, info any) {
+		sw.uvarint(uint64(eid))
+		switch info := info.(type) {
+		case *Function:
+			sw.uvarint(snapTagFunctionInfo)
+			if tu.functions[info.fid] != info {
+				sw.fail(fmt.Errorf("entity info of %v is not a function of the TU", eid))
+			}
+			sw.uvarint(uint64(info.fid))
+		case *InsnInfo:
+			sw.uvarint(snapTagInsnInfo)
+			sw.insnInfo(*info)
+		default:
+			sw.fail(fmt.Errorf("unsupported entity info %T of %v", info, eid))
+		}
+	})
+	writeSorted(sw, tu.insnInfo, func(id InsnId, info InsnInfo) {
+		sw.uvarint(uint64(id))
+		sw.insnInfo(info)
+	})
+	writeSorted(sw, tu.srcLocations, func(eid EntityId, loc SrcLoc) {
+		sw.uvarint(uint64(eid))
+		sw.srcLoc(loc)
+	})
+	files := tu.srcFilesInfo
+	writeSorted(sw, files.fileIdMap, func(path string, id FileId) {
+		sw.str(path)
+		sw.uvarint(uint64(id))
+	})
+	writeSorted(sw, files.files, func(id FileId, file SrcFile) {
+		sw.uvarint(uint64(id))
+		sw.uvarint(uint64(file.id))
+		sw.str(file.name)
+		sw.str(file.directory)
+	})
+	sw.uvarint(uint64(files.fileIdCounter))
+	sw.uvarint(uint64(files.freeSrcLocId))
+
+	if sw.err != nil {
+		return sw.err
+	}
+	return sw.w.Flush()
+}
+
+// ReadTUSnapshot reads a TU written by WriteTUSnapshot.
+func ReadTUSnapshot(r io.Reader) (*TU, error) {
+	sr := &snapshotReader{r: bufio.NewReader(r)}
+	magic := make([]byte, len(SnapshotMagic))
+	if _, err := io.ReadFull(sr.r, magic); err != nil || string(magic) != SnapshotMagic {
+		return nil, errors.New("not a TU snapshot (bad magic)")
+	}
+	if version := sr.uvarint(); version != SnapshotFormatVersion {
+		return nil, fmt.Errorf("unsupported snapshot version %d (expected %d)",
+			version, SnapshotFormatVersion)
+	}
+
+	// The maps are filled directly, NewTU() would allocate ids (for globalInit).
+	tu := &TU{
+		mergedTUs:    make(map[EntityId]*TU),
+		entityInfo:   make(map[EntityId]any),
+		functions:    make(map[EntityId]*Function),
+		literals:     make(map[EntityId]*LiteralInfo),
+		qualTypes:    make(map[EntityId]QualType),
+		insnInfo:     make(map[InsnId]InsnInfo),
+		callSites:    make(map[CallSiteId][]EntityId),
+		labels:       make(map[LabelId]string),
+		variables:    make(map[EntityId]*ValueInfo),
+		namesToId:    make(map[string]EntityId),
+		idsToName:    make(map[EntityId]string),
+		entityIdMap:  make(map[uint64]EntityId),
+		srcLocations: make(map[EntityId]SrcLoc),
+		srcFilesInfo: NewSrcFilesInfo(),
+	}
+
+	// 1. Basic information
+	tu.tuId = EntityId(sr.uvarint())
+	tu.tuName = sr.str()
+	tu.tuAbspath = sr.str()
+	tu.origin = sr.str()
+	tu.globalInit = EntityId(sr.uvarint())
+
+	// 2. The ids allocated so far
+	for range sr.count() {
+		eid := sr.uvarint()
+		tu.entityIdMap[eid] = EntityId(sr.uvarint())
+	}
+	pools := make([]idgen.PoolState, sr.count())
+	for i := range pools {
+		pools[i].PoolId = uint32(sr.uvarint())
+		if n := sr.count(); n > 0 {
+			pools[i].Free = make([]idgen.FreeRange, n)
+		}
+		for j := range pools[i].Free {
+			pools[i].Free[j] = idgen.FreeRange{From: uint32(sr.uvarint()), To: uint32(sr.uvarint())}
+		}
+	}
+	tu.idGen = idgen.NewIDGeneratorFromState(pools)
+
+	// 3. The entities
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		tu.qualTypes[eid] = sr.qualType()
+	}
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		vi := &ValueInfo{}
+		vi.name = sr.str()
+		vi.eid = EntityId(sr.uvarint())
+		vi.parentId = EntityId(sr.uvarint())
+		vi.qualType = sr.qualType()
+		tu.variables[eid] = vi
+	}
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		li := &LiteralInfo{}
+		li.qualType = sr.qualType()
+		li.lowVal = sr.uvarint()
+		li.highVal = sr.uvarint()
+		li.strVal = sr.str()
+		tu.literals[eid] = li
+	}
+	for range sr.count() {
+		id := LabelId(sr.uvarint())
+		tu.labels[id] = sr.str()
+	}
+	for range sr.count() {
+		fid := EntityId(sr.uvarint())
+		tu.functions[fid] = sr.function(tu)
+	}
+	for range sr.count() {
+		id := CallSiteId(sr.uvarint())
+		tu.callSites[id] = sr.eids()
+	}
+
+	// 4. Meta information
+	for range sr.count() {
+		name := sr.str()
+		tu.namesToId[name] = EntityId(sr.uvarint())
+	}
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		tu.idsToName[eid] = sr.str()
+	}
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		switch tag := sr.uvarint(); tag {
+		case snapTagFunctionInfo:
+			fun, ok := tu.functions[EntityId(sr.uvarint())]
+			if !ok {
+				sr.fail(fmt.Errorf("entity info of %v refers to an unknown function", eid))
+			}
+			tu.entityInfo[eid] = fun
+		case snapTagInsnInfo:
+			info := sr.insnInfo()
+			tu.entityInfo[eid] = &info
+		default:
+			sr.fail(fmt.Errorf("unknown entity info tag %d", tag))
+		}
+	}
+	for range sr.count() {
+		id := InsnId(sr.uvarint())
+		tu.insnInfo[id] = sr.insnInfo()
+	}
+	for range sr.count() {
+		eid := EntityId(sr.uvarint())
+		tu.srcLocations[eid] = sr.srcLoc()
+	}
+	files := tu.srcFilesInfo
+	for range sr.count() {
+		path := sr.str()
+		files.fileIdMap[path] = FileId(sr.uvarint())
+	}
+	for range sr.count() {
+		id := FileId(sr.uvarint())
+		file := SrcFile{}
+		file.id = FileId(sr.uvarint())
+		file.name = sr.str()
+		file.directory = sr.str()
+		files.files[id] = file
+	}
+	files.fileIdCounter = uint32(sr.uvarint())
+	files.freeSrcLocId = uint32(sr.uvarint())
+
+	if sr.err != nil {
+		return nil, sr.err
+	}
+	return tu, nil
+}
+
+// writeSorted writes the size of the map, and then calls put on its entries
+// in the ascending order of the keys.
+func writeSorted[K cmp.Ordered, V any](sw *snapshotWriter, m map[K]V, put func(K, V)) {
+	sw.uvarint(uint64(len(m)))
+	for _, key := range slices.Sorted(maps.Keys(m)) {
+		put(key, m[key])
+	}
+}
+
+// snapshotWriter keeps the first error; the writes after an error are no-ops.
+type snapshotWriter struct {
+	w       *bufio.Writer
+	buf     [binary.MaxVarintLen64]byte
+	err     error
+	typeIds map[any]uint64 // type -> 1 + its position in the order written
+}
+
+func (sw *snapshotWriter) fail(err error) {
+	if sw.err == nil {
+		sw.err = err
+	}
+}
+
+func (sw *snapshotWriter) uvarint(v uint64) {
+	if sw.err != nil {
+		return
+	}
+	n := binary.PutUvarint(sw.buf[:], v)
+	_, sw.err = sw.w.Write(sw.buf[:n])
+}
+
+func (sw *snapshotWriter) uint64(v uint64) {
+	if sw.err != nil {
+		return
+	}
+	binary.LittleEndian.PutUint64(sw.buf[:8], v)
+	_, sw.err = sw.w.Write(sw.buf[:8])
+}
+
+func (sw *snapshotWriter) bool(b bool) {
+	if b {
+		sw.uvarint(1)
+	} else {
+		sw.uvarint(0)
+	}
+}
+
+func (sw *snapshotWriter) str(s string) {
+	sw.uvarint(uint64(len(s)))
+	if sw.err == nil {
+		_, sw.err = sw.w.WriteString(s)
+	}
+}
+
+func (sw *snapshotWriter) eids(eids []EntityId) {
+	sw.uvarint(uint64(len(eids)))
+	for _, eid := range eids {
+		sw.uvarint(uint64(eid))
+	}
+}
+
+func (sw *snapshotWriter) srcLoc(loc SrcLoc) {
+	sw.uvarint(uint64(loc.line))
+	sw.uvarint(uint64(loc.col))
+	sw.uvarint(uint64(loc.fileId))
+}
+
+func (sw *snapshotWriter) insnInfo(info InsnInfo) {
+	sw.srcLoc(info.SrcLoc)
+	sw.uvarint(uint64(info.bbId))
+}
+
+func (sw *snapshotWriter) qualType(qt QualType) {
+	if qt == nil {
+		sw.uvarint(0)
+		return
+	}
+	sw.typ(qt)
+}
+
+func (sw *snapshotWriter) valueType(vt ValueType) {
+	if vt == nil {
+		sw.uvarint(0)
+		return
+	}
+	sw.typ(vt)
+}
+
+// typ writes a reference to an already written type: 1 + its position,
+// or a new type: 1 + the number of types written so far, a tag and its content.
+func (sw *snapshotWriter) typ(t any) {
+	switch t.(type) {
+	case *QualVT, BasicVT, *BasicVT, *PointerVT, *ArrayVT, *RecordVT, *FunctionVT, *VarArgsVT:
+	default:
+		// Checked first, as some other types can't be used as a map key.
+		sw.fail(fmt.Errorf("unsupported type %T in snapshot", t))
+		return
+	}
+	if id, ok := sw.typeIds[t]; ok {
+		sw.uvarint(id)
+		return
+	}
+	id := uint64(len(sw.typeIds)) + 1
+	sw.typeIds[t] = id // before the content: the types may be recursive
+	sw.uvarint(id)
+
+	switch t := t.(type) {
+	case *QualVT:
+		sw.uvarint(snapTagQualVT)
+		sw.uvarint(uint64(t.qBits))
+		sw.valueType(t.vt)
+	case BasicVT:
+		sw.uvarint(snapTagBasicVT)
+		sw.basicVT(t)
+	case *BasicVT:
+		sw.uvarint(snapTagBasicPtr)
+		sw.basicVT(*t)
+	case *PointerVT:
+		sw.uvarint(snapTagPointer)
+		sw.basicVT(t.BasicVT)
+		sw.qualType(t.pointee)
+	case *ArrayVT:
+		sw.uvarint(snapTagArray)
+		sw.basicVT(t.BasicVT)
+		sw.qualType(t.elemVT)
+		sw.uvarint(uint64(t.size))
+	case *RecordVT:
+		sw.uvarint(snapTagRecord)
+		sw.basicVT(t.BasicVT)
+		sw.str(t.name)
+		writeSorted(sw, t.members, func(name string, qt QualType) {
+			sw.str(name)
+			sw.qualType(qt)
+		})
+		sw.bool(t.srcLoc != nil)
+		if t.srcLoc != nil {
+			sw.srcLoc(*t.srcLoc)
+		}
+	case *FunctionVT:
+		sw.uvarint(snapTagFunction)
+		sw.basicVT(t.BasicVT)
+		sw.qualType(t.returnType)
+		sw.eids(t.paramIds)
+		sw.uvarint(uint64(len(t.paramTypes)))
+		for _, qt := range t.paramTypes {
+			sw.qualType(qt)
+		}
+		sw.bool(t.varArgs)
+		sw.str(t.callingConvention)
+	case *VarArgsVT:
+		sw.uvarint(snapTagVarArgs)
+		sw.basicVT(t.BasicVT)
+		sw.qualType(t.elemVT)
+	}
+}
+
+func (sw *snapshotWriter) basicVT(vt BasicVT) {
+	sw.uvarint(uint64(vt.kind))
+	sw.uvarint(uint64(vt.size))
+	sw.uvarint(uint64(vt.align))
+}
+
+func (sw *snapshotWriter) insns(insns []Insn) {
+	sw.uvarint(uint64(len(insns)))
+	for _, insn := range insns {
+		sw.uint64(insn.firstHalf)
+		sw.uint64(insn.secondHalf)
+	}
+}
+
+func (sw *snapshotWriter) function(tu *TU, fun *Function) {
+	sw.uvarint(uint64(fun.fid))
+	sw.str(fun.fName)
+	sw.bool(fun.originTU == tu)
+	sw.bool(fun.owningTU == tu)
+	sw.qualType(fun.funcType)
+	sw.eids(fun.paramIds)
+	sw.insns(fun.insns)
+	sw.graph(fun.body)
+}
+
+// graph writes a function body. The edges of a CFG are written as the
+// positions of the basic blocks in the CFG.
+func (sw *snapshotWriter) graph(g Graph) {
+	switch g := g.(type) {
+	case nil:
+		sw.uvarint(snapTagNilGraph)
+	case *BasicBlock:
+		if g == nil {
+			sw.uvarint(snapTagNilGraph)
+			return
+		}
+		sw.uvarint(snapTagBB)
+		sw.basicBlock(g)
+		if len(g.predecessors) != 0 || len(g.successors) != 0 {
+			sw.fail(fmt.Errorf("basic block body %v has edges", g.id))
+		}
+	case *ControlFlowGraph:
+		if g == nil {
+			sw.uvarint(snapTagNilGraph)
+			return
+		}
+		sw.uvarint(snapTagCFG)
+		sw.uvarint(uint64(g.id))
+		sw.uvarint(uint64(g.scope))
+		sw.uvarint(uint64(g.fid))
+
+		pos := make(map[*BasicBlock]uint64, len(g.basicBlocks))
+		for i, bb := range g.basicBlocks {
+			pos[bb] = uint64(i) + 1
+		}
+		ref := func(bb *BasicBlock) {
+			if bb == nil {
+				sw.uvarint(0)
+				return
+			}
+			p, ok := pos[bb]
+			if !ok {
+				sw.fail(fmt.Errorf("basic block %v is not in the CFG %v", bb.id, g.id))
+			}
+			sw.uvarint(p)
+		}
+		sw.uvarint(uint64(len(g.basicBlocks)))
+		for _, bb := range g.basicBlocks {
+			sw.basicBlock(bb)
+		}
+		for _, bb := range g.basicBlocks {
+			sw.uvarint(uint64(len(bb.predecessors)))
+			for _, pred := range bb.predecessors {
+				ref(pred)
+			}
+			sw.uvarint(uint64(len(bb.successors)))
+			for _, succ := range bb.successors {
+				ref(succ)
+			}
+		}
+		ref(g.entryBlock)
+		ref(g.exitBlock)
+	default:
+		sw.fail(fmt.Errorf("unsupported function body %T in snapshot", g))
+	}
+}
+
+func (sw *snapshotWriter) basicBlock(bb *BasicBlock) {
+	sw.uvarint(uint64(bb.id))
+	sw.uvarint(uint64(bb.scope))
+	sw.uvarint(uint64(bb.fid))
+	sw.uvarint(uint64(len(bb.labels)))
+	for _, label := range bb.labels {
+		sw.uvarint(uint64(label))
+	}
+	sw.insns(bb.insns)
+	sw.uvarint(bb.insnBitMap)
+}
+
+// snapshotReader keeps the first error; the reads after an error return zero values.
+type snapshotReader struct {
+	r     *bufio.Reader
+	err   error
+	types []any // the types in the order read
+}
+
+func (sr *snapshotReader) fail(err error) {
+	if sr.err == nil {
+		sr.err = err
+	}
+}
+
+func (sr *snapshotReader) uvarint() uint64 {
+	if sr.err != nil {
+		return 0
+	}
+	v, err := binary.ReadUvarint(sr.r)
+	if err != nil {
+		sr.fail(fmt.Errorf("truncated snapshot: %w", err))
+	}
+	return v
+}
+
+func (sr *snapshotReader) uint64() uint64 {
+	var buf [8]byte
+	if sr.err != nil {
+		return 0
+	}
+	if _, err := io.ReadFull(sr.r, buf[:]); err != nil {
+		sr.fail(fmt.Errorf("truncated snapshot: %w", err))
+		return 0
+	}
+	return binary.LittleEndian.Uint64(buf[:])
+}
+
+func (sr *snapshotReader) bool() bool {
+	return sr.uvarint() != 0
+}
+
+// count reads the length of a list or a map.
+func (sr *snapshotReader) count() int {
+	n := sr.uvarint()
+	if n > maxSnapshotLen {
+		sr.fail(fmt.Errorf("invalid length %d in snapshot", n))
+		return 0
+	}
+	return int(n)
+}
+
+func (sr *snapshotReader) str() string {
+	n := sr.count()
+	if n == 0 || sr.err != nil {
+		return ""
+	}
+	buf := make([]byte, n)
+	if _, err := io.ReadFull(sr.r, buf); err != nil {
+		sr.fail(fmt.Errorf("truncated snapshot: %w", err))
+		return ""
+	}
+	return string(buf)
+}
+
+func (sr *snapshotReader) eids() []EntityId {
+	n := sr.count()
+	if n == 0 {
+		return nil
+	}
+	eids := make([]EntityId, n)
+	for i := range eids {
+		eids[i] = EntityId(sr.uvarint())
+	}
+	return eids
+}
+
+func (sr *snapshotReader) srcLoc() SrcLoc {
+	loc := SrcLoc{}
+	loc.line = uint32(sr.uvarint())
+	loc.col = uint32(sr.uvarint())
+	loc.fileId = FileId(sr.uvarint())
+	return loc
+}
+
+func (sr *snapshotReader) insnInfo() InsnInfo {
+	loc := sr.srcLoc()
+	return NewInsnInfo(BasicBlockId(sr.uvarint()), loc)
+}
+
+func (sr *snapshotReader) qualType() QualType {
+	t := sr.typ()
+	qt, ok := t.(QualType)
+	if t != nil && !ok {
+		sr.fail(fmt.Errorf("expected a QualType, found %T", t))
+	}
+	return qt
+}
+
+func (sr *snapshotReader) valueType() ValueType {
+	t := sr.typ()
+	vt, ok := t.(ValueType)
+	if t != nil && !ok {
+		sr.fail(fmt.Errorf("expected a ValueType, found %T", t))
+	}
+	return vt
+}
+
+// typ reads a type (see snapshotWriter.typ).
+// A new type is registered before its content is read (for recursive types).
+func (sr *snapshotReader) typ() any {
+	id := sr.uvarint()
+	switch {
+	case sr.err != nil || id == 0:
+		return nil
+	case id <= uint64(len(sr.types)):
+		return sr.types[id-1]
+	case id != uint64(len(sr.types))+1:
+		sr.fail(fmt.Errorf("invalid type reference %d in snapshot", id))
+		return nil
+	}
+
+	pos := len(sr.types)
+	sr.types = append(sr.types, nil)
+	switch tag := sr.uvarint(); tag {
+	case snapTagQualVT:
+		t := &QualVT{}
+		sr.types[pos] = t
+		t.qBits = QualBits(sr.uvarint())
+		t.vt = sr.valueType()
+	case snapTagBasicVT:
+		sr.types[pos] = sr.basicVT()
+	case snapTagBasicPtr:
+		t := &BasicVT{}
+		sr.types[pos] = t
+		*t = sr.basicVT()
+	case snapTagPointer:
+		t := &PointerVT{}
+		sr.types[pos] = t
+		t.BasicVT = sr.basicVT()
+		t.pointee = sr.qualType()
+	case snapTagArray:
+		t := &ArrayVT{}
+		sr.types[pos] = t
+		t.BasicVT = sr.basicVT()
+		t.elemVT = sr.qualType()
+		t.size = VTSize(sr.uvarint())
+	case snapTagRecord:
+		t := &RecordVT{}
+		sr.types[pos] = t
+		t.BasicVT = sr.basicVT()
+		t.name = sr.str()
+		n := sr.count()
+		t.members = make(map[string]QualType, n)
+		for range n {
+			name := sr.str()
+			t.members[name] = sr.qualType()
+		}
+		if sr.bool() {
+			loc := sr.srcLoc()
+			t.srcLoc = &loc
+		}
+	case snapTagFunction:
+		t := &FunctionVT{}
+		sr.types[pos] = t
+		t.BasicVT = sr.basicVT()
+		t.returnType = sr.qualType()
+		t.paramIds = sr.eids()
+		if n := sr.count(); n > 0 {
+			t.paramTypes = make([]QualType, n)
+			for i := range t.paramTypes {
+				t.paramTypes[i] = sr.qualType()
+			}
+		}
+		t.varArgs = sr.bool()
+		t.callingConvention = sr.str()
+	case snapTagVarArgs:
+		t := &VarArgsVT{}
+		sr.types[pos] = t
+		t.BasicVT = sr.basicVT()
+		t.elemVT = sr.qualType()
+	default:
+		sr.fail(fmt.Errorf("unknown type tag %d in snapshot", tag))
+	}
+	return sr.types[pos]
+}
+
+func (sr *snapshotReader) basicVT() BasicVT {
+	vt := BasicVT{}
+	vt.kind = ValKind(sr.uvarint())
+	vt.size = VTSize(sr.uvarint())
+	vt.align = VTAlign(sr.uvarint())
+	return vt
+}
+
+func (sr *snapshotReader) insns() []Insn {
+	n := sr.count()
+	if n == 0 {
+		return nil
+	}
+	insns := make([]Insn, n)
+	for i := range insns {
+		insns[i].firstHalf = sr.uint64()
+		insns[i].secondHalf = sr.uint64()
+	}
+	return insns
+}
+
+func (sr *snapshotReader) function(tu *TU) *Function {
+	fun := &Function{}
+	fun.fid = EntityId(sr.uvarint())
+	fun.fName = sr.str()
+	if sr.bool() {
+		fun.originTU = tu
+	}
+	if sr.bool() {
+		fun.owningTU = tu
+	}
+	fun.funcType = sr.qualType()
+	fun.paramIds = sr.eids()
+	fun.insns = sr.insns()
+	fun.body = sr.graph(tu)
+	return fun
+}
+
+func (sr *snapshotReader) graph(tu *TU) Graph {
+	switch tag := sr.uvarint(); tag {
+	case snapTagNilGraph:
+		return nil
+	case snapTagBB:
+		return sr.basicBlock()
+	case snapTagCFG:
+		cfg := &ControlFlowGraph{tu: tu}
+		cfg.id = CFGId(sr.uvarint())
+		cfg.scope = ScopeId(sr.uvarint())
+		cfg.fid = EntityId(sr.uvarint())
+
+		bbs := make([]*BasicBlock, sr.count())
+		for i := range bbs {
+			bbs[i] = sr.basicBlock()
+		}
+		ref := func() *BasicBlock {
+			p := sr.uvarint()
+			if p > uint64(len(bbs)) {
+				sr.fail(fmt.Errorf("invalid basic block reference %d in snapshot", p))
+				return nil
+			}
+			if p == 0 {
+				return nil
+			}
+			return bbs[p-1]
+		}
+		for _, bb := range bbs {
+			if n := sr.count(); n > 0 {
+				bb.predecessors = make([]*BasicBlock, n)
+				for i := range bb.predecessors {
+					bb.predecessors[i] = ref()
+				}
+			}
+			if n := sr.count(); n > 0 {
+				bb.successors = make([]*BasicBlock, n)
+				for i := range bb.successors {
+					bb.successors[i] = ref()
+				}
+			}
+		}
+		cfg.basicBlocks = bbs
+		cfg.entryBlock = ref()
+		cfg.exitBlock = ref()
+		return cfg
+	default:
+		sr.fail(fmt.Errorf("unknown function body tag %d in snapshot", tag))
+		return nil
+	}
+}
+
+func (sr *snapshotReader) basicBlock() *BasicBlock {
+	bb := &BasicBlock{}
+	bb.id = BasicBlockId(sr.uvarint())
+	bb.scope = ScopeId(sr.uvarint())
+	bb.fid = EntityId(sr.uvarint())
+	if n := sr.count(); n > 0 {
+		bb.labels = make([]LabelId, n)
+		for i := range bb.labels {
+			bb.labels[i] = LabelId(sr.uvarint())
+		}
+	}
+	bb.insns = sr.insns()
+	bb.insnBitMap = sr.uvarint()
+	return bb
+}
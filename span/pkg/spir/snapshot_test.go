@@ -0,0 +1,142 @@
+package spir
+
+import (
+	"bytes"
+	"errors"
+	"io/fs"
+	"os"
+	"path/filepath"
+	"slices"
+	"testing"
+
+	"github.com/adhuliya/span/pkg/logger"
+)
+
+func snapshotBytes(t *testing.T, tu *TU) []byte {
+	t.Helper()
+	var buf bytes.Buffer
+	if err := WriteTUSnapshot(&buf, tu); err != nil {
+		t.Fatalf("WriteTUSnapshot: %v", err)
+	}
+	return buf.Bytes()
+}
+
+func insnIds(g Graph) []InsnId {
+	var ids []InsnId
+	cfg, ok := g.(*ControlFlowGraph)
+	if !ok {
+		return ids
+	}
+	for _, bb := range cfg.basicBlocks {
+		for _, insn := range bb.insns {
+			ids = append(ids, insn.Id())
+		}
+	}
+	return ids
+}
+
+// TestTUSnapshot_roundTrip checks that a decoded TU has the same snapshot,
+// functions, instruction ids and id generator state as the original TU.
+func TestTUSnapshot_roundTrip(t *testing.T) {
+	for name, newTU := range map[string]func() *TU{
+		"A": NewExampleTU_A, "B_0": NewExampleTU_B_0, "B_1": NewExampleTU_B_1,
+	} {
+		tu := newTU()
+		data := snapshotBytes(t, tu)
+		decoded, err := ReadTUSnapshot(bytes.NewReader(data))
+		if err != nil {
+			t.Fatalf("%s: ReadTUSnapshot: %v", name, err)
+		}
+		if !bytes.Equal(data, snapshotBytes(t, decoded)) {
+			t.Errorf("%s: the snapshot of the decoded TU differs", name)
+		}
+
+		if !slices.Equal(tu.FunctionIds(), decoded.FunctionIds()) {
+			t.Fatalf("%s: function ids %v, want %v", name, decoded.FunctionIds(), tu.FunctionIds())
+		}
+		for _, fid := range tu.FunctionIds() {
+			fun, got := tu.GetFunctionById(fid), decoded.GetFunctionById(fid)
+			if got.Name() != fun.Name() || (got.Body() == nil) != (fun.Body() == nil) {
+				t.Fatalf("%s: function %v decoded as %q", name, fid, got.Name())
+			}
+			if fun.Body() != nil && !slices.Equal(insnIds(fun.Body()), insnIds(got.Body())) {
+				t.Errorf("%s: insn ids of %q differ", name, fun.Name())
+			}
+		}
+		if got, want := decoded.GetUniqueBBId(), tu.GetUniqueBBId(); got != want {
+			t.Errorf("%s: next BB id is %v, want %v", name, got, want)
+		}
+	}
+}
+
+func TestTUSnapshot_invalid(t *testing.T) {
+	data := snapshotBytes(t, NewExampleTU_A())
+	if _, err := ReadTUSnapshot(bytes.NewReader(data[:len(data)/2])); err == nil {
+		t.Error("expected an error for a truncated snapshot")
+	}
+	if _, err := ReadTUSnapshot(bytes.NewReader([]byte("SPNR"))); err == nil {
+		t.Error("expected an error for a bad magic")
+	}
+}
+
+// TestConvertBitTUToInternalTU_deterministic checks that the ids are
+// allocated independent of the (random) map iteration order.
+func TestConvertBitTUToInternalTU_deterministic(t *testing.T) {
+	logger.Initialize(logger.NewLogConfig("error"))
+	bitTU := &BitTU{
+		TuName:     "det.c",
+		DataTypes:  map[uint64]*BitDataType{},
+		EntityInfo: map[uint64]*BitEntityInfo{},
+	}
+	intTypeEid := uint64(1000)
+	bitTU.DataTypes[intTypeEid] = &BitDataType{Vkind: K_VK_TINT32, TypeId: intTypeEid}
+	for eid := uint64(2); eid < 50; eid++ {
+		name := "v" + string(rune('a'+eid%26))
+		bitTU.EntityInfo[eid] = &BitEntityInfo{Eid: eid, Ekind: K_EK_EVAR_GLBL,
+			Vkind: K_VK_TINT32, DataTypeEid: &intTypeEid, StrVal: &name}
+	}
+
+	want := snapshotBytes(t, ConvertBitTUToInternalTU(bitTU))
+	for range 5 {
+		if got := snapshotBytes(t, ConvertBitTUToInternalTU(bitTU)); !bytes.Equal(got, want) {
+			t.Fatal("converting the same BitTU gave different TUs")
+		}
+	}
+}
+
+func TestSnapshotCache(t *testing.T) {
+	cache, err := NewSnapshotCache(filepath.Join(t.TempDir(), "cache"))
+	if err != nil {
+		t.Fatal(err)
+	}
+	key := SnapshotKey([]byte("contents"))
+	if key == SnapshotKey([]byte("contents2")) {
+		t.Fatal("different contents have the same key")
+	}
+	if _, err := cache.Load(key); !errors.Is(err, fs.ErrNotExist) {
+		t.Fatalf("expected a not-exist error for a missing snapshot, got %v", err)
+	}
+
+	tu := NewExampleTU_B_1()
+	if err := cache.Store(key, tu); err != nil {
+		t.Fatal(err)
+	}
+	loaded, err := cache.Load(key)
+	if err != nil {
+		t.Fatal(err)
+	}
+	if !bytes.Equal(snapshotBytes(t, tu), snapshotBytes(t, loaded)) {
+		t.Error("the loaded TU differs from the stored one")
+	}
+	entries, _ := os.ReadDir(cache.Dir())
+	if len(entries) != 1 {
+		t.Errorf("expected only the snapshot in the cache dir, found %d entries", len(entries))
+	}
+
+	if err := os.WriteFile(cache.path(key), []byte("garbage"), 0o644); err != nil {
+		t.Fatal(err)
+	}
+	if _, err := cache.Load(key); err == nil || errors.Is(err, fs.ErrNotExist) {
+		t.Errorf("expected an invalid snapshot error, got %v", err)
+	}
+}
@@ -11,39 +11,125 @@ package spir
 import (
 	"fmt"
 	"io"
+	"maps"
 	"os"
+	"slices"
+	"sync"
+	"time"
 
+	"github.com/adhuliya/span/pkg/idgen"
 	"github.com/adhuliya/span/pkg/logger"
 
 	"google.golang.org/protobuf/proto"
 )
 
+// Statistics of loading a SPIR file.
+type LoadStats struct {
+	BytesRead     int64
+	ReadTime      time.Duration // Time to read the file into memory
+	UnmarshalTime time.Duration // Time to unmarshal the protobuf message
+	ConvertTime   time.Duration // Time to convert the BitTU to an internal TU
+}
+
+func (s LoadStats) String() string {
+	return fmt.Sprintf("LoadStats(bytes=%d, read=%v, unmarshal=%v, convert=%v)",
+		s.BytesRead, s.ReadTime, s.UnmarshalTime, s.ConvertTime)
+}
+
+// Add accumulates the other stats into s.
+func (s *LoadStats) Add(other LoadStats) {
+	s.BytesRead += other.BytesRead
+	s.ReadTime += other.ReadTime
+	s.UnmarshalTime += other.UnmarshalTime
+	s.ConvertTime += other.ConvertTime
+}
+
+// Buffers to read the SPIR files into. They are reused across files,
+// which is safe as the unmarshalled message doesn't alias the input buffer.
+var spirReadBufPool = sync.Pool{
+	New: func() any { return new([]byte) },
+}
+
+// The message has no required fields, so the (full message) initialization
+// check is skipped, which is a whole extra pass over large TUs.
+var spirUnmarshalOptions = proto.UnmarshalOptions{
+	AllowPartial: true,
+}
+
 func ReadSpirProto(filename string) (*BitTU, error) {
-	bitTU, err := &BitTU{}, error(nil)
+	bitTU, _, err := ReadSpirProtoWithStats(filename)
+	return bitTU, err
+}
 
-	// Open the file for reading
-	file, openErr := os.Open(filename)
-	if openErr != nil {
-		err = openErr
-		return nil, err
+// ReadSpirProtoWithStats reads the file into a (pooled) buffer sized from
+// the file's size, and unmarshals the BitTU from it.
+func ReadSpirProtoWithStats(filename string) (*BitTU, LoadStats, error) {
+	return readSpirProto(filename, nil)
+}
+
+// readSpirProto is ReadSpirProtoWithStats, except that the contents of the
+// file are first passed to peek (if not nil). If peek returns true the
+// contents are not unmarshalled and a nil BitTU is returned.
+// The contents must not be retained by peek (the buffer is reused).
+func readSpirProto(filename string, peek func(data []byte) bool) (*BitTU, LoadStats, error) {
+	stats := LoadStats{}
+	start := time.Now()
+
+	file, err := os.Open(filename)
+	if err != nil {
+		return nil, stats, err
 	}
 	defer file.Close()
 
-	// Read all contents of the file into memory
-	fileData, readErr := io.ReadAll(file)
-	if readErr != nil {
-		err = readErr
-		return nil, err
+	info, err := file.Stat()
+	if err != nil {
+		return nil, stats, err
 	}
 
-	// Unmarshal Protobuf data into BitTU
-	unmarshalErr := proto.Unmarshal(fileData, bitTU)
-	if unmarshalErr != nil {
-		err = unmarshalErr
-		return nil, err
+	bufPtr := spirReadBufPool.Get().(*[]byte)
+	defer spirReadBufPool.Put(bufPtr)
+	size := int(info.Size())
+	if cap(*bufPtr) < size+1 {
+		// One extra byte so that the EOF is detected without growing the buffer.
+		*bufPtr = make([]byte, 0, size+1)
+	}
+	fileData, err := readAllInto((*bufPtr)[:0], file)
+	*bufPtr = fileData[:0] // keep the (possibly grown) buffer for reuse
+	if err != nil {
+		return nil, stats, err
+	}
+	stats.BytesRead = int64(len(fileData))
+	stats.ReadTime = time.Since(start)
+	if peek != nil && peek(fileData) {
+		return nil, stats, nil
 	}
 
-	return bitTU, err
+	start = time.Now()
+	bitTU := &BitTU{}
+	if err := spirUnmarshalOptions.Unmarshal(fileData, bitTU); err != nil {
+		return nil, stats, err
+	}
+	stats.UnmarshalTime = time.Since(start)
+
+	return bitTU, stats, nil
+}
+
+// readAllInto reads r until EOF, appending to buf.
+// Unlike io.ReadAll, it uses the capacity of the given buffer.
+func readAllInto(buf []byte, r io.Reader) ([]byte, error) {
+	for {
+		if len(buf) == cap(buf) {
+			buf = append(buf, 0)[:len(buf)] // grow (only if the file grew after Stat)
+		}
+		n, err := r.Read(buf[len(buf):cap(buf)])
+		buf = buf[:len(buf)+n]
+		if err == io.EOF {
+			return buf, nil
+		}
+		if err != nil {
+			return buf, err
+		}
+	}
 }
 
 func WriteSpirProto(bitTU *BitTU, filename string) error {
@@ -126,27 +212,61 @@ func FetchNameFromBitEntityId(bitTU *BitTU, eid uint64) string {
 
 // PopulateInternalEntityIds populates the internal entity IDs for the translation unit.
 // It reads the entity information from the bit TU and populates the internal entity IDs for the translation unit.
+// The ids are allocated in the ascending order of the bit entity ids (not in
+// the random map order), so that a BitTU is always converted to the same TU.
 func PopulateInternalEntityIds(tu *TU, bitTU *BitTU) {
 	// 1. Convert all BitEntityInfo entity ids to internal entity ids.
-	for eid, entityInfo := range bitTU.EntityInfo {
-		if eid != entityInfo.Eid {
+	eids := slices.Sorted(maps.Keys(bitTU.EntityInfo))
+	for _, eid := range eids {
+		if entityInfo := bitTU.EntityInfo[eid]; eid != entityInfo.Eid {
 			logger.Get().Error("entity ID mismatch", "map key", eid, "EntityInfo.Eid", entityInfo.Eid)
 		}
-		internalEid := CreateInternalEntityIdFromBitEntityInfo(tu, entityInfo)
-		tu.entityIdMap[eid] = internalEid
 	}
+	allocateInternalEntityIds(tu, eids, func(eid uint64) (uint16, uint8) {
+		entityInfo := bitTU.EntityInfo[eid]
+		return GetEntityPrefix16FromBitEntityInfo(entityInfo), entityInfo.Ekind.SeqIdBitLen()
+	})
 
 	// 2. Convert all BitDataType entity ids to internal entity ids.
-	for eid, dataType := range bitTU.DataTypes {
-		if eid != dataType.TypeId {
+	eids = eids[:0]
+	for _, eid := range slices.Sorted(maps.Keys(bitTU.DataTypes)) {
+		if dataType := bitTU.DataTypes[eid]; eid != dataType.TypeId {
 			logger.Get().Error("entity ID mismatch", "map key", eid, "BitDataType.TypeId", dataType.TypeId)
 		}
 		if tu.InternalEntityIdExists(eid) {
 			// Entity id already exists: Skip it. (possible for functions)
 			continue
 		}
-		internalEid := CreateInternalEntityIdFromBitDataType(tu, dataType)
-		tu.entityIdMap[eid] = internalEid
+		eids = append(eids, eid)
+	}
+	allocateInternalEntityIds(tu, eids, func(eid uint64) (uint16, uint8) {
+		return GetEntityPrefix16FromBitDataType(bitTU.DataTypes[eid]), K_EK_EDATA_TYPE.SeqIdBitLen()
+	})
+}
+
+// allocateInternalEntityIds maps the bit entity ids (in order) to new
+// internal entity ids, given the prefix and the sequence id bit length of each.
+// The ids of a prefix are reserved at once (see idgen.IDBlock), and are the
+// same as if allocated one by one.
+func allocateInternalEntityIds(tu *TU, eids []uint64, prefixOf func(uint64) (uint16, uint8)) {
+	counts := make(map[uint16]uint32)
+	for _, eid := range eids {
+		prefix16, _ := prefixOf(eid)
+		counts[prefix16]++
+	}
+
+	blocks := make(map[uint16]*idgen.IDBlock, len(counts))
+	for _, eid := range eids {
+		prefix16, seqIdBitLen := prefixOf(eid)
+		block, ok := blocks[prefix16]
+		if !ok {
+			block = tu.idGen.ReserveIDs(prefix16, seqIdBitLen, counts[prefix16])
+			blocks[prefix16] = block
+		}
+		tu.entityIdMap[eid] = EntityId(block.Next())
+	}
+	for _, block := range blocks {
+		block.Release()
 	}
 }
 
@@ -549,6 +669,7 @@ func CreateFunctionFromBitFunc(tu *TU, bitTU *BitTU, bitFunc *BitFunc) *Function
 	}
 	function.fName = bitFunc.Fname
 	tu.idsToName[function.fid] = function.fName
+	tu.namesToId[function.fName] = function.fid // e.g. for MainFuncId
 	function.originTU, function.owningTU = tu, tu
 	function.funcType = CreateQualTypeFromBitEntityId(tu, bitTU, bitFunc.TypeEid)
 
@@ -565,6 +686,7 @@ func CreateFunctionFromBitFunc(tu *TU, bitTU *BitTU, bitFunc *BitFunc) *Function
 		for i, insn := range bitFunc.Insns {
 			function.insns[i] = CreateInsnFromBitInsn(tu, bitTU, insn)
 		}
+		function.SetBody(tu, function.insns)
 	}
 
 	return function
@@ -637,3 +759,227 @@ func CreateExprFromBitExpr(tu *TU, bitTU *BitTU, bitExpr *BitExpr) Expr {
 	}
 	return Expr(expr)
 }
+
+// ConvertInternalTUToBitTU converts the TU back to a BitTU, e.g. to save a
+// linked TU with WriteSpirProto. The internal entity ids are the bit entity
+// ids. The data types (which the TU refers to by value) and the fields of the
+// records get new ids, above the entity ids, a type for each distinct type.
+// The instructions the BitTU can't represent (e.g. IUSE) are saved without
+// their operands, and are read back as a Nop.
+func ConvertInternalTUToBitTU(tu *TU) *BitTU {
+	bc := &bitConverter{
+		tu: tu,
+		bitTU: &BitTU{
+			TuName:     tu.tuName,
+			NamesToIds: make(map[string]uint64),
+			DataTypes:  make(map[uint64]*BitDataType),
+			EntityInfo: make(map[uint64]*BitEntityInfo),
+		},
+		typeIds: make(map[string]uint64),
+		nextId:  1 << 32,
+	}
+	bitTU := bc.bitTU
+	if tu.tuAbspath != "" {
+		bitTU.AbsPath = &tu.tuAbspath
+	}
+	if tu.origin != "" {
+		bitTU.Origin = &tu.origin
+	}
+
+	for _, eid := range slices.Sorted(maps.Keys(tu.variables)) {
+		variable := tu.variables[eid]
+		info := bc.entity(eid, eid.Kind(), variable.name)
+		info.Vkind = eid.ValKind()
+		if variable.parentId != NIL_ID {
+			info.ParentEid = bitEid(variable.parentId)
+		}
+		if variable.qualType != nil {
+			info.DataTypeEid = bc.typeId(variable.qualType)
+			if qBits := uint32(variable.qualType.GetQBits()); qBits != 0 {
+				info.Qtype = &qBits
+			}
+		}
+	}
+	for _, eid := range slices.Sorted(maps.Keys(tu.literals)) {
+		literal := tu.literals[eid]
+		eKind := K_EK_ELIT_NUM // an immediate literal is read back from its value
+		if eid.Kind() == K_EK_ELIT_STR {
+			eKind = K_EK_ELIT_STR
+		}
+		info := bc.entity(eid, eKind, "")
+		info.Vkind = eid.ValKind()
+		info.LowVal, info.HighVal = &literal.lowVal, &literal.highVal
+		if literal.strVal != "" {
+			info.StrVal = &literal.strVal
+		}
+		if literal.qualType != nil {
+			info.DataTypeEid = bc.typeId(literal.qualType)
+		}
+	}
+	for _, labelId := range slices.Sorted(maps.Keys(tu.labels)) {
+		bc.entity(EntityId(labelId), K_EK_ELABEL, tu.labels[labelId])
+	}
+
+	for _, fid := range tu.FunctionIds() {
+		fun := tu.functions[fid]
+		insns := fun.insns
+		if len(insns) == 0 {
+			insns = graphInsns(fun.body)
+		}
+		bitFunc := &BitFunc{Fid: uint64(fid), Fname: fun.fName}
+		if fid == tu.globalInit {
+			if len(insns) == 0 {
+				continue
+			}
+			bitFunc.Fid = K_00_GLBL_INIT_FUNC_ID
+		} else {
+			info := bc.entity(fid, K_EK_EFUNC, fun.fName)
+			if fun.funcType != nil {
+				info.DataTypeEid = bc.typeId(fun.funcType)
+			}
+		}
+		if fun.funcType != nil {
+			bitFunc.TypeEid = *bc.typeId(fun.funcType)
+			if funcVT, ok := fun.funcType.GetVT().(*FunctionVT); ok {
+				bitFunc.IsVariadic = funcVT.varArgs
+				if funcVT.callingConvention != "" {
+					bitFunc.CallingConvention = &funcVT.callingConvention
+				}
+			}
+		}
+		for _, insn := range insns {
+			bitFunc.Insns = append(bitFunc.Insns, bc.insn(insn))
+		}
+		bitTU.Functions = append(bitTU.Functions, bitFunc)
+	}
+
+	for name, eid := range tu.namesToId {
+		if _, ok := bitTU.EntityInfo[uint64(eid)]; ok {
+			bitTU.NamesToIds[name] = uint64(eid)
+		}
+	}
+	return bitTU
+}
+
+// bitConverter holds the state of ConvertInternalTUToBitTU.
+type bitConverter struct {
+	tu      *TU
+	bitTU   *BitTU
+	typeIds map[string]uint64 // the structural key of a type -> its id
+	nextId  uint64            // the next id of a type or a field
+}
+
+func bitEid(eid EntityId) *uint64 {
+	id := uint64(eid)
+	return &id
+}
+
+func (bc *bitConverter) entity(eid EntityId, eKind EntityKind, name string) *BitEntityInfo {
+	info := &BitEntityInfo{Eid: uint64(eid), Ekind: eKind}
+	if name != "" {
+		info.StrVal = &name
+	}
+	bc.bitTU.EntityInfo[uint64(eid)] = info
+	return info
+}
+
+// typeId returns the id of the data type of the value type of qt (its
+// qualifiers are saved with the entities).
+func (bc *bitConverter) typeId(qt QualType) *uint64 {
+	vt := qt.GetVT()
+	key := string(appendLinkVTKey(nil, vt, 0))
+	if id, ok := bc.typeIds[key]; ok {
+		return &id
+	}
+	id := bc.newId()
+	bc.typeIds[key] = id // before the subtypes, which may refer to it
+	btd := &BitDataType{TypeId: id, Vkind: vt.GetKind()}
+	if size := uint32(vt.GetSize()); size != 0 {
+		btd.Len = &size
+	}
+	if align := uint32(vt.GetAlign()); align != 0 {
+		btd.Align = &align
+	}
+	bc.bitTU.DataTypes[id] = btd
+
+	switch vt := vt.(type) {
+	case *PointerVT:
+		if vt.pointee != nil {
+			btd.SubTypeEid = bc.typeId(vt.pointee)
+		}
+	case *ArrayVT:
+		if vt.elemVT != nil {
+			btd.SubTypeEid = bc.typeId(vt.elemVT)
+		}
+	case *RecordVT:
+		btd.TypeName = &vt.name
+		for _, name := range slices.Sorted(maps.Keys(vt.members)) {
+			field := bc.newId()
+			bc.entity(EntityId(field), K_EK_ERECORD_FIELD, name).Eid = field
+			btd.FopIds = append(btd.FopIds, field)
+			btd.FopTypeEids = append(btd.FopTypeEids, *bc.typeId(vt.members[name]))
+		}
+	case *FunctionVT:
+		btd.Vkind = K_VK_TPTR_TO_FUNC // the kind of a function type in a BitTU
+		if vt.returnType != nil {
+			btd.SubTypeEid = bc.typeId(vt.returnType)
+		}
+		for i, paramId := range vt.paramIds {
+			if i < len(vt.paramTypes) {
+				btd.FopIds = append(btd.FopIds, uint64(paramId))
+				btd.FopTypeEids = append(btd.FopTypeEids, *bc.typeId(vt.paramTypes[i]))
+			}
+		}
+		variadic := vt.varArgs
+		btd.Variadic = &variadic
+	}
+	return &id
+}
+
+func (bc *bitConverter) newId() uint64 {
+	id := bc.nextId
+	bc.nextId++
+	return id
+}
+
+// insn converts the instruction (see CreateInsnFromBitInsn).
+func (bc *bitConverter) insn(insn Insn) *BitInsn {
+	bitInsn := &BitInsn{Ikind: insn.InsnKind()}
+	switch insn.InsnKind() {
+	case K_IK_IRETURN, K_IK_ILABEL, K_IK_IGOTO:
+		bitInsn.Expr1 = bc.expr(insn.GetFirstHalfExpr())
+	case K_IK_ICALL:
+		bitInsn.Expr1 = bc.expr(insn.GetCallExpr())
+	case K_IK_IASGN_SIMPLE, K_IK_IASGN_RHS_OP, K_IK_IASGN_LHS_OP, K_IK_IASGN_CALL:
+		bitInsn.Expr1, bitInsn.Expr2 = bc.expr(insn.LhsX()), bc.expr(insn.RhsX())
+	case K_IK_ICOND:
+		bitInsn.Expr1 = bc.expr(insn.GetFirstHalfExpr())
+		bitInsn.Expr2 = bc.expr(insn.GetTrueFalseLabelsExpr())
+	}
+	return bitInsn
+}
+
+// expr converts the expression (see CreateExprFromBitExpr).
+func (bc *bitConverter) expr(expr Expr) *BitExpr {
+	xk := expr.GetXK()
+	bitExpr := &BitExpr{Xkind: xk}
+	if xk.IsCall() {
+		if callee := expr.GetCallee(); callee != NIL_ID {
+			bitExpr.Oprnd1Eid = bitEid(callee)
+		}
+		for _, arg := range bc.tu.callSites[expr.GetCallSiteId()] {
+			bitExpr.Oprnds = append(bitExpr.Oprnds, uint64(arg))
+		}
+		return bitExpr
+	}
+	if xk == K_XK_XNIL {
+		return bitExpr
+	}
+	if opr1 := expr.GetOpr1(); opr1 != NIL_ID {
+		bitExpr.Oprnd1Eid = bitEid(opr1)
+	}
+	if opr2 := expr.GetOpr2(); opr2 != NIL_ID {
+		bitExpr.Oprnd2Eid = bitEid(opr2)
+	}
+	return bitExpr
+}
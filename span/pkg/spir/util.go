@@ -53,130 +53,106 @@ func ClearBit(value uint64, n uint) uint64 {
 //
 //  6. Create a special Exit basic block which is successor of all basic blocks without
 //     any successors. This is the exit block of the CFG.
+//
+//  7. A basic block holds at most 64 instructions (see BasicBlock), so a longer
+//     run of instructions is split into consecutive basic blocks, each falling
+//     through to the next one.
+//
+// The instructions are partitioned in a single pass, which also indexes the
+// labels by their basic block; the edges (successors and predecessors) are
+// then connected through the index. The blocks, their instructions and their
+// edges are carved out of a few preallocated slices, so the construction is
+// linear in the number of instructions.
 func ConstructCFG(insnSeq []Insn) *ControlFlowGraph {
-	// Setup
-	type LabelToBBMap map[LabelId]*BasicBlock
-
-	var (
-		bbs           []*BasicBlock        // All basic blocks, in order of creation
-		currBB        *BasicBlock          // The current basic block under construction
-		labelToBB     = make(LabelToBBMap) // Mapping labels to basic blocks
-		insnsForBlock []Insn               // To collect instructions for the current block
-		pendingLabels []LabelId            // Any label statements seen at block start
-	)
-
-	// Helper: Create or reuse the current block object
-	startNewBlock := func() {
-		currBB = &BasicBlock{
-			insns:      nil,
-			labels:     nil,
-			successors: nil,
-		}
-		bbs = append(bbs, currBB)
+	const maxBBInsns = 64
+
+	// A basic block under construction: its ranges in insns and labels.
+	type bbSpan struct {
+		insnFrom, insnTo   int
+		labelFrom, labelTo int
 	}
 
-	// Helper: Attach pending label(s) to the current block
-	attachLabelsToBlock := func() {
-		if len(pendingLabels) > 0 {
-			currBB.labels = make([]LabelId, len(pendingLabels))
-			copy(currBB.labels, pendingLabels)
-			for _, lid := range pendingLabels {
-				labelToBB[lid] = currBB
-			}
-			pendingLabels = nil
+	labelCount := 0
+	for i := range insnSeq {
+		if insnSeq[i].IsLabel() {
+			labelCount++
 		}
 	}
-
-	// Helper: Commit current block with its collected insns and (pending) labels
-	commitCurrBB := func() {
-		if currBB == nil {
-			startNewBlock()
+	insns := make([]Insn, 0, len(insnSeq)-labelCount) // the instructions without the labels
+	labels := make([]LabelId, 0, labelCount)
+	labelToBB := make(map[LabelId]int, labelCount) // label -> index of its basic block
+	spans := make([]bbSpan, 0, len(insnSeq)/4+1)
+	curr := bbSpan{}
+
+	// Commit the current basic block (if not empty), and start a new one.
+	commit := func() {
+		if curr.insnTo > curr.insnFrom || curr.labelTo > curr.labelFrom {
+			spans = append(spans, curr)
 		}
-		currBB.insns = append([]Insn(nil), insnsForBlock...)
-		attachLabelsToBlock()
-		insnsForBlock = insnsForBlock[:0]
+		curr = bbSpan{insnFrom: len(insns), insnTo: len(insns), labelFrom: len(labels), labelTo: len(labels)}
 	}
 
-	// Pass 1: Partition instructions into basic blocks as described
-	for i := 0; i < len(insnSeq); i++ {
-		insn := insnSeq[i]
-
-		// If this is a label, possibly open a new block if needed
+	// Pass 1: Partition the instructions into basic blocks.
+	for _, insn := range insnSeq {
 		if insn.IsLabel() {
-			// If we're at start of a block, collect the label for association
-			labelId, _ := insn.GetLabels()
-			// Consecutive labels should stay in the pending list
-			if len(insnsForBlock) == 0 {
-				pendingLabels = append(pendingLabels, labelId)
-			} else {
-				// Previous block ended with real instruction
-				commitCurrBB()
-				startNewBlock()
-				pendingLabels = pendingLabels[:0]
-				pendingLabels = append(pendingLabels, labelId)
+			// A label after an instruction starts a new block; consecutive labels
+			// name the same block.
+			if curr.insnTo > curr.insnFrom {
+				commit()
 			}
+			labelId, _ := insn.GetLabels()
+			labels = append(labels, labelId)
+			curr.labelTo++
+			labelToBB[labelId] = len(spans) // the index of the current block
 			continue
 		}
 
-		// Add to current block's insns
-		insnsForBlock = append(insnsForBlock, insn)
-
-		// If call/call-assignment, always end the block afterwards (except for leading labels)
-		isCall := insn.IsCall()
-		if isCall {
-			commitCurrBB()
-			startNewBlock()
-			continue
+		if curr.insnTo-curr.insnFrom == maxBBInsns {
+			commit() // split a long block (falls through to the next)
 		}
+		insns = append(insns, insn)
+		curr.insnTo++
 
-		// If/Return/Goto means this is a BB terminator
-		if insn.IsIf() || insn.IsGoto() || insn.IsReturn() {
-			commitCurrBB()
-			startNewBlock()
-			continue
+		// A call is kept alone in its block, and If/Return/Goto end the block.
+		if insn.IsCall() || insn.IsIf() || insn.IsGoto() || insn.IsReturn() {
+			commit()
 		}
 	}
-
-	// Commit the last basic block (if has instructions)
-	if len(insnsForBlock) > 0 || len(pendingLabels) > 0 {
-		commitCurrBB()
+	commit()
+
+	// The basic blocks (and the exit block, the last one).
+	bbCount := len(spans) + 1
+	blocks := make([]BasicBlock, bbCount)
+	bbs := make([]*BasicBlock, bbCount)
+	for i := range blocks {
+		bbs[i] = &blocks[i]
 	}
-
-	// --- Pass 2: Connect basic blocks by successors according to jump/label structure ---
-
-	// This helper function `getFirstLabel` finds the first label in a block, either from
-	// the block's `labels` slice or, if none are present, by scanning for a label instruction
-	// in the block's instruction list. However, it is currently unused in this function.
-	// It might have been left from a previous implementation or for future extension,
-	// but right now the label lookup is handled directly elsewhere.
-	// Remove or comment out to silence unused variable error.
-
-	// getFirstLabel := func(bb *BasicBlock) (LabelId, bool) {
-	// 	if len(bb.labels) > 0 {
-	// 		return bb.labels[0], true
-	// 	}
-	// 	for _, insn := range bb.insns {
-	// 		if insn.IsLabel() {
-	// 			lid, _ := insn.GetLabels()
-	// 			return lid, true
-	// 		}
-	// 	}
-	// 	return NIL_LABEL_ID, false
-	// }
-
-	// Build label lookup for fast block jumps if not already done
-	for _, bb := range bbs {
-		for _, lid := range bb.labels {
-			labelToBB[lid] = bb
+	exit := bbCount - 1
+	exitBB := bbs[exit]
+	exitBB.labels = []LabelId{} // No real labels, just for completeness
+	for i, span := range spans {
+		if span.insnTo > span.insnFrom {
+			bbs[i].insns = insns[span.insnFrom:span.insnTo:span.insnTo]
+		}
+		if span.labelTo > span.labelFrom {
+			bbs[i].labels = labels[span.labelFrom:span.labelTo:span.labelTo]
 		}
 	}
 
-	// Traverse and connect blocks
-	exitBB := &BasicBlock{insns: nil, labels: nil, successors: nil}
-	for i, bb := range bbs {
+	// Pass 2: Connect the basic blocks by successors according to the jumps
+	// and labels. A block has at most two successors (true edge first).
+	succs := make([]*BasicBlock, 2*bbCount)
+	predCounts := make([]int, bbCount)
+	for i, bb := range bbs[:len(spans)] {
+		bb.successors = succs[2*i : 2*i : 2*i+2]
+		addSucc := func(succ int) {
+			bb.successors = append(bb.successors, bbs[succ])
+			predCounts[succ]++
+		}
 		nInsns := len(bb.insns)
 		if nInsns == 0 {
-			// Only labels, no real statement - skip
+			// Only labels, no real statement: goes to the exit.
+			addSucc(exit)
 			continue
 		}
 		last := bb.insns[nInsns-1]
@@ -184,37 +160,43 @@ func ConstructCFG(insnSeq []Insn) *ControlFlowGraph {
 		case last.IsGoto():
 			labelId, _ := last.GetLabels()
 			if succ, ok := labelToBB[labelId]; ok {
-				bb.successors = append(bb.successors, succ)
+				addSucc(succ)
 			}
 		case last.IsIf():
 			trueId, falseId := last.GetLabels()
-			if succT, ok := labelToBB[trueId]; ok && succT != nil {
-				bb.successors = append(bb.successors, succT)
+			if succT, ok := labelToBB[trueId]; ok {
+				addSucc(succT)
 			}
-			if succF, ok := labelToBB[falseId]; ok && succF != nil && (succF != bb) {
-				bb.successors = append(bb.successors, succF)
+			if succF, ok := labelToBB[falseId]; ok && succF != i {
+				addSucc(succF)
 			}
 		case last.IsReturn():
-			bb.successors = append(bb.successors, exitBB)
-		default:
+			addSucc(exit)
+		case i+1 < len(spans):
 			// Not ending in a terminator: Fallthrough successor
-			if i+1 < len(bbs) {
-				bb.successors = append(bb.successors, bbs[i+1])
-			} else {
-				// Last basic block, fallthrough to exit
-				bb.successors = append(bb.successors, exitBB)
-			}
+			addSucc(i + 1)
+		default:
+			// Last basic block, fallthrough to exit
+			addSucc(exit)
 		}
-	}
 
-	// Pass 3: All BBs without any successors go to exit
-	for _, bb := range bbs {
+		// All BBs without any successors go to exit
 		if len(bb.successors) == 0 {
-			bb.successors = append(bb.successors, exitBB)
+			addSucc(exit)
+		}
+	}
+
+	// Pass 3: The predecessors, in the order of the blocks.
+	preds := make([]*BasicBlock, 0, 2*bbCount)
+	for i, count := range predCounts {
+		bbs[i].predecessors = preds[len(preds) : len(preds) : len(preds)+count]
+		preds = preds[:len(preds)+count]
+	}
+	for _, bb := range bbs[:len(spans)] {
+		for _, succ := range bb.successors {
+			succ.predecessors = append(succ.predecessors, bb)
 		}
 	}
-	exitBB.labels = []LabelId{} // No real labels, just for completeness
-	bbs = append(bbs, exitBB)
 
 	// Construct CFG struct
 	cfg := &ControlFlowGraph{
@@ -415,7 +397,7 @@ func AllocateInsnIdsForGraph(
 		panic("AllocateInsnIdsForGraph: graph or idGen is nil")
 	}
 	// We use reverse post order for deterministic allocation order, but plain order is also valid.
-	order := ReversePostOrder(graph, false)
+	order := GetBBWorklist(graph, ReversePostOrder)
 	for _, bbId := range order {
 		bb := graph.BasicBlock(bbId)
 		if bb == nil {
@@ -0,0 +1,54 @@
+#!/bin/bash
+
+# Compare the Go benchmarks of two commits with benchstat.
+#
+# Usage: scripts/benchcmp.sh [OLD [NEW [COUNT [BENCH [PKGS...]]]]]
+#   OLD    the baseline revision (default: HEAD~1)
+#   NEW    the revision to compare, or "." for the working tree (default: .)
+#   COUNT  the runs of each benchmark (default: 10; benchstat needs several)
+#   BENCH  the -bench regexp (default: .)
+#   PKGS   the packages to benchmark (default: ./pkg/...)
+#
+# The revisions are checked out into temporary git worktrees, so the working
+# tree is left alone. Needs benchstat:
+#   go install golang.org/x/perf/cmd/benchstat@latest
+
+set -e
+
+OLD="${1:-HEAD~1}"
+NEW="${2:-.}"
+COUNT="${3:-10}"
+BENCH="${4:-.}"
+shift $(( $# < 4 ? $# : 4 ))
+PKGS=("${@:-./pkg/...}")
+
+if ! command -v benchstat >/dev/null 2>&1; then
+    echo "benchstat not found; install it with:" >&2
+    echo "  go install golang.org/x/perf/cmd/benchstat@latest" >&2
+    exit 1
+fi
+
+GIT_ROOT="$(git rev-parse --show-toplevel)"
+MODULE_DIR="$(git rev-parse --show-prefix)" # the span module within the repo
+WORK_DIR="$(mktemp -d)"
+trap 'for wt in "$WORK_DIR"/wt-*; do git -C "$GIT_ROOT" worktree remove --force "$wt" 2>/dev/null || true; done; rm -rf "$WORK_DIR"' EXIT
+
+# run_bench REV OUT: runs the benchmarks of REV into the file OUT.
+run_bench() {
+    local rev="$1" out="$2" dir
+    if [ "$rev" = "." ]; then
+        dir="$GIT_ROOT/$MODULE_DIR"
+    else
+        dir="$WORK_DIR/wt-$(git rev-parse --short "$rev")"
+        git -C "$GIT_ROOT" worktree add --detach --quiet "$dir" "$rev"
+        dir="$dir/$MODULE_DIR"
+    fi
+    echo "Benchmarking $rev ..." >&2
+    (cd "$dir" && go test -run '^$' -bench "$BENCH" -benchmem -count "$COUNT" "${PKGS[@]}") > "$out" ||
+        echo "warning: some benchmarks of $rev failed, see $out" >&2
+}
+
+run_bench "$OLD" "$WORK_DIR/old.txt"
+run_bench "$NEW" "$WORK_DIR/new.txt"
+
+benchstat "$WORK_DIR/old.txt" "$WORK_DIR/new.txt"
@@ -0,0 +1,223 @@
+#! /usr/bin/env python3
+
+"""
+This script reads the results of SPAN analyses written in the facts format:
+
+    span analyze --format facts -o results.facts a.spir.pb
+
+The file is memory-mapped, and the arrays of a function are NumPy views of
+the file (nothing is parsed or copied), so that millions of facts can be
+post-processed without rendering them as text.
+See span/pkg/analysis/factsresults.go for the layout of the file.
+
+A function's facts (see FunctionFacts) are:
+1. insn_ids: the instruction ids (uint32), in ascending order.
+2. in_facts / out_facts: a record (FACT_DTYPE) per instruction, by kind:
+   - NIL: a nil lattice (Top); TOPBOT: only the flags are set.
+   - RANGE: val_kind, and the encoded bounds in a (min) and b (max).
+   - SET: count elements, a bitset over the universe starting at word a.
+   - KV: count entries (KV_DTYPE), starting at the entry a.
+   - STRING: the lattice as text, the string a.
+3. universe: the sorted entity ids of all the sets of the function.
+4. words: the bitsets, each of len(universe)/64 words (rounded up).
+5. kvs: the entries of the KV facts (the key and the record of its value).
+
+Run as a script, it prints a summary of each function.
+"""
+
+import argparse
+import mmap
+import sys
+
+try:
+    import numpy as np
+except ImportError as e:
+    print("Error: Could not import numpy. Install it with: pip install numpy", file=sys.stderr)
+    print(e, file=sys.stderr)
+    sys.exit(1)
+
+MAGIC = b"SPNFACTS"
+VERSION = 1
+
+HEADER_SIZE = 16
+FOOTER_SIZE = 40
+
+# The fact kinds and flags (see FactKind in factsresults.go)
+NIL, TOPBOT, RANGE, SET, KV, STRING = range(6)
+KIND_NAMES = ["nil", "topbot", "range", "set", "kv", "string"]
+FLAG_TOP, FLAG_BOT, FLAG_UNIVERSAL = 1, 2, 4
+
+FACT_DTYPE = np.dtype([
+    ("kind", "u1"), ("flags", "u1"), ("val_kind", "u1"), ("reserved", "u1"),
+    ("count", "<u4"), ("a", "<u8"), ("b", "<u8"),
+])
+KV_DTYPE = np.dtype([("key", "<u4"), ("reserved", "<u4"), ("value", FACT_DTYPE)])
+FUNC_DTYPE = np.dtype([
+    ("offset", "<u8"), ("func_id", "<u4"), ("tu", "<u4"), ("analysis", "<u4"), ("func", "<u4"),
+    ("insns", "<u4"), ("universe", "<u4"), ("words", "<u4"), ("kvs", "<u4"),
+    ("strs", "<u4"), ("str_bytes", "<u4"),
+])
+
+# The NumPy types of the range bounds, by the value kind (K_VK in spir.proto)
+RANGE_DTYPES = {
+    2: np.int8, 3: np.int16, 4: np.int32, 5: np.int64,
+    6: np.uint8, 7: np.uint16, 8: np.uint32, 9: np.uint64,
+    14: np.float32, 15: np.float64,
+}
+
+def align8(n):
+    return (n + 7) & ~7
+
+class FunctionFacts:
+    """The facts of a function, as views of the memory-mapped file."""
+
+    def __init__(self, buf, entry, names):
+        self.func_id = int(entry["func_id"])
+        self.tu = names[entry["tu"]]
+        self.analysis = names[entry["analysis"]]
+        self.name = names[entry["func"]]
+
+        n, u, w, k, s = (int(entry[f]) for f in ("insns", "universe", "words", "kvs", "strs"))
+        pos = int(entry["offset"])
+        self.insn_ids = np.frombuffer(buf, "<u4", n, pos)
+        pos += align8(4 * n)
+        self.in_facts = np.frombuffer(buf, FACT_DTYPE, n, pos)
+        pos += FACT_DTYPE.itemsize * n
+        self.out_facts = np.frombuffer(buf, FACT_DTYPE, n, pos)
+        pos += FACT_DTYPE.itemsize * n
+        self.universe = np.frombuffer(buf, "<u4", u, pos)
+        pos += align8(4 * u)
+        self.words = np.frombuffer(buf, "<u8", w, pos)
+        pos += 8 * w
+        self.kvs = np.frombuffer(buf, KV_DTYPE, k, pos)
+        pos += KV_DTYPE.itemsize * k
+        self._str_offsets = np.frombuffer(buf, "<u4", s + 1, pos)
+        self._str_base = pos + 4 * (s + 1)
+        self._buf = buf
+
+        self.set_words = (u + 63) // 64
+
+    def string(self, index):
+        """Returns the string of a STRING fact (its field a)."""
+        start, end = self._str_offsets[index], self._str_offsets[index + 1]
+        return bytes(self._buf[self._str_base + start:self._str_base + end]).decode("utf-8")
+
+    def set_matrix(self, facts):
+        """Returns a bool matrix, a row per SET fact in facts and a column per entity of the universe."""
+        facts = facts[facts["kind"] == SET]
+        if self.set_words == 0:
+            return np.zeros((len(facts), 0), dtype=bool)
+        starts = facts["a"].astype(np.int64)
+        rows = self.words[starts[:, None] + np.arange(self.set_words)]
+        bits = np.unpackbits(rows.view(np.uint8).reshape(len(facts), -1), axis=1, bitorder="little")
+        return bits[:, :len(self.universe)].astype(bool)
+
+    def set_members(self, fact):
+        """Returns the entity ids in a SET fact."""
+        return self.universe[self.set_matrix(np.asarray([fact], dtype=FACT_DTYPE))[0]]
+
+    def kv_entries(self, fact):
+        """Returns the entries of a KV fact."""
+        start = int(fact["a"])
+        return self.kvs[start:start + int(fact["count"])]
+
+def range_bounds(facts, val_kind):
+    """Returns the (min, max) arrays of the RANGE facts of a value kind, as its NumPy type."""
+    facts = facts[(facts["kind"] == RANGE) & (facts["val_kind"] == val_kind)]
+    dtype = np.dtype(RANGE_DTYPES[val_kind])
+    bounds = np.stack([facts["a"], facts["b"]], axis=1).astype("<u8")
+    if dtype.itemsize < 8:  # the bounds are in the low bytes of the words
+        bounds = bounds.view(np.uint8).reshape(-1, 2, 8)[:, :, :dtype.itemsize].copy()
+    values = bounds.view(dtype).reshape(-1, 2)
+    return values[:, 0], values[:, 1]
+
+class FactsFile:
+    """A facts file, memory-mapped. Use functions (FUNC_DTYPE) and function(i)."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buf = self._buf = self._mmap
+        if len(buf) < HEADER_SIZE + FOOTER_SIZE or bytes(buf[:8]) != MAGIC or bytes(buf[-8:]) != MAGIC:
+            raise ValueError(f"{path}: not a SPAN facts file")
+        self.version = int(np.frombuffer(buf, "<u4", 1, 8)[0])
+        if self.version != VERSION:
+            raise ValueError(f"{path}: unsupported version {self.version} (expected {VERSION})")
+
+        names_offset, name_count, index_offset, func_count = (
+            int(v) for v in np.frombuffer(buf, "<u8", 4, len(buf) - FOOTER_SIZE))
+        offsets = np.frombuffer(buf, "<u8", name_count + 1, names_offset)
+        base = names_offset + 8 * (name_count + 1)
+        self.names = [bytes(buf[base + offsets[i]:base + offsets[i + 1]]).decode("utf-8")
+                      for i in range(name_count)]
+        self.functions = np.frombuffer(buf, FUNC_DTYPE, func_count, index_offset)
+
+    def __len__(self):
+        return len(self.functions)
+
+    def function(self, i):
+        return FunctionFacts(self._buf, self.functions[i], self.names)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.function(i)
+
+    def find(self, name, analysis=None):
+        """Returns the facts of the functions with the name (and the analysis, if given)."""
+        return [f for f in self if f.name == name and (analysis is None or f.analysis == analysis)]
+
+    def close(self):
+        """Closes the file, unless arrays of it are still in use (then it is unmapped with them)."""
+        self.functions = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Print a summary of the SPAN analysis results in a facts file."
+    )
+    parser.add_argument("input", help="SPAN results file (span analyze --format facts)")
+    parser.add_argument("-f", "--func", help="Print the facts of the function with this name", default=None)
+    return parser.parse_args()
+
+def format_fact(facts, fact):
+    kind = int(fact["kind"])
+    if kind == RANGE and int(fact["val_kind"]) in RANGE_DTYPES:
+        lo, hi = range_bounds(np.asarray([fact], dtype=FACT_DTYPE), int(fact["val_kind"]))
+        return f"[{lo[0]}, {hi[0]}]"
+    if kind == SET:
+        return "{" + ", ".join(str(eid) for eid in facts.set_members(fact)) + "}"
+    if kind == KV:
+        entries = facts.kv_entries(fact)
+        return "{" + ", ".join(f"{e['key']}: {format_fact(facts, e['value'])}" for e in entries) + "}"
+    if kind == STRING:
+        return facts.string(int(fact["a"]))
+    flags = int(fact["flags"])
+    return "Top" if flags & FLAG_TOP else "Bot" if flags & FLAG_BOT else KIND_NAMES[kind]
+
+def main():
+    args = parse_args()
+    with FactsFile(args.input) as results:
+        for facts in results:
+            if args.func is not None and facts.name != args.func:
+                continue
+            kinds = np.bincount(np.concatenate([facts.in_facts["kind"], facts.out_facts["kind"]]),
+                                minlength=len(KIND_NAMES))
+            summary = ", ".join(f"{KIND_NAMES[k]}: {n}" for k, n in enumerate(kinds) if n)
+            print(f"{facts.tu}: {facts.analysis}: {facts.name} (id {facts.func_id}): "
+                  f"{len(facts.insn_ids)} insns ({summary})")
+            if args.func is not None:
+                for i, insn_id in enumerate(facts.insn_ids):
+                    print(f"  {insn_id}: IN {format_fact(facts, facts.in_facts[i])}, "
+                          f"OUT {format_fact(facts, facts.out_facts[i])}")
+
+if __name__ == "__main__":
+    main()